@@ -0,0 +1,229 @@
+#Benchmark suite for the driver and GUI data path at 8, 64 and 256 channels. No crate needed: replies are recorded
+#snmp tool output (cli text) or come from a simulated crate (MPODSimulator) running in its own process
+#Run from the repository folder:
+#   python Benchmarks/bench_driver.py                                  print results
+#   python Benchmarks/bench_driver.py --json results.json              also write them as JSON
+#   python Benchmarks/bench_driver.py --save                           store them as the baseline (Benchmarks/baseline.json)
+#   python Benchmarks/bench_driver.py --compare                        compare with the baseline, exit code 1 on a regression
+#Round trip benchmarks (Send, GetFrame, GetAllStatuses, GetAllValues) include the simulated agent's own python time
+#Times are per call [us]: min and median of --repeat runs. A benchmark regresses if its min is more than --tolerance
+#slower than the baseline's (default 50 %: run to run noise on a busy computer reaches ~40 %, more --repeat lowers it)
+#Re-save the baseline after changing computers, numbers from different machines don't compare
+import os
+import sys
+import json
+import time
+import timeit
+import argparse
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+import numpy as np
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from Driver.MPODClass import MPOD
+from Driver.MPODCustomFunctions import CustomFx
+from Driver.MPODSimulator import CrateSimulator
+from GUIExtras.DataBuffer import HistoryStore
+from GUIExtras.Decimate import MinMaxPyramid
+from GUIExtras.Recorder import RunRecorder
+from GUIExtras.RunFile import RunFileWriter
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+SIZES = (8, 64, 256)
+
+def Modules(n_channels):
+    '''{slot: channels} of a crate with n_channels: 16 channel modules (8: one 8 channel module)'''
+    if n_channels <= 16:
+        return {0: n_channels}
+    return {slot: 16 for slot in range(n_channels // 16)}
+
+def ServeSimulator(modules, pipe):
+    sim = CrateSimulator(modules).Start()
+    pipe.send(sim.port)
+    pipe.recv()#blocks until the benchmark is done
+    sim.Stop()
+
+class SimulatorProcess:
+    '''Simulated crate in a child process, so agent work does not share the GIL with the driver being timed'''
+    def __init__(self, modules):
+        self.pipe, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(target = ServeSimulator, args = (modules, child), daemon = True)
+        self.process.start()
+        self.port = self.pipe.recv()
+
+    def Stop(self):
+        self.pipe.send(None)
+        self.process.join(timeout = 5)
+
+def RecordedReplies(channels):
+    '''snmpget/snmpbulkwalk output (crate format) for every ParseReply mode, one value per channel for array modes'''
+    line = 'WIENER-CRATE-MIB::{}.u{} = {}'
+    return {
+        'float': line.format('outputVoltage', channels[0], 'Opaque: Float: 500.000000000000 V') + '\n',
+        'float array': '\n'.join(line.format('outputMeasurementSenseVoltage', ch, f'Opaque: Float: {1000 + ch*0.123456789:.12f} V')
+                                 for ch in channels) + '\n',
+        'binary array': '\n'.join(line.format('outputSwitch', ch, 'INTEGER: on(1)' if ch % 2 else 'INTEGER: off(0)')
+                                  for ch in channels) + '\n',
+        'integer array': '\n'.join(line.format('outputTripTimeMaxCurrent', ch, 'INTEGER: 100 ms') for ch in channels) + '\n',
+        'bits': line.format('outputStatus', channels[0], 'BITS: 04 00 40 outputFailureMaxCurrent(5) outputLowCurrentRange(17)') + '\n',
+        'bits array': '\n'.join(line.format('outputStatus', ch, 'BITS: 80 20 00 outputOn(0) outputRampUp(10) ')
+                                for ch in channels) + '\n',
+        'string': '\n'.join(line.format('outputName', ch, f'STRING: U{ch}') for ch in channels) + '\n',
+    }
+
+#ParseReply mode -> walked object for the native transport replies
+NATIVE_OBJECTS = {'float array': 'outputMeasurementSenseVoltage', 'binary array': 'outputSwitch',
+                  'integer array': 'outputTripTimeMaxCurrent', 'bits array': 'outputStatus', 'string': 'outputName'}
+
+def Time(call, repeat = 5, target = 0.05):
+    '''(min, median) seconds per call. Calls per run are chosen so one run takes about target seconds'''
+    number, elapsed = 1, 0
+    while True:
+        elapsed = timeit.timeit(call, number = number)
+        if elapsed >= target/4 or number >= 100000:
+            break
+        number = number*4
+    number = max(1, int(number*target/max(elapsed, 1e-9)))
+    runs = [t/number for t in timeit.repeat(call, number = number, repeat = repeat)]
+    return min(runs), float(np.median(runs)), number
+
+class DataPath:
+    '''The per frame work of GUI.update_loop without dearpygui: get_plot_data, scale, plot pyramid and history store'''
+    def __init__(self, n_channels, max_data_size = 5000):
+        self.n_outputs = 2*n_channels
+        self.scale_factor = np.ones(self.n_outputs)
+        self.pyramid = MinMaxPyramid(self.n_outputs + 1, max_data_size)
+        self.history = HistoryStore(self.n_outputs + 1)
+        self.start_time = time.monotonic()
+
+    def Row(self, frame):
+        data = np.empty(2*len(frame.v_actual))#GUI.get_plot_data
+        data[::2] = frame.v_actual
+        data[1::2] = frame.i_actual
+        return np.append(time.monotonic() - self.start_time, data*self.scale_factor)
+
+    def Append(self, frame):
+        row = self.Row(frame)
+        self.pyramid.append(row)
+        self.history.append(row)
+        return row
+
+    def Close(self):
+        self.history.close()
+
+def ColumnNames(channels):
+    return ['t[s]'] + [f'{kind}{ch}{unit}' for ch in channels for kind, unit in (('V', '[V]'), ('I', '[mA]'))]
+
+def RunSize(n_channels, repeat):
+    '''{benchmark name: (min, median, calls per run)} for one crate size'''
+    results = {}
+    def Add(name, call):
+        results[name] = Time(call, repeat)
+
+    sim = SimulatorProcess(Modules(n_channels))
+    try:
+        mpod = MPOD('127.0.0.1', port = sim.port)
+        channels = mpod.channels
+        #transport round trips (driver + simulated agent)
+        Add('Send get', lambda: mpod.Send('get', 'sysMainSwitch.0'))
+        mpod.EnableStats()#request statistics overhead
+        Add('Send get stats', lambda: mpod.Send('get', 'sysMainSwitch.0'))
+        mpod.EnableStats(False)
+        Add('Send walk', lambda: mpod.Send('walk', 'outputMeasurementSenseVoltage'))
+        Add('GetFrame', lambda: mpod.GetFrame(['v_actual', 'i_actual', 'pwr_ch']))
+        #parsing only: recorded replies
+        for mode, text in RecordedReplies(channels).items():
+            Add(f'ParseReply {mode} cli', lambda text = text, mode = mode: mpod.ParseReply(text, mode))
+        for mode, name in NATIVE_OBJECTS.items():
+            reply = mpod.Send('walk', name)
+            Add(f'ParseReply {mode} native', lambda reply = reply, mode = mode: mpod.ParseReply(reply, mode))
+        statuses = [['04', '00', '40']]*len(channels)
+        Add('ParseStatus', lambda: [mpod.ParseStatus(status, 'channel', 24) for status in statuses])
+        Add('GetAllStatuses', lambda: mpod.GetAllStatuses('channel'))
+        Add('GetAllStatuses quick', lambda: mpod.GetAllStatuses('channel', quick = True))
+        #CustomFx polling: scheduled (what the GUIs run) and every field
+        fx = CustomFx(mpod)
+        Add('GetAllValues', fx.GetAllValues)
+        def FullRead():
+            fx.scheduler.last_read = {group: -np.inf for group in fx.scheduler.last_read}
+            fx.GetAllValues()
+        Add('GetAllValues all fields', FullRead)
+        frame = fx.last_frame
+        mpod.Close()
+    finally:
+        sim.Stop()
+    #GUI data path and autosave, on the frame read above
+    path = DataPath(len(frame.v_actual))
+    Add('update_loop data', lambda: path.Append(frame))
+    row = path.Row(frame)
+    with tempfile.TemporaryDirectory() as folder:
+        for suffix, writer in (('csv', RunRecorder), ('mpod', RunFileWriter)):
+            rec = writer(os.path.join(folder, f'bench.{suffix}'), ColumnNames(frame.channels), path.scale_factor, 100, True)
+            Add(f'autosave {suffix}', lambda rec = rec: rec.write(row))
+            rec.close()
+    path.Close()
+    return results
+
+def Meta():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = ROOT, capture_output = True, text = True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'commit': commit, 'python': platform.python_version(),
+            'numpy': np.__version__, 'machine': platform.platform(), 'processor': platform.processor() or platform.machine()}
+
+def Run(sizes, repeat):
+    results = {}
+    for n_channels in sizes:
+        for name, (t_min, t_median, number) in RunSize(n_channels, repeat).items():
+            results[f'{name} / {n_channels}'] = {'min_us': t_min*1e6, 'median_us': t_median*1e6, 'calls': number}
+    return {'meta': Meta(), 'results': results}
+
+def Compare(report, baseline, tolerance):
+    '''Print new vs baseline min times. Returns the names that are more than tolerance slower'''
+    regressions = []
+    print(f"\n{'benchmark':<40} {'baseline [us]':>14} {'now [us]':>12} {'ratio':>7}")
+    for name, result in report['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            print(f'{name:<40} {"new":>14} {result["min_us"]:>12.1f}')
+            continue
+        ratio = result['min_us']/old['min_us']
+        flag = ''
+        if ratio > 1 + tolerance:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<40} {old["min_us"]:>14.1f} {result["min_us"]:>12.1f} {ratio:>6.2f}x{flag}')
+    missing = [name for name in baseline['results'] if name not in report['results']]
+    if missing:
+        print(f'Not run (in baseline): {", ".join(missing)}')
+    print(f"Baseline from {baseline['meta'].get('date', '?')} ({baseline['meta'].get('commit', '?')}, {baseline['meta'].get('machine', '?')})")
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Driver and GUI data path benchmarks')
+    parser.add_argument('--sizes', type = int, nargs = '+', default = list(SIZES), help = 'channel counts')
+    parser.add_argument('--repeat', type = int, default = 5, help = 'timed runs per benchmark')
+    parser.add_argument('--json', help = 'write the results to this file')
+    parser.add_argument('--save', nargs = '?', const = BASELINE, help = 'store the results as the baseline')
+    parser.add_argument('--compare', nargs = '?', const = BASELINE, help = 'baseline to compare with')
+    parser.add_argument('--tolerance', type = float, default = 0.5, help = 'allowed slow down before a regression is reported')
+    args = parser.parse_args()
+
+    report = Run(args.sizes, args.repeat)
+    print(f"{'benchmark':<40} {'min [us]':>12} {'median [us]':>12}")
+    for name, result in report['results'].items():
+        print(f'{name:<40} {result["min_us"]:>12.1f} {result["median_us"]:>12.1f}')
+    for path in (args.json, args.save):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(report, file, indent = 1)
+            print(f'Results written to {path}')
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = Compare(report, json.load(file), args.tolerance)
+        if regressions:
+            print(f'{len(regressions)} regression(s): {", ".join(regressions)}')
+            sys.exit(1)
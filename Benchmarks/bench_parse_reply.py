@@ -0,0 +1,65 @@
+#Compares MPOD.ParseReply (tokenized, MPODTransport.TEXT_TOKENS) with the previous split based parser
+#on snmpbulkwalk output for 16, 64 and 128 channels. Run from the repository folder: python Benchmarks/bench_parse_reply.py
+#Times are per reply [us]. ParseColumn additionally returns the channel number of every value (numpy arrays)
+#For scale: one snmpbulkwalk process takes tens of ms, the native transport returns typed values and skips text parsing
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Driver.MPODClass import MPOD
+
+def LegacyParseReply(reply, mode):
+    '''ParseReply cli text branch before the tokenizer (lowercase + split per marker)'''
+    if 'no such instance currently exists at this oid' in reply:
+        return None
+    reply = reply.lower()
+    result = []
+    match mode:
+        case 'float':
+            loc = reply.find('float:')
+            result = float(reply[loc+6:-3])
+        case 'float array':
+            for idx, k in enumerate(reply.split('float: ')):
+                if idx > 0:
+                    result.append(float(k.split(' ')[0]))
+        case 'binary array':
+            for idx, k in enumerate(reply.split('(')):
+                if idx > 0:
+                    result.append(int(k.split(')')[0]))
+        case 'bits array':
+            for idx, bit in enumerate(reply.split('bits: ')):
+                if idx > 0:
+                    result.append([r for r in bit.split(' ') if len(r) == 2])
+    return result
+
+def Channels(n_channels):
+    '''Channel numbers of a crate with n_channels: 16 channel modules in slots 0, 1, 2...'''
+    return [100*(n // 16) + n % 16 for n in range(n_channels)]
+
+def WalkText(n_channels):
+    '''snmpbulkwalk -Op .12 output (crate format) for three columns'''
+    channels = Channels(n_channels)
+    return {
+        'float array': '\n'.join(f'WIENER-CRATE-MIB::outputMeasurementSenseVoltage.u{ch} = Opaque: Float: {1000 + ch*0.123456789:.12f} V'
+                                 for ch in channels) + '\n',
+        'binary array': '\n'.join(f'WIENER-CRATE-MIB::outputSwitch.u{ch} = INTEGER: {"on(1)" if ch % 2 else "off(0)"}'
+                                  for ch in channels) + '\n',
+        'bits array': '\n'.join(f'WIENER-CRATE-MIB::outputStatus.u{ch} = BITS: 80 20 00 outputOn(0) outputRampUp(10) '
+                                for ch in channels) + '\n',
+    }
+
+def Time(call, number):
+    return min(timeit.repeat(call, number = number, repeat = 5))/number*1e6#[us] per call
+
+if __name__ == '__main__':
+    mpod = MPOD(mode = 1)
+    print(f"{'channels':>8} {'mode':>13} {'legacy [us]':>12} {'tokenized [us]':>15} {'speedup':>8} {'ParseColumn [us]':>17}")
+    for n_channels in (16, 64, 128):
+        for mode, text in WalkText(n_channels).items():
+            legacy, new = LegacyParseReply(text, mode), mpod.ParseReply(text, mode)
+            assert legacy == new, f'parsers disagree for {mode}'
+            number = max(20000 // n_channels, 10)
+            t_legacy = Time(lambda: LegacyParseReply(text, mode), number)
+            t_new = Time(lambda: mpod.ParseReply(text, mode), number)
+            t_column = Time(lambda: mpod.ParseColumn(text, mode), number) if mode != 'bits array' else float('nan')
+            print(f'{n_channels:>8} {mode:>13} {t_legacy:>12.1f} {t_new:>15.1f} {t_legacy/t_new:>7.2f}x {t_column:>17.1f}')
@@ -0,0 +1,441 @@
+#asyncio version of the MPOD driver: many requests in flight on one UDP socket, nothing blocks the event loop
+import asyncio
+import random
+import numpy as np
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODTransport import (NativeTransport, NoSuchValue, SNMPError, EncodeMessage, DecodeMessage, MakeVarBind,
+                                      ResolveOID, ChannelIndex, GET, SET, GETBULK)
+    from Driver.MPODClass import SNAPSHOT_FIELDS
+    from Driver.MPODFrame import ChannelMap, ChannelFrame
+    from Driver.MPODStatus import StatusWords
+except ImportError:
+    from MPODTransport import (NativeTransport, NoSuchValue, SNMPError, EncodeMessage, DecodeMessage, MakeVarBind,
+                               ResolveOID, ChannelIndex, GET, SET, GETBULK)
+    from MPODClass import SNAPSHOT_FIELDS
+    from MPODFrame import ChannelMap, ChannelFrame
+    from MPODStatus import StatusWords
+
+class AsyncTransport(asyncio.DatagramProtocol):
+    '''
+    SNMPv2c client for an event loop. Every request gets its own request-id and future, replies are matched by id,
+    so up to max_in_flight PDUs can be outstanding at once. A request is resent (same id) after timeout seconds,
+    retries times, then asyncio.TimeoutError. Replies to requests that already gave up are counted in self.late
+    Same encoding, packing and walk logic as MPODTransport.NativeTransport
+    '''
+    name = 'async'
+
+    def __init__(self, IP, port = 161, read_community = 'public', write_community = 'guru', timeout = 1.0, retries = 2,
+                 max_in_flight = 16, max_message_size = 1400, max_repetitions = 0):
+        self.IP = IP
+        self.port = port
+        self.read_community = read_community
+        self.write_community = write_community
+        self.timeout = timeout
+        self.retries = retries
+        self.max_message_size = max_message_size
+        self.max_repetitions = max_repetitions
+        self.slots = asyncio.Semaphore(max_in_flight)#the crate controller answers one PDU at a time, don't flood it
+        self.pending = {}#request_id: future
+        self.request_id = random.randrange(1, 2**30)
+        self.endpoint = None
+        self.last_cmd = ''
+        self.late = 0
+
+    async def Open(self):
+        loop = asyncio.get_running_loop()
+        self.endpoint, _ = await loop.create_datagram_endpoint(lambda: self, remote_addr = (self.IP, self.port))
+
+    def Close(self):
+        if self.endpoint is not None:
+            self.endpoint.close()
+            self.endpoint = None
+
+    def connection_lost(self, exc):
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError(f'Socket to {self.IP} closed'))
+
+    def datagram_received(self, data, addr):
+        try:
+            request_id, status, index, reply = DecodeMessage(data)
+        except (IndexError, ValueError):#not an SNMP message
+            return
+        future = self.pending.get(request_id)
+        if future is None or future.done():
+            self.late = self.late + 1
+            return
+        future.set_result((status, index, reply))
+
+    def error_received(self, exc):#e.g. ICMP port unreachable, the request times out and is retried
+        pass
+
+    async def Request(self, pdu_tag, varbinds, error_status = 0, error_index = 0):
+        '''Send one PDU and wait for its response. Returns list of VarBind'''
+        if self.endpoint is None:
+            await self.Open()
+        community = self.write_community if pdu_tag == SET else self.read_community
+        self.request_id = self.request_id % (2**31 - 1) + 1
+        request_id = self.request_id
+        packet = EncodeMessage(community, pdu_tag, request_id, varbinds, error_status, error_index)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            async with self.slots:
+                for attempt in range(self.retries + 1):
+                    self.endpoint.sendto(packet)
+                    try:
+                        status, index, reply = await asyncio.wait_for(asyncio.shield(future), self.timeout)
+                        break
+                    except asyncio.TimeoutError:
+                        if attempt == self.retries:
+                            raise
+        finally:
+            del self.pending[request_id]
+        reply = [MakeVarBind(oid, value) for oid, value in reply]
+        if status:
+            raise SNMPError(status, index, reply)
+        return reply
+
+    def Pack(self, varbinds, community):
+        return NativeTransport.Pack(self, varbinds, community)
+
+    async def RequestMany(self, pdu_tag, varbinds):
+        '''Request split into as few PDUs as fit. GET chunks are in flight together, SET chunks go out in order'''
+        community = self.write_community if pdu_tag == SET else self.read_community
+        chunks = self.Pack(varbinds, community)
+        if pdu_tag == SET:
+            replies = [await self.RequestChunk(pdu_tag, chunk) for chunk in chunks]
+        else:
+            replies = await asyncio.gather(*(self.RequestChunk(pdu_tag, chunk) for chunk in chunks))
+        return [vb for reply in replies for vb in reply]
+
+    async def RequestChunk(self, pdu_tag, chunk):
+        try:
+            return await self.Request(pdu_tag, chunk)
+        except SNMPError as err:
+            if err.status != 1 or len(chunk) == 1:#tooBig
+                raise
+            self.max_message_size = self.max_message_size * 3 // 4#agent limit is lower than configured, remember it
+            return await self.RequestMany(pdu_tag, chunk)
+
+    async def BulkWalk(self, roots, max_repetitions = None):
+        '''Walk several columns in parallel with GETBULK. Returns {root: [VarBind]}'''
+        if max_repetitions is None:
+            max_repetitions = self.max_repetitions
+        result = {root: [] for root in roots}
+        last = {root: root for root in roots}
+        active = list(roots)
+        while active:
+            reps = max_repetitions or max(1, (self.max_message_size - 40 - len(self.read_community)) // (32*len(active)))
+            try:
+                reply = await self.Request(GETBULK, [(last[root], None, None) for root in active], 0, reps)
+            except SNMPError as err:
+                if err.status != 1 or reps == 1:
+                    raise
+                self.max_message_size = self.max_message_size * 3 // 4
+                continue
+            done = set()
+            for i, vb in enumerate(reply):#row-major: row 0 of every column, then row 1...
+                root = active[i % len(active)]
+                if root in done:
+                    continue
+                if vb.oid[:len(root)] != root or vb.oid <= last[root] or isinstance(vb.value, NoSuchValue):
+                    done.add(root)
+                    continue
+                result[root].append(vb)
+                last[root] = vb.oid
+            if not reply:
+                done.update(active)
+            active = [root for root in active if root not in done]
+        return result
+
+    async def Walk(self, names, max_repetitions = None):
+        '''Walk MIB columns by name. Returns {name: [VarBind]}'''
+        roots = [ResolveOID(name) for name in names]
+        result = await self.BulkWalk(roots, max_repetitions)
+        return {name: result[root] for name, root in zip(names, roots)}
+
+# Awaitable counterpart of MPODClass.MPOD
+class AsyncMPOD:
+    r'''
+    Get/Set/GetAll* with the names and units of MPODClass.MPOD as coroutines, native SNMP only
+    Requests don't wait for each other (see AsyncTransport), so ramp monitoring, status polling and plotting can share
+    one event loop. A request that fails after its retries gives a warning (self.warnings) and None (NaN in GetAll* lists)
+    Usage Example:
+        async def main():
+            async with AsyncMPOD('169.254.107.70') as mpod:
+                v, i = await asyncio.gather(mpod.GetAllVoltages(), mpod.GetAllCurrents())
+                await mpod.SetTargetVoltage(101, 500)
+                await mpod.SetPower(101, 1)
+                await mpod.WaitVoltages([101], [500])
+        asyncio.run(main())
+    '''
+    def __init__(self, IP = '169.254.107.70', port = 161, timeout = 1.0, retries = 2, max_in_flight = 16, max_repetitions = 0):
+        self.IP = IP
+        self.port = port
+        self.initialized = 0
+        self.warnings = []
+        self.transport = AsyncTransport(IP, port, timeout = timeout, retries = retries, max_in_flight = max_in_flight,
+                                        max_repetitions = max_repetitions)
+        self.channels = []
+        self.n_channels = 0
+        self.channel_map = ChannelMap([])
+
+    async def Connect(self):
+        '''Open the socket, check the crate answers and read the channel list'''
+        await self.transport.Open()
+        pwr = await self.GetPowerCrate()
+        if pwr is None:
+            self.WarnHandler('Crate is not connected or configured correctly')
+        elif not pwr:
+            self.WarnHandler('Crate is off - turn on with SetPowerCrate(1)')
+        self.channels = await self.GetAllNames()
+        self.n_channels = len(self.channels)
+        self.channel_map = ChannelMap(self.channels)
+        self.initialized = 1
+        return self
+
+    def Close(self):
+        self.transport.Close()
+
+    async def __aenter__(self):
+        return await self.Connect()
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        self.Close()
+
+    def WarnHandler(self, warning_text):
+        self.warnings.append(warning_text)
+        print(warning_text)
+
+    ###### BASE REQUESTS ######
+    async def Read(self, names):
+        '''Values of several OIDs ("outputVoltage.u101") in one GET (split only if too big), None for missing ones'''
+        try:
+            reply = await self.transport.RequestMany(GET, [(ResolveOID(name), None, None) for name in names])
+        except (asyncio.TimeoutError, SNMPError, OSError) as ex:
+            self.WarnHandler(f'SNMP command failed. Command: get {" ".join(names)}, Error: {ex!r}')
+            return [None]*len(names)
+        return [None if isinstance(vb.value, NoSuchValue) else vb.value for vb in reply]
+
+    async def Write(self, sets):
+        '''sets: [(name, value type, value)] e.g. [('outputVoltage.u101', 'F', 500)], sent in order. True if accepted'''
+        try:
+            await self.transport.RequestMany(SET, [(ResolveOID(name), value_type, value) for name, value_type, value in sets])
+        except (asyncio.TimeoutError, SNMPError, OSError) as ex:
+            self.WarnHandler(f'SNMP command failed. Command: set {" ".join(str(s) for s in sets)}, Error: {ex!r}')
+            return False
+        return True
+
+    async def GetValue(self, name, scale = 1):
+        value = (await self.Read([name]))[0]
+        return value if value is None else value*scale
+
+    async def SetValue(self, name, value_type, value):
+        return await self.Write([(name, value_type, value)])
+
+    async def WalkColumns(self, names):
+        '''{name: [VarBind]}, None if the walk failed'''
+        try:
+            return await self.transport.Walk(names)
+        except (asyncio.TimeoutError, SNMPError, OSError) as ex:
+            self.WarnHandler(f'SNMP command failed. Command: walk {" ".join(names)}, Error: {ex!r}')
+            return None
+
+    async def GetColumn(self, name, scale = 1, dtype = float):
+        '''One table column in self.channels order, placed by channel number. NaN (0 for integers) for missing channels'''
+        fill = np.nan if dtype is float else 0
+        result = np.full(len(self.channel_map), fill, dtype = dtype)
+        walk = await self.WalkColumns([name])
+        if walk is None:
+            return result.tolist()
+        varbinds = [vb for vb in walk[name] if not isinstance(vb.value, NoSuchValue)]
+        rows = self.channel_map.Rows([ChannelIndex(vb.index) for vb in varbinds])
+        values = np.array([vb.value for vb in varbinds], dtype = dtype)*scale
+        result[rows[rows >= 0]] = values[rows >= 0]
+        if len(varbinds) < len(result):
+            self.WarnHandler(f'No reply from some channels for walk {name}, {fill} returned instead')
+        return result.tolist()
+
+    ###### SINGLE CHANNEL ######
+    async def SetTargetVoltage(self, channel, voltage):
+        '''Channel Voltage Set Target ::: [V] ::: float'''
+        return await self.SetValue(f'outputVoltage.u{channel}', 'F', voltage)
+
+    async def GetTargetVoltage(self, channel):
+        '''Channel Voltage Get Target ::: [V] ::: float'''
+        return await self.GetValue(f'outputVoltage.u{channel}')
+
+    async def SetCurrentLimit(self, channel, current):
+        '''Channel Current Set Target (limit) ::: [mA] ::: float'''
+        return await self.SetValue(f'outputCurrent.u{channel}', 'F', current / 1000)
+
+    async def GetCurrentLimit(self, channel):
+        '''Channel Current Get Target (limit) ::: [mA] ::: float'''
+        return await self.GetValue(f'outputCurrent.u{channel}', 1000)
+
+    async def GetVoltage(self, channel, mode = 'Sense'):
+        '''Channel Actual Voltage Get ::: [V] ::: float. Modes: 'Sense' or 'Terminal' '''
+        return await self.GetValue(f'outputMeasurement{mode}Voltage.u{channel}')
+
+    async def GetCurrent(self, channel):
+        '''Channel Actual Current Get ::: [mA] ::: float'''
+        return await self.GetValue(f'outputMeasurementCurrent.u{channel}', 1000)
+
+    async def GetConfigMaxVoltage(self, channel, mode = 'Sense'):
+        '''Channel Max Voltage Config (nominal) ::: [V] ::: float'''
+        return await self.GetValue(f'outputConfigMax{mode}Voltage.u{channel}')
+
+    async def GetConfigMaxCurrent(self, channel):
+        '''Channel Max Current Config (nominal) ::: [mA] ::: float'''
+        return await self.GetValue(f'outputConfigMaxCurrent.u{channel}', 1000)
+
+    async def SetPower(self, channel, power_state = 0):
+        '''Channel on (1) or off (0). resetEmergencyOff (2), setEmergencyOff (3), clearEvents (10)'''
+        return await self.SetValue(f'outputSwitch.u{channel}', 'i', power_state)
+
+    async def GetPower(self, channel):
+        return await self.GetValue(f'outputSwitch.u{channel}')
+
+    async def SetVoltageRate(self, channel, rate, direction = 'Rise'):
+        '''Channel Voltage Set Rise Rate ::: [V/s] ::: float, minimum 1 mV/s'''
+        if rate < 0.001:
+            rate = 0.001
+            self.WarnHandler('Requested rate too low! Rate set to minimum 1 mV/s')
+        return await self.SetValue(f'outputVoltage{direction}Rate.u{channel}', 'F', rate)
+
+    async def GetVoltageRate(self, channel, direction = 'Rise'):
+        '''Channel Voltage Get Rise Rate ::: [V/s] ::: float'''
+        return await self.GetValue(f'outputVoltage{direction}Rate.u{channel}')
+
+    async def SetCurrentRate(self, channel, rate, direction = 'Rise'):
+        '''Channel Current Set Rise Rate ::: [mA/s] ::: float'''
+        return await self.SetValue(f'outputCurrent{direction}Rate.u{channel}', 'F', rate / 1000)
+
+    async def GetCurrentRate(self, channel, direction = 'Rise'):
+        '''Channel Current Get Rise Rate ::: [mA/s] ::: float'''
+        return await self.GetValue(f'outputCurrent{direction}Rate.u{channel}', 1000)
+
+    async def SetTripTimeMaxCurrent(self, channel, time):
+        '''HV only ::: [ms] ::: int'''
+        return await self.SetValue(f'outputTripTimeMaxCurrent.u{channel}', 'i', int(time))
+
+    async def GetTripTimeMaxCurrent(self, channel):
+        '''HV only ::: [ms] ::: int'''
+        return await self.GetValue(f'outputTripTimeMaxCurrent.u{channel}')
+
+    ###### ALL CHANNELS (self.channels order) ######
+    async def GetAllTargetVoltages(self):
+        return await self.GetColumn('outputVoltage')
+
+    async def GetAllCurrentLimits(self):
+        return await self.GetColumn('outputCurrent', 1000)
+
+    async def GetAllVoltages(self, mode = 'Sense'):
+        return await self.GetColumn(f'outputMeasurement{mode}Voltage')
+
+    async def GetAllCurrents(self):
+        return await self.GetColumn('outputMeasurementCurrent', 1000)
+
+    async def GetAllConfigMaxVoltages(self, mode = 'Sense'):
+        return await self.GetColumn(f'outputConfigMax{mode}Voltage')
+
+    async def GetAllConfigMaxCurrents(self):
+        return await self.GetColumn('outputConfigMaxCurrent', 1000)
+
+    async def GetAllVoltageRates(self, direction = 'Rise'):
+        return await self.GetColumn(f'outputVoltage{direction}Rate')
+
+    async def GetAllCurrentRates(self, direction = 'Rise'):
+        return await self.GetColumn(f'outputCurrent{direction}Rate', 1000)
+
+    async def GetAllTripTimeMaxCurrent(self):
+        return await self.GetColumn('outputTripTimeMaxCurrent', dtype = np.int64)
+
+    async def GetAllPowers(self):
+        return await self.GetColumn('outputSwitch', dtype = np.int64)
+
+    async def GetAllNames(self):
+        '''Channel numbers in walk order (u101 -> 101)'''
+        walk = await self.WalkColumns(['outputName'])
+        if walk is None:
+            return []
+        return [ChannelIndex(vb.index) for vb in walk['outputName'] if not isinstance(vb.value, NoSuchValue)]
+
+    async def GetSnapshot(self, fields = None, channels = None):
+        '''MPOD.GetSnapshot: several fields of several channels in one GET ({field: [value per channel]}, None if missing)'''
+        if fields is None:
+            fields = ['pwr_crate', 'i_limit', 'i_rate', 'i_actual', 'v_target', 'v_rate', 'v_actual', 'pwr_ch']
+        if channels is None:
+            channels = self.channels
+        ch_fields = [f for f in fields if f != 'pwr_crate']
+        values = await self.Read([f'{SNAPSHOT_FIELDS[f][0]}.u{ch}' for f in ch_fields for ch in channels] + ['sysMainSwitch.0'])
+        n = len(channels)
+        result = {}
+        for k, f in enumerate(ch_fields):
+            scale = SNAPSHOT_FIELDS[f][2]
+            result[f] = [v if (v is None or scale is None) else v*scale for v in values[k*n:(k+1)*n]]
+        if 'pwr_crate' in fields:
+            result['pwr_crate'] = int(values[-1] or 0)
+        return result
+
+    async def GetFrame(self, fields = None):
+        '''MPOD.GetFrame: several columns in one multi-column walk into a ChannelFrame (GUI units, status as words)'''
+        if fields is None:
+            fields = ['i_limit', 'i_rate', 'i_actual', 'v_target', 'v_rate', 'v_actual', 'pwr_ch']
+        frame = ChannelFrame(self.channel_map, fields)
+        walk = await self.WalkColumns([SNAPSHOT_FIELDS[f][0] for f in fields])
+        if walk is None:
+            return frame
+        for f in fields:
+            name, mode, scale = SNAPSHOT_FIELDS[f]
+            varbinds = [vb for vb in walk[name] if not isinstance(vb.value, NoSuchValue)]
+            values = [vb.value for vb in varbinds]
+            if mode == 'bits':
+                values = StatusWords(values, 'channel')
+            frame.Fill(f, [ChannelIndex(vb.index) for vb in varbinds], values, scale)
+        return frame
+
+    async def GetStatusArray(self, mode = 'channel'):
+        '''MPOD.GetStatusArray: status words (uint32), channel words in self.channels order (0 if missing)'''
+        name = 'moduleStatus' if mode == 'module' else 'outputStatus'
+        walk = await self.WalkColumns([name])
+        if walk is None:
+            return StatusWords([], mode)
+        varbinds = [vb for vb in walk[name] if not isinstance(vb.value, NoSuchValue)]
+        words = StatusWords([vb.value for vb in varbinds], mode)
+        if mode == 'module':
+            return words
+        result = np.zeros(len(self.channel_map), dtype = words.dtype)
+        rows = self.channel_map.Rows([ChannelIndex(vb.index) for vb in varbinds])
+        result[rows[rows >= 0]] = words[rows >= 0]
+        return result
+
+    ###### CRATE & MODULES ######
+    async def SetPowerCrate(self, power_state = None):
+        if power_state is None:
+            power_state = int(not await self.GetPowerCrate())
+        return await self.SetValue('sysMainSwitch.0', 'i', power_state)
+
+    async def GetPowerCrate(self):
+        return await self.GetValue('sysMainSwitch.0')
+
+    async def ClearModule(self, module):
+        return await self.SetValue(f'moduleDoClear.ma{module}', 'i', 1)
+
+    ###### MONITORING ######
+    async def WaitVoltages(self, channels, targets, thresh = 1, interval = 0.1, timeout = None):
+        '''
+        Wait until every channel's measured voltage is within thresh [V] of its target (sign ignored, like RampTogether)
+        Polls all channels in one GET every interval seconds without blocking the loop. False on timeout
+        '''
+        loop = asyncio.get_running_loop()
+        t_end = None if timeout is None else loop.time() + timeout
+        names = [f'outputMeasurementSenseVoltage.u{ch}' for ch in channels]
+        while True:
+            values = await self.Read(names)
+            if None not in values and all(abs(abs(v) - abs(t)) <= thresh for v, t in zip(values, targets)):
+                return True
+            if t_end is not None and loop.time() > t_end:
+                return False
+            await asyncio.sleep(interval)
@@ -0,0 +1,363 @@
+#One process owns the crate connection: it polls CustomFx.GetAllValues, publishes every frame to a FrameBus
+#(shared memory) and runs commands from the GUI processes one at a time, in the order they were sent
+import multiprocessing
+import pickle
+import queue
+import threading
+import time
+import traceback
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODClass import MPOD
+    from Driver.MPODCustomFunctions import CustomFx
+    from Driver.MPODFrame import ChannelMap, ChannelFrame, CrateFrame
+    from Driver.MPODFrameBus import FrameBus, BusName
+except ImportError:
+    from MPODClass import MPOD
+    from MPODCustomFunctions import CustomFx
+    from MPODFrame import ChannelMap, ChannelFrame, CrateFrame
+    from MPODFrameBus import FrameBus, BusName
+
+''' Viewers never talk SNMP: frames come from shared memory, so another viewer adds no crate traffic
+Commands (any MPOD or CustomFx method) go through one queue and are executed by one thread in the broker,
+so writes reach the crate in the order they were sent, whichever process sent them
+Usage Example (see multigui.py):
+    broker = CrateBroker(IP = '169.254.107.70', active_modules = [0], channel_names = names)
+    broker.Start()
+    p = multiprocessing.Process(target = start_gui, args = (broker.Client(),))#one client per process
+    ...in the GUI process:
+    client.FX.last_frame#newest CrateFrame, read from shared memory
+    client.MPOD.SetPowerCrate(1)#runs in the broker
+    broker.Stop()
+'''
+
+#attributes copied to the Remote* stand-ins once at startup (static for the life of the broker)
+FX_ATTRIBUTES = ('my_channels', 'full_channel_list', 'modules', 'channels', 'channel_names', 'n_channels', 'channel_locs',
+                 'active_modules', 'active_channels', 'max_voltage_ramp', 'status_override')
+CRATE_ATTRIBUTES = ('IP', 'port', 'mode', 'channels', 'n_channels', 'initialized')
+BUS_MAX_CHANNELS, BUS_MAX_MODULES = 1000, 10#frame bus size, the crate's channel index (u0..u999, slot*100 + channel) limits it
+HEARTBEAT_PERIOD = 0.2#[s] the broker writes time.time() to CrateBroker.heartbeat this often (-1 once it has stopped)
+HEARTBEAT_TIMEOUT = 2#[s] a client gives up on a broker whose heartbeat is older than this (process died or hangs)
+
+class CrateBroker:
+    '''
+    Starts and stops the broker process, hands out clients for the viewer processes
+    sample_rate: [Hz] GetAllValues polls per second (0: as fast as the crate answers, None: FX.scheduler decides,
+        faster during ramps and after SETs, see MPODScheduler)
+    slots: frames kept in the FrameBus ring. bus_name: shared memory name, default BusName(IP, port), so other local
+        processes attach to FrameBus.Attach(BusName(IP)) and a second broker for the same crate refuses to start
+    max_clients: reply queues are made up front (queues can only be handed to a process when it starts)
+    request_timeout: [s] default time a client waits for a command's reply. None: 5 x (SNMP timeout x (retries + 1) x 2,
+        MPOD.Send retries once), 10 s with the native transport defaults
+    mpod_kwargs go to MPOD (transport, port, max_repetitions...)
+    '''
+    def __init__(self, IP = '169.254.107.70', take_real_data = True, active_modules = None, channel_names = None, sample_rate = None,
+                 max_clients = 4, slots = 16, bus_name = None, request_timeout = None, **mpod_kwargs):
+        if bus_name is None:
+            bus_name = BusName(IP, mpod_kwargs.get('port', 161))
+        self.settings = {'IP': IP, 'take_real_data': take_real_data, 'active_modules': active_modules,
+                         'channel_names': channel_names, 'sample_rate': sample_rate, 'mpod_kwargs': mpod_kwargs,
+                         'slots': slots, 'bus_name': bus_name, 'request_timeout': request_timeout}
+        self.commands = multiprocessing.Queue()
+        self.replies = [multiprocessing.Queue() for _ in range(max_clients)]
+        self.ready = multiprocessing.Queue()
+        self.heartbeat = multiprocessing.Value('d', 0., lock = False)#time.time() of the broker's last beat, see BrokerClient.Alive
+        self.n_clients = 0
+        self.info = None#{'bus': shared memory name, 'fx': FX_ATTRIBUTES, 'crate': CRATE_ATTRIBUTES} from the broker
+        self.process = None
+
+    def Start(self, timeout = 120):
+        '''Start the broker process and wait until it has connected to the crate (MPOD + CustomFx startup)'''
+        if self.process is not None and self.process.is_alive():
+            return self.info
+        self.process = multiprocessing.Process(target = BrokerMain, name = 'MPOD broker', daemon = True,
+                                               args = (self.settings, self.commands, self.replies, self.ready, self.heartbeat))
+        self.process.start()
+        info = self.ready.get(timeout = timeout)
+        if isinstance(info, Exception):
+            self.process.join()
+            self.process = None
+            raise info
+        self.info = info
+        return self.info
+
+    def Client(self):
+        '''New BrokerClient, pass it to exactly one process'''
+        if self.info is None:
+            raise RuntimeError('Start the broker before making clients')
+        if self.n_clients == len(self.replies):
+            raise RuntimeError(f'All {len(self.replies)} clients are in use, raise max_clients')
+        client = BrokerClient(self.n_clients, self.commands, self.replies[self.n_clients], self.info, self.heartbeat)
+        self.n_clients = self.n_clients + 1
+        return client
+
+    def Stop(self, timeout = 5):
+        if self.process is None:
+            return
+        self.commands.put(None)
+        self.process.join(timeout)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.heartbeat.value = -1#a terminated broker does not get to write it
+        self.process = None
+
+def BrokerMain(settings, commands, replies, ready, heartbeat):
+    '''Broker process: module level so it can be started with the spawn method (Windows, macOS)'''
+    stopped = threading.Event()
+    def beat():#own thread: keeps beating while a command waits on the crate, stops if the process hangs or dies
+        while not stopped.wait(HEARTBEAT_PERIOD):
+            heartbeat.value = time.time()
+    heartbeat.value = time.time()
+    threading.Thread(target = beat, name = 'MPOD broker heartbeat', daemon = True).start()
+    try:
+        try:
+            service = CrateService(settings)
+        except Exception as ex:
+            ready.put(RuntimeError(f'Broker could not start: {ex!r}'))
+            raise
+        ready.put(service.Info())
+        try:
+            service.Serve(commands, replies)
+        finally:
+            service.Close()
+    finally:
+        stopped.set()
+        heartbeat.value = -1
+
+class CrateService:
+    '''The broker's side: the only MPOD and CustomFx, the poll thread and the command loop'''
+    def __init__(self, settings):
+        #the block is made (and the crate's bus name taken) now, before any SNMP: a second broker raises here
+        self.bus = FrameBus.Reserve(BUS_MAX_CHANNELS, BUS_MAX_MODULES, settings['bus_name'], settings['slots'])
+        try:
+            self.MPOD = MPOD(IP = settings['IP'], mode = int(not settings['take_real_data']), **settings['mpod_kwargs'])
+            self.FX = CustomFx(self.MPOD, settings['take_real_data'], settings['active_modules'], settings['channel_names'])
+            self.bus.Configure(self.FX.my_channels, self.FX.modules)
+        except Exception:
+            self.bus.Close()
+            raise
+        self.sample_rate = settings['sample_rate']
+        self.settings = settings
+        self.bus.Publish(self.FX.last_frame)#CustomFx.__init__ already read the first frame
+        self.targets = {'MPOD': self.MPOD, 'FX': self.FX}
+        self.stop_event = threading.Event()
+        self.poll_thread = threading.Thread(target = self.Poll, name = 'MPOD broker poll', daemon = True)
+
+    def Info(self):
+        request_timeout = self.settings['request_timeout']
+        if request_timeout is None:
+            transport = self.MPOD.transport
+            request_timeout = 5*getattr(transport, 'timeout', 1.0)*(getattr(transport, 'retries', 0) + 1)*2
+        return {'bus': self.bus.name, 'request_timeout': request_timeout,
+                'fx': {key: getattr(self.FX, key, None) for key in FX_ATTRIBUTES},
+                'crate': {key: getattr(self.MPOD, key, None) for key in CRATE_ATTRIBUTES}}
+
+    def Poll(self):
+        while not self.stop_event.is_set():
+            t_start = time.monotonic()
+            try:
+                self.FX.GetAllValues()
+                self.bus.Publish(self.FX.last_frame)
+            except Exception as ex:#keep polling, a slow or missing reply should not end the broker
+                self.MPOD.WarnHandler(f'Broker poll failed: {ex!r}')
+            wait = 0
+            if self.sample_rate is None:
+                wait = self.FX.scheduler.Interval() - (time.monotonic() - t_start)
+            elif self.sample_rate > 0:
+                wait = 1 / self.sample_rate - (time.monotonic() - t_start)
+            self.stop_event.wait(max(wait, 0.001))#always yield briefly so commands can reach the crate
+
+    def Serve(self, commands, replies):
+        '''Run commands in arrival order until the None sentinel from CrateBroker.Stop'''
+        self.poll_thread.start()
+        while True:
+            command = commands.get()
+            if command is None:
+                return
+            client, request_id, target, kind, name, args, kwargs = command
+            try:
+                reply = (request_id, True, self.Execute(target, kind, name, args, kwargs))
+                pickle.dumps(reply)#an unpicklable result would be dropped silently by the queue
+            except Exception as ex:
+                traceback.print_exc()
+                reply = (request_id, False, RuntimeError(f'{target}.{name} failed in the broker: {ex!r}'))
+            replies[client].put(reply)
+
+    def Execute(self, target, kind, name, args, kwargs):
+        if name.startswith('_'):
+            raise AttributeError(f'{name} is private')
+        attr = getattr(self.targets[target], name)
+        if kind == 'get':
+            return attr
+        return attr(*args, **kwargs)
+
+    def Close(self):
+        self.stop_event.set()
+        if self.poll_thread.is_alive():
+            self.poll_thread.join(10)
+        self.bus.Close()
+
+class BrokerClient:
+    '''
+    A viewer's connection to the broker: frames from the FrameBus, commands through the queue
+    MPOD and FX are stand-ins (RemoteCrate, RemoteFx) for code written against the local objects
+    Safe to share between the threads of one process, replies are matched by request id
+    A request raises TimeoutError after info['request_timeout'] (CrateBroker request_timeout) and RuntimeError as soon as
+    the broker's heartbeat stops, so a dead or hung broker never freezes a viewer
+    '''
+    def __init__(self, index, commands, replies, info, heartbeat):
+        self.index = index
+        self.commands = commands
+        self.replies = replies
+        self.info = info
+        self.heartbeat = heartbeat
+        self.Local()
+
+    def Local(self):
+        '''Per process state, made again after the client is handed to a new process'''
+        self.lock = threading.Lock()
+        self.request_id = 0
+        self.bus = None
+        self.remote = {}
+
+    def __getstate__(self):
+        return {'index': self.index, 'commands': self.commands, 'replies': self.replies, 'info': self.info,
+                'heartbeat': self.heartbeat}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.Local()
+
+    @property
+    def MPOD(self):
+        if 'MPOD' not in self.remote:
+            self.remote['MPOD'] = RemoteCrate(self)
+        return self.remote['MPOD']
+
+    @property
+    def FX(self):
+        if 'FX' not in self.remote:
+            self.remote['FX'] = RemoteFx(self)
+        return self.remote['FX']
+
+    def Bus(self):
+        if self.bus is None:
+            self.bus = FrameBus.Attach(self.info['bus'])
+        return self.bus
+
+    def Latest(self):
+        '''Newest published CrateFrame (no crate traffic)'''
+        return self.Bus().Read()
+
+    def WaitFrame(self, after_seq = 0, timeout = None):
+        '''Newest frame once one newer than after_seq is published, None on timeout'''
+        return self.Bus().WaitFrame(after_seq, timeout)
+
+    def Alive(self):
+        '''True while the broker process beats (see HEARTBEAT_TIMEOUT)'''
+        beat = self.heartbeat.value
+        return beat > 0 and time.time() - beat < HEARTBEAT_TIMEOUT
+
+    def Request(self, target, kind, name, args = (), kwargs = None, timeout = None):
+        '''Run target.name(*args, **kwargs) (kind 'call') or read target.name (kind 'get') in the broker
+        timeout: [s], None: info['request_timeout']'''
+        if timeout is None:
+            timeout = self.info.get('request_timeout', 10)
+        with self.lock:#one outstanding request per client keeps the reply queue in order
+            if not self.Alive():
+                raise RuntimeError(f'The broker is not running, {target}.{name} not sent')
+            self.request_id = self.request_id + 1
+            request_id = self.request_id
+            self.commands.put((self.index, request_id, target, kind, name, tuple(args), kwargs or {}))
+            t_end = time.monotonic() + timeout
+            while True:
+                wait = min(max(t_end - time.monotonic(), 0), HEARTBEAT_PERIOD*2)#wake up to check the heartbeat
+                try:
+                    reply_id, ok, value = self.replies.get(timeout = wait)
+                except queue.Empty:
+                    if not self.Alive():
+                        raise RuntimeError(f'The broker stopped before replying to {target}.{name}') from None
+                    if time.monotonic() >= t_end:
+                        raise TimeoutError(f'No reply from the broker for {target}.{name} within {timeout} s') from None
+                    continue
+                if reply_id == request_id:#older ids are replies to requests that timed out
+                    break
+        if not ok:
+            raise value
+        return value
+
+class RemoteMethod:
+    def __init__(self, client, target, name):
+        self.client, self.target, self.name = client, target, name
+
+    def __call__(self, *args, **kwargs):
+        return self.client.Request(self.target, 'call', self.name, args, kwargs)
+
+class RemoteFx:
+    '''
+    CustomFx stand-in: static attributes are copies from the broker, last_frame comes from shared memory
+    every other method runs in the broker, e.g. FX.RampAll(), FX.Reset()
+    '''
+    def __init__(self, client):
+        self.client = client
+        for key, value in client.info['fx'].items():
+            setattr(self, key, value)
+
+    @property
+    def last_frame(self):
+        return self.client.Latest()
+
+    @property
+    def frame_seq(self):
+        return self.client.Bus().Seq()
+
+    def GetAllValues(self, channels = None, modules = None):
+        '''The broker polls on its own schedule, last_frame is always the newest frame'''
+        return None
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return RemoteMethod(self.client, 'FX', name)
+
+class RemoteCrate:
+    '''
+    MPOD stand-in: GetPowerCrate and GetFrame of the polled fields are answered from the newest frame,
+    every other method runs in the broker, e.g. MPOD.SetPowerCrate()
+    '''
+    def __init__(self, client):
+        self.client = client
+        for key, value in client.info['crate'].items():
+            setattr(self, key, value)
+        self.channel_map = ChannelMap(self.channels)
+        self.warning_cache = (0, [])#(time, warnings), warnings are fetched at most once per second
+
+    @property
+    def warnings(self):
+        t, warnings = self.warning_cache
+        if time.monotonic() - t > 1:
+            warnings = self.client.Request('MPOD', 'get', 'warnings')
+            self.warning_cache = (time.monotonic(), warnings)
+        return warnings
+
+    def GetPowerCrate(self):
+        latest = self.client.Latest()
+        return 0 if latest is None else latest.pwr_crate
+
+    def GetFrame(self, fields = None):
+        '''ChannelFrame like MPOD.GetFrame, polled fields of FX.my_channels only (other channels stay NaN)'''
+        if fields is None:
+            fields = list(CrateFrame.CHANNEL_FIELDS)
+        if any(f not in CrateFrame.CHANNEL_FIELDS for f in fields):#not polled, read it in the broker
+            return self.client.Request('MPOD', 'call', 'GetFrame', (fields,))
+        latest = self.client.Latest()
+        frame = ChannelFrame(self.channel_map, fields)
+        if latest is None:
+            return frame
+        for f in fields:
+            frame.Fill(f, latest.channels, latest[f])
+        return frame
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return RemoteMethod(self.client, 'MPOD', name)
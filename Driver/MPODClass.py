@@ -1,197 +1,394 @@
 import os
-import pexpect as px #for linux
-import subprocess #for windows
-import platform
 import time
 import traceback
-import inspect
+import threading
+import numpy as np
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODTransport import CreateTransport, CLITransport, NoSuchValue, ParseText, TokenizeText, ChannelIndex, TEXT_CONVERT
+    from Driver.MPODStatus import Describe, StatusWords, WordsToBits
+    from Driver.MPODFrame import ChannelMap, ChannelFrame
+    from Driver.MPODSimulator import CrateSimulator
+    from Driver.MPODStats import CommandStats, Family
+except ImportError:
+    from MPODTransport import CreateTransport, CLITransport, NoSuchValue, ParseText, TokenizeText, ChannelIndex, TEXT_CONVERT
+    from MPODStatus import Describe, StatusWords, WordsToBits
+    from MPODFrame import ChannelMap, ChannelFrame
+    from MPODSimulator import CrateSimulator
+    from MPODStats import CommandStats, Family
+
+#Per channel fields for GetSnapshot. field: (MIB object, ParseReply mode, scale to GUI units)
+SNAPSHOT_FIELDS = {
+    'i_limit':      ('outputCurrent', 'float', 1000),#[mA]
+    'i_rate':       ('outputCurrentRiseRate', 'float', 1000),#[mA/s]
+    'i_actual':     ('outputMeasurementCurrent', 'float', 1000),#[mA]
+    'v_target':     ('outputVoltage', 'float', 1),#[V]
+    'v_rate':       ('outputVoltageRiseRate', 'float', 1),#[V/s]
+    'v_fall':       ('outputVoltageFallRate', 'float', 1),#[V/s]
+    'v_actual':     ('outputMeasurementSenseVoltage', 'float', 1),#[V]
+    'v_terminal':   ('outputMeasurementTerminalVoltage', 'float', 1),#[V]
+    'v_configmax':  ('outputConfigMaxTerminalVoltage', 'float', 1),#[V]
+    'i_configmax':  ('outputConfigMaxCurrent', 'float', 1000),#[mA]
+    'i_triptimemax':('outputTripTimeMaxCurrent', 'integer', 1),#[ms]
+    'pwr_ch':       ('outputSwitch', 'binary', 1),
+    'status':       ('outputStatus', 'bits', None),#hex pairs, see ParseStatus
+}
+#'pwr_crate' (sysMainSwitch.0) can also be requested, it is returned as a single value
+#ParseReply mode (first word) -> MPODTransport value type, used to tokenize cli transport text
+REPLY_VALUE_TYPES = {'float': 'float', 'integer': 'int', 'binary': 'int', 'bits': 'bits', 'string': 'string'}
+
+class Batch:
+    '''
+    Commands collected inside a with block, sent together by MPOD.SendBatch when the block exits
+    Sets go first (in order, packed into as few PDUs as possible), then gets
+    Units match the MPOD methods: V, mA, V/s, mA/s
+    '''
+    def __init__(self, MPOD):
+        self.MPOD = MPOD
+        self.sets = []#commands
+        self.gets = []#(command, ParseReply mode, scale)
+        self.results = []#(command, reply, error) per set
+        self.values = []
+        self.errors = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        if exc_type is None:
+            self.Execute()
+        return False
+
+    def Execute(self):
+        for cmd, (reply, error) in zip(self.sets, self.MPOD.SendBatch('set', self.sets)):
+            self.results.append((cmd, reply, error))
+            if error is not None:
+                self.errors.append((cmd, error))
+        cmds = [cmd for cmd, mode, scale in self.gets]
+        for (cmd, mode, scale), (reply, error) in zip(self.gets, self.MPOD.SendBatch('get', cmds)):
+            value = None
+            if error is None:
+                value = self.MPOD.ParseReply(reply, mode)
+                if value is not None and scale != 1:
+                    value = value * scale
+            else:
+                self.errors.append((cmd, error))
+            self.values.append(value)
+        self.sets, self.gets = [], []
+        return self.values
+
+    ### SET ###
+    def set(self, cmd):
+        '''Raw set command: "outputVoltage.u101 F 500"'''
+        self.sets.append(cmd)
+
+    def set_voltage(self, channel, voltage):
+        self.set(f"outputVoltage.u{channel} F {voltage}")
+
+    def set_current_limit(self, channel, current):
+        self.set(f"outputCurrent.u{channel} F {current/1000}")
+
+    def set_power(self, channel, power_state = 0):
+        self.set(f"outputSwitch.u{channel} i {power_state}")
+
+    def set_voltage_rate(self, channel, rate, direction = 'Rise'):
+        rate = max(rate, 0.001)#see SetVoltageRate
+        self.set(f"outputVoltage{direction}Rate.u{channel} F {rate}")
+
+    def set_current_rate(self, channel, rate, direction = 'Rise'):
+        self.set(f"outputCurrent{direction}Rate.u{channel} F {rate/1000}")
+
+    def set_trip_time(self, channel, time):
+        self.set(f"outputTripTimeMaxCurrent.u{channel} i {int(time)}")
+
+    def set_power_crate(self, power_state):
+        self.set(f"sysMainSwitch.0 i {power_state}")
+
+    def clear_module(self, module):
+        self.set(f"moduleDoClear.ma{module} i 1")
+
+    ### GET ###
+    def get(self, cmd, mode = 'float', scale = 1):
+        '''Raw get command: "outputVoltage.u101", parsed with ParseReply(reply, mode) * scale'''
+        self.gets.append((cmd, mode, scale))
+
+    def get_target_voltage(self, channel):
+        self.get(f"outputVoltage.u{channel}", 'float', 1)
+
+    def get_voltage(self, channel, mode = 'Sense'):
+        self.get(f"outputMeasurement{mode}Voltage.u{channel}", 'float', 1)
+
+    def get_current(self, channel):
+        self.get(f"outputMeasurementCurrent.u{channel}", 'float', 1000)
+
+    def get_current_limit(self, channel):
+        self.get(f"outputCurrent.u{channel}", 'float', 1000)
+
+    def get_power(self, channel):
+        self.get(f"outputSwitch.u{channel}", 'binary', 1)
+
+class GatherContext(threading.local):
+    '''SendMultiple state. Thread local, so a script gathering commands never holds another thread's commands'''
+    def __init__(self):
+        self.active = 0
+        self.commands = []
+        self.command_type = ''#commands of another type are sent straight away
 
 # Written by Natalie Mujica-Schwahn, last updated: 10/4/25
 class MPOD:
     r'''
     Input IP to connect to MPOD
-    REQUIREMENT:  WIENER-CRATE-MIB.txt must be located in /usr/share/snmp/mibs (Windows: C:\usr\share\snmp\mibs)
+    transport: 'native' (in-process SNMP, default) or 'cli' (snmpget/snmpset/snmpbulkwalk tools, needs MIB file)
+    max_repetitions: rows per GETBULK request in GetAll* walks (0: as many as fit in one reply)
+    stats: count requests and their latency per MIB object (see stats(), EnableStats)
+    REQUIREMENT (cli only):  WIENER-CRATE-MIB.txt must be located in /usr/share/snmp/mibs (Windows: C:\usr\share\snmp\mibs)
     Reference 1: https://file.wiener-d.com/documentation/MPOD/WIENER_MPOD_Manual_3.2.pdf
     Reference 2: https://fsunuc.physics.fsu.edu/wiki/images/1/10/Iseg_SNMP_Programmers_Guide.pdf
     '''
 
-    def __init__(self, IP = '169.254.107.70', mode = 0, MIBdir = "/usr/share/snmp/mibs"):
+    def __init__(self, IP = '169.254.107.70', mode = 0, MIBdir = "/usr/share/snmp/mibs", transport = 'native', port = 161, max_repetitions = 0, stats = False):
         self.last_time = 0
         self.initialized = 0
+        self.simulator = None
+        if mode:#debug: a simulated crate on a local UDP port (MPODSimulator), read through the same code as a real crate
+            self.simulator = CrateSimulator().Start()
+            IP, port, transport = '127.0.0.1', self.simulator.port, 'native'
         self.IP = IP
+        self.port = port
         self.mibdir = MIBdir #or os.path.expanduser("~/.snmp/mibs")
-        self.mode = mode#mode: 0, driver, 1, debug (not connected)
+        self.mode = mode#mode: 0, driver, 1, debug (self.simulator instead of a crate)
         self.debug_mode = 0
-        self.os = platform.system()#windows or linux
-        #If program will not start, check these environment variables below. They may need to be set in shell. 
+        #If program will not start with transport = 'cli', check these environment variables below. They may need to be set in shell. 
         # os.environ["MIBS"] = "+WIENER-CRATE-MIB"
         # if os.path.isfile(self.mibdir + "/WIENER-CRATE-MIB.txt"):
         #     os.environ["MIBDIRS"] = self.mibdir
         # else: 
             # raise RuntimeError(f"MIB file was not found in {self.mibdir}")
         self.warnings = []
-        self.gather_commands=0
-        self.gathered_commands = []
-        self.gathered_command_type = ''
+        self.gather = GatherContext()#SendMultiple state, per thread
+        self.lock = threading.RLock()#serializes transport use between threads
+        self.set_listeners = []#called with the MIB objects of every SET sent (e.g. PollScheduler.Invalidate)
+        self.command_stats = CommandStats() if stats else None#request counts and latencies, see stats()
         self.last_cmd=''
         if self.debug_mode == 1:
             self.start_time = time.monotonic()
             self.last_cmd={'All commands': [], 'All replies': [], 'Errors':[],'error time':[],'command time': []}
         
-        self.precision ='-Op .12 '#high precision creating problems on windows. older SNMP protocols do not support this option 
+        self.max_repetitions = max_repetitions
+        self.transport = CreateTransport(transport, IP, port, max_repetitions)
         #Test power on and precision 
-        if not mode:
-            if len(self.Send('get','sysMainSwitch.0'))<1:
-                self.precision = ''#try lower precision values for older SNMP protocols
-                if len(self.Send('get','sysMainSwitch.0'))<1:
-                    self.WarnHandler('Crate is not connected or configured correctly')
-            if not self.GetPowerCrate():
-                self.WarnHandler('Crate is off - powering on now, wait for system to respond')
-                self.SetPowerCrate(1)
-                time.sleep(1)
-                if self.GetPowerCrate():#if power on was successful, wait for modules to respond
-                    while 'No Such Instance' in self.Send('walk','outputSwitch'):
-                        pass#time.sleep(0.5)
-                else: 
-                    self.WarnHandler('Crate did not turn on')
+        if not self.Probe():
+            self.WarnHandler('Crate is not connected or configured correctly')
+        if not self.GetPowerCrate():
+            self.WarnHandler('Crate is off - powering on now, wait for system to respond')
+            self.SetPowerCrate(1)
+            time.sleep(1)
+            if self.GetPowerCrate():#if power on was successful, wait for modules to respond
+                while self.NoInstances(self.Send('walk','outputSwitch')):
+                    pass#time.sleep(0.5)
+            else: 
+                self.WarnHandler('Crate did not turn on')
                    
-        self.n_channels = len(self.GetAllNames())
+        self.channels = self.GetAllNames()
+        self.n_channels = len(self.channels)
+        self.channel_map = ChannelMap(self.channels)#channel -> row of every GetAll* list and GetFrame array
         self.initialized = 1
-        ### FOR DEBUG ONLY: ###
-        if mode: 
-            d = {'i_limit':1.0123456789012, 'i_rate':2.1234567890123, 'i_actual':0.11234567890123, 'v_target':2000.1234567890123, 
-            'v_rate':5.1234567890123, 'v_sense':0.0123456789012, 'v_terminal': 0.1234567890123,'pwr':0,'v_configmax_sense':5000.1234567890123,
-            'v_configmax_terminal': 5000.1234567890123,'i_configmax':1.1234567890123, 'i_triptimemax':500}
-            d_pwr = {'pwr':1,'channels':self.GetAllNames()}
-            self.mimic = {'crate': d_pwr}
-            for ch in d_pwr['channels']:
-                self.mimic[str(ch)] = dict(d)
-        #######################
-       
-        ##example command : "snmpget -v 2c -Op .12 -m +WIENER-CRATE-MIB -c guru 169.254.107.70 outputPower.u0"
+
+    def Close(self):
+        '''Close the transport socket (and stop the simulated crate in debug mode)'''
+        self.transport.Close()
+        if self.simulator is not None:
+            self.simulator.Stop()
+
+    def Probe(self):
+        '''Check for a reply to sysMainSwitch.0. Native transport falls back to the CLI tools, 
+        CLI falls back to lower precision for older SNMP protocols'''
+        if self.Send('get','sysMainSwitch.0'):
+            return True
+        native = None
+        if self.transport.name == 'native':
+            native, self.transport = self.transport, CLITransport(self.IP, self.port, max_repetitions = self.max_repetitions)
+            if self.Send('get','sysMainSwitch.0'):
+                self.WarnHandler('No reply from native SNMP transport, using snmp command line tools instead')
+                return True
+        self.transport.precision = ''#try lower precision values for older SNMP protocols
+        if self.Send('get','sysMainSwitch.0'):
+            return True
+        if native is not None:#nothing answered, keep the faster transport for later reconnects
+            self.transport = native
+        return False
+
+    def NoInstances(self, reply):
+        '''True if a walk returned no table rows (modules still starting up)'''
+        if isinstance(reply, str):
+            return 'No Such Instance' in reply
+        return reply is not None and len(reply) == 0
     
-    def Send(self,cmd_type = 'walk', cmd = ''):
-        '''Base command struct and MPODCrate communication functions'''
-        #result = subprocess.run([cmd],shell = True,capture_output = True)
-        n=[]
-        
+    def Send(self,cmd_type = 'walk', cmd = '', bypass_batch = False):
+        '''Base command struct and MPODCrate communication functions
+        Returns reply text (cli transport) or list of VarBind (native transport)
+        While SendMultiple is gathering in this thread, commands of the gathered type are held until SendMultiple('end')
+        bypass_batch: send now even if this thread is gathering. Other threads (e.g. GUI reads) are never held
+        '''
         original_cmd = cmd
-        if self.gather_commands:       
-            for i in range(len(inspect.stack())):
-                n.append(inspect.stack()[i].filename)
-            f=[i for i,f in enumerate(n) if __file__ not in f]
-            if 'GUI' in n[f[0]].split('/')[-1]:#check if sender is GUI, dont block if so
-                self.SendMultiple('pause')
-                self.Send(cmd_type,cmd)
-                self.SendMultiple('start')
-            else:
-                if len(self.gathered_command_type)>0:
-                    if self.gathered_command_type is not cmd_type:
-                        self.WarnHandler('Command type does not match, skipping')
-                    else: 
-                        self.gathered_commands.append(cmd)
-                else:         
-                    self.gathered_command_type = cmd_type
-                    self.gathered_commands.append(cmd)
+        gather = self.gather
+        if gather.active and not bypass_batch and gather.command_type in ('', cmd_type):
+            gather.command_type = cmd_type
+            gather.commands.append(cmd)
         else:
-            if cmd_type == 'walk':#check connection
-                if cmd == '': #use lower precision
-                    cmd = f"snmpwalk -v 2c -m +WIENER-CRATE-MIB -c public {self.IP} " + cmd
-                else: # require higher precision (if available)
-                    cmd = f"snmpwalk -v 2c {self.precision}-m +WIENER-CRATE-MIB -c public {self.IP} " + cmd
-            elif cmd_type == 'set':
-                cmd = f"snmpset -v 2c {self.precision}-m +WIENER-CRATE-MIB -c guru {self.IP} " + cmd
-            elif cmd_type == 'get':
-                cmd = f"snmpget -v 2c {self.precision}-m +WIENER-CRATE-MIB -c guru {self.IP} " + cmd
-            else:
-                self.WarnHandler(cmd_type + ' is invalid command type')
-            try:
-                if self.os == 'Windows':
-                    result = subprocess.run(cmd.split(), capture_output = True, shell = True)
-                    result = result.stdout
-                else: 
-                    result = px.run(cmd)
-                result_parsed = result.decode().rstrip('\n').rstrip('\r')
-                if self.debug_mode == 0:
-                    self.last_cmd = cmd
-                else:
-                    self.last_cmd['All commands']=(cmd_type + ': ' + original_cmd)
-                    self.last_cmd['All replies']=(result_parsed)  
-                    self.last_cmd['command time']=(time.monotonic()-self.start_time)    
-                    # print(self.last_time,time.monotonic()-self.start_time)
-                    if ((time.monotonic()-self.start_time)-self.last_time)  > 1:
-                        print(self.last_cmd)
-                    self.last_time = time.monotonic()-self.start_time
-                    # if 
+            with self.lock:#one request in flight per crate (GUI thread and acquisition thread share the socket)
+                command_stats, retries = self.command_stats, 0
+                if command_stats is not None:
+                    start = time.perf_counter()
+                try:
+                    result_parsed = self.transport.Send(cmd_type, cmd)
+                    if self.debug_mode == 0:
+                        self.last_cmd = self.transport.last_cmd
+                    else:
+                        self.last_cmd['All commands']=(cmd_type + ': ' + original_cmd)
+                        self.last_cmd['All replies']=(result_parsed)  
+                        self.last_cmd['command time']=(time.monotonic()-self.start_time)    
+                        # print(self.last_time,time.monotonic()-self.start_time)
+                        if ((time.monotonic()-self.start_time)-self.last_time)  > 1:
+                            print(self.last_cmd)
+                        self.last_time = time.monotonic()-self.start_time
+                        # if 
                         
                 
-            except Exception as ex:# subprocess.CalledProcessError as err:
-                try: #reattempt
-                    time.sleep(0.1)#brief delay to prevent overloading filedescriptor on linux
+                except Exception as ex:# subprocess.CalledProcessError, socket.timeout, SNMPError
+                    retries = 1
+                    try: #reattempt
+                        time.sleep(0.1)#brief delay to prevent overloading filedescriptor on linux
 
-                    result_parsed = self.Send(cmd_type, cmd.split(' ')[-1])
-                    if self.debug_mode:
-                        self.last_cmd['All commands']=(cmd)
-                        self.last_cmd['All replies']=(result_parsed)  
-                        self.last_cmd['command time']=(time.monotonic()-self.start_time) 
-                    self.WarnHandler(f"SNMP command succesfully retried. Command: {cmd})")
-                except Exception as ex: 
-                    self.WarnHandler(f"SNMP command failed. Command: {cmd})")#, Error: {err.stderr}")
-                    result_parsed=None
+                        result_parsed = self.transport.Send(cmd_type, cmd)
+                        if self.debug_mode:
+                            self.last_cmd['All commands']=(self.transport.last_cmd)
+                            self.last_cmd['All replies']=(result_parsed)  
+                            self.last_cmd['command time']=(time.monotonic()-self.start_time) 
+                        self.WarnHandler(f"SNMP command succesfully retried. Command: {self.transport.last_cmd})")
+                    except Exception as ex: 
+                        self.WarnHandler(f"SNMP command failed. Command: {self.transport.last_cmd}, Error: {ex!r})")
+                        result_parsed=None
+                if command_stats is not None:
+                    command_stats.Record(cmd_type, Family(cmd), time.perf_counter() - start, result_parsed is None, retries)
+            if cmd_type == 'set':
+                self.NotifySet(cmd.split()[0::3])
             return result_parsed#, result, cmd#, result.stderr 
+
+    def EnableStats(self, enable = True):
+        '''Start (fresh window) or stop counting requests for stats(). Off by default: disabled costs one attribute check per request'''
+        self.command_stats = CommandStats() if enable else None
+
+    def stats(self, reset = False):
+        '''
+        Requests since EnableStats (or the last reset) per command type and MIB object family: count, errors, retries
+        and latency [ms]: total, mean, p50, p90, p99, max (from a log-linear histogram, ~3 % resolution)
+        reset: start a new window after reading this one
+        Usage Example:
+            mpod = MPOD(IP, stats = True)#or mpod.EnableStats()
+            ...poll...
+            s = mpod.stats(reset = True)
+            s['commands']['walk outputMeasurementCurrent']['p99_ms']
+            print(mpod.command_stats.Table())#same, as a table, most total time first
+        Returns {'window_s': seconds covered, 'commands': {"<type> <objects>": {...}}} ({} if stats are off)
+        '''
+        command_stats = self.command_stats
+        if command_stats is None:
+            return {}
+        with self.lock:
+            result = {'window_s': time.monotonic() - command_stats.start, 'commands': command_stats.Summary()}
+            if reset:
+                command_stats.Reset()
+        return result
+
+    def NotifySet(self, names):
+        '''Tell set_listeners which objects were just set (cached reads of them are stale)'''
+        for listener in self.set_listeners:
+            listener(names)
     
     def ParseReply(self, reply, mode):
         if reply is None: 
             result = 0
             if 'array' in mode:
                 result = [0]*self.n_channels
-            self.WarnHandler(f'Value read error for {self.last_cmd}, zeros returned instead') 
-        else: 
-            if 'no such instance currently exists at this oid' in reply:
-                self.WarnHandler('Warning: Disconnected from crate')
-                result = None
+            self.WarnHandler(f'Value read error for {self.last_cmd}, zeros returned instead')
+        elif isinstance(reply, list):#typed VarBinds from native transport
+            result = self.ParseVarBinds(reply, mode)
+        elif 'No Such' in reply:
+            self.WarnHandler('Warning: Disconnected from crate')
+            result = None
+        else:#cli transport text, tokenized in one pass per value type (MPODTransport.TEXT_TOKENS)
+            value_type = REPLY_VALUE_TYPES.get(mode.split(' ')[0], 'string')
+            convert = TEXT_CONVERT[value_type]
+            tokens = TokenizeText(reply, value_type)
+            if len(tokens) == 0 and 'array' not in mode and mode != 'string':
+                self.WarnHandler(f'Value read error for {self.last_cmd}, zeros returned instead')
+                result = 0
             else:
-                reply = reply.lower()#easier to match mixed cases this way
+                result = self.ShapeValues([index for name, index, value, unit in tokens],
+                                          [convert(value) for name, index, value, unit in tokens], mode)
+        return result
+
+    def ParseColumn(self, reply, mode = 'float array', name = None):
+        '''One walked table column as typed arrays keyed by channel: (channels, values), e.g. ([101, 102], [500., 0.])
+        Channels come from each OID index (u101 -> 101), not from walk order. Missing replies give empty arrays
+        name: keep only this MIB object (replies of multi-column walks)
+        For float/integer/binary modes, statuses are read with GetStatusArray'''
+        value_type = REPLY_VALUE_TYPES[mode.split(' ')[0]]
+        dtype = float if value_type == 'float' else np.int64
+        if reply is None:
+            self.WarnHandler(f'Value read error for {self.last_cmd}, no values returned')
+            return np.empty(0, dtype = np.int64), np.empty(0, dtype = dtype)
+        if isinstance(reply, str):
+            tokens = TokenizeText(reply, value_type)
+            if name is not None:
+                tokens = [t for t in tokens if t[0] == name]
+            channels = np.array([ChannelIndex(index) for obj, index, value, unit in tokens], dtype = np.int64)
+            return channels, np.array([TEXT_CONVERT[value_type](value) for obj, index, value, unit in tokens], dtype = dtype)
+        reply = [vb for vb in reply if not isinstance(vb.value, NoSuchValue) and (name is None or vb.name == name)]
+        channels = np.array([ChannelIndex(vb.index) for vb in reply], dtype = np.int64)
+        return channels, np.array([vb.value for vb in reply], dtype = dtype)
+
+    def AlignColumn(self, reply, mode = 'float array', name = None):
+        '''Walk reply as a list in self.channels order, each value placed by its OID's channel number
+        A channel missing from the walk gives NaN (0 for integer modes) and a warning, later channels never shift'''
+        if reply is None:
+            return self.ParseReply(None, mode)
+        channels, values = self.ParseColumn(reply, mode, name)
+        if np.array_equal(channels, self.channel_map.channels):#complete walk in crate order
+            return values.tolist()
+        fill = np.nan if values.dtype.kind == 'f' else 0
+        result = np.full(len(self.channel_map), fill, dtype = values.dtype)
+        rows = self.channel_map.Rows(channels)
+        result[rows[rows >= 0]] = values[rows >= 0]
+        missing = np.setdiff1d(self.channel_map.channels, channels)
+        if len(missing):
+            self.WarnHandler(f'No reply from channels {missing.tolist()} for {self.last_cmd}, {fill} returned instead')
+        return result.tolist()
+
+    def ParseVarBinds(self, reply, mode):
+        '''ParseReply for the native transport: values are already typed, only reshape by mode'''
+        if any(isinstance(vb.value, NoSuchValue) for vb in reply):
+            self.WarnHandler('Warning: Disconnected from crate')
+            return None
+        return self.ShapeValues([vb.index for vb in reply], [vb.value for vb in reply], mode)
+
+    def ShapeValues(self, indices, values, mode):
+        '''Typed values (and their MIB index labels) in the form each ParseReply mode returns'''
+        match mode:
+            case 'float' | 'integer' | 'binary':
+                result = values[0]
+            case 'float array' | 'integer array' | 'binary array':
+                result = values
+            case 'string':
+                #SPECIFICALLY FOR FINDING OUTPUT NAMES
+                result = [int(index.lstrip('u')) for index in indices]
+            case 'bits':
+                result = [f'{b:02x}' for b in values[0]]
+            case 'bits array':
+                result = [[f'{b:02x}' for b in v] for v in values]
+            case _:
                 result = []
-                match mode:
-                    case 'float':
-                        loc = reply.find('float:')
-                        result = float(reply[loc+6:-3])
-                    case 'float array':
-                        for idx, k in enumerate(reply.split('float: ')):
-                            if idx > 0:                           
-                                result.append(float(k.split(' ')[0]))
-                    case 'integer':
-                        loc = reply.find('integer: ')
-                        result = int(reply[loc+8:-3])
-                    case 'integer array':
-                        for idx, k in enumerate(reply.split('integer: ')):
-                            if idx > 0:                           
-                                result.append(int(k.split(' ')[0]))
-                    case 'string':
-                        #SPECIFICALLY FOR FINDING OUTPUT NAMES
-                        for k in reply.split('wiener-crate-mib::outputname.'):
-                            if len(k) > 0:
-                                loc = k.find('=')
-                                k = k[0:loc].strip().lstrip('u')
-                                result.append(int(k))
-                    case 'binary':
-                        #SPECIFICALLY FOR ON/OFF, MAY NEED EXTENSION
-                        result = int(reply.split('(')[1].strip(')'))
-                    case 'binary array':
-                        for idx, k in enumerate(reply.split('(')):
-                            if idx > 0:                           
-                                result.append(int(k.split(')')[0]))
-                    case 'bits':
-                        reply=reply.split('bits: ')[1]
-                        result = [r for r in reply.split(' ') if len(r) == 2]
-                        # 'WIENER-CRATE-MIB::outputStatus.u101 = BITS: 04 00 40 outputFailureMaxCurrent(5) outputLowCurrentRange(17)
-                    case 'bits array':
-                        for idx, bit in enumerate(reply.split('bits: ')):
-                            if idx > 0:
-                                result.append([r for r in bit.split(' ') if len(r) == 2])
-                    case _:
-                        self.WarnHandler(f"mode: {mode} not supported")                    
+                self.WarnHandler(f"mode: {mode} not supported")
         return result
 
     def WarnHandler(self,warning_text):
@@ -210,23 +407,91 @@ class MPOD:
         SetPower(0,1)
         SetPower(1,1)
         SendMultiple('end')
-        TODO: issue-this will block GUI! 
+        'end' sends everything gathered through SendBatch, returns the replies (get) or (reply, error) pairs (set) in order
+        Gathering is per thread (see GatherContext), GUI reads from another thread are not held
+        See also batch()
         '''
         mode=mode.lower()
+        result = None
+        gather = self.gather
         if mode == 'start':#Begin (or continue) listening to inputs
-            self.gather_commands = 1
+            gather.active = 1
         elif mode == 'pause':#Stop listening, just pass inputs thru like normal
-            self.gather_commands = 0
+            gather.active = 0
         elif mode == 'end':#Send then reset 
-            self.gather_commands = 0
-            self.Send(self.gathered_command_type, ' '.join(self.gathered_commands))
-            if self.gathered_command_type == 'get':
-                self.ParseReply()#not set up yet... 
-                #TODO: parse by command before clearing
+            gather.active = 0
+            tokens = ' '.join(gather.commands).split()
+            if gather.command_type == 'set':#one command per varbind: object type value
+                cmds = [' '.join(tokens[i:i+3]) for i in range(0, len(tokens) - 2, 3)]
+            else:
+                cmds = tokens
+            result = self.SendBatch(gather.command_type, cmds)
+            if gather.command_type == 'get':
+                result = [reply for reply, error in result]#parse each with ParseReply(reply, mode)
             
-            self.gathered_commands = []
-            self.gathered_command_type = ''
-               
+            gather.commands = []
+            gather.command_type = ''
+        return result
+
+    def SendBatch(self, cmd_type, cmds):
+        '''
+        Send a list of single varbind get or set commands in as few PDUs as possible
+        cmds: ["outputVoltage.u101 F 500", "outputSwitch.u101 i 1"] (set) or ["outputVoltage.u101"] (get)
+        Returns one (reply, error or None) per command, in request order. A rejected SET varbind does not stop the others
+        '''
+        if cmd_type == 'set':#same object twice in one PDU has no defined order, start a new PDU instead
+            segments, seen = [[]], set()
+            for cmd in cmds:
+                name = cmd.split()[0]
+                if name in seen:
+                    segments.append([])
+                    seen = set()
+                seen.add(name)
+                segments[-1].append(cmd)
+        else:
+            segments = [cmds]
+        results = []
+        for segment in segments:
+            if not segment:
+                continue
+            send = self.transport.SetMany if cmd_type == 'set' else self.transport.GetMany
+            with self.lock:
+                command_stats, retries, first = self.command_stats, 0, len(results)
+                if command_stats is not None:
+                    start = time.perf_counter()
+                try:
+                    results.extend(send(segment))
+                except Exception as ex:# subprocess.CalledProcessError, socket.timeout
+                    retries = 1
+                    try: #reattempt
+                        time.sleep(0.1)
+                        results.extend(send(segment))
+                        self.WarnHandler(f"SNMP command succesfully retried. Command: {self.transport.last_cmd})")
+                    except Exception as ex:
+                        self.WarnHandler(f"SNMP command failed. Command: {self.transport.last_cmd}, Error: {ex!r})")
+                        results.extend([(None, repr(ex))]*len(segment))
+                if command_stats is not None:#errors: rejected or unanswered varbinds
+                    errors = sum(error is not None for reply, error in results[first:])
+                    command_stats.Record(cmd_type, Family(' '.join(segment)), time.perf_counter() - start, errors, retries)
+        if self.debug_mode == 0:
+            self.last_cmd = self.transport.last_cmd
+        for cmd, (reply, error) in zip(cmds, results):
+            if error is not None:
+                self.WarnHandler(f"SNMP {cmd_type} failed for {cmd.split()[0]}: {error}")
+        if cmd_type == 'set' and cmds:
+            self.NotifySet([cmd.split()[0] for cmd in cmds])
+        return results
+
+    def batch(self):
+        '''
+        Usage Example:
+        with mpod.batch() as b:
+            b.set_voltage(101, 500)
+            b.set_power(101, 1)
+            b.get_voltage(101)
+        b.values: parsed get results in request order, b.errors: [(command, error)] for rejected varbinds
+        '''
+        return Batch(self)
 
     ###### MAIN FUNCTIONS: BASIC ONE CHANNEL GET/SET (LIST FROM ISEG MANUAL TABLE 2)#######
     def SetTargetVoltage(self, channel, voltage):
@@ -234,38 +499,23 @@ class MPOD:
         Channel Voltage Set Target ::: [V] ::: float
         Channels can be found from Web Browser or GetAllNames(), form will be 600:607,700:707, etc
         '''
-        if self.mode: #for testing
-            # reply = 'WIENER-CRATE-MIB::outputVoltage.u604 = Opaque: Float: 5.000000000000 V'
-            self.mimic[str(channel)]['v_target'] = voltage
-        else:
-            reply = self.Send('set', f"outputVoltage.u{channel} F {voltage}")
+        reply = self.Send('set', f"outputVoltage.u{channel} F {voltage}")
 
     def GetTargetVoltage(self, channel):
         ''' Channel Voltage Get Target (target set by SetTargetVoltage) ::: [V] ::: float '''
-        if self.mode: 
-            # reply = 'WIENER-CRATE-MIB::outputVoltage.u604 = Opaque: Float: 0.000000000000 V'
-            result = self.mimic[str(channel)]['v_target']
-        else: 
-            reply = self.Send('get', f"outputVoltage.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputVoltage.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result
 
     def SetCurrentLimit(self, channel, current):
         '''Channel Current Set Target (limit) ::: [mA] ::: float'''
         current = current / 1000
-        if self.mode:
-            self.mimic[str(channel)]['i_limit'] = current 
-        else:
-            self.Send('set', f"outputCurrent.u{channel} F {current}")
+        self.Send('set', f"outputCurrent.u{channel} F {current}")
 
     def GetCurrentLimit(self, channel):
         '''Channel Current Get Target (limit set by SetCurrentLimit) ::: [mA] ::: float'''
-        if self.mode: 
-            # reply = 'WIENER-CRATE-MIB::outputCurrent.u604 = Opaque: Float: 0.001000000000 A'
-            result = self.mimic[str(channel)]['i_limit']
-        else: 
-            reply = self.Send('get', f"outputCurrent.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputCurrent.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result*1000
     
     def GetVoltage(self, channel, mode = 'Sense'):
@@ -275,22 +525,14 @@ class MPOD:
         FOR HV MODULES, SENSE AND TERMINAL VALUES ARE IDENTICAL
         '''
         #TODO: determine difference between voltage types. Sense appears to be the useful one for now... 
-        if self.mode: #example response to be parsed
-            # reply = 'WIENER-CRATE-MIB::outputMeasurementSenseVoltage.u604 = Opaque: Float: 0.000000000000 V'
-            result = self.mimic[str(channel)][f'v_{mode.lower()}']
-        else:
-            reply = self.Send('get', f"outputMeasurement{mode}Voltage.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputMeasurement{mode}Voltage.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result
         
     def GetCurrent(self, channel):
         ''' Channel Actual Current Get ::: [mA] ::: float'''
-        if self.mode:
-            # reply = 'WIENER-CRATE-MIB::outputMeasurementCurrent.u604 = Opaque: Float: 0.001592196703 A'
-            result = self.mimic[str(channel)]['i_actual']
-        else:
-            reply = self.Send('get', f"outputMeasurementCurrent.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputMeasurementCurrent.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result*1000
 
     def GetConfigMaxVoltage(self, channel, mode = 'Sense'):
@@ -300,23 +542,15 @@ class MPOD:
         FOR HV MODULES, SENSE AND TERMINAL VALUES ARE IDENTICAL
         '''
         #TODO: figure out how this differs from other voltages
-        if self.mode:
-            # reply = 'WIENER-CRATE-MIB::outputConfigMaxSenseVoltage.u604 = Opaque: Float: 0.093592196703 V'
-            result = self.mimic[str(channel)][f'v_configmax_{mode.lower()}']
-        else:
-            reply = self.Send('get', f"outputConfigMax{mode}Voltage.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputConfigMax{mode}Voltage.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result
     
     def GetConfigMaxCurrent(self, channel):
         ''' Channel Max Current Config (nominal) ::: [mA] ::: float'''
         #TODO: figure out how this differs from other currents
-        if self.mode:
-            # reply = 'WIENER-CRATE-MIB::outputConfigMaxCurrent.u604 = Opaque: Float: 0.093592196703 A'
-            result = self.mimic[str(channel)]['i_configmax']
-        else:
-            reply = self.Send('get', f"outputConfigMaxCurrent.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputConfigMaxCurrent.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result*1000
 
     def SetPower(self, channel, power_state = 0):
@@ -324,19 +558,12 @@ class MPOD:
         Turn channel on (1) or off (0) ::: int
         Additonal states: resetEmergencyOff (2), setEmergencyOff (3), clearEvents(10)
         '''
-        if self.mode:
-            self.mimic[str(channel)]['pwr'] = power_state
-        else:
-            self.Send('set', f"outputSwitch.u{channel} i {power_state}")
+        self.Send('set', f"outputSwitch.u{channel} i {power_state}")
         
     def GetPower(self, channel):
         # returns integer, parse as binary
-        if self.mode:
-            # reply = 'WIENER-CRATE-MIB::outputSwitch.u604 = INTEGER: off(0)'
-            result = self.mimic[str(channel)]['pwr']
-        else:
-            reply = self.Send('get', f"outputSwitch.u{channel}")
-            result = self.ParseReply(reply, 'binary')
+        reply = self.Send('get', f"outputSwitch.u{channel}")
+        result = self.ParseReply(reply, 'binary')
         return result
     
     def SetVoltageRate(self, channel, rate, direction =  'Rise'):
@@ -352,10 +579,7 @@ class MPOD:
             rate = 0.001
             self.WarnHandler('Requested rate too low! Rate set to minimum 1 mV/s')
         
-        if self.mode: 
-            self.mimic[str(channel)]['v_rate'] = rate
-        else: 
-            self.Send('set', f"outputVoltage{direction}Rate.u{channel} F {rate}")
+        self.Send('set', f"outputVoltage{direction}Rate.u{channel} F {rate}")
     
     def GetVoltageRate(self, channel, direction =  'Rise'):
         ''' 
@@ -363,12 +587,8 @@ class MPOD:
         directions: 'Rise' and 'Fall' 
         Note: for most modules, rise & fall rates are tied together
         '''
-        if self.mode: 
-            # reply = 'WIENER-CRATE-MIB::outputVoltageRiseRate.u604 = Opaque: Float: 0.000000000000 V/s'
-            result = self.mimic[str(channel)]['v_rate']
-        else: 
-            reply = self.Send('get', f"outputVoltage{direction}Rate.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputVoltage{direction}Rate.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result
 
     def SetCurrentRate(self, channel, rate, direction =  'Rise'):
@@ -378,10 +598,7 @@ class MPOD:
         Note: for most modules, rise & fall rates are tied together
         '''
         rate = rate/1000
-        if self.mode: 
-            self.mimic[str(channel)]['i_rate'] = rate
-        else: 
-            self.Send('set', f"outputCurrent{direction}Rate.u{channel} F {rate}")
+        self.Send('set', f"outputCurrent{direction}Rate.u{channel} F {rate}")
     
     def GetCurrentRate(self, channel, direction =  'Rise'):
         ''' 
@@ -391,154 +608,182 @@ class MPOD:
         TODO: validate range
         Note: for most modules, rise & fall rates are tied together
         '''
-        if self.mode: 
-            # reply = 'WIENER-CRATE-MIB::outputCurrentRiseRate.u604 = Opaque: Float: 0.093592196703 A/s'
-            result = self.mimic[str(channel)]['i_rate']
-        else: 
-            reply = self.Send('get', f"outputCurrent{direction}Rate.u{channel}")
-            result = self.ParseReply(reply, 'float')
+        reply = self.Send('get', f"outputCurrent{direction}Rate.u{channel}")
+        result = self.ParseReply(reply, 'float')
         return result*1000
     ### ADDITIONAL SINGLE CHANNEL FUNCTIONS #####
     def SetTripTimeMaxCurrent(self, channel, time):
         # For HV only, time in ms
         #TODO: validation range 16-4000 ms
-        if self.mode: 
-            self.mimic[str(channel)]['i_triptimemax'] = time
-        else:
-            self.Send('set', f'outputTripTimeMaxCurrent.u{channel} i {int(time)}')
+        self.Send('set', f'outputTripTimeMaxCurrent.u{channel} i {int(time)}')
 
     def GetTripTimeMaxCurrent(self, channel):
         # For HV only, time in ms 
-        if self.mode: 
-            result = self.mimic[str(channel)]['i_triptimemax']
-        else: 
-            reply = self.Send('get','outputTripTimeMaxCurrent')
-            result = self.ParseReply(reply,'integer')
+        reply = self.Send('get','outputTripTimeMaxCurrent')
+        result = self.ParseReply(reply,'integer')
         return result
         
     ### GROUP FUNCTIONS: GET/Get ALL CHANNELS ####
     def GetAllTargetVoltages(self):
         #Output all target voltages
-        if self.mode: 
-            result = [self.GetTargetVoltage(ch) for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk', 'outputVoltage')
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', 'outputVoltage')
+        result = self.AlignColumn(reply, 'float array')
         return result
     
     def GetAllCurrentLimits(self):
         #Output all current limits ::: [mA] ::: list of floats
-        if self.mode: 
-            result = [self.GetCurrentLimit(ch)/1000 for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk','outputCurrent')
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk','outputCurrent')
+        result = self.AlignColumn(reply, 'float array')
         return [r * 1000 for r in result]
     
     def GetAllVoltages(self, mode = 'Sense'):
         ''' Output all actual voltages
         Modes: 'Sense' or 'Terminal' 
         FOR HV MODULES SENSE AND TERMINAL VALUES ARE IDENTICAL'''
-        if self.mode: 
-            result = [self.GetVoltage(ch,mode) for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk', f'outputMeasurement{mode}Voltage')
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', f'outputMeasurement{mode}Voltage')
+        result = self.AlignColumn(reply, 'float array')
         return result
 
     def GetAllCurrents(self):
         # Output all actual currents ::: [mA] ::: list of floats
-        if self.mode: 
-            result = [self.GetCurrent(ch)/1000 for ch in self.mimic['crate']['channels']]
-        else:
-            reply = self.Send('walk', f'outputMeasurementCurrent')
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', f'outputMeasurementCurrent')
+        result = self.AlignColumn(reply, 'float array')
         return [r * 1000 for r in result]
 
     def GetAllConfigMaxVoltages(self, mode = 'Sense'):
         # Modes: 'Sense' or 'Terminal' 
-        if self.mode:
-            result = [self.GetConfigMaxVoltage(ch,mode) for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk', f"outputConfigMax{mode}Voltage")
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', f"outputConfigMax{mode}Voltage")
+        result = self.AlignColumn(reply, 'float array')
         return result
 
     def GetAllConfigMaxCurrents(self):
         # desc ::: [mA] ::: list of floats
-        if self.mode: 
-            result = [self.GetConfigMaxCurrent(ch)/1000 for ch in self.mimic['crate']['channels']]
-        else:
-            reply = self.Send('walk', f"outputConfigMaxCurrent")
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', f"outputConfigMaxCurrent")
+        result = self.AlignColumn(reply, 'float array')
         return [r * 1000 for r in result]
     
     def GetAllVoltageRates(self, direction =  'Rise'):
-        if self.mode: 
-            result = [self.GetVoltageRate(ch,direction) for ch in self.mimic['crate']['channels']]
-        else:
-            reply = self.Send('walk', f"outputVoltage{direction}Rate")
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', f"outputVoltage{direction}Rate")
+        result = self.AlignColumn(reply, 'float array')
         return result       
     
     def GetAllCurrentRates(self, direction =  'Rise'):
         # desc ::: [mA] ::: list of floats
-        if self.mode: 
-            result = [self.GetCurrentRate(ch)/1000 for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk', f"outputCurrent{direction}Rate")
-            result = self.ParseReply(reply, 'float array')
+        reply = self.Send('walk', f"outputCurrent{direction}Rate")
+        result = self.AlignColumn(reply, 'float array')
         return [r * 1000 for r in result]
 
     def GetAllTripTimeMaxCurrent(self):
         ''' desc ::: [ms] ::: list of integers 
         '''
-        if self.mode: 
-            result = [self.GetTripTimeMaxCurrent(ch) for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk', f"outputTripTimeMaxCurrent")
-            result = self.ParseReply(reply, 'integer array')
+        reply = self.Send('walk', f"outputTripTimeMaxCurrent")
+        result = self.AlignColumn(reply, 'integer array')
+        return result
+    def GetAllColumns(self, columns):
+        ''' 
+        Walk several table columns together (multi-column GETBULK, a full crate reads in a handful of packets)
+        columns: {MIB object: ParseReply array mode}, e.g. {'outputVoltage': 'float array', 'outputSwitch': 'binary array'}
+        Returns {MIB object: list in self.channels order} (raw MIB units, no mA scaling), see AlignColumn
+        '''
+        reply = self.Send('walk', ' '.join(columns))
+        result = {}
+        for name, mode in columns.items():
+            result[name] = self.AlignColumn(reply, mode, name)
+        return result
+
+    def GetSnapshot(self, fields = None, channels = None):
+        ''' 
+        Read several per channel fields for several channels in one GET (split only if the agent's max message size requires it)
+        fields: keys of SNAPSHOT_FIELDS and/or 'pwr_crate'. Default: all fields used by CustomFx.GetAllValues
+        channels: default all channels (GetAllNames order)
+        Returns dict {field: [value per channel]} in GUI units ('pwr_crate': int). Values that could not be read are None
+        '''
+        if fields is None:
+            fields = ['pwr_crate', 'i_limit', 'i_rate', 'i_actual', 'v_target', 'v_rate', 'v_actual', 'pwr_ch']
+        if channels is None:
+            channels = self.channels
+        ch_fields = [f for f in fields if f != 'pwr_crate']
+        modes = [SNAPSHOT_FIELDS[f][1] for f in ch_fields for ch in channels]
+        names = [f'{SNAPSHOT_FIELDS[f][0]}.u{ch}' for f in ch_fields for ch in channels] + ['sysMainSwitch.0']
+        values = self.SnapshotValues(self.Send('get', ' '.join(names)), modes + ['binary'])
+        n = len(channels)
+        result = {}
+        for k, f in enumerate(ch_fields):
+            scale = SNAPSHOT_FIELDS[f][2]
+            result[f] = [v if (v is None or scale is None) else v*scale for v in values[k*n:(k+1)*n]]
+        if 'pwr_crate' in fields:
+            result['pwr_crate'] = int(values[-1] or 0)
         return result
+
+    def GetFrame(self, fields = None):
+        '''
+        Walk the SNAPSHOT_FIELDS columns of every channel together (one multi-column walk) into a ChannelFrame
+        Rows follow self.channel_map, each value is placed by its OID's channel number, GUI units (mA, V)
+        'status' is stored as the status word (see MPODStatus). Channels missing from the walk stay NaN
+        Usage Example:
+            frame = mpod.GetFrame(['v_actual', 'i_actual'])
+            v = frame.Select('v_actual', mpod.channel_map.Rows([101, 102]))
+        '''
+        if fields is None:
+            fields = ['i_limit', 'i_rate', 'i_actual', 'v_target', 'v_rate', 'v_actual', 'pwr_ch']
+        frame = ChannelFrame(self.channel_map, fields)
+        reply = self.Send('walk', ' '.join(SNAPSHOT_FIELDS[f][0] for f in fields))
+        if reply is None:
+            self.WarnHandler(f'Value read error for {self.last_cmd}, NaN returned instead')
+            return frame
+        for f in fields:
+            name, mode, scale = SNAPSHOT_FIELDS[f]
+            if mode == 'bits':
+                varbinds = ParseText(reply, 'bits') if isinstance(reply, str) else reply
+                varbinds = [vb for vb in varbinds if vb.name == name and not isinstance(vb.value, NoSuchValue)]
+                channels = [ChannelIndex(vb.index) for vb in varbinds]
+                values = StatusWords([vb.value for vb in varbinds], 'channel')
+            else:
+                channels, values = self.ParseColumn(reply, f'{mode} array', name)
+            unknown = frame.Fill(f, channels, values, scale)
+            if len(unknown):
+                self.WarnHandler(f'Channels {unknown.tolist()} are not in the channel list, call GetAllNames again')
+        return frame
+
+    def SnapshotValues(self, reply, modes):
+        '''Split a multi-OID GET reply into one value per OID (None if missing)'''
+        if reply is None:
+            self.WarnHandler(f'Value read error for {self.last_cmd}, None returned instead')
+            return [None]*len(modes)
+        if isinstance(reply, list):
+            values = [None if isinstance(vb.value, NoSuchValue) else vb.value for vb in reply]
+            values = [[f'{b:02x}' for b in v] if m == 'bits' and v is not None else v for v, m in zip(values, modes)]
+        else: #cli transport, one line per OID
+            lines = [line for line in reply.splitlines() if line.strip()]
+            if len(lines) != len(modes):
+                self.WarnHandler(f'Unexpected reply length for {self.last_cmd}, None returned instead')
+                return [None]*len(modes)
+            values = [None if 'No Such' in line else self.ParseReply(line, m) for line, m in zip(lines, modes)]
+        return values
+
     ### ADDITIONAL FUCTIONS ####
     def GetAllNames(self):
         #Output all channel names in an array
-        if self.mode: 
-            # 'WIENER-CRATE-MIB::outputName.u100 = STRING: 100 \\ WIENER-CRATE-MIB::outputName.u101 = STRING: 101'
-            result = [0,1,2,100,101,102,200,201,202,300,301,302,500,501,502,600,601,602,800,801,802]
-            result =[0,1,2,3,4,5,6,7]
-            result =[0,1,2,3,4,5,6,7,100,101,500,501]
-
-        else: 
-            reply = self.Send('walk', 'outputName')
-            result = self.ParseReply(reply, 'string')
+        reply = self.Send('walk', 'outputName')
+        result = self.ParseReply(reply, 'string')
         return result
 
     def SetPowerCrate(self, power_state = None):
         if power_state is None:
             power_state = int(not self.GetPowerCrate())
-        if self.mode:
-            self.mimic['crate']['pwr'] = power_state
-        else:
-            self.Send('set', f"sysMainSwitch.0 i {power_state}")
+        self.Send('set', f"sysMainSwitch.0 i {power_state}")
     
     def GetPowerCrate(self):
         #returns integer, parse as binary
-        if self.mode:
-            # reply = 'WIENER-CRATE-MIB::sysMainSwitch.0 = INTEGER: ON(1)'
-            result = self.mimic['crate']['pwr']
-        else: 
-            reply = self.Send('get', "sysMainSwitch.0")
-            result = self.ParseReply(reply, 'binary')
+        reply = self.Send('get', "sysMainSwitch.0")
+        result = self.ParseReply(reply, 'binary')
         
         return int(result)
 
     def GetAllPowers(self):
         # desc ::: list of integers (parse as binary array)
-        if self.mode: 
-            result = [self.GetPower(ch) for ch in self.mimic['crate']['channels']]
-        else: 
-            reply = self.Send('walk', f"outputSwitch")
-            result = self.ParseReply(reply, 'binary array')
+        reply = self.Send('walk', f"outputSwitch")
+        result = self.AlignColumn(reply, 'binary array')
         return result    
     
     def ClearModule(self,module):
@@ -549,10 +794,6 @@ class MPOD:
         Module Voltage Ramp Rate ::: [%] ::: float
         For HV modules only, a percentage of the nominal voltage of the module
         '''
-        # if self.mode: 
-            # reply = ''
-            # result = '''
-        # else: 
         reply = self.Send('get', f"moduleRampSpeedVoltage.ma{module}")
         result = self.ParseReply(reply, 'float')
         # v_nominal = self.GetConfigMaxVoltage()
@@ -563,10 +804,6 @@ class MPOD:
         Module Current Ramp Rate ::: [%] ::: float
         For HV modules only, a percentage of the nominal current of the module
         '''
-        # if self.mode: 
-            # reply = ''
-            # result = []
-        # else: 
         reply = self.Send('get', f"moduleRampSpeedCurrent.ma{module}")
         result = self.ParseReply(reply, 'float')
         return result
@@ -579,9 +816,6 @@ class MPOD:
         ''' 
         Channel Current Set Rise Rate ::: [%] ::: float)
         '''
-        # if self.mode: 
-        #     self.mimic[] = rate
-        # else: 
         self.Send('set', f"moduleRampSpeedCurrent.ma{module} F {pct_rate}")
     
     def GetAllModuleVoltageRate(self):
@@ -606,30 +840,27 @@ class MPOD:
         Module Events are static (vs 'module' -> flags that are transient)
         '''
         mode = mode.lower()
-        if self.mode: 
-            reply = 'WIENER-CRATE-MIB::outputStatus.u101 = BITS: 04 00 40 outputFailureMaxCurrent(5) outputLowCurrentRange(17)'
-        else: 
-            hex_length = 2 # default length for everything but channel
-            bit_length = hex_length*8
-            if 'get all' in mode:
-                to_get = mode.lstrip('get all ')
-                if to_get == 'channel':
-                    bit_length=24
-                return self.ParseStatus(['ff', 'ff', 'ff'],to_get,bit_length,quick)
+        hex_length = 2 # default length for everything but channel
+        bit_length = hex_length*8
+        if 'get all' in mode:
+            to_get = mode.lstrip('get all ')
+            if to_get == 'channel':
+                bit_length=24
+            return self.ParseStatus(['ff', 'ff', 'ff'],to_get,bit_length,quick)
             
-            if mode == 'crate':
-                reply = self.Send('get','sysStatus.0')
-            elif mode == 'channel':
-                reply = self.Send('get', f'outputStatus.u{channel_or_module}')
-                hex_length = 3
-                bit_length = hex_length*8
-            elif mode == 'module status':
-                self.WarnHandler('module status handling not set up - use "module" instead')
-                reply = self.Send('get',f'outputStatus.ma{channel_or_module}')
-            elif mode == 'module':
-                reply = self.Send('get',f'moduleEventStatus.ma{channel_or_module}')          
-            else:
-                self.WarnHandler(f"Mode '{mode}' is not a valid input to GetStatus")
+        if mode == 'crate':
+            reply = self.Send('get','sysStatus.0')
+        elif mode == 'channel':
+            reply = self.Send('get', f'outputStatus.u{channel_or_module}')
+            hex_length = 3
+            bit_length = hex_length*8
+        elif mode == 'module status':
+            self.WarnHandler('module status handling not set up - use "module" instead')
+            reply = self.Send('get',f'outputStatus.ma{channel_or_module}')
+        elif mode == 'module':
+            reply = self.Send('get',f'moduleEventStatus.ma{channel_or_module}')          
+        else:
+            self.WarnHandler(f"Mode '{mode}' is not a valid input to GetStatus")
 
         parsed_reply = self.ParseReply(reply,'bits')
         while len(parsed_reply)<hex_length:
@@ -641,22 +872,36 @@ class MPOD:
             return [name,flag,desc,active_bits]
 
     def GetAllStatuses(self,mode,quick = False):
-        hex_length = 2
-        bit_length = hex_length*8
+        '''Status of every channel (mode 'channel') or module (mode 'module'), one entry per row of GetStatusArray
+        quick: binary strings (bit 0 first), otherwise [name,flag,desc,active_bits] per row'''
+        bits = WordsToBits(self.GetStatusArray(mode), mode)
+        if quick:
+            return [''.join('1' if b else '0' for b in row) for row in bits]
+        return [Describe(row, mode) for row in bits]
+
+    def GetStatusArray(self, mode = 'channel'):
+        '''Status words of every channel/module as a (n,) uint32 array, one walk, no per bit parsing
+        Channel words are in self.channels order (rows of self.channel_map), a channel missing from the walk reads 0
+        Check flags with masks from MPODStatus, e.g. words & FLAG_MASKS['channel']['TRIP']'''
         if mode == 'module':
             reply = self.Send('walk','moduleStatus')
-        if mode =='channel':
-            reply  = self.Send('walk','outputStatus')
-            hex_length = 3
-            bit_length = hex_length*8
-        parsed_reply = self.ParseReply(reply,'bits array')
-        status=[]
-        for p in parsed_reply: 
-            while len(p)<hex_length:
-                p.append('00')
-            status.append(self.ParseStatus(p,mode,bit_length,quick))
-            # [name,flag,desc,active_bits] = self.ParseStatus(p,mode,bit_length,quick)
-        return status
+        else:
+            reply = self.Send('walk','outputStatus')
+        if reply is None:
+            self.WarnHandler(f'Value read error for {self.last_cmd}, no statuses returned')
+            return StatusWords([], mode)
+        if isinstance(reply, str):#cli transport: same octets as the native transport
+            reply = ParseText(reply, 'bits')
+        if any(isinstance(vb.value, NoSuchValue) for vb in reply):
+            self.WarnHandler('Warning: Disconnected from crate')
+            return StatusWords([], mode)
+        words = StatusWords([vb.value for vb in reply], mode)
+        if mode == 'module':
+            return words
+        result = np.zeros(len(self.channel_map), dtype = words.dtype)
+        rows = self.channel_map.Rows([ChannelIndex(vb.index) for vb in reply])
+        result[rows[rows >= 0]] = words[rows >= 0]
+        return result
 
     def TestConnection(self):
         '''Check for instrument response'''
@@ -664,205 +909,16 @@ class MPOD:
         print(result)
 
     def ParseStatus(self,status, mode, bit_length, quick = False):
-        #TODO: handle these statuses, add more desc
         ''' MSB is bit 0. Also, bits are chunked so each status is its own hex-pseduo bit (2digit)
         A perplexing choice of convention... 
         bit_length is 16 for all but channel status (24 for channel status)
+        Flag names/descriptions come from MPODStatus.STATUS_FLAGS
         '''
-        full_status = ''.join(status)
-        int_status = int(full_status,16)
-        binary_status=format(int(full_status,16),f'0{bit_length}b')
+        binary_status=format(int(''.join(status),16),f'0{bit_length}b')
         if quick: 
             return binary_status
             #to get single bit from status, take int(binary_status[bit#]) == True
-        else: 
-            active_bits = []
-            for idx, x in enumerate(binary_status):
-                if int(x):
-                    active_bits.append(idx)
-            name = []
-            flag = []
-            desc = []
-            bits = []
-            if mode == 'crate':
-                bits = [bit for bit in active_bits if bit in [0,1,2,3,4,5,6,8,9,10,11]]
-                for i in active_bits: 
-                    match i: 
-                        case 0:#bit0 = 'crate on flag' #ACTUALLY BIT 15!!! 
-                            name.append('ON')
-                            flag.append('Main On')
-                            desc.append('Crate status flag "Main On". The crate is switched on.')
-                        case 1:#bit1 = 'main inhibit'#BIT 14!!
-                            name.append('INHIBIT')
-                            flag.append('Main Inhibit')
-                            desc.append('An external (hardware-) interlock of the complete system is active.')
-                        case 2:#bit2 = 'local control only'#BIT 13
-                            name.append('LOCAL')
-                            flag.append('Local Control Only')
-                            desc.append('Only local control is possible (CAN BUS write access denied).')
-                        case 3:#bit3 = 'input error'#BIT 12
-                            name.append('INPUT ERROR')
-                            flag.append('Input Failure')
-                            desc.append('An input failure such as a power fail occurred.')
-                        case 4:#bit4 = 'channel error (see channel status)'#BIT 11
-                            name.append('CHANNEL ERROR')
-                            flag.append('Channel Error')
-                            desc.append('A channel error occurred. More details are available from the channel status flags.')
-                        case 5:#bit5 = 'fan tray failure'#BIT 10
-                            name.append('FAN')
-                            flag.append('Fan Tray Failure')
-                            desc.append('A fan tray failure occurred.')
-                        case 8:#bit8 = 'incompatible power supply and rack'#BIT 7
-                            name.append('INCOMPAT')
-                            flag.append('Plug and Play Incompatible')
-                            desc.append('A wrong power supply and rack have been connected.')
-                        case 9:#bit9 = 'system bus reset signal'#BIT 6
-                            name.append('RESET')
-                            flag.append('Bus Reset')
-                            desc.append('The system bus (e.g. VME or CPCI) reset signal is active.')
-                        case 10:#bit10= 'system power supply has derating (DEG) signal active' #BIT 5
-                            name.append('DERATING')
-                            flag.append('Supply Derating')
-                            desc.append('The first system power supply has the DEG signal active.')
-                        case 11:#bit11= 'system power supply has failure (FAL) signal active' #BIT 4
-                            name.append('SUPPLY')
-                            flag.append('Supply Failure')
-                            desc.append('The first system power supply has the FAL signal active.')
-                        
-            elif 'module' in mode:
-                #NOTE: FOR MODULE FLAGS, INVERTED BITS ARE NOT INVERTED. Otherwise identical! 
-                mask = b'0000 0000 1110 1110'#inverted bits in MSB order. bitwise sum should flip to indicate active states
-                #not implemented, ick! 
-                #Status behavior: sticky, i.e. indicates that the flag was triggered, must be cleared to remove
-                for i in active_bits: 
-                    bits = [bit for bit in active_bits if bit in [0,2,3,4,5,6,8,9,10,11,12,13,14,15]]
-                    match i: 
-                        case 0:#bit0 (actually bit 15)
-                            name.append('ADJ')
-                            flag.append('Fine Adjustment Active')
-                            desc.append('In fine adjustment mode: an additional compensation loop in the firmware adjusts Vmeas to the user set value for Vset. Fine adjustment takes some time to be effective after enabling the option.')
-                        case 2:#bit2
-                            name.append('LIVE INS')
-                            flag.append('Live Insertion')
-                            desc.append('Set if a hot plug is prepared for the module. Not available for all power supplies.')
-                        case 3:#bit3
-                            name.append('HV')
-                            flag.append('High Voltage On')
-                            desc.append('At least one channel delivers a high voltage.')
-                        case 4:#bit4
-                            name.append('SERVICE')
-                            flag.append('Maintenance Required')
-                            desc.append('The module has to be returned for maintenance.')
-                        case 5:#bit5
-                            name.append('V LIMIT')
-                            flag.append('Hardware Voltage Limit Exceeded')
-                            desc.append("The hardware voltage limit isn't in the correct range. Not available for all hardware, only HV distributor modules with current mirror.")
-                        case 6:#bit6
-                            name.append('IN ERROR')
-                            flag.append('Input Error')
-                            desc.append('A set value is out of range, has a bad polarity sign or other communication problem. Channel input errors are also reported here.')
-                        case 8:#bit8
-                            #inverted flag
-                            name.append('SUM ERROR')
-                            flag.append('Sum Error')
-                            desc.append('A critical event occurred in at least one channel. The concerned channel status flags are: I LIMIT, V LIMIT, TRIP, INHIBIT, V BOUND, I BOUND.')
-                        case 9:#bit9
-                            #TODO: Get just this bit for a lot of utility.. 
-                            #inverted flag
-                            name.append('RAMP')
-                            flag.append('Ramping')
-                            desc.append('At least one channel is ramping up or down.')
-                        case 10:#bit10
-                            #inverted flag
-                            name.append('SAFETY')
-                            flag.append('Safety Loop Open')
-                            desc.append("The safety loop is open. The SL connector on the front panel is potential free and requires an external 5-20 mA current to be closed. The internal optocoupler has a voltage drop of approx. 3 V. The safety loop needs to be activated by removing the jumper on the module's bottom side.")
-                        case 11:#bit11
-                            name.append('EVENT')
-                            flag.append('Event Active')
-                            desc.append('Set if a module event is active and the masks have been set accordingly. The module events that will trigger this flag are: SAFETY, ... list appears to be incomplete')
-                        case 12:#bit12
-                            #inverted flag
-                            name.append('MOD ERROR')
-                            flag.append('Module Error')
-                            desc.append('One of the following module flags is active : SUM ERROR, MAX TEMP, SUPPLY, SAFETY.')
-                        case 13:#bit13
-                            #inverted flag
-                            name.append('SUPPLY')
-                            flag.append('Power Supply Failure')
-                            desc.append("The module's power supply fails.")
-                        case 14:#bit14
-                            #inverted flag
-                            name.append('MAX TEMP')
-                            flag.append('Temperature High')
-                            desc.append('The temperature of the module is too high.')
-                        case 15:#bit15
-                            #TODO: Get just this bit for lots of behavior info
-                            name.append('KILL')
-                            flag.append('Kill Enabled')
-                            desc.append('The "Kill" option has been enabled for the module. If "Kill" is enabled, several channel status flags will lead to a shutdown of the channel. These status flags are TRIP, I LIMIT, V LIMIT, I BOUND, V BOUND, ARC.')
-            elif mode == 'channel':
-                #NOTE: Channel statuses are different for LV and HV modules! this is for HV modules only
-                for i in active_bits: 
-                    bits = [bit for bit in active_bits if bit in [0,1,4,5,10,11,12,13,14,15,16,17,18,19]]
-                    match i: 
-                        case 0:#Bit 0 (actually bit 23 in conventional ordering)
-                            name.append('ON')
-                            flag.append('Channel On')
-                            desc.append('The channel has been switched on.')
-                        case 1:#Bit 1 (actually bit 22)
-                            name.append('INHIBIT')
-                            flag.append('External Inhibit Detected')
-                            desc.append('An external inhibit signal is detected on the inhibit pin of the module. The channel will be shut down according to the "External Inhibit Action" in the channel properties. Also set if the crate controller interlock is active.')
-                        case 4:#Bit 4 (actually bit 19)
-                            name.append('V LIMIT')
-                            flag.append('Voltage Limit Exceeded')
-                            desc.append('Set if the voltage exceeds the value defined for the hardware voltage limit (Vmax potentiometer). If the "Kill" option has been enabled for the module, the channel will be shut down.')
-                        case 5:#Bit 5 (actually bit 18)
-                            name.append('TRIP')
-                            flag.append('Current Trip Occurred')
-                            desc.append('Set if Imeas exceeds Iset and the "Kill" option is enabled for the module or a delayed trip action has been defined. If a delayed trip is used the flag will only be set after Imeas exceeded Iset for a user-defined delay time. If the "Kill" option is not enabled for the module and no delayed trip action has been defined,the module will operate in current control mode when the output current reaches Iset.')
-                        case 10:#Bit 10 (actually bit 13)
-                            name.append('CC')
-                            flag.append('Constant Current Mode')
-                            desc.append('If module option "kill" has been disabled and no delayed trip action has been defined: this flag is set if the current defined for Iset is reached. The channel operates in current control mode. If the module option "kill" has been enabled or a delayed trip action has been defined: this flag is never set. A current trip will occur instead.')
-                        case 11:#Bit 11 (actually bit 12)
-                            name.append('RAMP UP')
-                            flag.append('Ramping Up')
-                            desc.append('The channel is ramped up')
-                        case 12:#Bit 12 (actually bit 11)
-                            name.append('RAMP DOWN')
-                            flag.append('Ramping Down')
-                            desc.append('The channel is ramped down')
-                        case 13:#Bit 13 (actually bit 10)
-                            name.append('KILL')
-                            flag.append('Kill Enabled')
-                            desc.append('The "Kill" option has been enabled for the module. If "Kill" is enabled, several channel status flags will lead to a shutdown of the channel. These status flags are TRIP, I LIMIT, V LIMIT, I BOUND, V BOUND.')
-                        case 14:#Bit 14 (actually bit 9)
-                            name.append('EMCY')
-                            flag.append('Emergency Off')
-                            desc.append('Emergency off is triggered by the user. The channel is shut down without ramp. The emergency has to be cleared before the channel can be switched on again.')
-                        case 15:#Bit 15 (actually bit 8)
-                            name.append('ADJ')
-                            flag.append('Fine Adjustment Active')
-                            desc.append('The module is in fine adjustment mode. An additional compensation loop in the firmware adjusts Vmeas to the user set value for Vset. Fine adjustment takes some time to be effective after enabling the option.')
-                        case 16:#Bit 16 (actually bit 7)
-                            name.append('CV')
-                            flag.append('Constant Voltage Mode')
-                            desc.append('Set if the voltage defined for Vset is reached. The channel operates in voltage control mode. Also active when the channel is ramped up or down.')
-                        case 17:#Bit 17 (actually bit 6)
-                            name.append('LCR')
-                            flag.append('Low Current Measurement Range')
-                            desc.append('Set if the low current range is used for current measurements. This increases the precision of Imeas. Only available for high precision power supplies.')
-                        case 18:#Bit 18 (actually bit 5)
-                            name.append('V BOUND')
-                            flag.append('Vbound Exceeded')
-                            desc.append('Set if | Vmeas - Vset | > Vbound. If the "Kill" option has been enabled for the module, the channel will be shut down.')
-                        case 19:#Bit 19 (actually bit 4)
-                            name.append('I LIMIT')
-                            flag.append('Current Limit Exceeded')
-                            desc.append('Set if the current exceeds the value defined for the hardware current limit (Imax potentiometer). If the "Kill" option has been enabled for the module, the channel will be shut down.')
-            return [name, flag, desc, bits]#active_bits[0:bit_length]] 
+        return Describe([int(b) for b in binary_status], mode)
            
     def GetChannel(self, channel):
         r'''Get all channel info (Voltage, Current, On/Off Status)'''
@@ -0,0 +1,183 @@
+#Several MPOD crates as one: parallel polling, crate:slot:channel addresses, group-wide ramps
+import concurrent.futures
+import numpy as np
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODClass import MPOD
+    from Driver.MPODFrame import ChannelMap, ChannelFrame
+except ImportError:
+    from MPODClass import MPOD
+    from MPODFrame import ChannelMap, ChannelFrame
+
+def ChannelAddress(crate, channel):
+    '''Global name of a channel: ChannelAddress('top', 103) -> 'top:1:3' (slot 1, channel 3)'''
+    return f'{crate}:{channel // 100}:{channel % 100}'
+
+def ParseAddress(address):
+    '''Inverse of ChannelAddress: 'top:1:3' -> ('top', 103)'''
+    crate, slot, channel = address.rsplit(':', 2)
+    return crate, 100*int(slot) + int(channel)
+
+class CrateGroup:
+    '''
+    N crates with one thread each: every group call runs on all crates at once, so a group read takes as long as
+    the slowest crate, not the sum. Channels are addressed crate:slot:channel (ChannelAddress)
+    crates: {name: IP or MPOD object}. Names must not contain ':'. mpod_kwargs go to every MPOD made here
+    A crate whose call fails gives a warning (self.warnings) and None for that crate, the other crates still run
+    Usage Example:
+        group = CrateGroup({'top': '169.254.107.70', 'bottom': '169.254.107.71'})
+        group.channels#['top:0:0', ..., 'bottom:1:7']
+        frame = group.GetFrame(['v_actual', 'i_actual'])#ChannelFrame, one row per group.channels entry
+        v = frame.Select('v_actual', group.Rows(['top:0:1', 'bottom:1:3']))
+        group.RampAll({'top:0:1': 500, 'bottom:1:3': 1200})
+        group.RampDown()#every channel of every crate to 0 V at its ramp rate
+        group.EmergencyOff()#every channel off without ramp
+    '''
+    def __init__(self, crates, max_workers = None, **mpod_kwargs):
+        self.warnings = []
+        self.names = list(crates)
+        if any(':' in name for name in self.names):
+            raise ValueError('Crate names must not contain ":"')
+        self.pool = concurrent.futures.ThreadPoolExecutor(max_workers = max_workers or len(self.names), thread_name_prefix = 'MPOD crate')
+        def connect(crate):
+            return crate if isinstance(crate, MPOD) else MPOD(IP = crate, **mpod_kwargs)
+        crates = self.Each({name: (connect, (crate,)) for name, crate in crates.items()})#startup checks in parallel too
+        self.crates = {name: crate for name, crate in crates.items() if crate is not None}
+        self.names = list(self.crates)
+        self.MapChannels()
+
+    def MapChannels(self):
+        '''Group channel list and the row of each crate's channels in it. Call again after a crate's GetAllNames changes'''
+        self.channels = [ChannelAddress(name, ch) for name in self.names for ch in self.crates[name].channels]
+        self.n_channels = len(self.channels)
+        self.row = {address: idx for idx, address in enumerate(self.channels)}
+        self.channel_map = ChannelMap(range(self.n_channels))#ChannelFrame rows: the channel "number" is the group row
+        self.crate_rows = {}#crate: group row of each of its channels (crate.channels order)
+        start = 0
+        for name in self.names:
+            n = len(self.crates[name].channels)
+            self.crate_rows[name] = np.arange(start, start + n)
+            start = start + n
+
+    def Rows(self, addresses):
+        '''Group row of each address as an index array, -1 for unknown addresses'''
+        return np.array([self.row.get(address, -1) for address in addresses], dtype = np.int64)
+
+    def ByCrate(self, addresses):
+        '''{crate: [channel numbers]} of a list of addresses, in the given order'''
+        result = {}
+        for address in addresses:
+            crate, channel = ParseAddress(address)
+            if crate not in self.crates:
+                self.WarnHandler(f'{address}: no crate named {crate}')
+                continue
+            result.setdefault(crate, []).append(channel)
+        return result
+
+    def WarnHandler(self, warning_text):
+        self.warnings.append(warning_text)
+        print(warning_text)
+
+    ###### PARALLEL CALLS ######
+    def Each(self, calls):
+        '''calls: {crate: (function, args)}, all run at once. Returns {crate: result}, None for a crate whose call raised'''
+        futures = {name: self.pool.submit(fx, *args) for name, (fx, args) in calls.items()}
+        result = {}
+        for name, future in futures.items():
+            try:
+                result[name] = future.result()
+            except Exception as ex:
+                self.WarnHandler(f'Crate {name}: {ex!r}')
+                result[name] = None
+        return result
+
+    def Map(self, method, *args, crates = None, **kwargs):
+        '''Same MPOD method on every crate (or the named ones) at once, e.g. group.Map('GetPowerCrate') -> {crate: result}'''
+        if crates is None:
+            crates = self.names
+        return self.Each({name: (lambda crate = self.crates[name]: getattr(crate, method)(*args, **kwargs), ()) for name in crates})
+
+    def Close(self):
+        self.pool.shutdown(wait = True)
+
+    ###### READS ######
+    def GetFrame(self, fields = None):
+        '''MPOD.GetFrame of every crate at once, merged into one ChannelFrame with a row per self.channels entry'''
+        frames = self.Map('GetFrame', fields)
+        frame = None
+        for name, crate_frame in frames.items():
+            if frame is None and crate_frame is not None:
+                frame = ChannelFrame(self.channel_map, crate_frame.values.keys())
+            if crate_frame is None:
+                continue
+            for field, values in crate_frame.values.items():
+                frame.Fill(field, self.crate_rows[name], values)
+        return frame if frame is not None else ChannelFrame(self.channel_map, fields or [])
+
+    def GetStatusArray(self, mode = 'channel'):
+        '''Channel status words of every crate at once, one per self.channels entry (0 if a crate did not reply)'''
+        words = np.zeros(self.n_channels, dtype = np.uint32)
+        for name, crate_words in self.Map('GetStatusArray', mode).items():
+            if crate_words is not None and len(crate_words) == len(self.crate_rows[name]):
+                words[self.crate_rows[name]] = crate_words
+        return words
+
+    def GetPowerCrate(self):
+        '''{crate: 0/1}'''
+        return self.Map('GetPowerCrate')
+
+    ###### SINGLE CHANNEL ######
+    def Crate(self, address):
+        '''(MPOD object, channel number) of an address'''
+        crate, channel = ParseAddress(address)
+        return self.crates[crate], channel
+
+    def SetTargetVoltage(self, address, voltage):
+        crate, channel = self.Crate(address)
+        crate.SetTargetVoltage(channel, voltage)
+
+    def GetVoltage(self, address, mode = 'Sense'):
+        crate, channel = self.Crate(address)
+        return crate.GetVoltage(channel, mode)
+
+    def SetPower(self, address, power_state = 0):
+        crate, channel = self.Crate(address)
+        crate.SetPower(channel, power_state)
+
+    ###### GROUP COMMANDS ######
+    def SendSets(self, commands):
+        '''commands: {crate: [(Batch method name, args)]}. One batch per crate (in order), all crates at once'''
+        def send(crate, crate_commands):
+            with crate.batch() as b:
+                for method, args in crate_commands:
+                    getattr(b, method)(*args)
+            return b.errors
+        return self.Each({name: (send, (self.crates[name], crate_commands)) for name, crate_commands in commands.items()})
+
+    def RampAll(self, targets, power_on = True):
+        '''targets: {address: voltage [V]}. Targets (then HV on) go to every crate at once, channels ramp at their own rate'''
+        commands = {}
+        for address, voltage in targets.items():
+            crate, channel = ParseAddress(address)
+            commands.setdefault(crate, []).append(('set_voltage', (channel, voltage)))
+        if power_on:
+            for crate, channels in self.ByCrate(targets).items():
+                commands[crate] = commands[crate] + [('set_power', (ch, 1)) for ch in channels]
+        return self.SendSets({crate: cmds for crate, cmds in commands.items() if crate in self.crates})
+
+    def RampDown(self, addresses = None):
+        '''Ramp channels (default: every channel of every crate) to 0 V at their ramp rate, all crates at once'''
+        if addresses is None:
+            addresses = self.channels
+        return self.RampAll({address: 0 for address in addresses}, power_on = False)
+
+    def EmergencyOff(self, addresses = None):
+        '''setEmergencyOff (outputSwitch 3): channels shut down without ramp, all crates at once. Clear with ResetEmergency'''
+        if addresses is None:
+            addresses = self.channels
+        return self.SendSets({crate: [('set_power', (ch, 3)) for ch in channels] for crate, channels in self.ByCrate(addresses).items()})
+
+    def ResetEmergency(self, addresses = None):
+        '''resetEmergencyOff (outputSwitch 2) so channels can be switched on again'''
+        if addresses is None:
+            addresses = self.channels
+        return self.SendSets({crate: [('set_power', (ch, 2)) for ch in channels] for crate, channels in self.ByCrate(addresses).items()})
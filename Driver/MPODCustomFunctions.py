@@ -2,6 +2,17 @@
 import time
 import warnings
 import traceback
+import numpy as np
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODStatus import AnyFlag, BitMask, StatusWords
+    from Driver.MPODFrame import CrateFrame
+    from Driver.MPODScheduler import PollScheduler
+    from Driver.MPODRamp import RampEngine
+except ImportError:
+    from MPODStatus import AnyFlag, BitMask, StatusWords
+    from MPODFrame import CrateFrame
+    from MPODScheduler import PollScheduler
+    from MPODRamp import RampEngine
 ''' most recent manual: https://file.wiener-d.com/documentation/MPOD/WIENER_MPOD_Manual_3.2.pdf
 '''
 
@@ -41,10 +52,11 @@ class CustomFx(DecorateAllMethods):
 
 
         '''
+        self.override_mask = BitMask(self.status_override, 'channel')#status_override bits as one status word mask
         ###########################################
         self.MPOD = MPOD #object created from MPOD in MPODclass
         self.channel_names = channel_names
-        self.full_channel_list = self.MPOD.GetAllNames()
+        self.full_channel_list = list(self.MPOD.channels)#same order as MPOD.channel_map rows
         self.my_channels = self.full_channel_list.copy()#to allow for active module control
         self.modules, self.channels = self.ChannelsPerModule()
         #### Controls active module input, overrides my channels ###
@@ -63,7 +75,7 @@ class CustomFx(DecorateAllMethods):
             self.my_channels = my_channels_overwrite
             self.channels = channel_overwrite
         
-        self.get_locs = lambda channels: [self.full_channel_list.index(ch) for ch in channels]
+        self.get_locs = self.MPOD.channel_map.Rows#channels -> index array into GetAll* lists (dict lookup per channel)
         self.channel_locs = self.get_locs(self.my_channels)
         #channel_locs is index of all_channels
         ###################################################
@@ -71,7 +83,11 @@ class CustomFx(DecorateAllMethods):
         self.n_channels = len(self.my_channels)
         self.active_modules = self.modules.copy()
         self.active_channels = self.my_channels.copy()
-        self.last_frame = []#most recently acquired data
+        self.last_frame = None#most recently acquired data (MPODFrame.CrateFrame)
+        self.frame_seq = 0#sequence number of last_frame
+        self.scheduler = PollScheduler()#which fields GetAllValues reads each call (MPODScheduler)
+        self.MPOD.set_listeners.append(self.scheduler.Invalidate)#SETs through the driver mark their fields due
+        self.ramp = RampEngine(self.MPOD)#RampTogether, stepped by GetAllValues while a ramp runs
         self.GetAllValues() #initialize last_frame with GetAllValues
         ## For main GUI
         cmd_values = [0]*self.n_channels
@@ -108,13 +124,10 @@ class CustomFx(DecorateAllMethods):
         ''' Returns True if any of the statuses set to override are detected on active channels'''
         if channels is None:
             channels = self.my_channels
-        status = self.MPOD.GetAllStatuses('channel',True)
-        # ramp_status = 15
-        # for idx, ch in enumerate(channels):
-        for idx in self.channel_locs:
-            # if 1 in 
-            if 1 in [int(status[idx][n]) for n in self.status_override]:
-                return [True,idx]
+        words = self.MPOD.GetStatusArray('channel')
+        hits = AnyFlag(words, self.override_mask, self.channel_locs[self.channel_locs >= 0])
+        if len(hits):
+            return [True,int(hits[0])]
         return [False, [-1]]
 
     def ResetIfStatus(self,channels = None):
@@ -193,109 +206,44 @@ class CustomFx(DecorateAllMethods):
                     #TODO: add monitor for status here 
                     #monitor statuses while ramping. reset & resend cmds if trips
 
-    def RampTogether(self, channels = None, target_voltage = None, pass_to_GUI = False, n_div = 10):
+    def RampTogether(self, channels = None, target_voltage = None, pass_to_GUI = False, n_div = None):
+        '''
+        Ramp channels so they all reach their targets at the same time, with the modules' own ramp generators:
+        rise/fall rates proportional to each channel's step (largest step at the safe rate below), then targets and
+        HV on in one batch. Completion of every channel is tracked by self.ramp (MPODRamp.RampEngine)
+        target_voltage: one value per channel, default: the targets already set on the crate
+        pass_to_GUI: False (default): wait until the ramp ends. True: return at once, every GetAllValues call
+            (GUI acquisition thread, CrateBroker poll) steps the ramp, see self.ramp.Summary()
+        n_div: no longer used (the ramp is no longer split into software steps), kept for old callers
+        Returns self.ramp.Progress()
         '''
-        Modes (pass to GUI): 
-            False (default): Execute ramp
-            True: Do not execute ramp. Send ramp parameters to GUI
-        #1) get set (target) voltage values
-        #2) calculate ideal ramp rates
-        #3) discretize using safe ramp rates
-        #4) run fx
-        n_div: number of steps to breakup ramp into
-        # '''
-        #TODO: implement target voltage
-        # self.Reset()
         if channels is None:
             channels = self.my_channels
-        targets, starting, maximum = [], [], []
-        channel_idx = self.get_locs(channels)
-        for idx, ch in enumerate(channels): 
-            if target_voltage is None: 
-                targets.append(self.MPOD.GetTargetVoltage(ch))#could replace with getall
-            else: 
-                targets.append(target_voltage[idx])
-            starting.append(abs(self.MPOD.GetVoltage(ch)))
-            maximum.append(abs(self.MPOD.GetConfigMaxVoltage(ch, 'Terminal')))
+        frame = self.MPOD.GetFrame(['v_target', 'v_configmax'])
+        rows = self.get_locs(channels)
+        if target_voltage is None:
+            target_voltage = frame['v_target'][rows]
         #TODO: add check for KILL_ENABLE to find limit for rampRate
-        #TODO: add user input in initialization to set max rampRate
-        #TODO: IMPORTANT: monitor for tripping and reset or turn off all channels
-        # likely a stock setting - lots of behavior control bits available (see MIB file & manual)
-        deltas, max_rates = [], []
-        for i in range(len(targets)): 
-            deltas.append(targets[i] - starting[i])# desired dV
-            max_rates.append(min([self.max_voltage_ramp, 0.01*maximum[i]]))#[V/s], modify here!
-            #When kill_enabled, the maximum rate is 1% of maximum terminal voltage
-        rate = min(max_rates)#[V/s] selected voltage rise rate for all channels
-        max_idx = deltas.index(max(deltas))# location of maximum delta
-        
-        subdelta = [d/n_div for d in deltas]
-        thresh = 1 #[V] threshold for "close enough" to consider finished
-        if pass_to_GUI: #return parameters for use in GUI
-            return [deltas, starting, rate, thresh, n_div]
-        else: #Run commands now
-            for n in range(n_div):
-                self.MPOD.SendMultiple('start')#BEGIN LISTEN 1
-                step_n_targets = []
-                for idx, ch in enumerate(channels):
-                    if n == n_div-1:
-                        step_n_targets.append(targets[idx])#enforce final targe value
-                    else:
-                        step_n_targets.append(round(starting[idx] + (n+1)*subdelta[idx]))
-                    self.MPOD.SetTargetVoltage(ch, step_n_targets[idx])
-                    # self.MPOD.SetVoltageRate(ch, rate)#only needs to be sent once for ISEG HV
-                    #TODO: is this the right voltage rate to set? or do I need to use SetModuleVoltageRate? 
-                # print(rate,subdelta)
-                self.MPOD.SendMultiple('end') #END LISTEN 1
-                time.sleep(0.1)
-                self.MPOD.SendMultiple('start')# START LISTEN 2
-                for idx, ch in enumerate(channels):
-                    self.MPOD.SetPower(ch, 1)# Turn on HV
-                current_V, target_V = 0, thresh*10
-                self.MPOD.SendMultiple('end')# END LISTEN 2
-                #TODO: get ramping status here
-                while abs(abs(current_V)-abs(target_V)) > thresh:
-                    #TODO: need to track ALL to ensure that other doent shut off... see screenshot
-                    current_V = abs(self.MPOD.GetVoltage(channels[max_idx]))
-                    target_V = step_n_targets[max_idx]#self.MPOD.GetTargetVoltage(channels[max_idx])
-                    #manual thresholding. better way to do this with Geting ramp status
-                    #waits until biggest change is completed
-                    time.sleep(0.1)
-                    [status, bad_ch] = self.CheckStatus()
-                    if status:
-                        print('resetting')
-                        self.Reset()
-                        # self.MPOD.SetPower(bad_ch,1)
-                        # P = self.MPOD.GetAllPowers()#[i,0,1]
-                        #TODO: below is not working yet. setup better! 
-                        # for idx,p in enumerate(P): 
-                        #     if p:
-                        time.sleep(0.1)
-                        for idx in range(len(channels)):
-                            self.MPOD.SetPower(channels[idx],1)
-                        # [self.MPOD.SetPower(i,1) for i in channel_idx if self.MPOD.GetPower(i)==1]
-                        # for i in self.channel_locs:
-                        #     if self.MPOD.GetPower(i):self.MPOD.SetPower(i,1)
-                        #Will channels power off? YES
-                    print('CH: ',channels[max_idx],': (Target, actual) = (', target_V,', ',current_V,')')
-                
-            print('Ramp sequence is complete')    
-        # print('moved to GUI, still preliminary')
-        # breakpoint
+        #When kill_enabled, the maximum rate is 1% of maximum terminal voltage
+        rate = min(self.max_voltage_ramp, 0.01*np.nanmin(np.abs(frame['v_configmax'][rows])))#[V/s], modify here!
+        self.ramp.Start(dict(zip(channels, target_voltage)), rate)
+        if pass_to_GUI:
+            return self.ramp.Progress()
+        result = self.ramp.Run()
+        print(self.ramp.Summary())
+        return result
 
     def Reset(self, channels = None):
         if channels is None:
             channels = self.my_channels #keep as all channels
-        self.MPOD.SendMultiple('start')
-        for ch in channels:
-            self.MPOD.SetPower(ch, 2)#reset EmergencyOff
-            self.MPOD.SetPower(ch, 10)#clear events in status
-            #note - this will not switch channels off, but channels may be turned off by some statuses
-        # self.MPOD.SendMultiple('end')
-        # self.MPOD.SendMultiple('start')
-        for m in self.modules:#manual states that channel events should be cleared before module events
-            self.MPOD.ClearModule(m)
-        self.MPOD.SendMultiple('end')
+        with self.MPOD.batch() as b:#repeated outputSwitch objects go out in separate PDUs, in order
+            for ch in channels:
+                b.set_power(ch, 2)#reset EmergencyOff
+            for ch in channels:
+                b.set_power(ch, 10)#clear events in status
+                #note - this will not switch channels off, but channels may be turned off by some statuses
+            for m in self.modules:#manual states that channel events should be cleared before module events
+                b.clear_module(m)
 
     def RampAll(self, channels_to_ramp = None, ramp_vals = None):
         ''' 
@@ -307,13 +255,12 @@ class CustomFx(DecorateAllMethods):
         if ramp_vals is None:
             ramp_vals = [[0]*len(channels_to_ramp)]*2
         print('Ramp values:', ramp_vals)
-        self.MPOD.SendMultiple('start')
-        for idx, ch in enumerate(self.my_channels): 
-            if ch in channels_to_ramp: 
-                self.MPOD.SetTargetVoltage(ch, ramp_vals[0][idx])
-                # self.MPOD.SetCurrentLimit(ch, ramp_vals[1][idx])
-                self.MPOD.SetPower(ch, 1)
-        self.MPOD.SendMultiple()
+        with self.MPOD.batch() as b:
+            for idx, ch in enumerate(self.my_channels): 
+                if ch in channels_to_ramp: 
+                    b.set_voltage(ch, ramp_vals[0][idx])
+                    # b.set_current_limit(ch, ramp_vals[1][idx])
+                    b.set_power(ch, 1)
         
     def IncrementAll(self, sender, app_data, user_data):
         #TODO: maybe this belongs in widgets, not here
@@ -332,56 +279,58 @@ class CustomFx(DecorateAllMethods):
                 self.MPOD.SetPower(ch, 1)
 
     def GetAllValues(self, channels = None, modules = None):
-        pwr_crate = self.MPOD.GetPowerCrate()
-        if pwr_crate: 
-            if channels is None:
-                    channels = self.my_channels # keep all channels
-            if modules is None:
-                    modules = self.modules # keep all channels
-            if channels == self.my_channels: # read all channels together
-                idx = self.get_locs(self.my_channels)
-                # idx=[idx for idx, value in enumerate(self.full_channel_list) if value in self.my_channels] 
-                i_rate, v_rate = [], []
-                i_limit = self.MPOD.GetAllCurrentLimits()
-                i_limit = [i_limit[i] for i in idx]
-                i_rate_tmp = self.MPOD.GetAllCurrentRates()
-                i_rate_tmp = [i_rate_tmp[i] for i in idx]
-                i_actual = self.MPOD.GetAllCurrents()
-                i_actual = [i_actual[i] for i in idx]
-                v_target = self.MPOD.GetAllTargetVoltages()
-                v_target = [v_target[i] for i in idx]
-                v_rate_tmp = self.MPOD.GetAllVoltageRates()
-                v_rate_tmp = [v_rate_tmp[i] for i in idx]
-                v_actual = self.MPOD.GetAllVoltages()
-                v_actual = [v_actual[i] for i in idx]
-                pwr_ch = self.MPOD.GetAllPowers()
-                pwr_ch = [pwr_ch[i] for i in idx]
-                s=0
-                for idx in range(len(self.modules)):
-                    s = s + len(self.channels[idx])-1 
-                    i_rate.append(i_rate_tmp[s])
-                    v_rate.append(v_rate_tmp[s])                
-            else: #read subset of channels (still probably faster to read all and parse)
-                i_limit, i_rate, i_actual = [], [], []
-                v_target, v_rate, v_actual = [], [], []
-                pwr_ch = []
-
-                for n_module, m in enumerate(modules): #only need to read 1x per module for HV modules
-                    ch = self.channels[n_module][0]
-                    i_rate.append(self.MPOD.GetCurrentRate(ch))#1
-                    v_rate.append(self.MPOD.GetVoltageRate(ch))#4
-                for ch in channels: 
-                    i_limit.append(self.MPOD.GetCurrentLimit(ch))#0
-                    i_actual.append(self.MPOD.GetCurrent(ch))#2
-
-                    v_target.append(self.MPOD.GetTargetVoltage(ch))#3
-                    v_actual.append(self.MPOD.GetVoltage(ch))#5
-
-                    pwr_ch.append(self.MPOD.GetPower(ch))#6
-            self.last_frame = [i_limit, i_rate, i_actual, v_target, v_rate, v_actual, pwr_crate, pwr_ch]
+        ''' Reads the fields of last_frame that self.scheduler says are due (and crate power) with one MPOD.GetSnapshot call
+        last_frame is a new CrateFrame (MPODFrame) each call, fields that were not due or could not be read keep their 
+        previous values and read time. Every field is read when the channels change or there is no previous frame '''
+        if channels is None:
+                channels = self.my_channels # keep all channels
+        if modules is None:
+                modules = self.modules # keep all channels
+        read_time = time.monotonic()
+        #only need to read rates 1x per module for HV modules (first channel of each module)
+        rate_channels = [self.channels[self.modules.index(m)][0] for m in modules]
+        previous = self.last_frame
+        if previous is not None and (previous.channels != tuple(channels) or previous.modules != tuple(modules)):
+            previous = None
+        due = self.scheduler.Due() if previous is not None else list(CrateFrame.FIELDS)
+        fields = ['pwr_crate'] + [field for field in CrateFrame.FIELDS if field in due and field != 'pwr_crate']
+        if any(field in CrateFrame.MODULE_FIELDS for field in fields):
+            read_channels = channels + [ch for ch in rate_channels if ch not in channels]
+        else:
+            read_channels = channels
+        snap = self.MPOD.GetSnapshot(fields, read_channels)
+        values, updated = {'pwr_crate': snap['pwr_crate']}, {'pwr_crate': read_time}
+        if snap['pwr_crate']: 
+            n = len(channels)
+            read_rows = {ch: idx for idx, ch in enumerate(read_channels)}
+            rate_idx = [read_rows[ch] for ch in rate_channels]
+            for field in CrateFrame.CHANNEL_FIELDS + CrateFrame.MODULE_FIELDS:
+                if field not in snap:#not due: previous frame's values and read time
+                    values[field] = getattr(previous, field)
+                    updated[field] = previous.updated.get(field, -np.inf)
+                    continue
+                if field in CrateFrame.MODULE_FIELDS:
+                    column = [snap[field][i] for i in rate_idx]
+                else:
+                    column = snap[field][:n]
+                if field == 'status':#hex pairs -> status word
+                    words = StatusWords([[] if v is None else v for v in column])
+                    column = [None if v is None else int(w) for v, w in zip(column, words)]
+                values[field], updated[field] = column, read_time
+                if None in column and previous is not None:#keep the last good value of channels that did not reply
+                    values[field] = [getattr(previous, field)[i] if v is None else v for i, v in enumerate(column)]
+                    updated[field] = previous.updated.get(field, -np.inf)
         else: 
             warnings.warn('Crate is powered OFF - turn on')
-            self.last_frame[-2] = 0
+            if previous is not None:#channel values are stale until the crate is back on
+                values.update({field: getattr(previous, field) for field in CrateFrame.CHANNEL_FIELDS + CrateFrame.MODULE_FIELDS})
+                updated.update({field: t for field, t in previous.updated.items() if field != 'pwr_crate'})
+            fields = ['pwr_crate']#nothing else was read, read the other fields again once the crate is back
             #TODO: add better handling and put an indicator on front panel
-            #TODO: better as a dictionary or other struct? 
-        
\ No newline at end of file
+        self.scheduler.Done(fields, read_time)
+        self.frame_seq = self.frame_seq + 1
+        self.last_frame = CrateFrame(self.frame_seq, read_time, channels, modules, values, updated)
+        self.scheduler.Observe(self.last_frame, previous)
+        if self.ramp.Active():#one status walk per poll tracks a running RampTogether
+            self.ramp.Step()
+        
@@ -0,0 +1,170 @@
+#Channel keyed results (walk values are placed by their OID's channel number, never by walk position)
+#and the CrateFrame snapshots CustomFx.GetAllValues produces
+import time
+import numpy as np
+
+class ChannelMap:
+    '''
+    Precomputed channel -> row lookup for the crate's channel list (MPOD.GetAllNames order)
+    Usage Example:
+        cmap = ChannelMap([0, 1, 100, 101])
+        cmap.Rows([101, 0])#array([3, 0])
+    '''
+    def __init__(self, channels):
+        self.channels = np.asarray(list(channels), dtype = np.int64)
+        self.row = {int(ch): idx for idx, ch in enumerate(self.channels)}
+
+    def __len__(self):
+        return len(self.channels)
+
+    def Rows(self, channels):
+        '''Row of each channel as an index array, -1 for channels not in the crate'''
+        return np.array([self.row.get(int(ch), -1) for ch in channels], dtype = np.int64)
+
+class ChannelFrame:
+    '''
+    Struct of arrays: one numpy array per field, one row per channel of a ChannelMap
+    Values are placed by channel number, rows a walk did not return stay NaN
+    Selecting channels is one fancy index: frame.Select('v_actual', rows)
+    Usage Example:
+        frame = mpod.GetFrame(['v_actual', 'i_actual'])
+        rows = frame.map.Rows(FX.my_channels)
+        v = frame.Select('v_actual', rows)
+    '''
+    def __init__(self, channel_map, fields = ()):
+        self.map = channel_map
+        self.values = {}
+        for field in fields:
+            self.Add(field)
+
+    def __getitem__(self, field):
+        return self.values[field]
+
+    def __contains__(self, field):
+        return field in self.values
+
+    def Add(self, field):
+        self.values[field] = np.full(len(self.map), np.nan)
+        return self.values[field]
+
+    def Fill(self, field, channels, values, scale = None):
+        '''Put values (one per channel number in channels) into their rows. Returns channels that are not in the map'''
+        column = self.values[field] if field in self.values else self.Add(field)
+        rows = self.map.Rows(channels)
+        values = np.asarray(values, dtype = float)
+        if scale is not None:
+            values = values*scale
+        known = rows >= 0
+        column[rows[known]] = values[known]
+        return np.asarray(channels)[~known]
+
+    def Select(self, field, rows = None):
+        '''Values of field for rows (index array from map.Rows, default all channels)'''
+        if rows is None:
+            return self.values[field]
+        return self.values[field][rows]
+
+    def Missing(self, field):
+        '''Channels with no value for field'''
+        return self.map.channels[np.isnan(self.values[field])]
+
+class CrateFrame:
+    '''
+    One immutable CustomFx.GetAllValues snapshot with named fields (replaces the positional last_frame list)
+    seq: increases by one per frame. time: time.monotonic() when the read started
+    updated: {field: time.monotonic() of the last read that returned the field}. A field that could not be read keeps
+        the previous frame's values and time, so Age(field) tells how stale it is
+    Channel fields have one value per CustomFx.my_channels entry, module fields (rates) one per CustomFx.modules entry
+    Usage Example:
+        frame = FX.last_frame
+        frame.v_actual[0], frame.pwr_crate, frame.Age('v_actual')
+        if frame.Changed(previous): ...redraw only frame.Changed(previous) fields
+    '''
+    CHANNEL_FIELDS = ('i_limit', 'i_actual', 'v_target', 'v_actual', 'pwr_ch', 'status')#status: outputStatus word (MPODStatus)
+    MODULE_FIELDS = ('i_rate', 'v_rate')
+    FIELDS = ('i_limit', 'i_rate', 'i_actual', 'v_target', 'v_rate', 'v_actual', 'pwr_crate', 'pwr_ch', 'status')#old last_frame order, then status
+    __slots__ = ('seq', 'time', 'channels', 'modules', 'updated') + FIELDS
+
+    def __init__(self, seq, read_time, channels, modules, values, updated, copy = True):
+        '''values: {field: list/array (pwr_crate: int)}, updated: {field: read time}
+        copy False keeps float64 arrays as they are (e.g. views into a FrameBus), only marking them read only'''
+        setattr_ = object.__setattr__
+        setattr_(self, 'seq', seq)
+        setattr_(self, 'time', read_time)
+        setattr_(self, 'channels', tuple(channels))
+        setattr_(self, 'modules', tuple(modules))
+        setattr_(self, 'updated', dict(updated))
+        for field in self.FIELDS:
+            if field == 'pwr_crate':
+                setattr_(self, field, int(values.get(field) or 0))
+                continue
+            n = len(self.modules) if field in self.MODULE_FIELDS else len(self.channels)
+            if field not in values:
+                column = np.full(n, np.nan)
+            elif copy:
+                column = np.array(values[field], dtype = float)
+            else:
+                column = np.asarray(values[field], dtype = float).view()#own view, so the caller's array stays writeable
+            column.flags.writeable = False
+            setattr_(self, field, column)
+
+    def __setattr__(self, name, value):
+        raise AttributeError('CrateFrame is immutable, build a new frame instead')
+
+    def __delattr__(self, name):
+        raise AttributeError('CrateFrame is immutable')
+
+    def __getitem__(self, field):
+        return getattr(self, field)
+
+    def __reduce__(self):#pickle through __init__, __setattr__ refuses the default slot by slot restore
+        values = {field: getattr(self, field) for field in self.FIELDS}
+        return (CrateFrame, (self.seq, self.time, self.channels, self.modules, values, self.updated))
+
+    def __repr__(self):
+        return f'CrateFrame(seq={self.seq}, pwr_crate={self.pwr_crate}, channels={list(self.channels)})'
+
+    def Value(self, field, idx):
+        '''field value of row idx (pwr_crate: the crate value), None if the field has no such row'''
+        value = getattr(self, field)
+        if np.ndim(value) == 0:
+            return value
+        return float(value[idx]) if idx < len(value) else None
+
+    def Age(self, field = None, now = None):
+        '''Seconds since field (default: oldest field) was last read'''
+        if now is None:
+            now = time.monotonic()
+        if field is None:
+            return now - min(self.updated.values(), default = -np.inf)
+        return now - self.updated.get(field, -np.inf)
+
+    def Stale(self, max_age, now = None):
+        '''Fields older than max_age seconds'''
+        return [field for field in self.FIELDS if self.Age(field, now) > max_age]
+
+    def Changed(self, other):
+        '''Fields whose values differ from other (all fields if other is None or has other channels)'''
+        if other is None or other.channels != self.channels or other.modules != self.modules:
+            return list(self.FIELDS)
+        changed = []
+        for field in self.FIELDS:
+            a, b = getattr(self, field), getattr(other, field)
+            if np.ndim(a) == 0:
+                if a != b:
+                    changed.append(field)
+            elif not np.array_equal(a, b, equal_nan = True):
+                changed.append(field)
+        return changed
+
+    def ChangedRows(self, other, field):
+        '''Rows of field that differ from other (NaN == NaN), all rows if other is None'''
+        a = getattr(self, field)
+        if other is None or other.channels != self.channels or other.modules != self.modules:
+            return np.arange(len(a))
+        b = getattr(other, field)
+        return np.flatnonzero((a != b) & ~(np.isnan(a) & np.isnan(b)))
+
+    def AsList(self):
+        '''Old positional layout: [i_limit, i_rate, i_actual, v_target, v_rate, v_actual, pwr_crate, pwr_ch], then status'''
+        return [getattr(self, field) for field in self.FIELDS]
@@ -0,0 +1,271 @@
+#CrateFrames in shared memory: one process (the crate broker) publishes, any local process attaches by name and reads
+import mmap
+import os
+import time
+import numpy as np
+from multiprocessing import shared_memory
+if os.name != 'nt':
+    import _posixshmem#what shared_memory itself uses, gives read only mappings
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODFrame import CrateFrame
+except ImportError:
+    from MPODFrame import CrateFrame
+
+''' Layout of the shared memory block:
+header: uint64 [MAGIC, seq, n_channels, n_modules, n_slots, publisher pid, max_channels, max_modules]
+    seq is the newest complete frame, frame seq s lives in slot s % n_slots
+    max_*: size the block was made for, n_* <= max_*: in use (Reserve makes the block before the crate is read, Configure fills in)
+channel numbers: int64 [max_channels], module numbers: int64 [max_modules]
+slots: n_slots x [lock, seq (uint64), frame words (float64) x FrameWords(max_channels, max_modules)]
+    frame words: [time, pwr_crate, updated time per CrateFrame.FIELDS, CHANNEL_FIELDS x n_channels, MODULE_FIELDS x n_modules]
+    lock is a seqlock: odd while the publisher writes the slot. A read is good if lock was even before and unchanged after,
+    and the slot still holds the seq that was asked for (the publisher only reuses a slot n_slots frames later)
+There is one publisher per block, and the block name follows the crate (BusName), so a second poller of the same crate
+can't start: Create/Reserve raise FileExistsError while the first publisher is alive
+MAGIC is written by Configure, Attach refuses a block whose channels are not known yet
+'''
+MAGIC = 0x4D504F44#'MPOD'
+HEADER_WORDS = 8
+SEQ, N_CHANNELS, N_MODULES, N_SLOTS, PID, MAX_CHANNELS, MAX_MODULES = 1, 2, 3, 4, 5, 6, 7
+LOCK, SLOT_SEQ, FRAME = 0, 1, 2#words of a slot
+
+def BusName(IP = '169.254.107.70', port = 161):
+    '''Shared memory name of the frame bus of one crate'''
+    return f"mpod_{IP.replace('.', '_').replace(':', '_')}_{port}"
+
+def FrameWords(n_channels, n_modules):
+    '''float64 words of one frame'''
+    return 2 + len(CrateFrame.FIELDS) + len(CrateFrame.CHANNEL_FIELDS)*n_channels + len(CrateFrame.MODULE_FIELDS)*n_modules
+
+class ReadOnlyMemory:
+    '''
+    Existing shared memory block mapped read only (numpy views of buf can't be written)
+    Not registered with the resource tracker: it would unlink the publisher's block when this process exits
+    '''
+    def __init__(self, name):
+        self.name = name
+        if os.name == 'nt':#windows: no resource tracker, read only is enforced by the numpy views
+            self.shm = shared_memory.SharedMemory(name = name)
+            self.buf, self.size = self.shm.buf, self.shm.size
+            return
+        self.shm = None
+        fd = _posixshmem.shm_open('/' + name, os.O_RDONLY, mode = 0o600)
+        try:
+            self.size = os.fstat(fd).st_size
+            self.mmap = mmap.mmap(fd, self.size, access = mmap.ACCESS_READ)
+        finally:
+            os.close(fd)
+        self.buf = memoryview(self.mmap)
+
+    def close(self):
+        if self.shm is not None:
+            self.buf = None
+            self.shm.close()
+            return
+        self.buf.release()
+        self.buf = None
+        self.mmap.close()
+
+def PublisherAlive(pid):
+    if pid == 0 or os.name == 'nt':#windows frees a block with its last handle, an existing block always has an owner
+        return pid != 0
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class FrameBus:
+    '''
+    Ring of the newest n_slots CustomFx.GetAllValues frames in shared memory
+    Create makes the block (the one publisher), Attach opens it by name, read only (n_channels etc. come from the header)
+    Reserve + Configure: make the block first (claims the name), give it the channels once they are known
+    Read() copies the newest frame. View() is zero copy: the frame's arrays point into the ring, check Valid(frame) after
+    using them (the publisher overwrites a slot n_slots frames later). Since(seq) copies every frame still in the ring after seq
+    Usage Example:
+        bus = FrameBus.Create(FX.my_channels, FX.modules, BusName(IP))#publisher (CrateBroker does this)
+        bus.Publish(FX.last_frame)
+        bus = FrameBus.Attach(BusName('169.254.107.70'))#any other process, e.g. an analysis script
+        frame = bus.View()
+        v = frame.v_actual.mean()
+        if bus.Valid(frame): ...v is from one complete frame
+    '''
+    def __init__(self, shm, owner = False):
+        self.shm = shm
+        self.owner = owner#only the owner publishes and unlinks the block
+        self.header = np.ndarray(HEADER_WORDS, dtype = np.uint64, buffer = shm.buf)
+        if int(self.header[0]) != MAGIC and not owner:#the owner of a reserved block configures it later
+            raise ValueError(f'{shm.name} is not an MPOD frame bus (or its broker has not read the crate yet)')
+        self.Map()
+
+    def Map(self):
+        '''Views of the block from the header'''
+        buf, header = self.shm.buf, self.header
+        n_channels, n_modules, n_slots = int(header[N_CHANNELS]), int(header[N_MODULES]), int(header[N_SLOTS])
+        max_channels, max_modules = int(header[MAX_CHANNELS]), int(header[MAX_MODULES])
+        offset = HEADER_WORDS*8
+        self.channels = tuple(int(ch) for ch in np.ndarray(n_channels, dtype = np.int64, buffer = buf, offset = offset))
+        offset = offset + max_channels*8
+        self.modules = tuple(int(m) for m in np.ndarray(n_modules, dtype = np.int64, buffer = buf, offset = offset))
+        offset = offset + max_modules*8
+        shape = (n_slots, FRAME + FrameWords(max_channels, max_modules))
+        self.slot_words = np.ndarray(shape, dtype = np.uint64, buffer = buf, offset = offset)#lock, seq
+        self.slot_frames = np.ndarray(shape, dtype = np.float64, buffer = buf, offset = offset)[:, FRAME:]
+        if not self.owner:#already read only on posix (read only mapping), windows maps read/write
+            for view in (self.header, self.slot_words, self.slot_frames):
+                view.flags.writeable = False
+        self.n_slots = n_slots
+        self.columns = self.Columns(n_channels, n_modules)
+
+    @classmethod
+    def Create(cls, channels, modules, name = None, slots = 16):
+        '''New block (name None: any free name). An existing block whose publisher has exited is replaced'''
+        channels, modules = list(channels), list(modules)
+        bus = cls.Reserve(len(channels), len(modules), name, slots)
+        bus.Configure(channels, modules)
+        return bus
+
+    @classmethod
+    def Reserve(cls, max_channels, max_modules, name = None, slots = 16):
+        '''
+        New block for up to max_channels/max_modules, without channels: takes the name (a second publisher gets
+        FileExistsError from now on) before the crate has been read. Configure it before the first Publish
+        Usage Example (CrateService does this):
+            bus = FrameBus.Reserve(1000, 10, BusName(IP))#raises if another broker publishes this crate
+            ...connect, read the channel list
+            bus.Configure(FX.my_channels, FX.modules)
+        '''
+        size = (HEADER_WORDS + max_channels + max_modules + slots*(FRAME + FrameWords(max_channels, max_modules)))*8
+        try:
+            shm = shared_memory.SharedMemory(name = name, create = True, size = size)
+        except FileExistsError:
+            old = ReadOnlyMemory(name)
+            pid = int(np.frombuffer(old.buf, dtype = np.uint64, count = HEADER_WORDS)[PID]) if old.size >= HEADER_WORDS*8 else 0
+            old.close()
+            if PublisherAlive(pid):
+                raise FileExistsError(f'Frame bus {name} already has a publisher (pid {pid}), attach to it instead') from None
+            shared_memory.SharedMemory(name = name).unlink()#left behind by a publisher that crashed
+            shm = shared_memory.SharedMemory(name = name, create = True, size = size)
+        np.ndarray(size // 8, dtype = np.uint64, buffer = shm.buf)[:] = 0
+        header = np.ndarray(HEADER_WORDS, dtype = np.uint64, buffer = shm.buf)
+        header[N_SLOTS], header[PID], header[MAX_CHANNELS], header[MAX_MODULES] = slots, os.getpid(), max_channels, max_modules
+        del header
+        return cls(shm, owner = True)
+
+    def Configure(self, channels, modules):
+        '''Channel and module numbers of the frames (once, before the first Publish). Raises ValueError if they don't fit'''
+        channels, modules = list(channels), list(modules)
+        max_channels, max_modules = int(self.header[MAX_CHANNELS]), int(self.header[MAX_MODULES])
+        if len(channels) > max_channels or len(modules) > max_modules:
+            raise ValueError(f'{len(channels)} channels/{len(modules)} modules, frame bus {self.name} has room for '
+                             f'{max_channels}/{max_modules}')
+        if int(self.header[0]) == MAGIC:
+            raise RuntimeError(f'Frame bus {self.name} is already configured, readers have mapped its channels')
+        ids = np.ndarray(max_channels + max_modules, dtype = np.int64, buffer = self.shm.buf, offset = HEADER_WORDS*8)
+        ids[:len(channels)] = channels
+        ids[max_channels:max_channels + len(modules)] = modules
+        del ids
+        self.header[N_CHANNELS], self.header[N_MODULES] = len(channels), len(modules)
+        self.Map()
+        self.header[0] = MAGIC#written last, Attach refuses a half initialized block
+
+    @classmethod
+    def Attach(cls, name):
+        return cls(ReadOnlyMemory(name))
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @staticmethod
+    def Columns(n_channels, n_modules):
+        '''{field: slice of the frame words}'''
+        columns, start = {}, 2 + len(CrateFrame.FIELDS)
+        for field in CrateFrame.CHANNEL_FIELDS + CrateFrame.MODULE_FIELDS:
+            n = n_modules if field in CrateFrame.MODULE_FIELDS else n_channels
+            columns[field] = slice(start, start + n)
+            start = start + n
+        return columns
+
+    def Seq(self):
+        '''seq of the newest published frame (0: nothing published yet)'''
+        return int(self.header[SEQ])
+
+    def Publish(self, frame):
+        if not self.owner:
+            raise PermissionError('Attached frame buses are read only, only the crate broker publishes')
+        if frame is None or frame.seq <= self.Seq():
+            return
+        slot = frame.seq % self.n_slots
+        words = self.slot_frames[slot]
+        self.slot_words[slot, LOCK] = self.slot_words[slot, LOCK] + 1#odd: write in progress
+        words[0], words[1] = frame.time, frame.pwr_crate
+        words[2:2 + len(CrateFrame.FIELDS)] = [frame.updated.get(field, -np.inf) for field in CrateFrame.FIELDS]
+        for field, cols in self.columns.items():
+            words[cols] = frame[field]
+        self.slot_words[slot, SLOT_SEQ] = frame.seq
+        self.slot_words[slot, LOCK] = self.slot_words[slot, LOCK] + 1
+        self.header[SEQ] = frame.seq#readers only look at complete slots
+
+    def Frame(self, seq, copy = True):
+        '''CrateFrame seq (copy, or views into the ring), None if it was overwritten or never published'''
+        if seq <= 0:
+            return None
+        slot = seq % self.n_slots
+        for _ in range(1000):
+            lock = int(self.slot_words[slot, LOCK])
+            if lock % 2:
+                time.sleep(0)
+                continue
+            if int(self.slot_words[slot, SLOT_SEQ]) != seq:
+                return None
+            words = self.slot_frames[slot]
+            if copy:
+                words = words.copy()
+            updated = dict(zip(CrateFrame.FIELDS, words[2:2 + len(CrateFrame.FIELDS)].tolist()))
+            read_time, pwr_crate = float(words[0]), int(words[1])
+            if int(self.slot_words[slot, LOCK]) == lock:
+                break
+        else:
+            return None
+        values = {field: words[cols] for field, cols in self.columns.items()}
+        values['pwr_crate'] = pwr_crate
+        return CrateFrame(seq, read_time, self.channels, self.modules, values, updated, copy = copy)
+
+    def Read(self):
+        '''Copy of the newest frame, None before the first Publish'''
+        return self.Frame(self.Seq())
+
+    def View(self):
+        '''Newest frame without copying, its arrays are read only views into the ring. Check Valid(frame) after use'''
+        return self.Frame(self.Seq(), copy = False)
+
+    def Valid(self, frame):
+        '''True if frame's slot has not been rewritten since View (so values read from it so far are from one frame)'''
+        slot = frame.seq % self.n_slots
+        lock = int(self.slot_words[slot, LOCK])
+        return lock % 2 == 0 and int(self.slot_words[slot, SLOT_SEQ]) == frame.seq
+
+    def Since(self, after_seq):
+        '''Copies of the frames after after_seq that are still in the ring, oldest first'''
+        newest = self.Seq()
+        frames = [self.Frame(seq) for seq in range(max(after_seq + 1, newest - self.n_slots + 1), newest + 1)]
+        return [frame for frame in frames if frame is not None]
+
+    def WaitFrame(self, after_seq = 0, timeout = None, poll = 0.005):
+        '''Copy of the newest frame once its seq is past after_seq, None on timeout'''
+        t_end = None if timeout is None else time.monotonic() + timeout
+        while self.Seq() <= after_seq:
+            if t_end is not None and time.monotonic() > t_end:
+                return None
+            time.sleep(poll)
+        return self.Read()
+
+    def Close(self):
+        '''Drop frames from View() first, their arrays still point into the block'''
+        self.header = self.slot_words = self.slot_frames = None#drop the views first, the buffer can't be closed while they exist
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
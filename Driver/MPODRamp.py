@@ -0,0 +1,246 @@
+#Multi-channel ramps run by the modules' own ramp generators, tracked from one status walk per tick
+import time
+import threading
+import numpy as np
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODStatus import FlagMask
+except ImportError:
+    from MPODStatus import FlagMask
+
+''' Start() sends per channel rise/fall rates (proportional to each channel's step when ramping together, so every
+channel arrives at the same time), the targets and HV on in one batch. From then on the hardware ramps, Step() only
+reads v_actual, v_target, pwr_ch and outputStatus in one multi-column walk and moves the state machine:
+    idle -> ramping -> done | fault | timeout | aborted
+A channel is done when its RAMP UP/RAMP DOWN bits are clear and |v_actual| is within thresh of |target|
+Note: some iseg modules tie the rates of all channels of a module together (see MPOD.SetVoltageRate), then only
+the module's largest step is timed exactly and the others finish early
+'''
+RAMP_MASK = FlagMask(['RAMP UP', 'RAMP DOWN'])
+FAULT_MASK = FlagMask(['TRIP', 'INHIBIT', 'EMCY', 'V LIMIT', 'I LIMIT'])
+
+class RampEngine:
+    '''
+    Non-blocking: Start() returns at once, each Step() is one bulk read. CustomFx.GetAllValues calls Step() while a
+    ramp is active, so any poller (GUI acquisition thread, CrateBroker) drives it; Run() steps until the ramp ends
+    thresh: [V] close enough to target
+    fault_action: what the other channels do when one trips/is inhibited/drops out:
+        'hold' (default, keeps the stack balanced: every channel stops at its present voltage), 'down' (all ramp to 0 V
+        at the restored rates), 'continue' (the others carry on)
+    restore_rates: put the channels' previous rise/fall rates back when the ramp ends (any end state, the ramp's rates
+        can be as low as 1 mV/s and would slow down every later manual ramp). RestoreRates() does it by hand
+    timeout_factor, grace: a ramp that has not finished by timeout_factor*expected time + grace [s] ends in 'timeout'
+    on_progress(engine) each Step, on_done(engine) when it ends (any end state), on_fault(engine, channels)
+    Callbacks run in the thread calling Step (the acquisition thread in the GUIs: no dpg calls there)
+    Usage Example:
+        ramp = RampEngine(mpod, on_done = lambda r: print(r.Summary()))
+        ramp.Start({101: 500, 102: 1000}, rate = 10)#[V/s] of the largest step, 100 s
+        while ramp.Active():
+            ramp.Step()#or let FX.GetAllValues do it
+            time.sleep(0.2)
+        ramp.Progress()['state']#'done'
+    '''
+    IDLE, RAMPING, DONE, FAULT, TIMEOUT, ABORTED = 'idle', 'ramping', 'done', 'fault', 'timeout', 'aborted'
+
+    def __init__(self, MPOD, thresh = 1, fault_action = 'hold', restore_rates = True, timeout_factor = 1.5, grace = 10,
+                 on_progress = None, on_done = None, on_fault = None):
+        self.MPOD = MPOD
+        self.thresh = thresh
+        self.fault_action = fault_action
+        self.restore_rates = restore_rates
+        self.timeout_factor = timeout_factor
+        self.grace = grace
+        self.on_progress, self.on_done, self.on_fault = on_progress, on_done, on_fault
+        self.lock = threading.RLock()#Step from the poller and Abort from a GUI callback (callbacks may call Start)
+        self.state = self.IDLE
+        self.channels = []
+        self.rows = np.zeros(0, dtype = np.int64)
+        self.start = np.zeros(0)#|V| at Start
+        self.target = np.zeros(0)#|V|
+        self.sign = np.zeros(0)#sign of the targets as given to Start
+        self.rates = np.zeros(0)#[V/s] sent
+        self.old_rates = None#(rise, fall) before Start
+        self.power_on = True#Start switched the channels on: one that is off again has dropped out
+        self.v = np.zeros(0)#|V| at the last Step
+        self.done = np.zeros(0, dtype = bool)
+        self.faulted = np.zeros(0, dtype = bool)
+        self.t_start, self.expected, self.deadline, self.t_end = 0., 0., 0., 0.
+        self.n_steps = 0
+
+    ###### STATE ######
+    def Active(self):
+        return self.state == self.RAMPING
+
+    def Progress(self):
+        '''{state, progress (0-1, slowest channel), elapsed, expected, eta [s], channels, done, faulted} (plain types)'''
+        with np.errstate(divide = 'ignore', invalid = 'ignore'):
+            step = np.abs(self.target - self.start)
+            fraction = np.where(step > 0, 1 - np.abs(self.target - self.v)/step, 1.)
+            remaining = np.where(self.done | self.faulted, 0, np.abs(self.target - self.v)/self.rates)
+        now = time.monotonic() if self.state == self.RAMPING else self.t_end
+        return {'state': self.state, 'progress': float(np.clip(fraction, 0, 1).min()) if len(fraction) else 1.,
+                'elapsed': now - self.t_start if self.t_start else 0., 'expected': self.expected,
+                'eta': float(np.nanmax(remaining)) if len(remaining) else 0., 'channels': list(self.channels),
+                'done': [ch for ch, d in zip(self.channels, self.done) if d],
+                'faulted': [ch for ch, f in zip(self.channels, self.faulted) if f]}
+
+    def Summary(self):
+        '''One line for a GUI label'''
+        p = self.Progress()
+        text = f"Ramp {p['state']}: {100*p['progress']:.0f} %, {len(p['done'])}/{len(p['channels'])} channels done"
+        if p['state'] == self.RAMPING:
+            text = text + f", {p['eta']:.0f} s left"
+        else:
+            text = text + f" in {p['elapsed']:.1f} s (expected {p['expected']:.1f} s)"
+        if p['faulted']:
+            text = text + f", fault on {p['faulted']}"
+        return text
+
+    ###### CONTROL ######
+    def Start(self, targets, rate, together = True, power_on = True):
+        '''
+        targets: {channel: voltage [V]}, rate: [V/s] of the largest step (limit it to what the modules allow)
+        together: rates proportional to each step so all channels arrive together, False: every channel at rate
+        power_on False: the targets and rates are sent, switching on is left to the caller (an off channel is not a fault)
+        Returns Progress(). A running ramp is replaced (its channels keep the targets already sent)
+        '''
+        with self.lock:
+            channels = list(targets)
+            rows = self.MPOD.channel_map.Rows(channels)
+            if (rows < 0).any():
+                self.MPOD.WarnHandler(f'Ramp: channels {[ch for ch, r in zip(channels, rows) if r < 0]} not found, not ramped')
+                channels = [ch for ch, r in zip(channels, rows) if r >= 0]
+                rows = rows[rows >= 0]
+            frame = self.MPOD.GetFrame(['v_actual', 'pwr_ch', 'v_rate', 'v_fall'])
+            self.channels, self.rows = channels, rows
+            self.power_on = power_on
+            self.target = np.array([targets[ch] for ch in channels], dtype = float)
+            self.sign = np.where(self.target < 0, -1., 1.)#targets are sent as given, Hold keeps their sign
+            self.target = np.abs(self.target)
+            self.start = np.abs(np.nan_to_num(frame['v_actual'][rows]))
+            self.start = np.where(np.nan_to_num(frame['pwr_ch'][rows]) > 0, self.start, 0)#an off channel starts from 0 V
+            self.old_rates = (frame['v_rate'][rows].copy(), frame['v_fall'][rows].copy())
+            step = np.abs(self.target - self.start)
+            if together and step.max(initial = 0) > 0:
+                self.rates = np.maximum(rate*step/step.max(), 0.001)#[V/s], 1 mV/s is the crate minimum
+            else:
+                self.rates = np.full(len(channels), max(rate, 0.001))
+            self.v = self.start.copy()
+            self.done = np.zeros(len(channels), dtype = bool)
+            self.faulted = np.zeros(len(channels), dtype = bool)
+            with self.MPOD.batch() as b:#rates before targets, then HV on: one SendBatch
+                for ch, r in zip(channels, self.rates):
+                    b.set_voltage_rate(ch, r, 'Rise')
+                    b.set_voltage_rate(ch, r, 'Fall')
+                for ch in channels:
+                    b.set_voltage(ch, targets[ch])
+                if power_on:
+                    for ch in channels:
+                        b.set_power(ch, 1)
+            if b.errors:
+                self.MPOD.WarnHandler(f'Ramp: {len(b.errors)} set(s) rejected: {b.errors}')
+            self.t_start = time.monotonic()
+            self.expected = float((step/self.rates).max(initial = 0))
+            self.deadline = self.t_start + self.timeout_factor*self.expected + self.grace
+            self.n_steps = 0
+            self.state = self.RAMPING
+        return self.Progress()
+
+    def Step(self):
+        '''One tick: one walk, update every channel, fire callbacks. Returns the state. Skipped if another thread is stepping'''
+        if self.state != self.RAMPING or not self.lock.acquire(blocking = False):
+            return self.state
+        try:
+            if self.state != self.RAMPING:
+                return self.state
+            frame = self.MPOD.GetFrame(['v_actual', 'v_target', 'pwr_ch', 'status'])
+            self.n_steps = self.n_steps + 1
+            v = frame['v_actual'][self.rows]
+            words = np.nan_to_num(frame['status'][self.rows]).astype(np.uint32)
+            read = ~np.isnan(v)#channels missing from this walk keep their last values
+            self.v = np.where(read, np.abs(np.nan_to_num(v)), self.v)
+            ramping = (words & RAMP_MASK) != 0
+            at_target = np.abs(self.v - self.target) <= self.thresh
+            self.done = self.done | (read & ~ramping & at_target)
+            dropped = read & (np.nan_to_num(frame['pwr_ch'][self.rows]) == 0) & (self.target > self.thresh) & self.power_on
+            new_fault = read & ~self.faulted & (((words & FAULT_MASK) != 0) | dropped)
+            if new_fault.any():
+                self.faulted = self.faulted | new_fault
+                self.Fault([ch for ch, f in zip(self.channels, new_fault) if f])
+            self.Callback(self.on_progress)
+            if self.state == self.RAMPING:
+                if (self.done | self.faulted).all():
+                    self.Finish(self.FAULT if self.faulted.any() else self.DONE)
+                elif time.monotonic() > self.deadline:
+                    self.MPOD.WarnHandler(f'Ramp timed out, channels not at target: '
+                                          f'{[ch for ch, d, f in zip(self.channels, self.done, self.faulted) if not (d or f)]}')
+                    self.Finish(self.TIMEOUT)
+            return self.state
+        finally:
+            self.lock.release()
+
+    def Run(self, tick = 0.2):
+        '''Blocking: Step every tick seconds until the ramp ends. Returns Progress()'''
+        while self.Active():
+            self.Step()
+            time.sleep(tick)
+        return self.Progress()
+
+    def Abort(self):
+        '''Stop every channel at its present voltage (read now, not the last Step's values, see Hold)'''
+        with self.lock:
+            if self.state != self.RAMPING:
+                return self.state
+            self.Hold(np.ones(len(self.channels), dtype = bool))
+            self.Finish(self.ABORTED)
+        return self.state
+
+    ###### INTERNAL ######
+    def Fault(self, channels):
+        self.MPOD.WarnHandler(f'Ramp: fault on channels {channels}, fault_action {self.fault_action}')
+        others = ~self.faulted & ~self.done
+        if self.fault_action == 'hold':
+            self.Hold(others)
+            self.Finish(self.FAULT)
+        elif self.fault_action == 'down':
+            with self.MPOD.batch() as b:
+                for ch in self.channels:
+                    b.set_voltage(ch, 0)
+            self.Finish(self.FAULT)
+        self.Callback(self.on_fault, channels)
+
+    def Hold(self, which):
+        '''Targets of channels which = their voltage right now. The last Step can be a whole poll period old (or the
+        start voltage if nothing polls), holding at it would ramp the channels back. Rows missing from this read keep self.v'''
+        v = self.MPOD.GetFrame(['v_actual'])['v_actual'][self.rows]
+        self.v = np.where(np.isnan(v), self.v, np.abs(np.nan_to_num(v)))
+        with self.MPOD.batch() as b:
+            for ch, v, sign, hold in zip(self.channels, self.v, self.sign, which):
+                if hold:
+                    b.set_voltage(ch, round(float(sign*v), 1))
+
+    def RestoreRates(self):
+        '''Rise/fall rates of the ramp's channels back to what they were before Start (Finish does it with restore_rates)'''
+        with self.lock:
+            if self.old_rates is None:
+                return
+            with self.MPOD.batch() as b:
+                for ch, rise, fall in zip(self.channels, *self.old_rates):
+                    if not np.isnan(rise):
+                        b.set_voltage_rate(ch, rise, 'Rise')
+                    if not np.isnan(fall):
+                        b.set_voltage_rate(ch, fall, 'Fall')
+
+    def Finish(self, state):
+        self.state = state
+        self.t_end = time.monotonic()
+        if self.restore_rates:
+            self.RestoreRates()
+        self.Callback(self.on_done)
+
+    def Callback(self, fx, *args):
+        if fx is None:
+            return
+        try:
+            fx(self, *args)
+        except Exception as ex:#a broken display callback must not stop the ramp tracking
+            self.MPOD.WarnHandler(f'Ramp callback {fx!r} failed: {ex!r}')
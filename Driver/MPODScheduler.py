@@ -0,0 +1,111 @@
+#Which CustomFx.GetAllValues fields to read each frame, and how long a poller should wait between frames
+import time
+
+''' Fields are read in groups, each with its own refresh interval [s] (0: every frame):
+    idle: nothing is happening, active: during ramps and for active_time seconds after a SET, a switch change or a new
+    status bit (TRIP, INHIBIT... read every idle interval, so a trip without a SET still speeds up polling)
+Quasi-static groups (set points, rates) change only through SETs, so they are read rarely and re-read right after
+any SET through the driver (MPOD.set_listeners). Fields that are not due keep the previous frame's values and read time
+(CrateFrame.Age shows how old they are)
+'''
+#group: (CrateFrame fields, idle interval, active interval)
+FIELD_GROUPS = {
+    'measured': (('v_actual', 'i_actual'), 0, 0),
+    'switches': (('pwr_crate', 'pwr_ch'), 0, 0),
+    'status':   (('status',), 1, 0),
+    'targets':  (('v_target', 'i_limit'), 10, 1),
+    'rates':    (('v_rate', 'i_rate'), 60, 10),
+}
+#MIB object of a SET -> groups to re-read on the next frame (any SET also starts active mode)
+SET_GROUPS = {
+    'outputVoltage': ('targets',),
+    'outputCurrent': ('targets',),
+    'outputVoltageRiseRate': ('rates',),
+    'outputVoltageFallRate': ('rates',),
+    'outputCurrentRiseRate': ('rates',),
+    'outputCurrentFallRate': ('rates',),
+    'moduleRampSpeedVoltage': ('rates',),
+    'moduleRampSpeedCurrent': ('rates',),
+    'outputSwitch': ('switches', 'targets', 'status'),
+    'sysMainSwitch': tuple(FIELD_GROUPS),
+}
+
+class PollScheduler:
+    '''
+    Usage Example (CustomFx.GetAllValues does this):
+        fields = scheduler.Due()#fields to read now
+        ...read them into frame...
+        scheduler.Done(fields, read_time)
+        scheduler.Observe(frame, previous)#ramping or a status change -> active mode
+        time.sleep(scheduler.Interval())#broker poll period
+    poll_interval: (idle, active) seconds between frames for a poller that follows the scheduler (CrateBroker)
+    ramp_threshold: [V] a powered channel further than this from its target is ramping
+    '''
+    def __init__(self, groups = None, poll_interval = (1.0, 0.2), active_time = 10, ramp_threshold = 1):
+        self.groups = dict(FIELD_GROUPS if groups is None else groups)
+        self.poll_interval = poll_interval
+        self.active_time = active_time
+        self.ramp_threshold = ramp_threshold
+        self.last_read = {group: -float('inf') for group in self.groups}
+        self.invalidated = {group: -float('inf') for group in self.groups}#time of the last SET that made the group due
+        self.active_until = -float('inf')
+        self.n_sets = 0#SETs seen, for diagnostics
+
+    def Active(self, now = None):
+        if now is None:
+            now = time.monotonic()
+        return now < self.active_until
+
+    def Activate(self, now = None):
+        '''Fast refresh for the next active_time seconds'''
+        if now is None:
+            now = time.monotonic()
+        self.active_until = max(self.active_until, now + self.active_time)
+
+    def Due(self, now = None):
+        '''Fields of every group whose interval has passed'''
+        if now is None:
+            now = time.monotonic()
+        col = 2 if self.Active(now) else 1
+        fields = []
+        for group, spec in self.groups.items():
+            if now - self.last_read[group] >= spec[col]:
+                fields.extend(spec[0])
+        return fields
+
+    def Done(self, fields, read_time):
+        '''Groups of fields were read by a walk that started at read_time. A group invalidated after read_time stays due
+        (the SET landed during the walk, the value read may be from before it)'''
+        for group, spec in self.groups.items():
+            if any(field in fields for field in spec[0]) and self.invalidated[group] < read_time:
+                self.last_read[group] = read_time
+
+    def Invalidate(self, names = (), now = None):
+        '''A SET went out: names are the MIB objects set ("outputVoltage.u101"). Their groups are re-read next frame'''
+        if now is None:
+            now = time.monotonic()
+        self.n_sets = self.n_sets + 1
+        self.Activate(now)
+        for name in names:
+            for group in SET_GROUPS.get(name.split('.')[0], ()):
+                if group in self.last_read:
+                    self.last_read[group] = -float('inf')
+                    self.invalidated[group] = now
+
+    def Observe(self, frame, previous):
+        '''Active mode while channels ramp and after a switch or status word changes (compares a new CrateFrame with the
+        previous one)'''
+        if frame is None:
+            return
+        if previous is not None:
+            changed = frame.Changed(previous)
+            if 'pwr_ch' in changed or 'status' in changed or frame.pwr_crate != previous.pwr_crate:
+                self.Activate()
+                return
+        on = frame.pwr_ch > 0
+        if (abs(abs(frame.v_actual[on]) - abs(frame.v_target[on])) > self.ramp_threshold).any():
+            self.Activate()
+
+    def Interval(self, now = None):
+        '''Seconds a poller should wait before the next frame'''
+        return self.poll_interval[1] if self.Active(now) else self.poll_interval[0]
@@ -0,0 +1,475 @@
+#Local WIENER-CRATE-MIB agent: SNMPv2c on a UDP port, with ramps, current trips, status bits and agent latency
+#Replaces the old dict based mimic mode, MPOD(mode = 1) starts one and talks to it through the native transport
+import sys
+import time
+import bisect
+import random
+import socket
+import threading
+import numpy as np
+try:#imported from GUI (Driver package) or from inside Driver folder
+    from Driver.MPODTransport import (MIB_OBJECTS, OID_NAMES, ERROR_STATUS, GET, GETNEXT, GETBULK, SET, RESPONSE,
+                                      SEQUENCE, OCTET_STRING, NULL, EncodeTLV, EncodeInteger, EncodeOID,
+                                      EncodeValue, DecodeTLV, DecodeMessage)
+    from Driver.MPODStatus import BitMask
+except ImportError:
+    from MPODTransport import (MIB_OBJECTS, OID_NAMES, ERROR_STATUS, GET, GETNEXT, GETBULK, SET, RESPONSE,
+                               SEQUENCE, OCTET_STRING, NULL, EncodeTLV, EncodeInteger, EncodeOID,
+                               EncodeValue, DecodeTLV, DecodeMessage)
+    from MPODStatus import BitMask
+
+''' Model (one row per channel, numpy arrays, advanced on every request by the time since the last one, no timer thread):
+- outputSwitch on: the sense/terminal voltage ramps to outputVoltage at outputVoltageRiseRate (FallRate going down),
+    off: ramps down to 0 V. setEmergencyOff (3): off without ramp, EMCY until resetEmergencyOff (2)
+- current = voltage / load (SetLoad). Above outputCurrent for longer than outputTripTimeMaxCurrent [ms]: the channel
+    trips (off without ramp, TRIP flag) and stays off until clearEvents (outputSwitch 10) or moduleDoClear
+- outputStatus: ON, INHIBIT, TRIP, RAMP UP, RAMP DOWN, KILL, EMCY, CV (MPODStatus bit numbers)
+- sysMainSwitch off: every channel drops to 0 V and the channel/module tables have no instances (as a crate that is off)
+- moduleRampSpeedVoltage/Current [% of nominal] set the rates of every channel of the module
+- latency + per_varbind [s] delay every reply, loss drops that fraction of requests (tests retries)
+Replies follow the agent rules the driver relies on: GET of a missing instance gives noSuchInstance, GETNEXT/GETBULK
+walk in OID order and stop at endOfMibView, GETBULK replies are cut to max_message_size, a SET is checked completely
+before any varbind is applied (wrongType/notWritable/wrongValue with error-index), wrong community is not answered
+'''
+NO_SUCH_OBJECT, NO_SUCH_INSTANCE, END_OF_MIB_VIEW = 0x80, 0x81, 0x82
+ERRORS = {name: idx for idx, name in enumerate(ERROR_STATUS)}
+WRITABLE = ('sysMainSwitch', 'outputSwitch', 'outputVoltage', 'outputCurrent', 'outputVoltageRiseRate', 'outputVoltageFallRate',
+            'outputCurrentRiseRate', 'outputCurrentFallRate', 'outputTripTimeMaxCurrent', 'outputSupervisionBehavior',
+            'moduleRampSpeedVoltage', 'moduleRampSpeedCurrent', 'moduleDoClear')
+CHANNEL_FLAGS = {name: BitMask([bit], 'channel') for name, bit in
+                 (('ON', 0), ('INHIBIT', 1), ('TRIP', 5), ('RAMP UP', 11), ('RAMP DOWN', 12), ('KILL', 13), ('EMCY', 14), ('CV', 16))}
+MODULE_FLAGS = {name: BitMask([bit], 'module') for name, bit in (('HV', 3), ('RAMP', 9), ('KILL', 15))}
+CRATE_FLAGS = {name: BitMask([bit], 'crate') for name, bit in (('ON', 0), ('CHANNEL ERROR', 4))}
+
+class CrateSimulator:
+    '''
+    modules: {slot: number of channels}, channel numbers are 100*slot + n (GetAllNames order)
+    v_max [V], i_max [A]: outputConfigMax* of every channel. load [Ohm]: default resistance on every channel
+    port 0 picks a free port (self.port after Start)
+    Usage Example:
+        sim = CrateSimulator({0: 16, 1: 16, 2: 16}, latency = 0.002).Start()
+        mpod = MPOD('127.0.0.1', port = sim.port)
+        sim.SetLoad([101], 1e6)#1 MOhm on channel 101: trips above i_limit*1 MOhm
+        sim.Stop()
+    From a shell (a crate for the GUIs, or for other computers with host 0.0.0.0):
+        python Driver/MPODSimulator.py [port] [slots] [channels per slot]
+    '''
+    def __init__(self, modules = None, host = '127.0.0.1', port = 0, v_max = 3000., i_max = 0.001, load = 10e6,
+                 latency = 0., per_varbind = 0., loss = 0., max_message_size = 1472, read_community = 'public',
+                 write_community = 'guru'):
+        if modules is None:
+            modules = {0: 8, 1: 2, 5: 2}
+        self.host, self.port = host, port
+        self.latency, self.per_varbind, self.loss = latency, per_varbind, loss
+        self.max_message_size = max_message_size
+        self.read_community, self.write_community = read_community, write_community
+        self.slots = sorted(modules)
+        self.channels = np.array([100*slot + n for slot in self.slots for n in range(modules[slot])], dtype = np.int64)
+        self.row = {int(ch): idx for idx, ch in enumerate(self.channels)}
+        self.module_of = self.channels // 100
+        n = len(self.channels)
+        self.v_max, self.i_max = np.full(n, float(v_max)), np.full(n, float(i_max))
+        self.load = np.full(n, float(load))
+        self.v_target, self.v = np.zeros(n), np.zeros(n)
+        self.i_limit = np.full(n, 0.5*i_max)
+        self.v_rise, self.v_fall = np.full(n, 0.01*v_max), np.full(n, 0.01*v_max)#1 % of nominal per second
+        self.i_rise, self.i_fall = np.full(n, 0.5*i_max), np.full(n, 0.5*i_max)
+        self.trip_time = np.full(n, 100, dtype = np.int64)#[ms]
+        self.supervision = np.zeros(n, dtype = np.int64)
+        self.on = np.zeros(n, dtype = bool)
+        self.trip, self.emergency, self.inhibit = np.zeros(n, dtype = bool), np.zeros(n, dtype = bool), np.zeros(n, dtype = bool)
+        self.over_since = np.full(n, np.nan)#time the current went above the limit
+        self.module_rate = {slot: [1., 50.] for slot in self.slots}#moduleRampSpeedVoltage, moduleRampSpeedCurrent [%]
+        self.main_switch = 1
+        self.noise = 0.#relative noise of measured values
+        self.last_update = time.monotonic()
+        self.lock = threading.RLock()
+        self.requests, self.varbinds, self.dropped = 0, 0, 0
+        self.sock, self.thread = None, None
+        self.BuildOIDs()
+
+    def BuildOIDs(self):
+        '''Sorted OIDs of every instance (walk order) and their (object, row) lookups'''
+        self.instances = {}
+        for name, (oid, value_type, index_type) in MIB_OBJECTS.items():
+            base = tuple(int(x) for x in oid.split('.'))
+            if index_type == 'scalar':
+                self.instances[base + (0,)] = (name, None)
+            elif index_type == 'channel':
+                for row, ch in enumerate(self.channels):
+                    self.instances[base + (int(ch) + 1,)] = (name, row)
+            elif index_type == 'module':
+                for slot in self.slots:
+                    self.instances[base + (slot + 1,)] = (name, slot)
+        self.oids = sorted(self.instances)
+
+    ###### SERVER ######
+    def Start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((self.host, self.port))
+        self.sock.settimeout(0.2)#Stop is noticed within 0.2 s (closing the socket does not wake recvfrom on linux)
+        self.port = self.sock.getsockname()[1]
+        self.thread = threading.Thread(target = self.Serve, name = f'MPOD simulator :{self.port}', daemon = True)
+        self.thread.start()
+        return self
+
+    def Stop(self):
+        if self.sock is not None:
+            sock, self.sock = self.sock, None
+            self.thread.join(timeout = 1)
+            sock.close()
+
+    def __enter__(self):
+        return self.Start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.Stop()
+        return False
+
+    def Serve(self):
+        sock = self.sock
+        while self.sock is not None:
+            try:
+                data, address = sock.recvfrom(65535)
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            try:
+                reply, n_varbinds = self.Handle(data)
+            except Exception as ex:#a malformed packet must not stop the agent
+                print(f'MPOD simulator: bad request ignored ({ex!r})')
+                continue
+            if reply is None:
+                continue
+            self.requests, self.varbinds = self.requests + 1, self.varbinds + n_varbinds
+            if self.loss and random.random() < self.loss:
+                self.dropped = self.dropped + 1
+                continue
+            delay = self.latency + self.per_varbind*n_varbinds
+            if delay > 0:
+                time.sleep(delay)
+            try:
+                sock.sendto(reply, address)
+            except OSError:
+                return
+
+    def Handle(self, data):
+        '''One request packet -> (reply packet or None, varbinds in the request)'''
+        tag, pos, end = DecodeTLV(data, 0)
+        tag, pos, nxt = DecodeTLV(data, pos)#version
+        tag, pos, nxt = DecodeTLV(data, nxt)
+        community = bytes(data[pos:nxt]).decode(errors = 'replace')
+        pdu_tag, pos, end = DecodeTLV(data, nxt)
+        request_id, field2, field3, varbinds = DecodeMessage(data)
+        allowed = self.write_community if pdu_tag == SET else self.read_community
+        if community != allowed:#v2c agents do not answer a wrong community
+            return None, len(varbinds)
+        with self.lock:
+            self.Update()
+            if pdu_tag == GET:
+                encoded, status, index = [self.EncodeGet(oid) for oid, value in varbinds], 0, 0
+            elif pdu_tag == GETNEXT:
+                encoded, status, index = [self.EncodeNext(oid)[1] for oid, value in varbinds], 0, 0
+            elif pdu_tag == GETBULK:
+                encoded, status, index = self.Bulk(varbinds, field2, field3, len(community)), 0, 0
+            elif pdu_tag == SET:
+                status, index = self.Set(varbinds)
+                encoded = [EncodeOID(oid) + EncodeTLV(NULL, b'') for oid, value in varbinds] if status else [self.EncodeGet(oid) for oid, value in varbinds]
+            else:
+                return None, len(varbinds)
+        reply = self.Message(community, request_id, encoded, status, index)
+        if len(reply) > self.max_message_size and pdu_tag != GETBULK:
+            reply = self.Message(community, request_id, [EncodeOID(oid) + EncodeTLV(NULL, b'') for oid, value in varbinds], ERRORS['tooBig'], 0)
+        return reply, len(varbinds)
+
+    def Message(self, community, request_id, encoded, error_status = 0, error_index = 0):
+        '''Response message from encoded varbind contents (oid + value)'''
+        vbs = b''.join(EncodeTLV(SEQUENCE, vb) for vb in encoded)
+        pdu = EncodeInteger(request_id) + EncodeInteger(error_status) + EncodeInteger(error_index) + EncodeTLV(SEQUENCE, vbs)
+        return EncodeTLV(SEQUENCE, EncodeInteger(1) + EncodeTLV(OCTET_STRING, community.encode()) + EncodeTLV(RESPONSE, pdu))
+
+    ###### GET ######
+    def Visible(self, name, row):
+        '''Channel and module tables have no instances while the crate is off'''
+        return row is None or self.main_switch == 1
+
+    def EncodeGet(self, oid):
+        instance = self.instances.get(oid)
+        if instance is None or not self.Visible(*instance):
+            tag = NO_SUCH_INSTANCE if oid[:-1] in OID_NAMES else NO_SUCH_OBJECT
+            return EncodeOID(oid) + EncodeTLV(tag, b'')
+        return EncodeOID(oid) + self.EncodeInstance(*instance)
+
+    def EncodeNext(self, oid):
+        '''(next oid or None, encoded varbind) in walk order'''
+        idx = bisect.bisect_right(self.oids, tuple(oid))
+        while idx < len(self.oids):
+            name, row = self.instances[self.oids[idx]]
+            if self.Visible(name, row):
+                return self.oids[idx], EncodeOID(self.oids[idx]) + self.EncodeInstance(name, row)
+            idx = idx + 1
+        return None, EncodeOID(oid) + EncodeTLV(END_OF_MIB_VIEW, b'')
+
+    def Bulk(self, varbinds, non_repeaters, max_repetitions, community_length):
+        '''GETBULK: next of the first non_repeaters OIDs, then rows of the others until max_repetitions or the size limit'''
+        encoded = [self.EncodeNext(oid)[1] for oid, value in varbinds[:non_repeaters]]
+        size = 40 + community_length + sum(len(vb) + 4 for vb in encoded)#message, pdu and header overhead
+        current = [oid for oid, value in varbinds[non_repeaters:]]
+        done = [False]*len(current)#column walked past the end of the MIB
+        for repetition in range(max(max_repetitions, 0)):
+            row = []
+            for k, oid in enumerate(current):
+                if done[k]:
+                    row.append(EncodeOID(oid) + EncodeTLV(END_OF_MIB_VIEW, b''))
+                    continue
+                next_oid, vb = self.EncodeNext(oid)
+                if next_oid is None:
+                    done[k] = True
+                else:
+                    current[k] = next_oid
+                row.append(vb)
+            size = size + sum(len(vb) + 4 for vb in row)
+            if size > self.max_message_size and (repetition > 0 or encoded):
+                break
+            encoded.extend(row)
+            if all(done):
+                break
+        return encoded
+
+    def EncodeInstance(self, name, row):
+        value_type = MIB_OBJECTS[name][1]
+        value = self.Value(name, row)
+        if value_type == 'float':
+            return EncodeValue('F', value)
+        if value_type == 'int':
+            return EncodeValue('i', value)
+        if value_type == 'bits':
+            return EncodeTLV(OCTET_STRING, value)
+        return EncodeValue('s', value)
+
+    def Value(self, name, row):
+        '''Current value of one instance (row: channel row, module slot, or None for scalars). Floats in V, A, V/s, A/s'''
+        if name == 'sysMainSwitch':
+            return self.main_switch
+        if name == 'sysStatus':
+            word = (CRATE_FLAGS['ON'] if self.main_switch else 0) | (CRATE_FLAGS['CHANNEL ERROR'] if self.trip.any() else 0)
+            return word.to_bytes(2, 'big')
+        if name == 'outputNumber':
+            return len(self.channels)
+        if name.startswith('module'):
+            return self.ModuleValue(name, row)
+        noise = 1 + self.noise*np.random.standard_normal() if self.noise else 1
+        channel = int(self.channels[row])
+        match name:
+            case 'outputIndex':
+                return channel + 1
+            case 'outputName':
+                return f'U{channel}'
+            case 'outputGroup':
+                return int(self.module_of[row])
+            case 'outputStatus':
+                return self.StatusWord(row).to_bytes(3, 'big')
+            case 'outputMeasurementSenseVoltage' | 'outputMeasurementTerminalVoltage':
+                return float(self.v[row])*noise
+            case 'outputMeasurementCurrent':
+                return float(self.Current()[row])*noise
+            case 'outputMeasurementTemperature':
+                return 30
+            case 'outputSwitch':
+                return int(self.on[row])
+            case 'outputVoltage':
+                return float(self.v_target[row])
+            case 'outputAdjustVoltage':
+                return 0
+            case 'outputCurrent':
+                return float(self.i_limit[row])
+            case 'outputVoltageRiseRate':
+                return float(self.v_rise[row])
+            case 'outputVoltageFallRate':
+                return float(self.v_fall[row])
+            case 'outputSupervisionBehavior':
+                return int(self.supervision[row])
+            case 'outputConfigMaxSenseVoltage' | 'outputConfigMaxTerminalVoltage':
+                return float(self.v_max[row])
+            case 'outputConfigMaxCurrent':
+                return float(self.i_max[row])
+            case 'outputCurrentRiseRate':
+                return float(self.i_rise[row])
+            case 'outputCurrentFallRate':
+                return float(self.i_fall[row])
+            case 'outputTripTimeMaxCurrent':
+                return int(self.trip_time[row])
+        return 0
+
+    def ModuleValue(self, name, slot):
+        rows = self.module_of == slot
+        match name:
+            case 'moduleDescription':
+                return f'iseg, E{int(rows.sum()):02d} {int(self.v_max[rows][0])}V, simulated'
+            case 'moduleRampSpeedVoltage':
+                return self.module_rate[slot][0]
+            case 'moduleRampSpeedCurrent':
+                return self.module_rate[slot][1]
+            case 'moduleStatus':
+                words = [self.StatusWord(row) for row in np.flatnonzero(rows)]
+                word = MODULE_FLAGS['KILL']
+                if (self.v[rows] > 0).any():
+                    word = word | MODULE_FLAGS['HV']
+                if any(w & (CHANNEL_FLAGS['RAMP UP'] | CHANNEL_FLAGS['RAMP DOWN']) for w in words):
+                    word = word | MODULE_FLAGS['RAMP']
+                return word.to_bytes(2, 'big')
+            case 'moduleEventStatus' | 'moduleEventChannelStatus':
+                return bytes(2)
+            case 'moduleDoClear':
+                return 0
+        return 0
+
+    def StatusWord(self, row):
+        word = CHANNEL_FLAGS['KILL']
+        if self.on[row]:
+            word = word | CHANNEL_FLAGS['ON']
+        if self.inhibit[row]:
+            word = word | CHANNEL_FLAGS['INHIBIT']
+        if self.trip[row]:
+            word = word | CHANNEL_FLAGS['TRIP']
+        if self.emergency[row]:
+            word = word | CHANNEL_FLAGS['EMCY']
+        goal = self.v_target[row] if self.on[row] else 0
+        if abs(self.v[row]) < abs(goal):
+            word = word | CHANNEL_FLAGS['RAMP UP']
+        elif abs(self.v[row]) > abs(goal):
+            word = word | CHANNEL_FLAGS['RAMP DOWN']
+        elif self.on[row]:
+            word = word | CHANNEL_FLAGS['CV']
+        return word
+
+    ###### SET ######
+    def Set(self, varbinds):
+        '''Check every varbind, then apply them in order. Returns (error status, error index)'''
+        for k, (oid, value) in enumerate(varbinds):
+            instance = self.instances.get(oid)
+            if instance is None or not self.Visible(*instance):
+                return ERRORS['noCreation'] if oid[:-1] in OID_NAMES else ERRORS['notWritable'], k + 1
+            name = instance[0]
+            if name not in WRITABLE:
+                return ERRORS['notWritable'], k + 1
+            value_type = MIB_OBJECTS[name][1]
+            if value_type == 'float' and not isinstance(value, float) or value_type == 'int' and not isinstance(value, int):
+                return ERRORS['wrongType'], k + 1
+            if value_type == 'float' and (not np.isfinite(value) or value < 0 and name != 'outputVoltage'):
+                return ERRORS['wrongValue'], k + 1
+            if name == 'outputSwitch' and value not in (0, 1, 2, 3, 10):
+                return ERRORS['wrongValue'], k + 1
+        for oid, value in varbinds:
+            self.Apply(*self.instances[oid], value)
+        return 0, 0
+
+    def Apply(self, name, row, value):
+        match name:
+            case 'sysMainSwitch':
+                self.main_switch = int(bool(value))
+                if not self.main_switch:
+                    self.on[:], self.v[:] = False, 0
+            case 'outputSwitch':
+                if value == 0:
+                    self.on[row] = False
+                elif value == 1 and not (self.trip[row] or self.emergency[row] or self.inhibit[row]):
+                    self.on[row] = True
+                elif value == 2:
+                    self.emergency[row] = False
+                elif value == 3:
+                    self.on[row], self.emergency[row], self.v[row] = False, True, 0
+                elif value == 10:
+                    self.trip[row] = False
+                self.over_since[row] = np.nan
+            case 'outputVoltage':
+                self.v_target[row] = min(max(value, -self.v_max[row]), self.v_max[row])
+            case 'outputCurrent':
+                self.i_limit[row] = min(value, self.i_max[row])
+            case 'outputVoltageRiseRate':
+                self.v_rise[row] = value
+            case 'outputVoltageFallRate':
+                self.v_fall[row] = value
+            case 'outputCurrentRiseRate':
+                self.i_rise[row] = value
+            case 'outputCurrentFallRate':
+                self.i_fall[row] = value
+            case 'outputTripTimeMaxCurrent':
+                self.trip_time[row] = value
+            case 'outputSupervisionBehavior':
+                self.supervision[row] = value
+            case 'moduleRampSpeedVoltage':
+                rows = self.module_of == row
+                self.module_rate[row][0] = value
+                self.v_rise[rows] = self.v_fall[rows] = value/100*self.v_max[rows]
+            case 'moduleRampSpeedCurrent':
+                rows = self.module_of == row
+                self.module_rate[row][1] = value
+                self.i_rise[rows] = self.i_fall[rows] = value/100*self.i_max[rows]
+            case 'moduleDoClear':
+                self.trip[self.module_of == row] = False
+
+    ###### MODEL ######
+    def Current(self):
+        return np.abs(self.v) / self.load
+
+    def Update(self, now = None):
+        '''Advance ramps and trip timers to now'''
+        if now is None:
+            now = time.monotonic()
+        last = self.last_update
+        dt = max(now - last, 0)
+        self.last_update = now
+        v_before = np.abs(self.v)
+        goal = np.where(self.on, self.v_target, 0)
+        up = np.abs(goal) > np.abs(self.v)
+        step = np.where(up, self.v_rise, self.v_fall)*dt
+        self.v = np.where(np.abs(goal - self.v) <= step, goal, self.v + np.sign(goal - self.v)*step)
+        over = self.on & (self.Current() > self.i_limit)
+        started = over & np.isnan(self.over_since)
+        if started.any():#the ramp crossed the limit between requests: time it reached i_limit*load
+            v_limit = self.i_limit*self.load
+            with np.errstate(divide = 'ignore', invalid = 'ignore'):
+                crossed = last + np.clip((v_limit - v_before)/self.v_rise, 0, dt)
+            self.over_since[started] = crossed[started]
+        self.over_since[~over] = np.nan
+        tripped = over & (now - self.over_since >= self.trip_time/1000)
+        if tripped.any():#kill: off without ramp
+            self.on[tripped], self.trip[tripped], self.v[tripped] = False, True, 0
+            self.over_since[tripped] = np.nan
+
+    ###### TEST HOOKS ######
+    def Rows(self, channels):
+        return np.array([self.row[int(ch)] for ch in channels], dtype = np.int64)
+
+    def SetLoad(self, channels, ohms):
+        '''Load resistance of channels: current = voltage / load'''
+        with self.lock:
+            self.Update()
+            self.load[self.Rows(channels)] = ohms
+
+    def Inhibit(self, channels, active = True):
+        '''External inhibit: channels switch off without ramp and can't be switched on while it is active'''
+        with self.lock:
+            self.Update()
+            rows = self.Rows(channels)
+            self.inhibit[rows] = active
+            if active:
+                self.on[rows], self.v[rows] = False, 0
+
+    def Stats(self):
+        '''Requests answered, varbinds in them, replies dropped on purpose (loss)'''
+        return {'requests': self.requests, 'varbinds': self.varbinds, 'dropped': self.dropped}
+
+if __name__ == '__main__':
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 1161
+    n_slots = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+    n_channels = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    sim = CrateSimulator({slot: n_channels for slot in range(n_slots)}, host = '0.0.0.0', port = port).Start()
+    print(f'Simulated crate with {len(sim.channels)} channels on UDP port {sim.port}: MPOD(IP, port = {sim.port}). Ctrl+C stops')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.Stop()
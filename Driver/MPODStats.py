@@ -0,0 +1,113 @@
+#Request counters and latency histograms for MPOD.Send/SendBatch (MPOD.EnableStats, MPOD.stats)
+import time
+
+''' Latencies go into log-linear buckets (HDR histogram style): exact below SUB_BUCKETS us, above that each power of two
+is split into SUB_BUCKETS buckets, so any recorded value is known to within 1/SUB_BUCKETS (~3 %) from 1 us to hours
+with a few dozen buckets in use. Recording is a dict increment, percentiles are computed only when asked for
+Keys are (command type, OID family): the MIB objects of the command, e.g. ('walk', 'outputMeasurementCurrent') or
+('get', 'outputCurrent+outputMeasurementCurrent+...') for a GetSnapshot GET
+'''
+SUB_BITS = 5
+SUB_BUCKETS = 1 << SUB_BITS
+
+def BucketIndex(us):
+    if us < SUB_BUCKETS:
+        return us
+    shift = us.bit_length() - SUB_BITS - 1
+    return SUB_BUCKETS + shift*SUB_BUCKETS + (us >> shift) - SUB_BUCKETS
+
+def BucketValue(index):
+    '''Upper edge [us] of a bucket (values in it are at most this)'''
+    if index < SUB_BUCKETS:
+        return index
+    shift, sub = divmod(index - SUB_BUCKETS, SUB_BUCKETS)
+    return ((sub + SUB_BUCKETS + 1) << shift) - 1
+
+def Family(cmd):
+    '''MIB objects of a command string in order of appearance: "outputVoltage.u1 F 5 outputSwitch.u1 i 1" -> outputVoltage+outputSwitch'''
+    names = []
+    for token in cmd.split():
+        name = token.split('.')[0]
+        if name[:1].isalpha() and len(name) > 1 and name not in names:
+            names.append(name)
+    return '+'.join(names)
+
+class LatencyHistogram:
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.#[s]
+        self.max = 0.
+
+    def Record(self, seconds):
+        us = int(seconds*1e6)
+        index = BucketIndex(us) if us > 0 else 0
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count = self.count + 1
+        self.total = self.total + seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def Percentile(self, p):
+        '''Latency [s] below which p % of the recorded values fall (to bucket precision)'''
+        if not self.count:
+            return 0.
+        rank, seen = p/100*self.count, 0
+        for index in sorted(self.buckets):
+            seen = seen + self.buckets[index]
+            if seen >= rank:
+                return min(BucketValue(index)/1e6, self.max)
+        return self.max
+
+    def Merge(self, other):
+        for index, n in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + n
+        self.count, self.total, self.max = self.count + other.count, self.total + other.total, max(self.max, other.max)
+
+class CommandStats:
+    '''
+    Per (command type, OID family): requests, errors (no reply or rejected varbinds), retries, latency histogram
+    A window runs from creation or the last Reset until now
+    Usage Example (MPOD does this, see MPOD.stats):
+        stats = CommandStats()
+        stats.Record('walk', 'outputMeasurementCurrent', 0.0042)
+        stats.Summary()['walk outputMeasurementCurrent']['p99_ms']
+    '''
+    def __init__(self):
+        self.Reset()
+
+    def Reset(self):
+        self.entries = {}#(cmd_type, family): [count, errors, retries, LatencyHistogram]
+        self.start = time.monotonic()
+        self.busy = 0.#[s] total request time in this window (difference two readings for the time spent in between)
+
+    def Record(self, cmd_type, family, seconds, errors = 0, retries = 0):
+        entry = self.entries.get((cmd_type, family))
+        if entry is None:
+            entry = self.entries[(cmd_type, family)] = [0, 0, 0, LatencyHistogram()]
+        entry[0] = entry[0] + 1
+        entry[1] = entry[1] + errors
+        entry[2] = entry[2] + retries
+        entry[3].Record(seconds)
+        self.busy = self.busy + seconds
+
+    def Summary(self, percentiles = (50, 90, 99)):
+        '''{"<type> <family>": {count, errors, retries, total_ms, mean_ms, p50_ms..., max_ms}}, most total time first'''
+        result = {}
+        for (cmd_type, family), (count, errors, retries, hist) in sorted(self.entries.items(), key = lambda item: -item[1][3].total):
+            row = {'count': count, 'errors': errors, 'retries': retries, 'total_ms': hist.total*1e3,
+                   'mean_ms': hist.total/count*1e3 if count else 0.}
+            for p in percentiles:
+                row[f'p{p}_ms'] = hist.Percentile(p)*1e3
+            row['max_ms'] = hist.max*1e3
+            result[f'{cmd_type} {family}'] = row
+        return result
+
+    def Table(self, width = 60):
+        '''Summary as text, one line per command'''
+        lines = [f"{'command':<{width}} {'count':>7} {'err':>5} {'retry':>5} {'total ms':>10} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+        for name, row in self.Summary().items():
+            name = name if len(name) <= width else name[:width - 3] + '...'
+            lines.append(f"{name:<{width}} {row['count']:>7} {row['errors']:>5} {row['retries']:>5} {row['total_ms']:>10.1f} "
+                         f"{row['p50_ms']:>8.2f} {row['p99_ms']:>8.2f} {row['max_ms']:>8.2f}")
+        return '\n'.join(lines)
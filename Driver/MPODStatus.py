@@ -0,0 +1,142 @@
+#Status word decoding for the WIENER-CRATE-MIB BITS objects (sysStatus, outputStatus, moduleStatus, moduleEventStatus)
+import numpy as np
+
+''' Bit numbering follows the crate: bit 0 is the MSB of the first octet (a perplexing choice of convention...)
+e.g. outputStatus 'BITS: 04 00 40' -> bits 5 (TRIP) and 17 (LCR)
+Decoded statuses are arrays, one row per channel/module, one column per bit:
+    words = StatusWords(replies, 'channel')#(n,) uint32, bit 0 is the most significant of bit_length bits
+    bits = StatusBits(replies, 'channel')#(n, 24) uint8 of 0/1
+Flags are checked with precomputed masks, descriptions only come from the STATUS_FLAGS table when asked for
+'''
+
+BIT_LENGTH = {'crate': 16, 'module': 16, 'channel': 24}
+
+#mode: {bit: (name, flag, desc)}
+STATUS_FLAGS = {
+    'crate': {
+        0:  ('ON', 'Main On', 'Crate status flag "Main On". The crate is switched on.'),#ACTUALLY BIT 15!!!
+        1:  ('INHIBIT', 'Main Inhibit', 'An external (hardware-) interlock of the complete system is active.'),#BIT 14!!
+        2:  ('LOCAL', 'Local Control Only', 'Only local control is possible (CAN BUS write access denied).'),#BIT 13
+        3:  ('INPUT ERROR', 'Input Failure', 'An input failure such as a power fail occurred.'),#BIT 12
+        4:  ('CHANNEL ERROR', 'Channel Error', 'A channel error occurred. More details are available from the channel status flags.'),#BIT 11
+        5:  ('FAN', 'Fan Tray Failure', 'A fan tray failure occurred.'),#BIT 10
+        8:  ('INCOMPAT', 'Plug and Play Incompatible', 'A wrong power supply and rack have been connected.'),#BIT 7
+        9:  ('RESET', 'Bus Reset', 'The system bus (e.g. VME or CPCI) reset signal is active.'),#BIT 6
+        10: ('DERATING', 'Supply Derating', 'The first system power supply has the DEG signal active.'),#BIT 5
+        11: ('SUPPLY', 'Supply Failure', 'The first system power supply has the FAL signal active.'),#BIT 4
+    },
+    #NOTE: FOR MODULE FLAGS, INVERTED BITS ARE NOT INVERTED. Otherwise identical!
+    #Status behavior: sticky, i.e. indicates that the flag was triggered, must be cleared to remove
+    'module': {
+        0:  ('ADJ', 'Fine Adjustment Active', 'In fine adjustment mode: an additional compensation loop in the firmware adjusts Vmeas to the user set value for Vset. Fine adjustment takes some time to be effective after enabling the option.'),#bit0 (actually bit 15)
+        2:  ('LIVE INS', 'Live Insertion', 'Set if a hot plug is prepared for the module. Not available for all power supplies.'),
+        3:  ('HV', 'High Voltage On', 'At least one channel delivers a high voltage.'),
+        4:  ('SERVICE', 'Maintenance Required', 'The module has to be returned for maintenance.'),
+        5:  ('V LIMIT', 'Hardware Voltage Limit Exceeded', "The hardware voltage limit isn't in the correct range. Not available for all hardware, only HV distributor modules with current mirror."),
+        6:  ('IN ERROR', 'Input Error', 'A set value is out of range, has a bad polarity sign or other communication problem. Channel input errors are also reported here.'),
+        8:  ('SUM ERROR', 'Sum Error', 'A critical event occurred in at least one channel. The concerned channel status flags are: I LIMIT, V LIMIT, TRIP, INHIBIT, V BOUND, I BOUND.'),#inverted flag
+        9:  ('RAMP', 'Ramping', 'At least one channel is ramping up or down.'),#inverted flag
+        10: ('SAFETY', 'Safety Loop Open', "The safety loop is open. The SL connector on the front panel is potential free and requires an external 5-20 mA current to be closed. The internal optocoupler has a voltage drop of approx. 3 V. The safety loop needs to be activated by removing the jumper on the module's bottom side."),#inverted flag
+        11: ('EVENT', 'Event Active', 'Set if a module event is active and the masks have been set accordingly. The module events that will trigger this flag are: SAFETY, ... list appears to be incomplete'),
+        12: ('MOD ERROR', 'Module Error', 'One of the following module flags is active : SUM ERROR, MAX TEMP, SUPPLY, SAFETY.'),#inverted flag
+        13: ('SUPPLY', 'Power Supply Failure', "The module's power supply fails."),#inverted flag
+        14: ('MAX TEMP', 'Temperature High', 'The temperature of the module is too high.'),#inverted flag
+        15: ('KILL', 'Kill Enabled', 'The "Kill" option has been enabled for the module. If "Kill" is enabled, several channel status flags will lead to a shutdown of the channel. These status flags are TRIP, I LIMIT, V LIMIT, I BOUND, V BOUND, ARC.'),
+    },
+    #NOTE: Channel statuses are different for LV and HV modules! this is for HV modules only
+    'channel': {
+        0:  ('ON', 'Channel On', 'The channel has been switched on.'),#Bit 0 (actually bit 23 in conventional ordering)
+        1:  ('INHIBIT', 'External Inhibit Detected', 'An external inhibit signal is detected on the inhibit pin of the module. The channel will be shut down according to the "External Inhibit Action" in the channel properties. Also set if the crate controller interlock is active.'),
+        4:  ('V LIMIT', 'Voltage Limit Exceeded', 'Set if the voltage exceeds the value defined for the hardware voltage limit (Vmax potentiometer). If the "Kill" option has been enabled for the module, the channel will be shut down.'),
+        5:  ('TRIP', 'Current Trip Occurred', 'Set if Imeas exceeds Iset and the "Kill" option is enabled for the module or a delayed trip action has been defined. If a delayed trip is used the flag will only be set after Imeas exceeded Iset for a user-defined delay time. If the "Kill" option is not enabled for the module and no delayed trip action has been defined,the module will operate in current control mode when the output current reaches Iset.'),
+        10: ('CC', 'Constant Current Mode', 'If module option "kill" has been disabled and no delayed trip action has been defined: this flag is set if the current defined for Iset is reached. The channel operates in current control mode. If the module option "kill" has been enabled or a delayed trip action has been defined: this flag is never set. A current trip will occur instead.'),
+        11: ('RAMP UP', 'Ramping Up', 'The channel is ramped up'),
+        12: ('RAMP DOWN', 'Ramping Down', 'The channel is ramped down'),
+        13: ('KILL', 'Kill Enabled', 'The "Kill" option has been enabled for the module. If "Kill" is enabled, several channel status flags will lead to a shutdown of the channel. These status flags are TRIP, I LIMIT, V LIMIT, I BOUND, V BOUND.'),
+        14: ('EMCY', 'Emergency Off', 'Emergency off is triggered by the user. The channel is shut down without ramp. The emergency has to be cleared before the channel can be switched on again.'),
+        15: ('ADJ', 'Fine Adjustment Active', 'The module is in fine adjustment mode. An additional compensation loop in the firmware adjusts Vmeas to the user set value for Vset. Fine adjustment takes some time to be effective after enabling the option.'),
+        16: ('CV', 'Constant Voltage Mode', 'Set if the voltage defined for Vset is reached. The channel operates in voltage control mode. Also active when the channel is ramped up or down.'),
+        17: ('LCR', 'Low Current Measurement Range', 'Set if the low current range is used for current measurements. This increases the precision of Imeas. Only available for high precision power supplies.'),
+        18: ('V BOUND', 'Vbound Exceeded', 'Set if | Vmeas - Vset | > Vbound. If the "Kill" option has been enabled for the module, the channel will be shut down.'),
+        19: ('I LIMIT', 'Current Limit Exceeded', 'Set if the current exceeds the value defined for the hardware current limit (Imax potentiometer). If the "Kill" option has been enabled for the module, the channel will be shut down.'),
+    },
+}
+
+def StatusMode(mode):
+    '''GetStatus modes ('module event', 'get all channel'...) -> key of STATUS_FLAGS'''
+    for key in ('channel', 'module', 'crate'):
+        if key in mode:
+            return key
+    return 'crate'
+
+def BitMask(bits, mode = 'channel'):
+    '''Integer mask of bit numbers (crate convention) for words from StatusWords'''
+    bit_length = BIT_LENGTH[StatusMode(mode)]
+    mask = 0
+    for b in bits:
+        mask = mask | (1 << (bit_length - 1 - b))
+    return mask
+
+#name: mask, e.g. FLAG_MASKS['channel']['TRIP']
+FLAG_MASKS = {mode: {name: BitMask([bit], mode) for bit, (name, flag, desc) in flags.items()}
+              for mode, flags in STATUS_FLAGS.items()}
+KNOWN_MASKS = {mode: BitMask(flags, mode) for mode, flags in STATUS_FLAGS.items()}
+
+def FlagMask(names, mode = 'channel'):
+    '''Mask for several flags by name, e.g. FlagMask(['TRIP', 'V LIMIT', 'I LIMIT'])'''
+    mode = StatusMode(mode)
+    mask = 0
+    for name in names:
+        mask = mask | FLAG_MASKS[mode][name]
+    return mask
+
+def StatusOctets(statuses, mode = 'channel'):
+    '''
+    Statuses as a (n, n_bytes) uint8 array. Each status is bytes (native transport) or a list of hex pairs
+    (ParseReply 'bits'). Short replies are zero padded like the crate's trailing zero octets
+    '''
+    n_bytes = BIT_LENGTH[StatusMode(mode)] // 8
+    octets = np.zeros((len(statuses), n_bytes), dtype = np.uint8)
+    for idx, status in enumerate(statuses):
+        if isinstance(status, (bytes, bytearray)):
+            row = np.frombuffer(status[:n_bytes], dtype = np.uint8)
+        else:
+            row = [int(h, 16) for h in status[:n_bytes]]
+        octets[idx, :len(row)] = row
+    return octets
+
+def StatusBits(statuses, mode = 'channel'):
+    '''(n, bit_length) array of 0/1, column b is crate bit b'''
+    return np.unpackbits(StatusOctets(statuses, mode), axis = 1)
+
+def StatusWords(statuses, mode = 'channel'):
+    '''(n,) uint32 status words, test flags with words & mask'''
+    octets = StatusOctets(statuses, mode).astype(np.uint32)
+    words = np.zeros(len(octets), dtype = np.uint32)
+    for col in range(octets.shape[1]):
+        words = (words << 8) | octets[:, col]
+    return words
+
+def WordsToBits(words, mode = 'channel'):
+    bit_length = BIT_LENGTH[StatusMode(mode)]
+    shifts = np.arange(bit_length - 1, -1, -1, dtype = np.uint32)
+    return ((np.asarray(words, dtype = np.uint32)[:, None] >> shifts) & 1).astype(np.uint8)
+
+def AnyFlag(words, mask, rows = None):
+    '''Row indices (into words, or into rows if given) where any bit of mask is set'''
+    words = np.asarray(words, dtype = np.uint32)
+    if rows is not None:
+        words = words[rows]
+    hits = np.flatnonzero(words & np.uint32(mask))
+    if rows is not None:
+        hits = np.asarray(rows)[hits]
+    return hits
+
+def Describe(bits_row, mode = 'channel'):
+    '''[name, flag, desc, bits] of the known active flags in one row of StatusBits (or one status word)'''
+    mode = StatusMode(mode)
+    if np.ndim(bits_row) == 0:
+        bits_row = WordsToBits([bits_row], mode)[0]
+    flags = STATUS_FLAGS[mode]
+    bits = [int(b) for b in np.flatnonzero(bits_row) if b in flags]
+    return [[flags[b][0] for b in bits], [flags[b][1] for b in bits], [flags[b][2] for b in bits], bits]
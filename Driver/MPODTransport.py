@@ -0,0 +1,577 @@
+import re
+import socket
+import struct
+import random
+import platform
+import subprocess #for windows
+import collections
+try:
+    import pexpect as px #for linux
+except ImportError:
+    px = None
+r'''
+SNMP transports used by MPODClass. Both take the same command strings MPOD.Send builds,
+e.g. Send('set', 'outputVoltage.u101 F 500') or Send('walk', 'outputSwitch')
+- NativeTransport: SNMPv2c in-process over one UDP socket (BER encode/decode done here). Returns typed VarBinds.
+- CLITransport: original net-snmp command line path (snmpget/snmpset/snmpbulkwalk). Returns reply text.
+Walks are GETBULK based, several table columns can be walked together (Walk(['outputVoltage', 'outputSwitch'])).
+The native transport does not read the MIB file, object names are resolved with MIB_OBJECTS below.
+Reference: WIENER-CRATE-MIB.txt (https://file.wiener-d.com/software/net-snmp/)
+'''
+
+WIENER_CRATE = '1.3.6.1.4.1.19947.1' #enterprises.wiener.crate
+#name: (oid, value type, index type)
+#value types: float (Opaque float), int, bits (BITS as raw bytes), string
+#index types: scalar (.0), channel (u101 -> 102), module (ma3 -> 4), group (number)
+MIB_OBJECTS = {
+    'sysMainSwitch':                    (WIENER_CRATE + '.1.1', 'int', 'scalar'),
+    'sysStatus':                        (WIENER_CRATE + '.1.2', 'bits', 'scalar'),
+    'outputNumber':                     (WIENER_CRATE + '.3.1', 'int', 'scalar'),
+    'outputIndex':                      (WIENER_CRATE + '.3.2.1.1', 'int', 'channel'),
+    'outputName':                       (WIENER_CRATE + '.3.2.1.2', 'string', 'channel'),
+    'outputGroup':                      (WIENER_CRATE + '.3.2.1.3', 'int', 'channel'),
+    'outputStatus':                     (WIENER_CRATE + '.3.2.1.4', 'bits', 'channel'),
+    'outputMeasurementSenseVoltage':    (WIENER_CRATE + '.3.2.1.5', 'float', 'channel'),
+    'outputMeasurementTerminalVoltage': (WIENER_CRATE + '.3.2.1.6', 'float', 'channel'),
+    'outputMeasurementCurrent':         (WIENER_CRATE + '.3.2.1.7', 'float', 'channel'),
+    'outputMeasurementTemperature':     (WIENER_CRATE + '.3.2.1.8', 'int', 'channel'),
+    'outputSwitch':                     (WIENER_CRATE + '.3.2.1.9', 'int', 'channel'),
+    'outputVoltage':                    (WIENER_CRATE + '.3.2.1.10', 'float', 'channel'),
+    'outputAdjustVoltage':              (WIENER_CRATE + '.3.2.1.11', 'int', 'channel'),
+    'outputCurrent':                    (WIENER_CRATE + '.3.2.1.12', 'float', 'channel'),
+    'outputVoltageRiseRate':            (WIENER_CRATE + '.3.2.1.13', 'float', 'channel'),
+    'outputVoltageFallRate':            (WIENER_CRATE + '.3.2.1.14', 'float', 'channel'),
+    'outputSupervisionBehavior':        (WIENER_CRATE + '.3.2.1.15', 'int', 'channel'),
+    'outputConfigMaxSenseVoltage':      (WIENER_CRATE + '.3.2.1.21', 'float', 'channel'),
+    'outputConfigMaxTerminalVoltage':   (WIENER_CRATE + '.3.2.1.22', 'float', 'channel'),
+    'outputConfigMaxCurrent':           (WIENER_CRATE + '.3.2.1.23', 'float', 'channel'),
+    'outputCurrentRiseRate':            (WIENER_CRATE + '.3.2.1.25', 'float', 'channel'),
+    'outputCurrentFallRate':            (WIENER_CRATE + '.3.2.1.26', 'float', 'channel'),
+    'outputTripTimeMaxCurrent':         (WIENER_CRATE + '.3.2.1.27', 'int', 'channel'),
+    'groupsSwitch':                     (WIENER_CRATE + '.3.4.1.9', 'int', 'group'),
+    'moduleDescription':                (WIENER_CRATE + '.3.6.1.2', 'string', 'module'),
+    'moduleRampSpeedVoltage':           (WIENER_CRATE + '.3.6.1.7', 'float', 'module'),
+    'moduleRampSpeedCurrent':           (WIENER_CRATE + '.3.6.1.8', 'float', 'module'),
+    'moduleStatus':                     (WIENER_CRATE + '.3.6.1.9', 'bits', 'module'),
+    'moduleEventStatus':                (WIENER_CRATE + '.3.6.1.10', 'bits', 'module'),
+    'moduleEventChannelStatus':         (WIENER_CRATE + '.3.6.1.11', 'bits', 'module'),
+    'moduleDoClear':                    (WIENER_CRATE + '.3.6.1.12', 'int', 'module'),
+}
+OID_NAMES = {tuple(int(x) for x in oid.split('.')): name for name, (oid, value_type, index_type) in MIB_OBJECTS.items()}
+VALUE_SIZES = {'float': 9, 'int': 6, 'bits': 8, 'string': 64}#worst case encoded value size, used to pack replies into PDUs
+
+#BER tags (SNMPv2c, RFC 3416)
+INTEGER, OCTET_STRING, NULL, OBJECT_ID, SEQUENCE = 0x02, 0x04, 0x05, 0x06, 0x30
+IP_ADDRESS, COUNTER32, GAUGE32, TIMETICKS, OPAQUE, COUNTER64 = 0x40, 0x41, 0x42, 0x43, 0x44, 0x46
+GET, GETNEXT, RESPONSE, SET, GETBULK = 0xa0, 0xa1, 0xa2, 0xa3, 0xa5
+ERROR_STATUS = ['noError', 'tooBig', 'noSuchName', 'badValue', 'readOnly', 'genErr', 'noAccess', 'wrongType',
+                'wrongLength', 'wrongEncoding', 'wrongValue', 'noCreation', 'inconsistentValue', 'resourceUnavailable',
+                'commitFailed', 'undoFailed', 'authorizationError', 'notWritable', 'inconsistentName']
+
+class NoSuchValue:
+    '''v2c varbind exceptions (noSuchObject, noSuchInstance, endOfMibView), returned in place of a value'''
+    def __init__(self, name):
+        self.name = name
+    def __repr__(self):
+        return self.name
+    def __bool__(self):
+        return False
+NO_SUCH_VALUES = {0x80: NoSuchValue('noSuchObject'), 0x81: NoSuchValue('noSuchInstance'), 0x82: NoSuchValue('endOfMibView')}
+
+VarBind = collections.namedtuple('VarBind', ['name', 'index', 'value', 'oid'])
+# name: MIB object name (outputVoltage), index: MIB index label (u101, ma0, 0), value: python value, oid: tuple of ints
+
+class SNMPError(Exception):
+    '''Agent returned a non-zero error-status'''
+    def __init__(self, status, index, varbinds = ()):
+        self.status = status
+        self.index = index #1-based position of the failed varbind (0 if not varbind specific)
+        self.varbinds = varbinds
+        name = ERROR_STATUS[status] if status < len(ERROR_STATUS) else str(status)
+        failed = f' ({varbinds[index-1].name}.{varbinds[index-1].index})' if 0 < index <= len(varbinds) else ''
+        super().__init__(f'SNMP error {name}{failed}')
+
+###### BER ENCODE/DECODE ######
+def EncodeLength(length):
+    if length < 0x80:
+        return bytes([length])
+    out = length.to_bytes((length.bit_length() + 7) // 8, 'big')
+    return bytes([0x80 | len(out)]) + out
+
+def EncodeTLV(tag, content):
+    return bytes([tag]) + EncodeLength(len(content)) + content
+
+def EncodeInteger(value, tag = INTEGER):
+    n_bytes = max(1, (value + (value < 0)).bit_length() // 8 + 1)#two's complement, minimal length
+    return EncodeTLV(tag, value.to_bytes(n_bytes, 'big', signed = True))
+
+def EncodeUnsigned(value, tag = GAUGE32):
+    n_bytes = value.bit_length() // 8 + 1
+    return EncodeTLV(tag, value.to_bytes(n_bytes, 'big'))
+
+def EncodeOID(oid):
+    out = bytearray([40*oid[0] + oid[1]])
+    for arc in oid[2:]:
+        chunk = [arc & 0x7f]
+        arc >>= 7
+        while arc:
+            chunk.append(0x80 | (arc & 0x7f))
+            arc >>= 7
+        out.extend(reversed(chunk))
+    return EncodeTLV(OBJECT_ID, bytes(out))
+
+def EncodeValue(value_type, value):
+    '''value_type uses snmpset letters: i (integer), u (unsigned), F (Opaque float), D (Opaque double), s (string), x (hex string)'''
+    if value_type is None:
+        return EncodeTLV(NULL, b'')
+    if value_type == 'i':
+        return EncodeInteger(int(value))
+    if value_type == 'u':
+        return EncodeUnsigned(int(value))
+    if value_type == 'F':#WIENER floats are wrapped in Opaque: 9f 78 04 <IEEE754 float32>
+        return EncodeTLV(OPAQUE, b'\x9f\x78\x04' + struct.pack('>f', float(value)))
+    if value_type == 'D':
+        return EncodeTLV(OPAQUE, b'\x9f\x79\x08' + struct.pack('>d', float(value)))
+    if value_type == 's':
+        return EncodeTLV(OCTET_STRING, str(value).encode())
+    if value_type == 'x':
+        return EncodeTLV(OCTET_STRING, bytes.fromhex(str(value)))
+    raise ValueError(f'SNMP value type {value_type} not supported')
+
+def EncodeMessage(community, pdu_tag, request_id, varbinds, error_status = 0, error_index = 0):
+    '''varbinds: list of (oid, value_type, value). For GETBULK error_status/error_index are non-repeaters/max-repetitions'''
+    vbs = b''.join(EncodeTLV(SEQUENCE, EncodeOID(oid) + EncodeValue(value_type, value)) for oid, value_type, value in varbinds)
+    pdu = EncodeInteger(request_id) + EncodeInteger(error_status) + EncodeInteger(error_index) + EncodeTLV(SEQUENCE, vbs)
+    return EncodeTLV(SEQUENCE, EncodeInteger(1) + EncodeTLV(OCTET_STRING, community.encode()) + EncodeTLV(pdu_tag, pdu))
+
+def DecodeTLV(data, pos):
+    '''Returns tag, start of content, end of content'''
+    tag = data[pos]
+    length = data[pos + 1]
+    pos = pos + 2
+    if length & 0x80:
+        n = length & 0x7f
+        length = int.from_bytes(data[pos:pos + n], 'big')
+        pos = pos + n
+    return tag, pos, pos + length
+
+def DecodeOID(content):
+    oid = [content[0] // 40, content[0] % 40] if content[0] < 80 else [2, content[0] - 80]
+    arc = 0
+    for b in content[1:]:
+        arc = (arc << 7) | (b & 0x7f)
+        if not b & 0x80:
+            oid.append(arc)
+            arc = 0
+    return tuple(oid)
+
+def DecodeOpaque(content):
+    if len(content) > 3 and content[0] == 0x9f:
+        if content[1] == 0x78:#float
+            return struct.unpack('>f', content[3:7])[0]
+        if content[1] == 0x79:#double
+            return struct.unpack('>d', content[3:11])[0]
+    return bytes(content)
+
+def DecodeValue(tag, content):
+    if tag == INTEGER:
+        return int.from_bytes(content, 'big', signed = True)
+    if tag == OPAQUE:
+        return DecodeOpaque(content)
+    if tag == OCTET_STRING:
+        return bytes(content)
+    if tag in (COUNTER32, GAUGE32, TIMETICKS, COUNTER64):
+        return int.from_bytes(content, 'big')
+    if tag == OBJECT_ID:
+        return DecodeOID(content)
+    if tag == IP_ADDRESS:
+        return '.'.join(str(b) for b in content)
+    if tag == NULL:
+        return None
+    if tag in NO_SUCH_VALUES:
+        return NO_SUCH_VALUES[tag]
+    return bytes(content)
+
+def DecodeMessage(data):
+    '''Returns request_id, error_status, error_index, [(oid, value)]'''
+    tag, pos, end = DecodeTLV(data, 0)#message
+    tag, pos, nxt = DecodeTLV(data, pos)#version
+    tag, pos, nxt = DecodeTLV(data, nxt)#community
+    pdu_tag, pos, end = DecodeTLV(data, nxt)
+    fields = []
+    for n in range(3):
+        tag, pos, nxt = DecodeTLV(data, pos)
+        fields.append(int.from_bytes(data[pos:nxt], 'big', signed = True))
+        pos = nxt
+    tag, pos, end = DecodeTLV(data, pos)#varbind list
+    varbinds = []
+    while pos < end:
+        tag, vb_pos, vb_end = DecodeTLV(data, pos)
+        tag, oid_pos, oid_end = DecodeTLV(data, vb_pos)
+        value_tag, value_pos, value_end = DecodeTLV(data, oid_end)
+        varbinds.append((DecodeOID(data[oid_pos:oid_end]), DecodeValue(value_tag, data[value_pos:value_end])))
+        pos = vb_end
+    return fields[0], fields[1], fields[2], varbinds
+
+###### NAME RESOLUTION ######
+def ResolveOID(name):
+    '''outputVoltage.u101 -> (1,3,6,...,10,102), outputVoltage -> column oid, numeric oids passed through'''
+    name = name.split('::')[-1].lstrip('.')
+    if name[0].isdigit():
+        return tuple(int(x) for x in name.split('.'))
+    obj, _, index = name.partition('.')
+    oid, value_type, index_type = MIB_OBJECTS[obj]
+    oid = tuple(int(x) for x in oid.split('.'))
+    if index == '':
+        return oid
+    if index_type == 'channel':
+        return oid + (int(index.lstrip('u')) + 1,)#outputIndex enumeration: u0(1), u1(2)...
+    if index_type == 'module':
+        return oid + (int(index.lstrip('ma')) + 1,)#moduleIndex enumeration: ma0(1), ma1(2)...
+    return oid + (int(index),)
+
+def NameOID(oid):
+    '''Inverse of ResolveOID: returns (name, index label)'''
+    name = OID_NAMES.get(oid[:-1])
+    if name is None:
+        return '.'.join(str(x) for x in oid), ''
+    index_type = MIB_OBJECTS[name][2]
+    if index_type == 'channel':
+        return name, f'u{oid[-1] - 1}'
+    if index_type == 'module':
+        return name, f'ma{oid[-1] - 1}'
+    return name, str(oid[-1])
+
+def MakeVarBind(oid, value):
+    name, index = NameOID(oid)
+    if name in MIB_OBJECTS and MIB_OBJECTS[name][1] == 'string' and isinstance(value, bytes):
+        value = value.decode(errors = 'replace')
+    return VarBind(name, index, value, oid)
+
+def ParseCommand(cmd_type, cmd):
+    '''Split an MPOD.Send command string into (oid, value_type, value) tuples
+    get/walk: "outputVoltage.u101 outputVoltage.u102" set: "outputVoltage.u101 F 500 outputSwitch.u101 i 1"
+    '''
+    tokens = cmd.split()
+    if cmd_type == 'set':
+        return [(ResolveOID(tokens[i]), tokens[i + 1], tokens[i + 2]) for i in range(0, len(tokens) - 2, 3)]
+    return [(ResolveOID(t), None, None) for t in tokens]
+
+###### SNMP TOOL OUTPUT ######
+#One precompiled pattern per value type, matched over the whole reply in one pass (no lowercasing, splitting or fixed offsets)
+#Each match is (name, index, value text, unit), e.g.
+#   WIENER-CRATE-MIB::outputVoltage.u101 = Opaque: Float: 500.000000000000 V -> ('outputVoltage', 'u101', '500.000000000000', 'V')
+#   WIENER-CRATE-MIB::outputSwitch.u101 = INTEGER: on(1) -> ('outputSwitch', 'u101', '1', '')
+#   WIENER-CRATE-MIB::outputStatus.u101 = BITS: 04 00 40 outputFailureMaxCurrent(5) ... -> ('outputStatus', 'u101', '04 00 40', '')
+TEXT_LINE = r'::(\w+)\.(\S+) = '#MIB prefix (WIENER-CRATE-MIB::) is always printed with -m +WIENER-CRATE-MIB
+TEXT_VALUES = {
+    'float':  r'(?:Opaque: )?Float: (\S+) ?(\w*)',
+    'int':    r'INTEGER: (?:\w*\()?(-?\d+)\)? ?(\w*)',
+    'bits':   r'BITS: ([0-9A-Fa-f]{2}(?: [0-9A-Fa-f]{2})*)()',
+    'string': r'STRING: "?([^"\r\n]*)"?()',
+}
+TEXT_TOKENS = {value_type: re.compile(TEXT_LINE + pattern) for value_type, pattern in TEXT_VALUES.items()}
+TEXT_NO_SUCH = re.compile(TEXT_LINE + r'(No Such Object|No Such Instance|No more variables)')
+TEXT_NO_SUCH_VALUES = {'No Such Object': NO_SUCH_VALUES[0x80], 'No Such Instance': NO_SUCH_VALUES[0x81],
+                       'No more variables': NO_SUCH_VALUES[0x82]}
+TEXT_CONVERT = {'float': float, 'int': int, 'bits': bytes.fromhex, 'string': str}
+
+def TokenizeText(text, value_type):
+    '''All (name, index, value text, unit) of one value type in snmp tool output, in reply order'''
+    return TEXT_TOKENS[value_type].findall(text)
+
+def ParseText(text, value_type):
+    '''snmp tool output -> typed VarBinds (oid None), same values as the native transport returns
+    Lines of another value type are skipped, "No Such ..." lines give NoSuchValue VarBinds at the end'''
+    convert = TEXT_CONVERT[value_type]
+    result = [VarBind(name, index, convert(value), None) for name, index, value, unit in TEXT_TOKENS[value_type].findall(text)]
+    if 'No ' in text:
+        result.extend(VarBind(name, index, TEXT_NO_SUCH_VALUES[kind], None) for name, index, kind in TEXT_NO_SUCH.findall(text))
+    return result
+
+def ChannelIndex(index):
+    '''MIB index label -> number: u101 -> 101, ma3 -> 3, 0 -> 0'''
+    return int(index.lstrip('ma').lstrip('u'))
+
+###### TRANSPORTS ######
+class NativeTransport:
+    '''In-process SNMPv2c client. One UDP socket per crate, replies matched on request-id'''
+    name = 'native'
+
+    def __init__(self, IP, port = 161, read_community = 'public', write_community = 'guru', timeout = 1.0, retries = 0, max_message_size = 1400, max_repetitions = 0):
+        self.IP = IP
+        self.max_message_size = max_message_size #agent's max reply size [bytes], default stays under one ethernet frame
+        self.max_repetitions = max_repetitions #GETBULK rows per request, 0: as many as fit in max_message_size
+        self.port = port
+        self.read_community = read_community
+        self.write_community = write_community
+        self.timeout = timeout
+        self.retries = retries
+        self.last_cmd = ''
+        self.request_id = random.randrange(1, 2**30)
+        self.sock = None
+
+    def Open(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect((self.IP, self.port))
+
+    def Close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def Request(self, pdu_tag, varbinds, community = None, error_status = 0, error_index = 0):
+        '''Send one PDU and wait for the matching response. Returns list of VarBind'''
+        if self.sock is None:
+            self.Open()
+        if community is None:
+            community = self.write_community if pdu_tag == SET else self.read_community
+        self.request_id = (self.request_id + 1) % 2**31
+        packet = EncodeMessage(community, pdu_tag, self.request_id, varbinds, error_status, error_index)
+        for attempt in range(self.retries + 1):
+            self.sock.send(packet)
+            try:
+                while True:#discard late replies to earlier (timed out) requests
+                    request_id, status, index, reply = DecodeMessage(self.sock.recv(65535))
+                    if request_id == self.request_id:
+                        break
+            except socket.timeout:
+                if attempt == self.retries:
+                    raise
+                continue
+            reply = [MakeVarBind(oid, value) for oid, value in reply]
+            if status:
+                raise SNMPError(status, index, reply)
+            return reply
+
+    def Pack(self, varbinds, community):
+        '''Split varbinds into chunks whose (estimated) reply fits in max_message_size'''
+        chunks, chunk = [], []
+        size = 40 + len(community)#message, pdu & varbind list headers
+        for vb in varbinds:
+            name = OID_NAMES.get(vb[0][:-1])
+            vb_size = len(EncodeOID(vb[0])) + 4 + VALUE_SIZES[MIB_OBJECTS[name][1]] if name else 128
+            if chunk and size + vb_size > self.max_message_size:
+                chunks.append(chunk)
+                chunk, size = [], 40 + len(community)
+            chunk.append(vb)
+            size = size + vb_size
+        if chunk:
+            chunks.append(chunk)
+        return chunks
+
+    def RequestMany(self, pdu_tag, varbinds):
+        '''Request split into as few PDUs as the agent's message size allows. tooBig replies are split in half and resent'''
+        community = self.write_community if pdu_tag == SET else self.read_community
+        result = []
+        for chunk in self.Pack(varbinds, community):
+            try:
+                result.extend(self.Request(pdu_tag, chunk))
+            except SNMPError as err:
+                if err.status != 1 or len(chunk) == 1:#tooBig
+                    raise
+                self.max_message_size = self.max_message_size * 3 // 4#agent limit is lower than configured, remember it
+                result.extend(self.RequestMany(pdu_tag, chunk))
+        return result
+
+    def Get(self, oids):
+        return self.RequestMany(GET, [(oid, None, None) for oid in oids])
+
+    def Set(self, varbinds):
+        return self.Request(SET, varbinds)
+
+    def SetChunk(self, varbinds):
+        '''One SET PDU with per-varbind results. The agent applies a PDU all or nothing,
+        so the varbind named by error-index is dropped and the rest is resent'''
+        results = [None]*len(varbinds)
+        pending = list(range(len(varbinds)))
+        while pending:
+            try:
+                reply = self.Request(SET, [varbinds[i] for i in pending])
+            except SNMPError as err:
+                name = ERROR_STATUS[err.status] if err.status < len(ERROR_STATUS) else str(err.status)
+                if err.status == 1 and len(pending) > 1:#tooBig
+                    self.max_message_size = self.max_message_size * 3 // 4
+                    half = len(pending) // 2
+                    for part in (pending[:half], pending[half:]):
+                        for i, result in zip(part, self.SetChunk([varbinds[i] for i in part])):
+                            results[i] = result
+                    return results
+                if 0 < err.index <= len(pending):
+                    results[pending.pop(err.index - 1)] = (None, name)
+                    continue
+                for i in pending:#not varbind specific, whole PDU failed
+                    results[i] = (None, name)
+                return results
+            for i, vb in zip(pending, reply):
+                results[i] = ([vb], None)
+            pending = []
+        return results
+
+    def SetMany(self, cmds):
+        '''cmds: list of set command strings ("outputSwitch.u101 i 1")
+        Returns one (reply, error name or None) per command, in order'''
+        varbinds = [ParseCommand('set', cmd)[0] for cmd in cmds]
+        self.last_cmd = 'set ' + ' '.join(cmds)
+        results = []
+        for chunk in self.Pack(varbinds, self.write_community):
+            results.extend(self.SetChunk(chunk))
+        return results
+
+    def GetMany(self, cmds):
+        '''cmds: list of get command strings ("outputVoltage.u101")
+        Returns one (reply, error name or None) per command, in order'''
+        self.last_cmd = 'get ' + ' '.join(cmds)
+        reply = self.RequestMany(GET, [ParseCommand('get', cmd)[0] for cmd in cmds])
+        return [([vb], vb.value.name) if isinstance(vb.value, NoSuchValue) else ([vb], None) for vb in reply]
+
+    def BulkWalk(self, roots, max_repetitions = None):
+        '''Walk several columns (subtrees) in parallel with GETBULK, one varbind per column per row
+        Returns {root: [VarBind]} '''
+        if max_repetitions is None:
+            max_repetitions = self.max_repetitions
+        result = {root: [] for root in roots}
+        last = {root: root for root in roots}#last oid read in each column
+        active = list(roots)
+        while active:
+            reps = max_repetitions or max(1, (self.max_message_size - 40 - len(self.read_community)) // (32*len(active)))
+            try:
+                reply = self.Request(GETBULK, [(last[root], None, None) for root in active], error_status = 0, error_index = reps)
+            except SNMPError as err:
+                if err.status != 1 or reps == 1:#tooBig: ask for fewer rows
+                    raise
+                self.max_message_size = self.max_message_size * 3 // 4
+                continue
+            done = set()
+            for i, vb in enumerate(reply):#reply is row-major: row 0 of every column, then row 1...
+                root = active[i % len(active)]
+                if root in done:
+                    continue
+                if vb.oid[:len(root)] != root or vb.oid <= last[root] or isinstance(vb.value, NoSuchValue):
+                    done.add(root)
+                    continue
+                result[root].append(vb)
+                last[root] = vb.oid
+            if not reply:
+                done.update(active)
+            active = [root for root in active if root not in done]
+        return result
+
+    def Walk(self, names, max_repetitions = None):
+        '''Walk MIB columns by name (multi-column GETBULK). Returns {name: [VarBind]}'''
+        roots = [ResolveOID(name) for name in names]
+        result = self.BulkWalk(roots, max_repetitions)
+        return {name: result[root] for name, root in zip(names, roots)}
+
+    def Send(self, cmd_type = 'walk', cmd = ''):
+        '''Same command strings as CLITransport. Returns list of VarBind'''
+        self.last_cmd = f'{cmd_type} {cmd}'
+        if cmd_type == 'walk':
+            if cmd == '':#no object given, walk crate system group
+                cmd = WIENER_CRATE + '.1'
+            return [vb for column in self.Walk(cmd.split()).values() for vb in column]
+        elif cmd_type == 'get':
+            return self.RequestMany(GET, ParseCommand(cmd_type, cmd))
+        elif cmd_type == 'set':
+            return self.Request(SET, ParseCommand(cmd_type, cmd))
+        raise ValueError(cmd_type + ' is invalid command type')
+
+class CLITransport:
+    r'''net-snmp command line tools, one process per command (walks use snmpbulkwalk)
+    REQUIREMENT:  WIENER-CRATE-MIB.txt must be located in /usr/share/snmp/mibs (Windows: C:\usr\share\snmp\mibs)
+    '''
+    name = 'cli'
+
+    def __init__(self, IP, port = 161, read_community = 'public', write_community = 'guru', max_oids = 64, max_repetitions = 0):
+        self.IP = IP if port == 161 else f'{IP}:{port}'
+        self.max_repetitions = max_repetitions #snmpbulkwalk -Cr option, 0: net-snmp default
+        self.max_oids = max_oids #OIDs per snmpget process (keeps command line short enough for windows)
+        self.read_community = read_community
+        self.write_community = write_community
+        self.os = platform.system()#windows or linux
+        self.precision = '-Op .12 '#high precision creating problems on windows. older SNMP protocols do not support this option
+        self.last_cmd = ''
+        ##example command : "snmpget -v 2c -Op .12 -m +WIENER-CRATE-MIB -c guru 169.254.107.70 outputPower.u0"
+
+    def Close(self):
+        pass
+
+    def Walk(self, names, max_repetitions = None):
+        '''One snmpbulkwalk per column. Returns {name: reply text}'''
+        if max_repetitions is not None:
+            default, self.max_repetitions = self.max_repetitions, max_repetitions
+        result = {name: self.Send('walk', name) for name in names}
+        if max_repetitions is not None:
+            self.max_repetitions = default
+        return result
+
+    def SetMany(self, cmds):
+        '''One snmpset per max_oids commands. Returns one (reply line, error or None) per command, in order
+        A rejected varbind is reported by snmpset as "Failed object", it is dropped and the rest resent'''
+        results = [None]*len(cmds)
+        for start in range(0, len(cmds), self.max_oids):
+            pending = list(range(start, min(start + self.max_oids, len(cmds))))
+            while pending:
+                reply = self.Send('set', ' '.join(cmds[i] for i in pending))
+                if 'Failed object: ' not in reply:
+                    lines = [line for line in reply.splitlines() if line.strip()]
+                    if len(lines) != len(pending):
+                        for i in pending:
+                            results[i] = (None, reply.strip() or 'no reply')
+                    else:
+                        for i, line in zip(pending, lines):
+                            results[i] = (line, None)
+                    break
+                failed = reply.split('Failed object: ')[1].split()[0].split('::')[-1]
+                reason = reply.split('Reason: ')[1].splitlines()[0] if 'Reason: ' in reply else 'error'
+                bad = [i for i in pending if cmds[i].split()[0] == failed]
+                if not bad:
+                    for i in pending:
+                        results[i] = (None, reason)
+                    break
+                results[bad[0]] = (None, reason)
+                pending.remove(bad[0])
+        return results
+
+    def GetMany(self, cmds):
+        '''Returns one (reply line, error or None) per command, in order'''
+        lines = [line for line in self.Send('get', ' '.join(cmds)).splitlines() if line.strip()]
+        if len(lines) != len(cmds):
+            return [(None, 'unexpected reply length')]*len(cmds)
+        return [(line, 'No Such Instance') if 'No Such' in line else (line, None) for line in lines]
+
+    def Send(self, cmd_type = 'walk', cmd = ''):
+        '''Returns reply text'''
+        oids = cmd.split()
+        if cmd_type == 'get' and len(oids) > self.max_oids:#one line per OID, in request order
+            return '\n'.join(self.Send('get', ' '.join(oids[i:i + self.max_oids])) for i in range(0, len(oids), self.max_oids))
+        if cmd_type == 'walk' and len(oids) > 1:#snmpbulkwalk takes one root
+            return '\n'.join(self.Send('walk', oid) for oid in oids)
+        if cmd_type == 'walk':#check connection
+            bulk = f'-Cr{self.max_repetitions} ' if self.max_repetitions else ''
+            if cmd == '': #use lower precision
+                cmd = f"snmpbulkwalk -v 2c {bulk}-m +WIENER-CRATE-MIB -c {self.read_community} {self.IP} " + cmd
+            else: # require higher precision (if available)
+                cmd = f"snmpbulkwalk -v 2c {bulk}{self.precision}-m +WIENER-CRATE-MIB -c {self.read_community} {self.IP} " + cmd
+        elif cmd_type == 'set':
+            cmd = f"snmpset -v 2c {self.precision}-m +WIENER-CRATE-MIB -c {self.write_community} {self.IP} " + cmd
+        elif cmd_type == 'get':
+            cmd = f"snmpget -v 2c {self.precision}-m +WIENER-CRATE-MIB -c {self.write_community} {self.IP} " + cmd
+        else:
+            raise ValueError(cmd_type + ' is invalid command type')
+        self.last_cmd = cmd
+        if self.os == 'Windows':
+            result = subprocess.run(cmd.split(), capture_output = True, shell = True)
+            result = result.stdout
+        else:
+            result = px.run(cmd)
+        return result.decode().rstrip('\n').rstrip('\r')
+
+def CreateTransport(kind, IP, port = 161, max_repetitions = 0):
+    '''kind: 'native' (default) or 'cli' '''
+    if kind == 'native':
+        return NativeTransport(IP, port, max_repetitions = max_repetitions)
+    elif kind == 'cli':
+        return CLITransport(IP, port, max_repetitions = max_repetitions)
+    raise ValueError(f'Transport {kind} not supported, use native or cli')
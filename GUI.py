@@ -1,12 +1,17 @@
 import dearpygui.dearpygui as dpg
 import numpy as np
-import pandas as pd
 import time
 import pathlib
 from screeninfo import get_monitors
 from Driver.MPODClass import MPOD
 from Driver.MPODCustomFunctions import CustomFx
 import GUIExtras.Widgets as widget
+from GUIExtras.Acquisition import Acquisition
+from GUIExtras.DataBuffer import HistoryStore
+from GUIExtras.Decimate import MinMaxPyramid
+from GUIExtras.Recorder import RunRecorder
+from GUIExtras.RunFile import RunFileWriter
+from GUIExtras.Profiler import FrameProfiler
 #TODO: enable sendign commands to HV
 # add ch on off switch
 # add enable.disable module control 
@@ -25,7 +30,7 @@ class GUI:
     def __init__(self, IP = '169.254.107.70', take_real_data = True, active_modules = [0],channel_names = ['Drift','GEM Top+','GEM Top-','GEM Mid+','GEM Mid-','GEM Low+','GEM Low-','None']):
         #TODO: add check if instrument is connected
         #TODO: add mib file to this repo and point to self
-        self.warnings = ['This GUI is a work in progress. Startup delay is 5-60 seconds before plotting rate stabilizes. Saving & File Path panel has been debugged - working!. Autosaving recommended.']  # List of startup warnings to display on front
+        self.warnings = ['This GUI is a work in progress. Saving & File Path panel has been debugged - working!. Autosaving recommended.']  # List of startup warnings to display on front
         self.IP = IP
         self.take_real_data = take_real_data  # True: Instrument data, False: synthesized data
         self.active_modules = active_modules#disable control and data for all but these modules
@@ -38,16 +43,18 @@ class GUI:
         # Initialize  vars for later use
         self.max_data_size = 5000
         self.savefile_path = str(pathlib.Path(__file__).parent.resolve()/"Results") # Default/current file path
-        self.data_series, self.time_series = np.array([]), np.array([]) # Windowed data for plotting
-        self.save_data = np.array([])  # Full data to be saved
         self.loop_plot = True # (De)activate plot
         self.en = []  # Enable plot mask
         self.data_size, self.sample_rate = 0, 0 # Displayed on GUI
-        self.autosave_counter = 1 # Autosave counter (bins of 100)
-        self.autosave = 0 # Does autosave file exist?
-        self.n_autosave = 100 # How often to auto save data
+        self.n_autosave = 100 # Rows between autosave file syncs (fsync)
+        self.recorder = None # Open autosave file (RunRecorder) while Autosave is checked
+        self.profiler = FrameProfiler(folder = self.savefile_path) # Frame time panel (Debug tab), captures go to Results
+        self.profiler_stats = False # True if the profiler switched on MPOD request statistics (off again with the panel)
+        self.profiler_shown = 0 # Last panel refresh
         self.n_outputs = self.FX.n_channels * 2
         self.scale_factor = np.ones(self.n_outputs)  # default scale factor of 1, optional
+        self.history = HistoryStore(self.n_outputs + 1) # Full data to be saved, spills to disk in chunks
+        self.pyramid = MinMaxPyramid(self.n_outputs + 1, self.max_data_size, history = self.history) # Plot data: t, V, I, V, I... newest max_data_size rows raw, older as min/max (raw from history when zoomed in)
         self.screensize = [1600, 400] #track viewportsize for resize management
         self.winscale = [8/10,5/7]#global scaling for windows, width & height
         self.initialized = 0 #flag for window initialization
@@ -67,6 +74,7 @@ class GUI:
         t = time.localtime()
         self.datestr = f"{t.tm_mon}_{t.tm_mday}_{t.tm_year}_{t.tm_hour}-{t.tm_min}-{t.tm_sec}"
 
+        self.acquisition = Acquisition(self.read_frame, self.sample_rate, timed = True)#crate polling thread, started in start_app
         self.run = 1
     def date_string(self):
         t = time.localtime()
@@ -76,7 +84,7 @@ class GUI:
     def start_plot(self):
         if not self.loop_plot:  # Only runs if plot is not already started
             self.loop_plot = True
-            if len(self.save_data) == 0 and dpg.get_value('saveFilename') == self.datestr:
+            if len(self.history) == 0 and dpg.get_value('saveFilename') == self.datestr:
                 self.date_string()  # Updates datestr in file window
 
             # Add line to graph at current time
@@ -112,27 +120,23 @@ class GUI:
         if val is None:
             flag = 1
             val = self.datestr
-        full_file_path = pathlib.Path(self.savefile_path + "/" + val + '.csv')
-        #scale_out = pd.DataFrame(self.scale_factor)
-        #scale_out.to_csv(pathlib.Path(self.savefile_path + "/" + val + '_scale.csv'), header=False, index=False)
-        #desc = f'\nScale factors saved to {self.savefile_path + "/" + val}_scale.csv'
-        # Reformat column names, then save data using pandas (pd)
-        savecolumn_names = []
-        for i in range(len(self.column_names)):
-            if i == 0:
-                savecolumn_names.append(self.column_names[i] + '[s]')
-            else:
-                savecolumn_names.append(self.column_names[i] + self.units_name[np.mod(i, len(self.units_name))])
-
-        if len(self.save_data) > 0:  # Checks that data is not empty
-            dataframe_out = pd.DataFrame(self.save_data, columns = savecolumn_names)
-            # Writes file if file does not exist or overwrite is allowed
-            if (not pathlib.Path.is_file(full_file_path)) or dpg.get_value('enable_overwrite'):
-                dataframe_out.to_csv(full_file_path, index=False)  # Writes data to CSV file
+        full_file_path = pathlib.Path(self.savefile_path + "/" + val + (dpg.get_value('saveFormat') or '.csv'))
+        savecolumn_names = self.save_column_names()
+        if len(self.history) > 0:  # Checks that data is not empty
+            if self.recorder is not None and pathlib.Path(self.recorder.path) == full_file_path:
+                self.recorder.sync()  # Autosave is already streaming to this file
                 desc = ''
                 if not flag:
                     dpg.set_value('messages', 'Data saved to: ' + str(full_file_path) + desc)
                     dpg.bind_item_theme('messages', 'text_theme')
+            # Writes file if file does not exist or overwrite is allowed
+            elif (not pathlib.Path.is_file(full_file_path)) or dpg.get_value('enable_overwrite'):
+                with self.open_run_file(full_file_path, self.history.chunk_rows, overwrite = True) as rec:
+                    self.write_history(rec)  # Chunk by chunk, the full history is never loaded at once
+                desc = f'\nScale factors saved to {self.savefile_path + "/" + val}_scale.csv' if full_file_path.suffix == '.csv' else ''
+                if not flag:
+                    dpg.set_value('messages', 'Data saved to: ' + str(full_file_path) + desc)
+                    dpg.bind_item_theme('messages', 'text_theme')
             else:
                 if not flag:
                     dpg.set_value('messages', 'Warning: \nAllow Overwrite or rename file. File already exists.')
@@ -143,9 +147,51 @@ class GUI:
                 dpg.set_value('messages', 'Warning: \nData is empty')
                 dpg.bind_item_theme('messages', 'warning_text_theme')
 
+    def save_column_names(self):
+        # Column names with units: t[s], V101[V], I101[mA]...
+        savecolumn_names = []
+        for i in range(len(self.column_names)):
+            if i == 0:
+                savecolumn_names.append(self.column_names[i] + '[s]')
+            else:
+                savecolumn_names.append(self.column_names[i] + self.units_name[np.mod(i, len(self.units_name))])
+        return savecolumn_names
+
+    def open_run_file(self, full_file_path, sync_every, overwrite):
+        # .csv: text, save_plot layout. .mpod: binary with channel names, units & scale factors in the header
+        if full_file_path.suffix == '.mpod':
+            return RunFileWriter(full_file_path, self.save_column_names(), self.scale_factor, sync_every, overwrite,
+                channels = self.FX.my_channels, channel_names = self.FX.channel_names)
+        return RunRecorder(full_file_path, self.save_column_names(), self.scale_factor, sync_every, overwrite)
+
+    def write_history(self, rec):
+        for start in range(0, len(self.history), self.history.chunk_rows):
+            rec.write_rows(self.history.rows(start, start + self.history.chunk_rows))
+
+    def start_recorder(self):
+        # Autosave: open the run file and write the data so far, update_loop then appends every new frame
+        val = dpg.get_value("saveFilename")
+        full_file_path = pathlib.Path(self.savefile_path + "/" + val + dpg.get_value('saveFormat'))
+        try:
+            self.recorder = self.open_run_file(full_file_path, dpg.get_value('NAutosave'), dpg.get_value('enable_overwrite'))
+        except FileExistsError:
+            dpg.set_value('Autosave', False)
+            dpg.enable_item('NAutosave')
+            dpg.set_value('messages', 'Warning: \nAllow Overwrite or rename file. File already exists.')
+            dpg.bind_item_theme('messages', 'warning_text_theme')
+            return
+        self.write_history(self.recorder)
+        dpg.set_value('messages', 'Autosave on, data streamed to: ' + str(full_file_path))
+        dpg.bind_item_theme('messages', 'text_theme')
+
+    def stop_recorder(self):
+        self.recorder.close()
+        dpg.set_value('messages', f'Autosave off, {self.recorder.n_rows} rows saved to: ' + self.recorder.path)
+        dpg.bind_item_theme('messages', 'text_theme')
+        self.recorder = None
+
     def refresh_plot(self):
-        self.data_series = np.array([]) 
-        self.time_series = np.array([]) 
+        self.pyramid.clear()
         self.startTime = time.monotonic()  # Resets t=0 on graph
         for tag in self.tag_set:  # Cleans up lines for start/stop of plot on graph
             dpg.delete_item(tag)
@@ -162,8 +208,9 @@ class GUI:
             print('turned on')
     
     def clear_save_data(self):
-        self.save_data = np.array([])
-        self.autosave_counter = 0
+        self.history.clear()
+        if self.recorder is not None:  # Next autosave starts a new file
+            self.stop_recorder()
         if dpg.get_value('saveFilename') == self.datestr:
             self.date_string()  # Updates datestr in file window
             dpg.set_value('datasize', 0)
@@ -185,9 +232,28 @@ class GUI:
             for i in range(1, len(self.column_names)):
                 dpg.configure_item(self.column_names[i] + 'tag1', show = self.en[i - 1])# Update visibility on Plot 1
 
-        # Always update time axis
-        for ax in self.ax_set:
-            dpg.fit_axis_data("time_axis" + ax)
+        # Update time axis unless the user is zooming/panning (Follow unchecked)
+        if dpg.get_value('follow_plot'):
+            for ax in self.ax_set:
+                dpg.fit_axis_data("time_axis" + ax)
+
+    def update_plot_series(self):
+        # About one point per horizontal pixel of each plot, whatever the history length (see GUIExtras/Decimate.py)
+        # Returns [V min, V max, I min, I max] of the plotted points
+        limits = []
+        for idx, ax in enumerate(self.ax_set):# V on plot 1, I on plot 2
+            n_points = max(dpg.get_item_rect_size(self.plot_set[idx])[0], 100)
+            t_start, t_stop = None, None# Follow: whole history
+            if not dpg.get_value('follow_plot'):
+                t_start, t_stop = dpg.get_axis_limits('time_axis' + ax)# Visible range, full resolution when zoomed in
+            lo, hi = np.inf, -np.inf
+            for i in range(idx, self.n_outputs, 2):
+                x, y = self.pyramid.series(i + 1, t_start, t_stop, n_points)
+                dpg.set_value(self.column_names[i + 1] + 'tag1', [x.tolist(), y.tolist()])
+                if len(y) > 0:
+                    lo, hi = min(lo, np.min(y)), max(hi, np.max(y))
+            limits.extend([lo, hi])
+        return limits
 
     def set_all_checks(self, sender, data, TF):
         for i in range(self.n_outputs):
@@ -223,6 +289,7 @@ class GUI:
 
     def update_sample_rate(self): # Check and set sample rate for future data points
         self.sample_rate = dpg.get_value('sample_rate')
+        self.acquisition.sample_rate = self.sample_rate
         if self.sample_rate > 0:
             s = 1 / self.sample_rate
             if s < 100:  # Display sample rate in seconds, minutes, or hours (depending on magnitude)
@@ -239,10 +306,14 @@ class GUI:
     def create_data_task(self):
         self.MPOD = MPOD(IP = self.IP, mode = not self.take_real_data)
         self.FX = CustomFx(self.MPOD, self.take_real_data, self.active_modules, self.channel_names)
+        self.frame_seq = 0#seq of the last FX.last_frame handed to the plot (a new FX counts from 0 again)
 
     def close(self):  # Cleanup save and close instrument
         #TODO: close on save & Protections!
         #TODO: window doesnt close before displaying savedata question
+        if self.recorder is not None:
+            self.recorder.close()
+        self.history.close()# removes spilled chunk files
         print('program closed')
         # if len(self.save_data) > 0:
         #     out = input('Do you want to save your data? y/n    ')
@@ -277,21 +348,44 @@ class GUI:
             dpg.bind_item_theme('messages', 'warning_text_theme')
         
 
-    def get_plot_data(self):
-        # i_limit, i_rate, i_actual, v_target, v_rate, v_actual, pwr_crate, pwr_ch = self.FX.GetAllValues()
+    def read_frame(self):
+        #Runs in the acquisition thread: crate reads only, no dpg calls. Returns (frame.time, frame): with a broker the
+        #newest frame can be up to one broker poll old, it is plotted at the time it was read
+        #None (Acquisition skips it) if there is no new frame: CustomFx swallows a failed GetAllValues and keeps last_frame
+        if not self.profiler.enabled:
+            self.FX.GetAllValues()
+            return self.new_frame()
+        stats = self.MPOD.command_stats#request time inside the read, see MPOD.stats
+        busy = stats.busy if stats is not None else 0
+        t = time.perf_counter()
         self.FX.GetAllValues()
-        for kind in ['V', 'I']:
-            widget.SetTable(self.FX.my_channels, kind, self.FX)
-        v_actual = self.FX.last_frame[5]#data from MPOD.GetVoltage
-        i_actual = self.FX.last_frame[2]#data from MPOD.GetCurrent
-        data = []
-        for idx in range(len(i_actual)):
-            data.append(v_actual[idx])
-            data.append(i_actual[idx])
+        dt = time.perf_counter() - t
+        snmp = max(stats.busy - busy, 0) if stats is not None else 0
+        self.profiler.record('read_frame', dt)
+        self.profiler.record('SNMP requests', snmp)
+        self.profiler.record('ParseReply + frame', dt - snmp)
+        return self.new_frame()
+
+    def new_frame(self):
+        '''(frame.time, frame) if FX.last_frame is newer than the last one returned, else None'''
+        frame = self.FX.last_frame
+        if frame is None or frame.seq <= self.frame_seq:
+            return None
+        self.frame_seq = frame.seq
+        return frame.time, frame
+
+    def get_plot_data(self, frame = None):
+        # frame: MPODFrame.CrateFrame (FX.last_frame)
+        if frame is None:
+            frame = self.FX.last_frame
+        data = np.empty(2*len(frame.v_actual))
+        data[::2] = frame.v_actual#data from MPOD.GetVoltage
+        data[1::2] = frame.i_actual#data from MPOD.GetCurrent
         return data
 
     def update_loop(self,update_data = True):
-        currentTime = np.array(time.monotonic() - self.startTime)
+        prof = self.profiler
+        t = prof.now()
         if self.loop_plot:
             # DAQ process
             # if self.take_real_data:  # Instrument is connected
@@ -299,86 +393,90 @@ class GUI:
                 self.create_data_task()
             #TODO: Add check if datatask exists. if N, recreate, if Y, acquire data
             if update_data:#keeps buttons live when sample rate is low
-                instrument_data = self.get_plot_data()#takes data, updates table
-                append_data = np.array(instrument_data)
-                append_data = append_data * self.scale_factor 
-                if len(self.data_series) == 0:
-                    self.data_series = np.copy(append_data)
-                else:
-                    self.data_series = np.vstack((self.data_series, append_data))
-                    
-                append_data = np.append(currentTime, append_data)
-                # Time series data
-                self.time_series = np.append(self.time_series, currentTime)
-                # Full data arrays for saving
-                if len(self.save_data) == 0:
-                    self.save_data = np.copy([append_data])
-                else:
-                    self.save_data = np.append(self.save_data, [append_data], axis = 0)
-                    if len(self.time_series) > 1:
-                        for i in range(self.n_outputs):# Plot data for all plots
-                            dpg.set_value(self.column_names[i + 1] + 'tag1', [self.time_series, np.ndarray.tolist(self.data_series[:, i])])
-
-                # Remove last element of plot data if length > max_data_size
-                if len(self.time_series) > self.max_data_size:
-                    self.data_series = np.delete(self.data_series, 0, 0)
-                    self.time_series = np.delete(self.time_series, 0)
-
-                # Updates data size counter
-                self.data_size = len(self.save_data + 1) * (self.FX.n_channels + 1)
-                dpg.set_value('datasize', f'{self.data_size:.2E}')
-                #Refresh plot
-                self.link_plot(0)
-
-                # Auto saving
-                if dpg.get_value("Autosave"):
-                    self.n_autosave = dpg.get_value('NAutosave')
-                    if len(self.save_data) > (self.autosave_counter * self.n_autosave):
-                        if self.autosave == 0:
-                            self.save_plot()
-                            self.autosave = 1
-                            self.autosave_counter = len(self.save_data) // self.n_autosave
-                        else:
-                            # Generate full file path
-                            val = dpg.get_value("saveFilename")
-                            full_file_path = pathlib.Path(self.savefile_path + "/" + val + '.csv')
-                            df = pd.DataFrame(self.save_data[-self.n_autosave - 1:-1, :])  # New data to save
-                            df.to_csv(full_file_path, mode = 'a', index = False, header = False)  # Append new data
-                            self.autosave = self.autosave + 1
-                            dpg.set_value('messages', f'Autosave #{self.autosave}, data saved to: ' + str(full_file_path))
-                            dpg.bind_item_theme('messages', 'text_theme')
-                            self.autosave_counter = self.autosave_counter + 1
+                frames = self.acquisition.drain()#everything acquired since the last render frame
+                if not self.acquisition.running():#no acquisition thread (e.g. before start_app), read here
+                    frame = self.read_frame()
+                    frames = [] if frame is None else [frame]
+                t = prof.lap('drain', t)
+                if len(frames) > 0:
+                    for kind in ['V', 'I']:
+                        widget.SetTable(self.FX.my_channels, kind, self.FX)
+                    widget.UpdateRegistry(self.FX)#debug table and module rate sources, once per render frame
+                t = prof.lap('SetTable + registry', t)
+                # Auto saving: every frame is streamed to the run file while Autosave is checked
+                if dpg.get_value("Autosave") and self.recorder is None:
+                    self.start_recorder()
+                elif not dpg.get_value("Autosave") and self.recorder is not None:
+                    self.stop_recorder()
+                t = prof.lap('autosave', t)
+                for frame_time, frame in frames:
+                    currentTime = frame_time - self.startTime
+                    instrument_data = self.get_plot_data(frame)
+                    append_data = np.array(instrument_data) * self.scale_factor
+                    append_data = np.append(currentTime, append_data)
+                    self.pyramid.append(append_data)
+                    self.history.append(append_data)
+                    t = prof.lap('plot + history buffers', t)
+                    if self.recorder is not None:
+                        self.recorder.write(append_data)
+                        t = prof.lap('autosave', t)
+                if len(frames) > 0:
+                    if len(self.pyramid) > 1:
+                        self.update_plot_series()
+                    t = prof.lap('plot series set_value', t)
+
+                    # Updates data size counter
+                    self.data_size = len(self.history) * (self.FX.n_channels + 1)
+                    dpg.set_value('datasize', f'{self.data_size:.2E}')
+                    #Refresh plot
+                    self.link_plot(0)
+                    t = prof.lap('link_plot', t)
             self.display_warnings()
+            if self.FX.ramp.state != 'idle':#RampTogether progress (stepped in the acquisition thread)
+                dpg.set_value('ramp_status', self.FX.ramp.Summary())
+            t = prof.lap('warnings', t)
+            if prof.enabled and time.monotonic() - self.profiler_shown > 0.5:
+                self.update_profiler_panel()
+                prof.lap('profiler panel', t)
+        else:
+            self.acquisition.drain()#plot stopped, discard so old frames are not plotted on restart
+
+    def toggle_profiler(self, sender = None, app_data = False):
+        # Frame profiler panel: times each update_loop phase, render and acquisition read (see GUIExtras/Profiler.py)
+        self.profiler.reset()
+        self.profiler.enabled = bool(app_data)
+        if app_data and self.MPOD.command_stats is None:#SNMP share of each read comes from the request statistics
+            self.MPOD.EnableStats()
+            self.profiler_stats = True
+        elif not app_data and self.profiler_stats:
+            self.MPOD.EnableStats(False)
+            self.profiler_stats = False
+        dpg.set_value('profiler_check', bool(app_data))
+        dpg.configure_item('profiler_window', show = bool(app_data))
+
+    def update_profiler_panel(self):
+        self.profiler_shown = time.monotonic()
+        s = self.profiler.summary()
+        requested = f'{self.sample_rate:g} Hz' if self.sample_rate > 0 else 'as fast as possible'
+        dpg.set_value('profiler_rates', f"Render: {s['fps']:.1f} frames/s    Acquisition: {s['read_rate']:.2f} Hz (requested: {requested})")
+        dpg.set_value('profiler_capture', self.profiler.capture_status())
+        dpg.delete_item('profiler_table', children_only = True, slot = 1)#rows only, columns stay
+        for key, title, total_name in (('frame', 'Per render frame', 'frame'), ('read', 'Per acquisition read', 'read_frame')):
+            total = s[key].get(total_name, (0,))[0]
+            with dpg.table_row(parent = 'profiler_table'):
+                dpg.add_text(title)
+            for name, (mean, p50, p99) in sorted(s[key].items(), key = lambda item: -item[1][0]):
+                with dpg.table_row(parent = 'profiler_table'):
+                    dpg.add_text('  ' + name)
+                    for value in (mean, p50, p99):
+                        dpg.add_text(f'{value:.2f}')
+                    dpg.add_text(f'{100*mean/total:.0f} %' if total > 0 else '')
 
     def GUI_ramp_together(self):
-        #duplicate of fx from CustomFX, but needs to have GUI loop inside call to prevent program from hanging during ramp wait. 
-        #plots of ramp fx would be nice to validate cmds
-        [deltas, starting, rate, thresh, n_div] = self.FX.RampTogether(pass_to_GUI = True)
-        channels = self.FX.active_channels
-        # thresh, n_div = [],[] #current default: 1, 10
-        #TODO: test different thresholds & n_div settings. Then update MPODCustomFunctions.py
-        #same steps here as in ramptogether. needed to be passed here to prevent plot from hanging
-        max_idx = deltas.index(max(deltas))
-        for n in range(n_div):
-                for idx, ch in enumerate(channels):
-                    subdelta = deltas[idx]/n_div #V interval at each step
-                    self.MPOD.SetTargetVoltage(ch, starting[idx] + subdelta)
-                    self.MPOD.SetVoltageRate(ch, rate)#only needs to be sent once for ISEG HV
-                    #TODO: check this ^^^^
-                time.sleep(0.1)
-                for idx, ch in enumerate(channels):
-                    self.MPOD.SetPower(ch, 1)# Turn on HV
-                    current_V, target_V = 0, thresh*10
-                    self.update_loop()
-                while abs(current_V - target_V) > thresh:
-                    current_V = self.MPOD.GetVoltage(channels[max_idx])
-                    target_V = self.MPOD.GetTargetVoltage(channels[max_idx])
-                    #manual thresholding. probably better way to do this with Geting ramp status
-                    #waits until biggest change is completed
-                    #TODO: TEST UPDATE LOOP!
-                    # time.sleep(0.1)
-                    self.update_loop()
-                    print('Target: ', target_V, '\nActual: ', current_V)
+        # Starts FX.RampTogether without waiting: the acquisition thread's GetAllValues steps the ramp (FX.ramp),
+        # update_loop shows its progress, so the plot keeps running during the ramp
+        self.FX.RampTogether(self.FX.active_channels, pass_to_GUI = True)
+
     ############################INITALIZATION###########################    
     def start_app(self):
         m = get_monitors()
@@ -424,14 +522,13 @@ class GUI:
         ### Testing some value registry items
         with dpg.value_registry():
             for idx, n in enumerate(self.FX.modules):
-                dpg.add_float_value(tag=f'{n}_VRate_Source', default_value=self.FX.last_frame[4][idx])
-                # dpg.add_float_value(tag=f'{idx}_IRate_Source', default_value=self.FX.last_frame[1][idx])
+                dpg.add_float_value(tag=f'{n}_VRate_Source', default_value=self.FX.last_frame.v_rate[idx])
+                # dpg.add_float_value(tag=f'{idx}_IRate_Source', default_value=self.FX.last_frame.i_rate[idx])
             for i, row_label in enumerate(self.FX.my_channels):
-                for n in range(len(self.FX.last_frame)):
-                    try:
-                        dpg.add_float_value(tag = f'{i}_{n}_Source',default_value = self.FX.last_frame[n][i])
-                    except:
-                        pass
+                for field in self.FX.last_frame.FIELDS:
+                    value = self.FX.last_frame.Value(field, i)
+                    if value is not None:
+                        dpg.add_float_value(tag = f'{i}_{field}_Source',default_value = value)
                         
         dpg.add_file_dialog(directory_selector = True, show = False, tag = "file_dialog_id", width = heights[0],height=heights[0] // 2, callback = self.user_selected_filepath)
         ########## CONTROLS WINDOW ###############
@@ -470,6 +567,7 @@ class GUI:
 
             dpg.add_button(label = "Disable (plotting) all", tag = "ClearChecks", callback = self.set_all_checks, user_data = False, width = widths[0])
             dpg.add_button(label = "Enable (plotting) all", tag = "EnableAllChecks", callback = self.set_all_checks, user_data = True, width = widths[0])
+            dpg.add_checkbox(label = 'Follow newest data (uncheck to zoom/pan plots)', tag = 'follow_plot', default_value = True)
             #TODO: disable/enable by module 
             dpg.add_separator()
             dpg.add_text('Data sample rate (approx):')
@@ -541,12 +639,15 @@ class GUI:
             
             # with dpg.group(horizontal = True):
             dpg.add_text('Voltage Ramping Functions:')
-            dpg.add_button(label = "Ramp Together (WORK IN PROGRESS)", callback = self.GUI_ramp_together, user_data = None, width = widths[0])
+            with dpg.group(horizontal = True):
+                dpg.add_button(label = "Ramp Together", callback = self.GUI_ramp_together, user_data = None, width = widths[0]*2//3)
+                dpg.add_button(label = "Abort ramp", callback = lambda: self.FX.ramp.Abort(), width = widths[0]//3)
+            dpg.add_text('', tag = 'ramp_status', wrap = widths[0])
                 # dpg.add_text(f'Ramps all channels at proportional ramp rates via N discrete steps')
             with dpg.group(horizontal = True):
                 dpg.add_button(label = "Ramp Selected to Inputs", callback = lambda: self.FX.RampAll(self.FX.active_channels, self.FX.cmd_values), user_data = None, width = widths[0])
                 
-                # dpg.add_text(f'Ramps all channels at set ramp rates: {self.FX.last_frame[4]} V/s')
+                # dpg.add_text(f'Ramps all channels at set ramp rates: {self.FX.last_frame.v_rate} V/s')
             
             dpg.add_button(label = "Ramp All to Zero", callback = self.FX.RampAll, user_data = None, width = widths[0])
             dpg.add_text(f"Module ramp rates [V/s]:")
@@ -606,18 +707,20 @@ class GUI:
                 dpg.add_text("Basic module specs:", parent = 'Tab3')
                 dpg.add_image("info", parent = 'Tab3')
         with dpg.group(parent = 'DebugTab'):
+            dpg.add_checkbox(label = 'Frame profiler (time per update_loop phase, render and crate read)', tag = 'profiler_check',
+            default_value = False, callback = self.toggle_profiler)
             with dpg.table(header_row = True, resizable=True, policy=dpg.mvTable_SizingFixedFit,row_background = True):
-                columns = ['i_limit', 'i_rate', 'i_actual', 'v_target', 'v_rate', 'v_actual', 'pwr_crate', 'pwr_ch']
+                columns = self.FX.last_frame.FIELDS#i_limit, i_rate, i_actual, v_target, v_rate, v_actual, pwr_crate, pwr_ch
                 w = [widths[1]//len(columns)]*len(columns)
                 for n, column_label in enumerate(columns):
                     dpg.add_table_column(label = column_label, width_fixed= not (column_label == 'Status'), init_width_or_weight = w[n])
                 for i, row_label in enumerate(self.FX.my_channels):
                     with dpg.table_row():
-                        for n in range(len(columns)):
-                            try:
-                                dpg.add_input_float(source = f'{i}_{n}_Source',step = 0,readonly=True)
-                            except:
-                                dpg.add_text('NaN')#set target
+                        for field in columns:
+                            if dpg.does_item_exist(f'{i}_{field}_Source'):
+                                dpg.add_input_float(source = f'{i}_{field}_Source',step = 0,readonly=True)
+                            else:
+                                dpg.add_text('NaN')#rate fields only exist for one row per module
 
         ########## SAVE & FILE PATH WINDOW ###############
         with dpg.window(label = "Saving & File Path", height = heights[1], width = self.screensize[0], pos = (0, heights[0]), tag = 'saver'):
@@ -627,13 +730,14 @@ class GUI:
                 dpg.add_checkbox(label = 'Allow Overwrite', tag = 'enable_overwrite', default_value = False)
                 dpg.add_checkbox(label = 'Autosave', tag = 'Autosave', default_value = False,
                 callback = lambda: dpg.disable_item('NAutosave') if dpg.get_value('Autosave') else dpg.enable_item('NAutosave'))
-                dpg.add_input_int(label = 'N per autosave', tag = 'NAutosave', default_value = self.n_autosave, width = widths[0] // 2)
+                dpg.add_input_int(label = 'N per autosave sync', tag = 'NAutosave', default_value = self.n_autosave, width = widths[0] // 2)
     
             dpg.add_separator()
             dpg.add_text("\nCurrent save file path: " + self.savefile_path, tag = 'dispFilePath', wrap = round(sum(widths[0:3]) * 0.9))  # Updates with selected file path
             with dpg.group(horizontal = True):
                 dpg.add_text("Name of save file (editable):")
-                dpg.add_input_text(label = ".csv    ", tag = "saveFilename", default_value = self.datestr, width = widths[1] // 3)
+                dpg.add_input_text(tag = "saveFilename", default_value = self.datestr, width = widths[1] // 3)
+                dpg.add_combo(['.csv', '.mpod'], tag = 'saveFormat', default_value = '.csv', width = 70)# .mpod: binary, see GUIExtras/RunFile.py
             
             with dpg.group(horizontal = True):
                 dpg.add_button(label = "Select save file path", tag = "PathSelector", callback = lambda: dpg.show_item("file_dialog_id"), width = widths[0])
@@ -654,20 +758,32 @@ class GUI:
                 #dpg.set_exit_callback(self.close)  # Asks if user wants to save data on window close
             dpg.set_viewport_resize_callback(callback = self.resizer)
 
+        ########## FRAME PROFILER WINDOW (Debug tab checkbox) ###############
+        with dpg.window(label = 'Frame profiler', tag = 'profiler_window', show = False, width = widths[0]*2, height = heights[0]//2,
+        pos = (widths[1]//4, heights[0]//4), on_close = lambda: self.toggle_profiler(None, False)):
+            dpg.add_text('', tag = 'profiler_rates')
+            with dpg.table(tag = 'profiler_table', header_row = True, policy = dpg.mvTable_SizingStretchProp, row_background = True):
+                for column_label, weight in (('phase', 3), ('mean [ms]', 1), ('p50 [ms]', 1), ('p99 [ms]', 1), ('share', 1)):
+                    dpg.add_table_column(label = column_label, init_width_or_weight = weight)
+            with dpg.group(horizontal = True):
+                dpg.add_input_int(label = 's', tag = 'profile_seconds', default_value = 10, min_value = 1, min_clamped = True, width = widths[0]//3)
+                dpg.add_button(label = 'cProfile capture (GUI thread)', callback = lambda: self.profiler.capture('cprofile', dpg.get_value('profile_seconds')))
+                dpg.add_button(label = 'Sampling capture (all threads)', callback = lambda: self.profiler.capture('sample', dpg.get_value('profile_seconds')))
+                dpg.add_button(label = 'Reset', callback = self.profiler.reset)
+            dpg.add_text('', tag = 'profiler_capture')
+
         ############ END APP CONFIG SETUP ########                
         # DearPyGUI window handle functions
         dpg.show_viewport()
         dpg.maximize_viewport()
-        t_zero = time.monotonic()  # For sample rate calc
-        t_one = 0 # For sample rate calc
+        self.acquisition.start()#polls the crate at sample_rate, independent of the frame rate
         while dpg.is_dearpygui_running() and self.run:
+            self.profiler.begin()
             dpg.render_dearpygui_frame()
-            if self.sample_rate == 0 or t_one > 1 / self.sample_rate:
-                self.update_loop(True)  # Core DAQ and plotting loop
-                t_zero = time.monotonic()
-            else: 
-                self.update_loop(False)
-            t_one = time.monotonic() - t_zero # For sample rate calc                    
+            self.profiler.lap('render', self.profiler.t0)
+            self.update_loop(True)  # Plots frames from the acquisition thread, never waits on the crate
+            self.profiler.end()
+        self.acquisition.stop()
         self.close()
         dpg.destroy_context()
 
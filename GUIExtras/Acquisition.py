@@ -0,0 +1,87 @@
+#Background data acquisition for the GUIs
+import collections
+import threading
+import time
+
+class Acquisition:
+    '''
+    Polls the crate in a worker thread so SNMP round trips never stall the render loop
+    read_frame: function returning one frame, e.g. a list of channel values. Called from the worker thread only,
+        so it must not call dpg
+    sample_rate: [Hz], 0 polls as fast as the crate answers
+    timed: read_frame returns (time, frame) with the frame's own read time (time.monotonic() clock, e.g. CrateFrame.time,
+        which is system wide, so a broker's read time can be used as it is)
+    Frames are kept as (time, frame) in a bounded deque, time is time.monotonic() at the start of the read unless timed
+    The render loop calls drain() for everything new or latest() for the newest frame only
+    If the render loop falls behind by more than max_frames, the oldest frames are dropped (counted in self.dropped)
+    Usage Example:
+        acq = Acquisition(lambda: MPOD.GetAllVoltages(), sample_rate = 2)
+        acq.start()
+        while dpg.is_dearpygui_running():
+            for t, frame in acq.drain(): ...
+        acq.stop()
+    '''
+    def __init__(self, read_frame, sample_rate = 0, max_frames = 1000, timed = False):
+        self.read_frame = read_frame
+        self.sample_rate = sample_rate
+        self.timed = timed
+        self.frames = collections.deque(maxlen = max_frames)#append/popleft are atomic, no lock needed
+        self.last = None#newest (time, frame), kept after drain
+        self.n_frames = 0#frames acquired since start
+        self.dropped = 0#frames discarded because the queue was full
+        self.errors = collections.deque(maxlen = 100)#(time, repr of exception) from read_frame
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target = self.run, name = 'MPOD acquisition', daemon = True)
+        self.thread.start()
+
+    def stop(self, timeout = 5):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def run(self):
+        while not self.stop_event.is_set():
+            t_start = time.monotonic()
+            try:
+                frame = self.read_frame()
+            except Exception as ex:#keep polling, a slow or missing reply should not end acquisition
+                self.errors.append((t_start, repr(ex)))
+            else:
+                if frame is not None and self.timed:#waiting for a published frame: stamp it with when it was read
+                    self.push(*frame)
+                elif frame is not None:
+                    self.push(t_start, frame)
+            wait = 0
+            if self.sample_rate > 0:
+                wait = 1 / self.sample_rate - (time.monotonic() - t_start)
+            self.stop_event.wait(max(wait, 0.001))#always yield briefly so GUI callbacks can reach the crate
+
+    def push(self, t, frame):
+        if len(self.frames) == self.frames.maxlen:
+            self.dropped = self.dropped + 1
+        self.last = (t, frame)
+        self.frames.append(self.last)
+        self.n_frames = self.n_frames + 1
+
+    def drain(self):
+        '''All frames acquired since the last drain, oldest first'''
+        out = []
+        while True:
+            try:
+                out.append(self.frames.popleft())
+            except IndexError:
+                return out
+
+    def latest(self):
+        '''Newest (time, frame) or None, does not consume the queue'''
+        return self.last
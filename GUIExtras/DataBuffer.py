@@ -0,0 +1,136 @@
+#Fixed size data stores for plotting and saving, appends never reallocate
+import os
+import shutil
+import tempfile
+import numpy as np
+
+class RingBuffer:
+    '''
+    Fixed capacity columnar buffer: column 0 is time, columns 1..n are channel values
+    Each row is written twice (slot i and i + capacity), so the newest rows are always one contiguous slice:
+    view(), times() and column() return numpy views, nothing is copied
+    Usage Example:
+        window = RingBuffer(1 + n_outputs, 5000)
+        window.append([t, v0, i0, v1, i1])
+        dpg.set_value(tag, [window.times(), window.column(1)])
+    '''
+    def __init__(self, n_columns, capacity, dtype = np.float64):
+        self.n_columns = n_columns
+        self.capacity = capacity
+        self.data = np.zeros((n_columns, 2*capacity), dtype = dtype)
+        self.head = 0#next slot to write, 0 to capacity-1
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def append(self, row):
+        self.data[:, self.head] = row
+        self.data[:, self.head + self.capacity] = row
+        self.head = (self.head + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+
+    def view(self, n = None):
+        '''Newest n rows (default all) as a (n_columns, n) view, oldest first'''
+        n = self.size if n is None else min(n, self.size)
+        end = self.head + self.capacity
+        return self.data[:, end - n:end]
+
+    def times(self, n = None):
+        return self.view(n)[0]
+
+    def column(self, idx, n = None):
+        return self.view(n)[idx]
+
+    def clear(self):
+        self.head = 0
+        self.size = 0
+
+class HistoryStore:
+    '''
+    Full run history with bounded RAM: rows fill one preallocated chunk, full chunks are spilled to .npy files
+    spill_dir: folder for the chunk files (default: new temporary folder, removed by close())
+    rows(start, stop) reads any range back, spilled chunks are memory mapped
+    search(t) finds a time (column 0) in O(log rows), opening at most one spilled chunk
+    '''
+    def __init__(self, n_columns, chunk_rows = 10000, spill_dir = None, dtype = np.float64):
+        self.n_columns = n_columns
+        self.chunk_rows = chunk_rows
+        self.chunk = np.empty((chunk_rows, n_columns), dtype = dtype)
+        self.n_chunk = 0#rows in the in-memory chunk
+        self.files = []#spilled chunks, each chunk_rows long
+        self.first_times = []#column 0 of the first row of each spilled chunk
+        self.spill_dir = spill_dir
+        self.own_dir = spill_dir is None
+
+    def __len__(self):
+        return len(self.files)*self.chunk_rows + self.n_chunk
+
+    def append(self, row):
+        self.chunk[self.n_chunk] = row
+        self.n_chunk = self.n_chunk + 1
+        if self.n_chunk == self.chunk_rows:
+            self.spill()
+
+    def spill(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix = 'mpod_history_')
+        os.makedirs(self.spill_dir, exist_ok = True)
+        path = os.path.join(self.spill_dir, f'chunk{len(self.files):06d}.npy')
+        np.save(path, self.chunk[:self.n_chunk])
+        self.files.append(path)
+        self.first_times.append(self.chunk[0, 0])
+        self.n_chunk = 0
+
+    def rows(self, start = 0, stop = None):
+        '''Rows start to stop (python slice rules) as one array'''
+        start, stop, _ = slice(start, stop).indices(len(self))
+        parts = []
+        first_chunk, last_chunk = start // self.chunk_rows, (stop - 1) // self.chunk_rows
+        for n in range(first_chunk, last_chunk + 1):
+            if stop <= start:
+                break
+            if n < len(self.files):
+                block = np.load(self.files[n], mmap_mode = 'r')
+            else:
+                block = self.chunk[:self.n_chunk]
+            offset = n*self.chunk_rows
+            parts.append(block[max(start - offset, 0):stop - offset])
+        if len(parts) == 0:
+            return np.empty((0, self.n_columns), dtype = self.chunk.dtype)
+        return np.concatenate(parts)
+
+    def search(self, t, side = 'left', start = 0):
+        '''Row index where time t would be inserted (numpy.searchsorted on column 0), looking at rows from start on only
+        (column 0 must be increasing there)'''
+        n = len(self)
+        if start >= n:
+            return n
+        first = start // self.chunk_rows
+        firsts = self.first_times[first:] + ([self.chunk[0, 0]] if self.n_chunk else [])
+        firsts[0] = self.rows(start, start + 1)[0, 0]#the first chunk is searched from start only
+        c = first + max(int(np.searchsorted(firsts, t, side)) - 1, 0)
+        lo = max(start, c*self.chunk_rows)
+        block = self.rows(lo, (c + 1)*self.chunk_rows)
+        return lo + int(np.searchsorted(block[:, 0], t, side))
+
+    def to_array(self):
+        return self.rows()
+
+    def clear(self):
+        for path in self.files:
+            if os.path.isfile(path):
+                os.remove(path)
+        self.files = []
+        self.first_times = []
+        self.n_chunk = 0
+
+    def close(self):
+        self.clear()
+        if self.own_dir and self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors = True)
+            self.spill_dir = None
@@ -0,0 +1,113 @@
+#Min/max decimation for plotting long histories at a fixed number of points per frame
+import numpy as np
+from GUIExtras.DataBuffer import RingBuffer
+
+class MinMaxPyramid:
+    '''
+    Multi-resolution store of plot rows (time + data columns)
+    Level 0 keeps the newest `capacity` raw rows. Level k keeps one bucket per factor**k raw rows:
+    (bucket start time, min of each column, max of each column), newest `bucket_capacity` buckets
+    Appending is O(levels), series() returns at most ~n_points points whatever the history length
+    history: HistoryStore the same rows are appended to (GUI.history). A zoomed in range older than level 0 that fits
+        in n_points raw rows is read from it, so zooming always ends at full resolution
+    Usage Example:
+        pyramid = MinMaxPyramid(1 + n_outputs, history = history)
+        pyramid.append([t, v0, i0])
+        x, y = pyramid.series(1, n_points = 800)#whole history of column 1 in ~800 points
+    '''
+    def __init__(self, n_columns, capacity = 5000, factor = 4, n_levels = 8, bucket_capacity = 2048, history = None):
+        self.n_columns = n_columns
+        self.history = history
+        self.n_data = n_columns - 1
+        self.factor = factor
+        self.levels = [RingBuffer(n_columns, capacity)]
+        self.levels.extend(RingBuffer(1 + 2*self.n_data, bucket_capacity) for k in range(1, n_levels))
+        self.n_rows = 0
+        #partial bucket of each level (index 0 unused)
+        self.pending_t = np.zeros(n_levels)
+        self.pending_min = np.full((n_levels, self.n_data), np.inf)
+        self.pending_max = np.full((n_levels, self.n_data), -np.inf)
+        self.pending_n = np.zeros(n_levels, dtype = int)
+
+    def __len__(self):
+        return self.n_rows
+
+    def append(self, row):
+        row = np.asarray(row, dtype = float)
+        self.levels[0].append(row)
+        self.n_rows = self.n_rows + 1
+        t, lo, hi = row[0], row[1:], row[1:]
+        for k in range(1, len(self.levels)):#fold into level k, carry up only when its bucket is complete
+            if self.pending_n[k] == 0:
+                self.pending_t[k] = t
+            np.minimum(self.pending_min[k], lo, out = self.pending_min[k])
+            np.maximum(self.pending_max[k], hi, out = self.pending_max[k])
+            self.pending_n[k] = self.pending_n[k] + 1
+            if self.pending_n[k] < self.factor:
+                break
+            t, lo, hi = self.pending_t[k], self.pending_min[k].copy(), self.pending_max[k].copy()
+            self.levels[k].append(np.concatenate(([t], lo, hi)))
+            self.pending_min[k].fill(np.inf)
+            self.pending_max[k].fill(-np.inf)
+            self.pending_n[k] = 0
+
+    def clear(self):
+        for level in self.levels:
+            level.clear()
+        self.n_rows = 0
+        self.pending_min.fill(np.inf)
+        self.pending_max.fill(-np.inf)
+        self.pending_n.fill(0)
+
+    def series(self, column, t_start = None, t_stop = None, n_points = 1000):
+        '''
+        (x, y) of data column `column` (1 = first column after time) between t_start and t_stop (None: all)
+        Uses the finest level that covers the range within n_points, min/max levels give 2 points per bucket
+        '''
+        if self.n_rows == 0:
+            return np.empty(0), np.empty(0)
+        raw = self.levels[0]
+        if self.history is not None and t_start is not None and len(raw) == raw.capacity and raw.times()[0] > t_start:
+            rows = self.history_rows(t_start, t_stop, n_points)
+            if rows is not None:
+                return rows[:, 0], rows[:, column]
+        for k, level in enumerate(self.levels):
+            if len(level) == 0:
+                break
+            t = level.times()
+            covered = len(level) < level.capacity or (t_start is not None and t[0] <= t_start)
+            start = 0 if t_start is None else max(int(np.searchsorted(t, t_start)) - 1, 0)#one point past each edge
+            stop = len(t) if t_stop is None else min(int(np.searchsorted(t, t_stop, side = 'right')) + 1, len(t))
+            n = (stop - start)*(1 if k == 0 else 2)
+            chosen = k
+            if covered and n <= n_points:
+                break
+        level = self.levels[chosen]
+        if chosen == 0:
+            return level.times()[start:stop], level.column(column)[start:stop]
+        view = level.view()[:, start:stop]
+        t_parts, lo_parts, hi_parts = [view[0]], [view[column]], [view[column + self.n_data]]
+        for k in range(chosen, 0, -1):#partial buckets, oldest (coarsest) first
+            if self.pending_n[k] > 0 and (t_stop is None or self.pending_t[k] <= t_stop):
+                t_parts.append([self.pending_t[k]])
+                lo_parts.append([self.pending_min[k][column - 1]])
+                hi_parts.append([self.pending_max[k][column - 1]])
+        t_sel = np.concatenate(t_parts)
+        x = np.repeat(t_sel, 2)
+        y = np.empty(len(x))
+        y[0::2] = np.concatenate(lo_parts)
+        y[1::2] = np.concatenate(hi_parts)
+        return x, y
+
+    def history_rows(self, t_start, t_stop, n_points):
+        '''Raw rows of the range from history (one past each edge), None if there are more than n_points or history
+        does not reach back to t_start'''
+        n = len(self.history)
+        first = n - min(self.n_rows, n)#rows appended since clear(): history keeps older runs with another t=0
+        if first == n or self.history.rows(first, first + 1)[0, 0] > t_start:#history cleared since, it doesn't go back that far
+            return None
+        start = max(self.history.search(t_start, 'left', first) - 1, first)
+        stop = n if t_stop is None else min(self.history.search(t_stop, 'right', first) + 1, n)
+        if stop - start > n_points:
+            return None
+        return self.history.rows(start, stop)
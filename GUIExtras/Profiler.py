@@ -0,0 +1,189 @@
+#Frame time breakdown of the GUI render loop and on demand profiler captures
+import os
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import collections
+import numpy as np
+
+class FrameProfiler:
+    '''
+    Rolling per phase times of the render loop (one value per render frame) and of the acquisition reads
+    (one value per read), with p50/p99 over the last n_frames. Off by default: disabled, lap() and record()
+    return straight away without reading the clock
+    Usage Example (GUI.start_app / GUI.update_loop do this):
+        prof = FrameProfiler()
+        prof.enabled = True
+        prof.begin()
+        t = prof.lap('render', prof.t0)#time since begin goes to 'render'
+        ...SetTable...
+        t = prof.lap('tables', t)#called again in the same frame, times add up
+        prof.end()
+        prof.record('read_frame', dt)#acquisition thread
+        print(prof.table())
+        prof.capture('sample', 10)#10 s capture written to folder, see capture()
+    '''
+    def __init__(self, n_frames = 300, folder = 'Results'):
+        self.enabled = False
+        self.n_frames = n_frames
+        self.folder = folder
+        self.phases = {}#render loop phase: deque of [s] per frame
+        self.reads = {}#acquisition phase: deque of [s] per read
+        self.frame_times = collections.deque(maxlen = n_frames)#time.monotonic() of each end()
+        self.read_times = collections.deque(maxlen = n_frames)#time.monotonic() of each 'read_frame' record
+        self.current = {}#phase: [s] in the frame being timed
+        self.t0 = 0.
+        self.pending = None#(kind, seconds) capture requested from a callback, started by the render thread in begin()
+        self.profile = None#running cProfile.Profile
+        self.capture_end = 0.
+        self.last_capture = ''#path of the last capture written (shown in the panel)
+
+    def reset(self):
+        self.phases, self.reads, self.current = {}, {}, {}
+        self.frame_times.clear()
+        self.read_times.clear()
+
+    ###### TIMING ######
+    def begin(self):
+        if self.pending is not None or self.profile is not None:
+            self.capture_step()
+        if not self.enabled:
+            return
+        self.current = {}
+        self.t0 = time.perf_counter()
+
+    def now(self):
+        '''Start of the first lap in code that does not call begin() itself'''
+        return time.perf_counter() if self.enabled else 0.
+
+    def lap(self, name, t):
+        '''Add the time since t to phase name of this frame, returns now (start of the next lap)'''
+        if not self.enabled:
+            return 0.
+        now = time.perf_counter()
+        self.current[name] = self.current.get(name, 0.) + now - t
+        return now
+
+    def end(self):
+        if not self.enabled:
+            return
+        current, phases = self.current, self.phases#reset() from a dpg callback swaps these, not clears them
+        current['frame'] = time.perf_counter() - self.t0
+        for name in phases.keys() | current.keys():
+            if name not in phases:
+                phases[name] = collections.deque([0.]*len(self.frame_times), maxlen = self.n_frames)
+            phases[name].append(current.get(name, 0.))
+        self.frame_times.append(time.monotonic())
+        self.current = {}
+
+    def record(self, name, seconds):
+        '''One acquisition read phase (any thread). Each 'read_frame' record counts as one read for the sample rate'''
+        if not self.enabled:
+            return
+        if name not in self.reads:
+            self.reads[name] = collections.deque(maxlen = self.n_frames)
+        self.reads[name].append(seconds)
+        if name == 'read_frame':
+            self.read_times.append(time.monotonic())
+
+    ###### SUMMARY ######
+    def rate(self, times):
+        '''[Hz] over the rolling window'''
+        if len(times) < 2 or times[-1] <= times[0]:
+            return 0.
+        return (len(times) - 1)/(times[-1] - times[0])
+
+    def summary(self):
+        '''{'frame': {phase: (mean, p50, p99) [ms]}, 'read': {...}, 'fps': Hz, 'read_rate': Hz}'''
+        result = {'fps': self.rate(self.frame_times), 'read_rate': self.rate(self.read_times)}
+        for key, phases in (('frame', self.phases), ('read', self.reads)):
+            result[key] = {}
+            for name, values in list(phases.items()):
+                values = np.array(list(values))*1e3#list() copies the deque in one step, record() may run in another thread
+                if len(values):
+                    result[key][name] = (values.mean(), np.percentile(values, 50), np.percentile(values, 99))
+        return result
+
+    def table(self, requested_rate = 0):
+        '''Text for the profiler panel. requested_rate: sample rate set in the GUI [Hz], 0: as fast as possible'''
+        s = self.summary()
+        requested = f'{requested_rate:g} Hz' if requested_rate > 0 else 'max'
+        lines = [f"render {s['fps']:.1f} fps, acquisition {s['read_rate']:.2f} Hz (requested {requested})",
+                 f"{'phase':<22}{'mean ms':>9}{'p50 ms':>9}{'p99 ms':>9}{'share':>7}"]
+        for key, title in (('frame', 'per render frame:'), ('read', 'per acquisition read:')):
+            phases = s[key]
+            total = phases.get('frame' if key == 'frame' else 'read_frame', (0,))[0]
+            lines.append(title)
+            for name, (mean, p50, p99) in sorted(phases.items(), key = lambda item: -item[1][0]):
+                share = f'{100*mean/total:>6.0f}%' if total > 0 else ''
+                lines.append(f'  {name:<20}{mean:>9.2f}{p50:>9.2f}{p99:>9.2f}{share:>7}')
+        lines.append(self.capture_status())
+        return '\n'.join(lines)
+
+    def capture_status(self):
+        if self.pending is not None or time.monotonic() < self.capture_end:
+            return 'capture running...'
+        return f'last capture: {self.last_capture}' if self.last_capture else ''
+
+    ###### CAPTURES ######
+    def capture(self, kind = 'sample', seconds = 10):
+        '''
+        Record seconds of profile into folder (started by the render thread on its next begin(), safe from dpg callbacks)
+        kind 'cprofile': every call in the render thread (render, update_loop, callbacks run from it),
+            written as <name>.prof (snakeviz, pstats) and <name>.txt (top functions by cumulative time)
+        kind 'sample': stacks of all threads (acquisition/SNMP included) sampled every 5 ms,
+            written as <name>.txt collapsed stacks, one "thread;outer;...;inner count" line per stack (flamegraph.pl, speedscope)
+        '''
+        self.pending = (kind, seconds)
+
+    def capture_step(self):
+        now = time.monotonic()
+        if self.pending is not None and self.profile is None:
+            kind, seconds = self.pending
+            self.pending = None
+            self.capture_end = now + seconds
+            if kind == 'cprofile':
+                self.profile = cProfile.Profile()
+                self.profile.enable()
+            else:
+                threading.Thread(target = self.sample, args = (seconds,), name = 'MPOD profiler', daemon = True).start()
+        elif self.profile is not None and now >= self.capture_end:
+            self.profile.disable()
+            path = self.capture_path('cprofile')
+            self.profile.dump_stats(path + '.prof')
+            with open(path + '.txt', 'w') as file:
+                pstats.Stats(self.profile, stream = file).sort_stats('cumulative').print_stats(60)
+            self.profile = None
+            self.last_capture = path + '.prof'
+
+    def sample(self, seconds, interval = 0.005):
+        '''Sampling profiler thread: counts the call stack of every other thread each interval'''
+        stacks = collections.Counter()
+        names = {}
+        me = threading.get_ident()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                if ident not in names:
+                    names = {thread.ident: thread.name for thread in threading.enumerate()}
+                stacks[';'.join([names.get(ident, str(ident))] + stack[::-1])] += 1
+            time.sleep(interval)
+        path = self.capture_path('samples') + '.txt'
+        with open(path, 'w') as file:
+            for stack, count in stacks.most_common():
+                file.write(f'{stack} {count}\n')
+        self.last_capture = path
+
+    def capture_path(self, kind):
+        os.makedirs(self.folder, exist_ok = True)
+        t = time.localtime()
+        return os.path.join(self.folder, f'{kind}_{t.tm_mon}_{t.tm_mday}_{t.tm_year}_{t.tm_hour}-{t.tm_min}-{t.tm_sec}')
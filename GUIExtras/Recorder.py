@@ -0,0 +1,54 @@
+#Streaming run log: frames are written as they arrive, nothing is kept in RAM for saving
+import os
+
+class RunRecorder:
+    '''
+    Append-only CSV run file that stays open for the whole run
+    Same layout as GUI.save_plot: one header row ("t[s]", "V101[V]", "I101[mA]"...), then one row per frame
+    scale_factor (one per data column) is written next to it as <name>_scale.csv
+    sync_every: rows between flush + os.fsync, so at most that many rows are lost on a crash
+    Usage Example:
+        rec = RunRecorder('Results/run.csv', ['t[s]', 'V101[V]', 'I101[mA]'])
+        rec.write([0.0, 500.0, 0.001])
+        rec.close()
+    '''
+    def __init__(self, path, column_names, scale_factor = None, sync_every = 100, overwrite = False):
+        self.path = str(path)
+        self.column_names = list(column_names)
+        self.sync_every = max(int(sync_every), 1)
+        self.n_rows = 0
+        self.unsynced = 0
+        self.file = open(self.path, 'w' if overwrite else 'x', buffering = 1 << 16, newline = '')
+        self.file.write(','.join(self.column_names) + '\n')
+        if scale_factor is not None:
+            with open(os.path.splitext(self.path)[0] + '_scale.csv', 'w') as f:
+                f.write(','.join(self.column_names[1:]) + '\n')
+                f.write(','.join(map(repr, map(float, scale_factor))) + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def write(self, row):
+        self.file.write(','.join(map(repr, map(float, row))) + '\n')#shortest exact float text, like pandas
+        self.n_rows = self.n_rows + 1
+        self.unsynced = self.unsynced + 1
+        if self.unsynced >= self.sync_every:
+            self.sync()
+
+    def write_rows(self, rows):
+        for row in rows:
+            self.write(row)
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.unsynced = 0
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
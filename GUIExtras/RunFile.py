@@ -0,0 +1,163 @@
+#Binary run files (.mpod) for long runs: fixed header, then float blocks that can be memory mapped
+import json
+import os
+import numpy as np
+
+MAGIC = b'MPODRUN1'
+EXTENSION = '.mpod'
+# File layout:
+#   MAGIC (8 bytes), header length (uint32, little endian), JSON header padded with spaces so data starts 64 byte aligned
+#   data: rows of n_columns values (header 'dtype', '<f8' or '<f4'), written in blocks, row-major
+# Header keys: version, dtype, columns (save_plot names: t[s], V101[V]...), units, channels, channel_names, scale_factor
+# A row cut short by a crash is ignored by the reader, everything before it stays readable
+
+def Units(column_names):
+    # 'V101[V]' -> 'V'
+    return [name[name.find('[') + 1:name.rfind(']')] if '[' in name else '' for name in column_names]
+
+class RunFileWriter:
+    '''
+    Same interface as Recorder.RunRecorder (write, write_rows, sync, close), binary instead of CSV
+    Rows are collected in a preallocated block of sync_every rows, each full block is one write + os.fsync
+    '''
+    def __init__(self, path, column_names, scale_factor = None, sync_every = 100, overwrite = False,
+                 channels = None, channel_names = None, dtype = '<f8'):
+        self.path = str(path)
+        self.column_names = list(column_names)
+        self.dtype = np.dtype(dtype)
+        self.block = np.empty((max(int(sync_every), 1), len(self.column_names)), dtype = self.dtype)
+        self.n_block = 0
+        self.n_rows = 0
+        header = {
+            'version': 1,
+            'dtype': self.dtype.str,
+            'columns': self.column_names,
+            'units': Units(self.column_names),
+            'channels': list(channels) if channels is not None else [],
+            'channel_names': list(channel_names) if channel_names is not None else [],
+            'scale_factor': [float(x) for x in scale_factor] if scale_factor is not None else [],
+        }
+        text = json.dumps(header).encode()
+        size = len(MAGIC) + 4 + len(text)
+        text = text + b' '*(-size % 64)#data starts 64 byte aligned
+        self.file = open(self.path, 'wb' if overwrite else 'xb')
+        self.file.write(MAGIC + len(text).to_bytes(4, 'little') + text)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+        return False
+
+    def write(self, row):
+        self.block[self.n_block] = row
+        self.n_block = self.n_block + 1
+        self.n_rows = self.n_rows + 1
+        if self.n_block == len(self.block):
+            self.sync()
+
+    def write_rows(self, rows):
+        rows = np.asarray(rows, dtype = self.dtype)
+        if self.n_block == 0 and len(rows) >= len(self.block):#whole blocks go straight to the file
+            self.file.write(rows.tobytes())
+            self.n_rows = self.n_rows + len(rows)
+            self.sync()
+            return
+        for row in rows:
+            self.write(row)
+
+    def sync(self):
+        if self.n_block > 0:
+            self.file.write(self.block[:self.n_block].tobytes())
+            self.n_block = 0
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+class RunFileReader:
+    '''
+    Memory mapped reader, nothing is parsed or copied until used
+    data: (n_rows, n_columns) numpy memmap, column 0 is time [s]
+    Usage Example:
+        run = RunFileReader('Results/run.mpod')
+        t, v = run.range(3600, 7200, 'V101[V]')#views of one hour of one channel
+    '''
+    def __init__(self, path):
+        self.path = str(path)
+        with open(self.path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{self.path} is not an MPOD run file')
+            length = int.from_bytes(f.read(4), 'little')
+            self.header = json.loads(f.read(length).decode())
+        self.offset = len(MAGIC) + 4 + length
+        self.columns = self.header['columns']
+        self.dtype = np.dtype(self.header['dtype'])
+        row_bytes = self.dtype.itemsize*len(self.columns)
+        self.n_rows = (os.path.getsize(self.path) - self.offset) // row_bytes
+        if self.n_rows > 0:
+            self.data = np.memmap(self.path, dtype = self.dtype, mode = 'r', offset = self.offset, shape = (self.n_rows, len(self.columns)))
+        else:
+            self.data = np.empty((0, len(self.columns)), dtype = self.dtype)
+
+    def __len__(self):
+        return self.n_rows
+
+    def column(self, name_or_idx):
+        idx = self.columns.index(name_or_idx) if isinstance(name_or_idx, str) else name_or_idx
+        return self.data[:, idx]
+
+    def times(self):
+        return self.data[:, 0]
+
+    def rows(self, t_start = None, t_stop = None):
+        '''Rows with t_start <= t < t_stop (time is assumed increasing), as a view'''
+        t = self.times()
+        start = 0 if t_start is None else int(np.searchsorted(t, t_start, side = 'left'))
+        stop = self.n_rows if t_stop is None else int(np.searchsorted(t, t_stop, side = 'left'))
+        return self.data[start:stop]
+
+    def range(self, t_start = None, t_stop = None, name_or_idx = 1):
+        '''(time, values) views of one column between t_start and t_stop'''
+        block = self.rows(t_start, t_stop)
+        idx = self.columns.index(name_or_idx) if isinstance(name_or_idx, str) else name_or_idx
+        return block[:, 0], block[:, idx]
+
+###### CSV CONVERSION (layout written by GUI.save_plot) ######
+def CSVToRunFile(csv_path, run_path = None, dtype = '<f8', block_rows = 10000, overwrite = False):
+    '''Streams a save_plot CSV (and its _scale.csv if present) into a run file. Returns the run file path'''
+    csv_path = str(csv_path)
+    if run_path is None:
+        run_path = os.path.splitext(csv_path)[0] + EXTENSION
+    scale_factor = None
+    scale_path = os.path.splitext(csv_path)[0] + '_scale.csv'
+    if os.path.isfile(scale_path):
+        with open(scale_path) as f:
+            lines = f.read().splitlines()
+        scale_factor = [float(x) for x in lines[-1].split(',')]
+    with open(csv_path) as f:
+        column_names = f.readline().strip().split(',')
+        with RunFileWriter(run_path, column_names, scale_factor, block_rows, overwrite, dtype = dtype) as run:
+            for line in f:
+                if line.strip():
+                    run.write([float(x) for x in line.split(',')])
+    return run_path
+
+def RunFileToCSV(run_path, csv_path = None, block_rows = 10000, overwrite = False):
+    '''Writes a run file back out in the save_plot CSV layout. Returns the CSV path'''
+    run = RunFileReader(run_path)
+    if csv_path is None:
+        csv_path = os.path.splitext(str(run_path))[0] + '.csv'
+    with open(csv_path, 'w' if overwrite else 'x', newline = '') as f:
+        f.write(','.join(run.columns) + '\n')
+        for start in range(0, len(run), block_rows):
+            f.writelines(','.join(map(repr, row)) + '\n' for row in run.data[start:start + block_rows].tolist())
+    if run.header['scale_factor']:
+        with open(os.path.splitext(csv_path)[0] + '_scale.csv', 'w') as f:
+            f.write(','.join(run.columns[1:]) + '\n')
+            f.write(','.join(map(repr, run.header['scale_factor'])) + '\n')
+    return csv_path
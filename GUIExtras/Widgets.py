@@ -1,6 +1,7 @@
 #functions for widgets on GUI
 import dearpygui.dearpygui as dpg
 def CreateTable(row_names, width, kind, FX):
+    ForgetRendered(kind)#new widgets, draw every cell once
     with dpg.table(header_row = True, resizable=True, policy=dpg.mvTable_SizingFixedFit,row_background = True):
         columns = ['Ch', 'Target Input', 'Target', 'Actual', 'Status']
         widths = [width, width*3//4, width*2//3, width, width//2]
@@ -21,41 +22,92 @@ def CreateTable(row_names, width, kind, FX):
                     #TODO: setup data linkages for buttons & text
     SetTable(row_names, kind, FX) #initialize table
 
+#### DIFFERENTIAL UPDATES ####
+# Last value sent to dpg per (tag, property). SetValue/BindTheme/Configure/SetLabel only call dpg when it changes
+RENDERED = {}
+RENDERED_FRAMES = {}#kind ('V', 'I', 'registry'): CrateFrame last drawn
+
+def SetValue(tag, value):
+    if RENDERED.get((tag, 'value')) != value:
+        dpg.set_value(tag, value)
+        RENDERED[(tag, 'value')] = value
+
+def BindTheme(tag, theme):
+    if RENDERED.get((tag, 'theme')) != theme:
+        dpg.bind_item_theme(tag, theme)
+        RENDERED[(tag, 'theme')] = theme
+
+def SetLabel(tag, label):
+    if RENDERED.get((tag, 'label')) != label:
+        dpg.set_item_label(tag, label)
+        RENDERED[(tag, 'label')] = label
+
+def Configure(tag, **kwargs):
+    for key, value in kwargs.items():
+        if RENDERED.get((tag, key)) != value:
+            dpg.configure_item(tag, **{key: value})
+            RENDERED[(tag, key)] = value
+
+def ForgetRendered(kind = None):
+    '''Drop the cache (widgets were recreated or changed outside these functions). kind: only that table'''
+    if kind is None:
+        RENDERED.clear()
+        RENDERED_FRAMES.clear()
+    else:
+        RENDERED_FRAMES.pop(kind, None)
+        for key in [key for key in RENDERED if key[0].startswith(kind)]:
+            del RENDERED[key]
+
 def SetTable(row_names, kind, FX):
-    # Called every frame
-    # FX.last_frame = [i_limit, i_rate, i_actual, v_target, v_rate, v_actual, pwr_crate, pwr_ch]
+    # Called every frame. Only rows whose values changed since the last drawn frame are formatted,
+    # and only widgets whose text/theme/state changed are sent to dpg
+    frame = FX.last_frame
     if kind == 'V': 
-        vals = FX.last_frame[3:6] #v_target, v_rate, v_actual
+        target, actual = frame.v_target, frame.v_actual
+        fields = ['v_target', 'v_actual', 'pwr_ch']
     elif kind == 'I':
-        vals = FX.last_frame[0:3] #i_limit, i_rate, i_actual
-    # for n, row_label in enumerate(FX.active_channels):#prev row_names
+        target, actual = frame.i_limit, frame.i_actual
+        fields = ['i_limit', 'i_actual', 'pwr_ch']
+    previous = RENDERED_FRAMES.get(kind)
+    if previous is not frame:
+        rows = set()
+        for field in fields:
+            rows.update(frame.ChangedRows(previous, field).tolist())
+        for n in sorted(rows):
+            row_label = FX.my_channels[n]
+            SetValue(f'{kind}Set{row_label}', f'{target[n]:.5g}') 
+            SetValue(f'{kind}Actual{row_label}', f'{actual[n]:.5g}')
+        RENDERED_FRAMES[kind] = frame
+    #active channels can change without a new frame, the cache keeps this loop free of dpg calls
+    active = set(FX.active_channels)
     for n, row_label in enumerate(FX.my_channels):
-        dpg.set_value(f'{kind}Set{row_label}', f'{vals[0][n]:.5g}') 
-        dpg.set_value(f'{kind}Actual{row_label}', f'{vals[2][n]:.5g}')
         #TODO: check sizing of status column (and other columns) adjust w window
-        ChannelStatus(n, row_label, kind, FX)
-        UpdateRegistry(FX)
+        ChannelStatus(n, row_label, kind, FX, row_label in active)
+    CrateStatus(FX)
 
-def ChannelStatus(n, row_label, kind, FX):
-    # Called every frame
+def ChannelStatus(n, row_label, kind, FX, active = None):
+    # Called every frame, for each row
     #TODO: readout full status & set status button based on instrument status bits
-    pwr = FX.last_frame[-1]
-    crate_pwr = FX.last_frame[-2]
+    pwr = FX.last_frame.pwr_ch
+    if active is None:
+        active = row_label in FX.active_channels
     ### MODULE STATUS ###
     #todo: FIGURE OUT HOW TO GET MODULES IN WHEN CALLED FOR EVERY ROW - MAYBE JUST FOR N =0? 
     ### CHANNEL STATUS ####
-    if row_label in FX.active_channels:
-        dpg.bind_item_theme(f'{kind}Indicator{row_label}', 'green_theme' if pwr[n] else 'red_theme')
-        dpg.set_value(f'{kind}Status{row_label}', 'ON' if pwr[n] else 'OFF')
-        dpg.configure_item(f'{kind}Input{row_label}', enabled=True)
+    if active:
+        BindTheme(f'{kind}Indicator{row_label}', 'green_theme' if pwr[n] else 'red_theme')
+        SetValue(f'{kind}Status{row_label}', 'ON' if pwr[n] else 'OFF')
+        Configure(f'{kind}Input{row_label}', enabled=True)
     else:
-        dpg.bind_item_theme(f'{kind}Indicator{row_label}', 'grey_theme')
-        dpg.set_value(f'{kind}Status{row_label}', 'DISABLED')
-        dpg.configure_item(f'{kind}Input{row_label}', enabled=False)
+        BindTheme(f'{kind}Indicator{row_label}', 'grey_theme')
+        SetValue(f'{kind}Status{row_label}', 'DISABLED')
+        Configure(f'{kind}Input{row_label}', enabled=False)
 
-    ### CRATE STATUS ###   
-    dpg.bind_item_theme('pwr_crate', 'green_theme' if crate_pwr else 'red_theme')
-    dpg.set_item_label('pwr_crate', 'Crate ON' if crate_pwr else 'Crate OFF')
+def CrateStatus(FX):
+    # Called every frame, once
+    crate_pwr = FX.last_frame.pwr_crate
+    BindTheme('pwr_crate', 'green_theme' if crate_pwr else 'red_theme')
+    SetLabel('pwr_crate', 'Crate ON' if crate_pwr else 'Crate OFF')
 
 def SendValue(sender, app_data, user_data):
     print('Sender:',sender, 'App:', app_data, 'User:', user_data)
@@ -90,14 +142,22 @@ def CreateIncrementButtons(FX, width):
     dpg.add_text('Increments active channels by ____ Volts')
 
 def UpdateRegistry(FX):
-    for idx, n in enumerate(FX.modules):
-        dpg.set_value(f'{n}_VRate_Source', FX.last_frame[4][idx])
-    for i, row_label in enumerate(FX.my_channels):
-        for n in range(len(FX.my_channels)):
-            try:
-                dpg.set_value(f'{i}_{n}_Source',FX.last_frame[n][i])
-            except:
-                pass
+    # Called every frame, once. value registry made in GUI.create_gui: {module}_VRate_Source, {row}_{field}_Source
+    frame = FX.last_frame
+    previous = RENDERED_FRAMES.get('registry')
+    if previous is frame:
+        return
+    changed = frame.Changed(previous)
+    if 'v_rate' in changed:
+        for idx, n in enumerate(FX.modules):
+            SetValue(f'{n}_VRate_Source', frame.v_rate[idx])
+    for field in changed:
+        rows = range(len(FX.my_channels)) if field == 'pwr_crate' else frame.ChangedRows(previous, field).tolist()
+        for i in rows:
+            value = frame.Value(field, i)
+            if value is not None and i < len(FX.my_channels):
+                SetValue(f'{i}_{field}_Source', value)
+    RENDERED_FRAMES['registry'] = frame
 
 def module_enable(sender,app_data,user_data):
     FX,index,src= user_data
@@ -12,24 +12,32 @@ from plotsGUI import plotsGUI
 #TODO: ramp all down button needs to override everything
 
 
-from Driver.MPODClass import MPOD
+from Driver.MPODBroker import CrateBroker
 
-def start_gui1():
-    G = voltageGUI()
+#The broker process owns the only crate connection and polls it, both GUIs read its frames from shared memory
+#and send commands through it (a third viewer is just another broker.Client(), no extra crate traffic)
+CHANNEL_NAMES = ['Cathode','GEM Top+','GEM Top-','GEM Mid+','GEM Mid-','GEM Low+','GEM Low-','None']
+
+def start_gui1(broker):
+    G = voltageGUI(broker = broker)
     G.start_app()
 
-def start_gui2():
-    g=plotsGUI(take_real_data=True)
+def start_gui2(broker):
+    g=plotsGUI(take_real_data=True, broker = broker)
     g.start_app()
 
 if __name__ == '__main__':
     multiprocessing.freeze_support()
 
-    p1 = multiprocessing.Process(target=start_gui1)
-    p2 = multiprocessing.Process(target=start_gui2)
+    broker = CrateBroker(take_real_data = True, active_modules = [0], channel_names = CHANNEL_NAMES)
+    broker.Start()#waits for the crate startup checks, done once for every GUI
+
+    p1 = multiprocessing.Process(target=start_gui1, args=(broker.Client(),))
+    p2 = multiprocessing.Process(target=start_gui2, args=(broker.Client(),))
  
     p1.start()
     p2.start()
 
     p1.join()
     p2.join()
+    broker.Stop()
@@ -1,12 +1,16 @@
 import dearpygui.dearpygui as dpg
 import numpy as np
-import pandas as pd
 import time
 import pathlib
 from screeninfo import get_monitors
 from Driver.MPODClass import MPOD
 from Driver.MPODCustomFunctions import CustomFx
 import GUIExtras.Widgets as widget
+from GUIExtras.Acquisition import Acquisition
+from GUIExtras.DataBuffer import HistoryStore
+from GUIExtras.Decimate import MinMaxPyramid
+from GUIExtras.Recorder import RunRecorder
+from GUIExtras.RunFile import RunFileWriter
 #import ctypes
 """
 Written by Natalie Mujica-Schwahn
@@ -17,8 +21,8 @@ G.start_app()
 """
 
 class plotsGUI:
-    def __init__(self, IP = '169.254.107.70', take_real_data = True, active_modules = [0],channel_names = ['Cathode','GEM Top+','GEM Top-','GEM Mid+','GEM Mid-','GEM Low+','GEM Low-','None'],MPOD = None,FX = None):
-        self.warnings = ['This GUI is a work in progress. Startup delay is 5-60 seconds before plotting rate stabilizes. Saving & File Path panel has been debugged - working!. Autosaving recommended.']  # List of startup warnings to display on front
+    def __init__(self, IP = '169.254.107.70', take_real_data = True, active_modules = [0],channel_names = ['Cathode','GEM Top+','GEM Top-','GEM Mid+','GEM Mid-','GEM Low+','GEM Low-','None'],MPOD = None,FX = None, broker = None):
+        self.warnings = ['This GUI is a work in progress. Saving & File Path panel has been debugged - working!. Autosaving recommended.']  # List of startup warnings to display on front
         self.IP = IP
         self.take_real_data = take_real_data  # True: Instrument data, False: synthesized data
         self.active_modules = active_modules#disable control and data for all but these modules
@@ -29,23 +33,26 @@ class plotsGUI:
         if not take_real_data:
             self.warnings.append('Dummy data plotted. Set take_real_data to True to plot real data')
         self.MPOD, self.FX = MPOD, FX #MPOD Class & functions object placeholders
+        self.broker = broker#Driver.MPODBroker client: frames are read from shared memory, the broker polls the crate
+        self.frame_seq = 0#seq of the last broker frame plotted
+        if broker is not None:
+            self.MPOD, self.FX = broker.MPOD, broker.FX
         self.create_data_task()
 
         # Initialize  vars for later use
         self.max_data_size = 5000
         self.savefile_path = str(pathlib.Path(__file__).parent.resolve()/"Results") # Default/current file path
-        self.data_series, self.time_series = np.array([]), np.array([]) # Windowed data for plotting
-        self.save_data = np.array([])  # Full data to be saved
         self.limit_vals=[0,0,0,0]#Data range
         self.loop_plot = True # (De)activate plot
         self.en = []  # Enable plot mask
         self.flag=0#flag for various status conditions
         self.data_size, self.sample_rate = 0, 0 # Displayed on GUI
-        self.autosave_counter = 1 # Autosave counter (bins of 100)
-        self.autosave = 0 # Does autosave file exist?
-        self.n_autosave = 100 # How often to auto save data
+        self.n_autosave = 100 # Rows between autosave file syncs (fsync)
+        self.recorder = None # Open autosave file (RunRecorder) while Autosave is checked
         self.n_outputs = self.FX.n_channels * 2
         self.scale_factor = np.ones(self.n_outputs)  # default scale factor of 1, optional
+        self.history = HistoryStore(self.n_outputs + 1) # Full data to be saved, spills to disk in chunks
+        self.pyramid = MinMaxPyramid(self.n_outputs + 1, self.max_data_size, history = self.history) # Plot data: t, V, I, V, I... newest max_data_size rows raw, older as min/max (raw from history when zoomed in)
         self.screensize = [1600, 400] #track viewportsize for resize management
         self.winscale = [1,5/7]#global scaling for windows, width & height
         self.initialized = 0 #flag for window initialization
@@ -66,6 +73,7 @@ class plotsGUI:
         t = time.localtime()
         self.datestr = f"{t.tm_mon}_{t.tm_mday}_{t.tm_year}_{t.tm_hour}-{t.tm_min}-{t.tm_sec}"
 
+        self.acquisition = Acquisition(self.get_plot_data, self.sample_rate, timed = True)#crate polling thread, started in start_app
         self.run = 1
     def date_string(self):
         t = time.localtime()
@@ -75,7 +83,7 @@ class plotsGUI:
     def start_plot(self):
         if not self.loop_plot:  # Only runs if plot is not already started
             self.loop_plot = True
-            if len(self.save_data) == 0 and dpg.get_value('saveFilename') == self.datestr:
+            if len(self.history) == 0 and dpg.get_value('saveFilename') == self.datestr:
                 self.date_string()  # Updates datestr in file window
 
             # Add line to graph at current time
@@ -111,27 +119,23 @@ class plotsGUI:
         if val is None:
             flag = 1
             val = self.datestr
-        full_file_path = pathlib.Path(self.savefile_path + "/" + val + '.csv')
-        #scale_out = pd.DataFrame(self.scale_factor)
-        #scale_out.to_csv(pathlib.Path(self.savefile_path + "/" + val + '_scale.csv'), header=False, index=False)
-        #desc = f'\nScale factors saved to {self.savefile_path + "/" + val}_scale.csv'
-        # Reformat column names, then save data using pandas (pd)
-        savecolumn_names = []
-        for i in range(len(self.column_names)):
-            if i == 0:
-                savecolumn_names.append(self.column_names[i] + '[s]')
-            else:
-                savecolumn_names.append(self.column_names[i] + self.units_name[np.mod(i, len(self.units_name))])
-
-        if len(self.save_data) > 0:  # Checks that data is not empty
-            dataframe_out = pd.DataFrame(self.save_data, columns = savecolumn_names)
-            # Writes file if file does not exist or overwrite is allowed
-            if (not pathlib.Path.is_file(full_file_path)) or dpg.get_value('enable_overwrite'):
-                dataframe_out.to_csv(full_file_path, index=False)  # Writes data to CSV file
+        full_file_path = pathlib.Path(self.savefile_path + "/" + val + (dpg.get_value('saveFormat') or '.csv'))
+        savecolumn_names = self.save_column_names()
+        if len(self.history) > 0:  # Checks that data is not empty
+            if self.recorder is not None and pathlib.Path(self.recorder.path) == full_file_path:
+                self.recorder.sync()  # Autosave is already streaming to this file
                 desc = ''
                 if not flag:
                     dpg.set_value('messages', 'Data saved to: ' + str(full_file_path) + desc)
                     dpg.bind_item_theme('messages', 'text_theme')
+            # Writes file if file does not exist or overwrite is allowed
+            elif (not pathlib.Path.is_file(full_file_path)) or dpg.get_value('enable_overwrite'):
+                with self.open_run_file(full_file_path, self.history.chunk_rows, overwrite = True) as rec:
+                    self.write_history(rec)  # Chunk by chunk, the full history is never loaded at once
+                desc = f'\nScale factors saved to {self.savefile_path + "/" + val}_scale.csv' if full_file_path.suffix == '.csv' else ''
+                if not flag:
+                    dpg.set_value('messages', 'Data saved to: ' + str(full_file_path) + desc)
+                    dpg.bind_item_theme('messages', 'text_theme')
             else:
                 if not flag:
                     dpg.set_value('messages', 'Warning: \nAllow Overwrite or rename file. File already exists.')
@@ -142,9 +146,51 @@ class plotsGUI:
                 dpg.set_value('messages', 'Warning: \nData is empty')
                 dpg.bind_item_theme('messages', 'warning_text_theme')
 
+    def save_column_names(self):
+        # Column names with units: t[s], V101[V], I101[mA]...
+        savecolumn_names = []
+        for i in range(len(self.column_names)):
+            if i == 0:
+                savecolumn_names.append(self.column_names[i] + '[s]')
+            else:
+                savecolumn_names.append(self.column_names[i] + self.units_name[np.mod(i, len(self.units_name))])
+        return savecolumn_names
+
+    def open_run_file(self, full_file_path, sync_every, overwrite):
+        # .csv: text, save_plot layout. .mpod: binary with channel names, units & scale factors in the header
+        if full_file_path.suffix == '.mpod':
+            return RunFileWriter(full_file_path, self.save_column_names(), self.scale_factor, sync_every, overwrite,
+                channels = self.FX.my_channels, channel_names = self.FX.channel_names)
+        return RunRecorder(full_file_path, self.save_column_names(), self.scale_factor, sync_every, overwrite)
+
+    def write_history(self, rec):
+        for start in range(0, len(self.history), self.history.chunk_rows):
+            rec.write_rows(self.history.rows(start, start + self.history.chunk_rows))
+
+    def start_recorder(self):
+        # Autosave: open the run file and write the data so far, update_loop then appends every new frame
+        val = dpg.get_value("saveFilename")
+        full_file_path = pathlib.Path(self.savefile_path + "/" + val + dpg.get_value('saveFormat'))
+        try:
+            self.recorder = self.open_run_file(full_file_path, dpg.get_value('NAutosave'), dpg.get_value('enable_overwrite'))
+        except FileExistsError:
+            dpg.set_value('Autosave', False)
+            dpg.enable_item('NAutosave')
+            dpg.set_value('messages', 'Warning: \nAllow Overwrite or rename file. File already exists.')
+            dpg.bind_item_theme('messages', 'warning_text_theme')
+            return
+        self.write_history(self.recorder)
+        dpg.set_value('messages', 'Autosave on, data streamed to: ' + str(full_file_path))
+        dpg.bind_item_theme('messages', 'text_theme')
+
+    def stop_recorder(self):
+        self.recorder.close()
+        dpg.set_value('messages', f'Autosave off, {self.recorder.n_rows} rows saved to: ' + self.recorder.path)
+        dpg.bind_item_theme('messages', 'text_theme')
+        self.recorder = None
+
     def refresh_plot(self):
-        self.data_series = np.array([]) 
-        self.time_series = np.array([]) 
+        self.pyramid.clear()
         self.startTime = time.monotonic()  # Resets t=0 on graph
         for tag in self.tag_set:  # Cleans up lines for start/stop of plot on graph
             dpg.delete_item(tag)
@@ -161,8 +207,9 @@ class plotsGUI:
             print('turned on')
     
     def clear_save_data(self):
-        self.save_data = np.array([])
-        self.autosave_counter = 0
+        self.history.clear()
+        if self.recorder is not None:  # Next autosave starts a new file
+            self.stop_recorder()
         if dpg.get_value('saveFilename') == self.datestr:
             self.date_string()  # Updates datestr in file window
             dpg.set_value('datasize', 0)
@@ -186,9 +233,28 @@ class plotsGUI:
             for i in range(1, len(self.column_names)):
                 dpg.configure_item(self.column_names[i] + 'tag1', show = self.en[i - 1])# Update visibility on Plot 1
 
-        # Always update time axis
-        for ax in self.ax_set:
-            dpg.fit_axis_data("time_axis" + ax)
+        # Update time axis unless the user is zooming/panning (Follow unchecked)
+        if dpg.get_value('follow_plot'):
+            for ax in self.ax_set:
+                dpg.fit_axis_data("time_axis" + ax)
+
+    def update_plot_series(self):
+        # About one point per horizontal pixel of each plot, whatever the history length (see GUIExtras/Decimate.py)
+        # Returns [V min, V max, I min, I max] of the plotted points
+        limits = []
+        for idx, ax in enumerate(self.ax_set):# V on plot 1, I on plot 2
+            n_points = max(dpg.get_item_rect_size(self.plot_set[idx])[0], 100)
+            t_start, t_stop = None, None# Follow: whole history
+            if not dpg.get_value('follow_plot'):
+                t_start, t_stop = dpg.get_axis_limits('time_axis' + ax)# Visible range, full resolution when zoomed in
+            lo, hi = np.inf, -np.inf
+            for i in range(idx, self.n_outputs, 2):
+                x, y = self.pyramid.series(i + 1, t_start, t_stop, n_points)
+                dpg.set_value(self.column_names[i + 1] + 'tag1', [x.tolist(), y.tolist()])
+                if len(y) > 0:
+                    lo, hi = min(lo, np.min(y)), max(hi, np.max(y))
+            limits.extend([lo, hi])
+        return limits
 
     def set_all_checks(self, sender, data, TF):
         for i in range(self.n_outputs):
@@ -211,6 +277,7 @@ class plotsGUI:
 
     def update_sample_rate(self): # Check and set sample rate for future data points
         self.sample_rate = dpg.get_value('sample_rate')
+        self.acquisition.sample_rate = self.sample_rate
         if self.sample_rate > 0:
             s = 1 / self.sample_rate
             if s < 100:  # Display sample rate in seconds, minutes, or hours (depending on magnitude)
@@ -231,12 +298,15 @@ class plotsGUI:
             self.FX = CustomFx(self.MPOD, self.take_real_data, self.active_modules, self.channel_names)
 
     def close(self):  # Cleanup save and close instrument
-        if len(self.save_data) > 0:
+        if len(self.history) > 0:
             out = input('Do you want to save your data? y/n    ')
             yes_list = ['y', 'yes', 'Yes', 'Y', 'YES', True, 1, 'ok']
             if yes_list.count(out) > 0:
                 self.save_plot()
                 print('data saved')
+        if self.recorder is not None:
+            self.recorder.close()
+        self.history.close()# removes spilled chunk files
 
     def display_warnings(self):
         #TODO: include warnings from other submodules too
@@ -249,76 +319,63 @@ class plotsGUI:
             dpg.bind_item_theme('messages', 'warning_text_theme')
 
     def get_plot_data(self):
-        if self.take_real_data and int(self.MPOD.GetPowerCrate()):
-            v_actual = self.MPOD.GetAllVoltages()#Voltage data
-            i_actual = self.MPOD.GetAllCurrents()#Current data
+        #Runs in the acquisition thread: crate reads only, no dpg calls. Returns (time.monotonic() of the read, data)
+        read_time = time.monotonic()
+        if self.broker is not None:#plot every frame the broker publishes once, no crate traffic from here
+            frame = self.broker.WaitFrame(self.frame_seq, timeout = 1)
+            if frame is None:
+                return None
+            self.frame_seq = frame.seq
+            read_time = frame.time#when the broker read it, not when the wait began (monotonic is system wide)
+            v_actual, i_actual = frame.v_actual, frame.i_actual#already in FX.my_channels order
+        elif self.take_real_data and int(self.MPOD.GetPowerCrate()):
+            frame = self.MPOD.GetFrame(['v_actual', 'i_actual'])#one walk, rows keyed by channel number
+            v_actual = frame.Select('v_actual', self.FX.channel_locs)#Voltage data
+            i_actual = frame.Select('i_actual', self.FX.channel_locs)#Current data
         else: #dummy data
-            v_actual = [-0.101010, 0,1,2,3,4,5,6,7,8,9,10]
-            i_actual = [0,-1.512353251E-3,2.152351325E-3,3E-6,-4E-6,5E-6,6E-6,7E-6,8E-6,9E-6,10.13525E-6]
-        data = [None] * (len(self.FX.channel_locs)*2) # Create a result list of the correct size
-        data[::2] =[v_actual[idx] for idx in self.FX.channel_locs]
-        data[1::2] = [i_actual[idx] for idx in self.FX.channel_locs]
-        return data
+            v_actual = np.array([-0.101010, 0,1,2,3,4,5,6,7,8,9,10])[self.FX.channel_locs]
+            i_actual = np.array([0,-1.512353251E-3,2.152351325E-3,3E-6,-4E-6,5E-6,6E-6,7E-6,8E-6,9E-6,10.13525E-6])[self.FX.channel_locs]
+        data = np.empty(2*len(self.FX.channel_locs)) # Create a result list of the correct size
+        data[::2] = v_actual
+        data[1::2] = i_actual
+        return read_time, data
 
     def update_loop(self,update_data = True):
-        currentTime = np.array(time.monotonic() - self.startTime)
         if self.loop_plot:
             # DAQ process
             if self.MPOD is None:
                 self.create_data_task()
             update_data = True#self.MPOD.GetPowerCrate()
             if update_data and self.MPOD.initialized:#keeps buttons live when sample rate is low
-                instrument_data = self.get_plot_data()#takes data, updates table
-                append_data = np.array(instrument_data)
-                append_data = append_data * self.scale_factor 
-                if len(self.data_series) == 0:
-                    self.data_series = np.copy(append_data)
-                else:
-                    self.data_series = np.vstack((self.data_series, append_data))
-                    self.limit_vals = [np.min(self.data_series[:,::2]),np.max(self.data_series[:,::2]),np.min(self.data_series[:,1::2]),np.max(self.data_series[:,1::2])]
-
-                append_data = np.append(currentTime, append_data)
-                # Time series data
-                self.time_series = np.append(self.time_series, currentTime)
-                # Full data arrays for saving
-                if len(self.save_data) == 0:
-                    self.save_data = np.copy([append_data])
-                else:
-                    self.save_data = np.append(self.save_data, [append_data], axis = 0)
-                    if len(self.time_series) > 1:
-                        for i in range(self.n_outputs):# Plot data for all plots
-                            dpg.set_value(self.column_names[i + 1] + 'tag1', [self.time_series, np.ndarray.tolist(self.data_series[:, i])])
-
-                # Remove last element of plot data if length > max_data_size
-                if len(self.time_series) > self.max_data_size:
-                    self.data_series = np.delete(self.data_series, 0, 0)
-                    self.time_series = np.delete(self.time_series, 0)
-
-                # Updates data size counter
-                self.data_size = len(self.save_data + 1) * (self.FX.n_channels + 1)
-                dpg.set_value('datasize', f'{self.data_size:.2E}')
-                #Refresh plot
-                self.link_plot(0)#5 if self.flag==0 else 0)
-
-                # Auto saving
-                if dpg.get_value("Autosave"):
-                    self.n_autosave = dpg.get_value('NAutosave')
-                    if len(self.save_data) > (self.autosave_counter * self.n_autosave):
-                        if self.autosave == 0:
-                            self.save_plot()
-                            self.autosave = 1
-                            self.autosave_counter = len(self.save_data) // self.n_autosave
-                        else:
-                            # Generate full file path
-                            val = dpg.get_value("saveFilename")
-                            full_file_path = pathlib.Path(self.savefile_path + "/" + val + '.csv')
-                            df = pd.DataFrame(self.save_data[-self.n_autosave - 1:-1, :])  # New data to save
-                            df.to_csv(full_file_path, mode = 'a', index = False, header = False)  # Append new data
-                            self.autosave = self.autosave + 1
-                            dpg.set_value('messages', f'Autosave #{self.autosave}, data saved to: ' + str(full_file_path))
-                            dpg.bind_item_theme('messages', 'text_theme')
-                            self.autosave_counter = self.autosave_counter + 1
+                frames = self.acquisition.drain()#everything acquired since the last render frame
+                if not self.acquisition.running():#no acquisition thread (e.g. before start_app), read here
+                    frame = self.get_plot_data()
+                    frames = [] if frame is None else [frame]
+                # Auto saving: every frame is streamed to the run file while Autosave is checked
+                if dpg.get_value("Autosave") and self.recorder is None:
+                    self.start_recorder()
+                elif not dpg.get_value("Autosave") and self.recorder is not None:
+                    self.stop_recorder()
+                for frame_time, instrument_data in frames:
+                    currentTime = frame_time - self.startTime
+                    append_data = np.array(instrument_data) * self.scale_factor
+                    append_data = np.append(currentTime, append_data)
+                    self.pyramid.append(append_data)
+                    self.history.append(append_data)
+                    if self.recorder is not None:
+                        self.recorder.write(append_data)
+                if len(frames) > 0:
+                    if len(self.pyramid) > 1:
+                        self.limit_vals = self.update_plot_series()
+
+                    # Updates data size counter
+                    self.data_size = len(self.history) * (self.FX.n_channels + 1)
+                    dpg.set_value('datasize', f'{self.data_size:.2E}')
+                    #Refresh plot
+                    self.link_plot(0)#5 if self.flag==0 else 0)
             self.display_warnings()
+        else:
+            self.acquisition.drain()#plot stopped, discard so old frames are not plotted on restart
 
     ############################INITALIZATION###########################    
     def start_app(self):
@@ -460,13 +517,15 @@ class plotsGUI:
                 dpg.add_checkbox(label = 'Allow Overwrite', tag = 'enable_overwrite', default_value = False)
                 dpg.add_checkbox(label = 'Autosave', tag = 'Autosave', default_value = False,
                 callback = lambda: dpg.disable_item('NAutosave') if dpg.get_value('Autosave') else dpg.enable_item('NAutosave'))
-                dpg.add_input_int(label = 'N per autosave', tag = 'NAutosave', default_value = self.n_autosave, width = 100)
+                dpg.add_input_int(label = 'N per autosave sync', tag = 'NAutosave', default_value = self.n_autosave, width = 100)
+            dpg.add_checkbox(label = 'Follow newest data (uncheck to zoom/pan plots)', tag = 'follow_plot', default_value = True)
 
             dpg.add_separator()
             dpg.add_text("\nCurrent save file path: " + self.savefile_path, tag = 'dispFilePath', wrap = round(sum(widths[0:3]) * 0.9))  # Updates with selected file path
             with dpg.group(horizontal = True):
                 dpg.add_text("Name of save file (editable):")
-                dpg.add_input_text(label = ".csv    ", tag = "saveFilename", default_value = self.datestr, width = 200)
+                dpg.add_input_text(tag = "saveFilename", default_value = self.datestr, width = 200)
+                dpg.add_combo(['.csv', '.mpod'], tag = 'saveFormat', default_value = '.csv', width = 70)# .mpod: binary, see GUIExtras/RunFile.py
             
             with dpg.group(horizontal = True):
                 dpg.add_button(label = "Select save file path", tag = "PathSelector", callback = lambda: dpg.show_item("file_dialog_id"), width = widths[0])
@@ -488,16 +547,11 @@ class plotsGUI:
         ############ END APP CONFIG SETUP ########                
         # DearPyGUI window handle functions
         dpg.show_viewport()
-        t_zero = time.monotonic()  # For sample rate calc
-        t_one = 0 # For sample rate calc
+        self.acquisition.start()#polls the crate at sample_rate, independent of the frame rate
         while dpg.is_dearpygui_running() and self.run:
             dpg.render_dearpygui_frame()
-            # if self.sample_rate == 0 or t_one > 1 / self.sample_rate:
-            self.update_loop(True)  # Core DAQ and plotting loop
-                # t_zero = time.monotonic()
-            # else: 
-                # self.update_loop(False)
-            # t_one = time.monotonic() - t_zero # For sample rate calc                               
+            self.update_loop(True)  # Plots frames from the acquisition thread, never waits on the crate
+        self.acquisition.stop()
         # self.close()
         dpg.destroy_context()
 
@@ -0,0 +1,19 @@
+#Fixtures for the tests: a simulated crate (MPODSimulator) on a local UDP port, no crate or snmp tools needed
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from Driver.MPODClass import MPOD
+from Driver.MPODSimulator import CrateSimulator
+
+@pytest.fixture
+def sim():
+    sim = CrateSimulator({0: 8, 1: 4}).Start()
+    yield sim
+    sim.Stop()
+
+@pytest.fixture
+def mpod(sim):
+    mpod = MPOD('127.0.0.1', port = sim.port)
+    yield mpod
+    mpod.Close()
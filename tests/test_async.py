@@ -0,0 +1,66 @@
+#MPODAsync: the asyncio driver against the simulated crate (coroutines run with asyncio.run)
+import asyncio
+import numpy as np
+from Driver.MPODAsync import AsyncMPOD
+from Driver.MPODStatus import AnyFlag, FlagMask
+from Driver.MPODTransport import EncodeMessage, RESPONSE, ResolveOID
+
+def Run(sim, test, **kwargs):
+    '''Run test(mpod) on a connected AsyncMPOD'''
+    async def main():
+        async with AsyncMPOD('127.0.0.1', port = sim.port, **kwargs) as mpod:
+            return await test(mpod)
+    return asyncio.run(main())
+
+def test_replies_matched_by_request_id(sim):
+    '''Requests in flight together each get their own reply, a reply nobody waits for is only counted'''
+    sim.v_target[:] = sim.channels + 0.5
+    async def test(mpod):
+        assert mpod.channels == list(sim.channels) and mpod.initialized
+        values = await asyncio.gather(*(mpod.GetTargetVoltage(ch) for ch in reversed(sim.channels)))
+        columns = await asyncio.gather(mpod.GetAllTargetVoltages(), mpod.GetAllPowers(), mpod.GetPowerCrate())
+        transport = mpod.transport
+        transport.datagram_received(EncodeMessage('public', RESPONSE, transport.request_id + 100,
+                                                  [(ResolveOID('outputSwitch.u0'), 'i', 1)]), None)
+        return values, columns, transport
+    values, (v_target, powers, pwr_crate), transport = Run(sim, test)
+    assert values == list(reversed(sim.channels + 0.5)) and v_target == list(sim.channels + 0.5)
+    assert powers == [0]*len(sim.channels) and pwr_crate == 1
+    assert transport.pending == {} and transport.late == 1
+
+def test_resend_after_dropped_reply(sim):
+    async def test(mpod):
+        sim.loss = 1.
+        request = asyncio.ensure_future(mpod.GetAllNames())
+        await asyncio.sleep(0.08)#first tries dropped
+        sim.loss = 0.
+        return await request, mpod.warnings
+    names, warnings = Run(sim, test, timeout = 0.05, retries = 5)
+    assert names == list(sim.channels) and warnings == []
+    assert sim.Stats()['dropped'] >= 1
+
+def test_timeout_gives_none_and_warning(sim):
+    async def test(mpod):
+        sim.loss = 1.
+        return await asyncio.gather(mpod.GetVoltage(0), mpod.GetAllCurrents(), mpod.SetPower(0, 1)), mpod.warnings
+    (voltage, currents, accepted), warnings = Run(sim, test, timeout = 0.05, retries = 1)
+    assert voltage is None and np.all(np.isnan(currents)) and len(currents) == len(sim.channels) and accepted is False
+    assert len(warnings) >= 3 and all('SNMP command failed' in w or 'No reply' in w for w in warnings)
+    assert sim.on[0]#the SET was applied, only its reply was lost
+
+def test_get_frame_and_wait_voltages(sim):
+    sim.v_rise[:] = 3000.
+    async def test(mpod):
+        await asyncio.gather(*(mpod.SetTargetVoltage(ch, 100.) for ch in (0, 101)))
+        await asyncio.gather(*(mpod.SetPower(ch, 1) for ch in (0, 101)))
+        reached = await mpod.WaitVoltages([0, 101], [100., 100.], interval = 0.02, timeout = 2)
+        frame = await mpod.GetFrame(['v_target', 'v_actual', 'pwr_ch', 'status'])
+        stuck = await mpod.WaitVoltages([1], [100.], interval = 0.02, timeout = 0.1)
+        return reached, frame, stuck, await mpod.GetStatusArray()
+    reached, frame, stuck, words = Run(sim, test)
+    rows = frame.map.Rows([0, 101])
+    assert reached and not stuck
+    assert list(frame['v_target'][rows]) == [100., 100.] and np.allclose(frame['v_actual'][rows], 100.)
+    assert list(frame['pwr_ch']) == [1 if ch in (0, 101) else 0 for ch in sim.channels]
+    assert np.array_equal(frame['status'], words)
+    assert list(AnyFlag(words, FlagMask(['ON']))) == list(rows)
@@ -0,0 +1,40 @@
+#Batched SETs: MPOD.SendBatch, batch() and SendMultiple against the simulated crate
+import threading
+
+def test_batch_with_rejected_varbind(sim, mpod):
+    '''The agent rejects the whole PDU, the driver drops the bad varbind and resends the others'''
+    with mpod.batch() as b:
+        b.set_voltage(0, 100)
+        b.set("outputSwitch.u0 i 7")#not a valid switch value
+        b.set_voltage(101, 200)
+        b.get_target_voltage(0)
+    assert [cmd for cmd, error in b.errors] == ["outputSwitch.u0 i 7"]
+    assert b.errors[0][1] == 'wrongValue'
+    assert sim.v_target[sim.row[0]] == 100. and sim.v_target[sim.row[101]] == 200.
+    assert b.values == [100.]
+
+def test_send_multiple(sim, mpod):
+    '''Gathered SETs go out together with one (reply, error) per command, in order'''
+    before = sim.Stats()['requests']
+    mpod.SendMultiple('start')
+    mpod.SetTargetVoltage(0, 500)
+    mpod.SetTargetVoltage(1, 1000)
+    mpod.SetPower(0, 1)
+    mpod.SetPower(1, 1)
+    assert sim.Stats()['requests'] == before#nothing sent yet
+    results = mpod.SendMultiple('end')
+    assert [error for reply, error in results] == [None]*4
+    assert sim.Stats()['requests'] - before <= 2#same object twice: two PDUs at most
+    assert list(sim.v_target[sim.Rows([0, 1])]) == [500., 1000.] and list(sim.on[sim.Rows([0, 1])]) == [True, True]
+
+def test_send_multiple_is_per_thread(sim, mpod):
+    '''A read from another thread while a script gathers is sent at once, not held in the batch'''
+    mpod.SendMultiple('start')
+    mpod.SetTargetVoltage(0, 300)
+    values = []
+    reader = threading.Thread(target = lambda: values.append(mpod.GetAllTargetVoltages()))
+    reader.start()
+    reader.join(5)
+    assert values and values[0][sim.row[0]] == 0.
+    mpod.SendMultiple('end')
+    assert sim.v_target[sim.row[0]] == 300.
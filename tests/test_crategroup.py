@@ -0,0 +1,68 @@
+#MPODCrateGroup: two simulated crates as one group
+import numpy as np
+import pytest
+from Driver.MPODClass import MPOD
+from Driver.MPODCrateGroup import CrateGroup, ChannelAddress, ParseAddress
+from Driver.MPODSimulator import CrateSimulator
+from Driver.MPODStatus import AnyFlag, FlagMask
+
+@pytest.fixture
+def crates():
+    sims = {'top': CrateSimulator({0: 4, 1: 2}).Start(), 'bottom': CrateSimulator({0: 2, 3: 3}).Start()}
+    group = CrateGroup({name: MPOD('127.0.0.1', port = sim.port) for name, sim in sims.items()})
+    yield group, sims
+    group.Map('Close')
+    group.Close()
+    for sim in sims.values():
+        sim.Stop()
+
+def test_addresses():
+    assert ChannelAddress('top', 103) == 'top:1:3' and ParseAddress('top:1:3') == ('top', 103)
+    assert ParseAddress(ChannelAddress('a', 0)) == ('a', 0) and ParseAddress('x:y:2:15') == ('x:y', 215)
+    with pytest.raises(ValueError):
+        CrateGroup({'a:b': None})
+
+def test_channels_and_rows(crates):
+    group, sims = crates
+    assert group.channels == ['top:0:0', 'top:0:1', 'top:0:2', 'top:0:3', 'top:1:0', 'top:1:1',
+                              'bottom:0:0', 'bottom:0:1', 'bottom:3:0', 'bottom:3:1', 'bottom:3:2']
+    assert list(group.Rows(['bottom:3:2', 'top:0:1', 'top:7:0'])) == [10, 1, -1]
+    assert list(group.crate_rows['bottom']) == [6, 7, 8, 9, 10]
+    assert group.ByCrate(['bottom:3:1', 'top:1:0', 'bottom:0:0', 'side:0:0']) == {'bottom': [301, 0], 'top': [100]}
+    assert group.warnings == ['side:0:0: no crate named side']
+
+def test_get_frame_merges_crates(crates):
+    group, sims = crates
+    for name, sim in sims.items():
+        sim.v_target[:] = sim.channels + (1000 if name == 'bottom' else 0)
+    sims['bottom'].on[-1] = True
+    frame = group.GetFrame(['v_target', 'pwr_ch'])
+    assert list(frame['v_target']) == [0, 1, 2, 3, 100, 101, 1000, 1001, 1300, 1301, 1302]
+    assert list(frame['pwr_ch']) == [0]*10 + [1]
+    assert list(AnyFlag(group.GetStatusArray(), FlagMask(['ON']))) == [10]
+    assert group.GetPowerCrate() == {'top': 1, 'bottom': 1}
+
+def test_ramp_all_per_crate(crates):
+    group, sims = crates
+    errors = group.RampAll({'top:1:1': 500, 'bottom:3:0': 1200, 'bottom:0:1': 50})
+    assert errors == {'top': [], 'bottom': []}
+    assert sims['top'].v_target[sims['top'].Rows([101])] == 500 and sims['top'].on.sum() == 1
+    assert list(sims['bottom'].v_target[sims['bottom'].Rows([300, 1])]) == [1200, 50] and sims['bottom'].on.sum() == 2
+    group.RampDown(['bottom:3:0'])
+    assert sims['bottom'].v_target[sims['bottom'].Rows([300])] == 0 and sims['bottom'].on.sum() == 2#ramps down, still on
+    group.EmergencyOff()
+    assert not sims['top'].on.any() and sims['bottom'].emergency.all() and sims['top'].emergency.all()
+    group.ResetEmergency(['top:1:1'])
+    assert list(np.flatnonzero(~sims['top'].emergency)) == [5]
+
+def test_failed_crate_does_not_stop_the_others(crates):
+    group, sims = crates
+    def broken(*args):
+        raise ConnectionError('crate gone')
+    group.crates['top'].GetFrame = broken
+    sims['bottom'].v_target[:] = 7.
+    frame = group.GetFrame(['v_target'])
+    assert np.all(np.isnan(frame['v_target'][:6])) and np.all(frame['v_target'][6:] == 7.)
+    assert group.warnings == ["Crate top: ConnectionError('crate gone')"]
+    result = group.Each({'top': (broken, ()), 'bottom': (lambda: 'ok', ())})
+    assert result == {'top': None, 'bottom': 'ok'}
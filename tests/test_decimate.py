@@ -0,0 +1,52 @@
+#GUIExtras.Decimate.MinMaxPyramid and DataBuffer.HistoryStore: plot data at any zoom
+import numpy as np
+from GUIExtras.DataBuffer import HistoryStore
+from GUIExtras.Decimate import MinMaxPyramid
+
+def Fill(n_rows, capacity = 500, chunk_rows = 1000):
+    history = HistoryStore(3, chunk_rows = chunk_rows)
+    pyramid = MinMaxPyramid(3, capacity, history = history)
+    for k in range(n_rows):
+        row = [0.1*k, np.sin(k/10), k]
+        pyramid.append(row)
+        history.append(row)
+    return pyramid, history
+
+def test_history_search_across_chunks():
+    pyramid, history = Fill(25000)
+    try:
+        t = history.rows()[:, 0]
+        for value in (-1, 0, 0.05, 99.95, 100., 1234.5, 2499.9, 3000):
+            for side in ('left', 'right'):
+                assert history.search(value, side) == np.searchsorted(t, value, side)
+        assert history.search(100., 'left', start = 5000) == 5000
+    finally:
+        history.close()
+
+def test_zoom_into_old_data_is_full_resolution():
+    '''Level 0 holds the newest 500 rows (t > 2450 s): 100-110 s comes from history, raw'''
+    pyramid, history = Fill(25000)
+    try:
+        x, y = pyramid.series(2, 100, 110, n_points = 1000)
+        assert np.allclose(x, 0.1*np.arange(999, 1102))#one row past each edge
+        assert np.array_equal(y, np.arange(999, 1102))
+        x, y = pyramid.series(2, 0, 2000, n_points = 1000)#too many raw rows: min/max buckets
+        assert len(x) <= 1000 and y.min() == 0
+        x, y = pyramid.series(2, 2460, 2470, n_points = 1000)#inside level 0
+        assert np.array_equal(y, np.arange(24599, 24702))
+    finally:
+        history.close()
+
+def test_zoom_after_refresh_ignores_older_runs():
+    '''refresh_plot clears the pyramid and restarts t=0, history keeps the older rows'''
+    pyramid, history = Fill(3000)
+    try:
+        pyramid.clear()
+        for k in range(1000):
+            row = [0.1*k, 0., -k]
+            pyramid.append(row)
+            history.append(row)
+        x, y = pyramid.series(2, 10, 11, n_points = 1000)
+        assert np.array_equal(y, -np.arange(99, 112))
+    finally:
+        history.close()
@@ -0,0 +1,31 @@
+#Channel keyed results: ChannelMap, ChannelFrame and MPOD.GetFrame/AlignColumn against the simulated crate
+import numpy as np
+from Driver.MPODFrame import ChannelMap, ChannelFrame
+
+def test_channel_map_and_frame():
+    cmap = ChannelMap([0, 1, 100, 101])
+    assert list(cmap.Rows([101, 0, 7])) == [3, 0, -1]
+    frame = ChannelFrame(cmap, ['v_actual'])
+    unknown = frame.Fill('v_actual', [101, 7, 0], [5., 6., 7.], scale = 2)
+    assert list(unknown) == [7]
+    assert np.array_equal(frame['v_actual'], [14., np.nan, np.nan, 10.], equal_nan = True)
+    assert list(frame.Missing('v_actual')) == [1, 100]
+    assert list(frame.Select('v_actual', cmap.Rows([101]))) == [10.]
+
+def test_get_frame_matches_simulator(sim, mpod):
+    sim.v_target[:] = 100.
+    sim.on[:4] = True
+    frame = mpod.GetFrame(['v_target', 'pwr_ch'])
+    rows = mpod.channel_map.Rows(list(sim.channels))
+    assert np.all(frame['v_target'][rows] == 100.)
+    assert list(frame['pwr_ch'][rows]) == [1]*4 + [0]*(len(sim.channels) - 4)
+
+def test_values_placed_by_channel_number(sim, mpod):
+    '''A channel list that differs from the crate's: values land in their own rows, never shifted'''
+    sim.v_target[:] = sim.channels*1.
+    mpod.channel_map = ChannelMap([101, 0, 999, 1])
+    frame = mpod.GetFrame(['v_target'])
+    assert np.array_equal(frame['v_target'], [101., 0., np.nan, 1.], equal_nan = True)
+    assert any('not in the channel list' in w for w in mpod.warnings)
+    assert np.array_equal(mpod.AlignColumn(mpod.Send('walk', 'outputVoltage'), 'float array', 'outputVoltage'),
+                          [101., 0., np.nan, 1.], equal_nan = True)
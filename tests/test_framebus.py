@@ -0,0 +1,104 @@
+#MPODFrameBus: CrateFrames through shared memory, publisher and a read only reader in one process
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from Driver.MPODFrame import CrateFrame
+from Driver.MPODFrameBus import FrameBus, LOCK, PID
+
+CHANNELS, MODULES = [0, 1, 2, 101], [0, 1]
+
+def Frame(seq):
+    values = {field: np.arange(len(MODULES if field in CrateFrame.MODULE_FIELDS else CHANNELS)) + seq
+              for field in CrateFrame.CHANNEL_FIELDS + CrateFrame.MODULE_FIELDS}
+    values['pwr_crate'] = 1
+    return CrateFrame(seq, 1000. + seq, CHANNELS, MODULES, values, {field: 1000. + seq for field in CrateFrame.FIELDS})
+
+@pytest.fixture
+def bus():
+    bus = FrameBus.Create(CHANNELS, MODULES, f'mpod_test_{os.getpid()}', slots = 4)
+    yield bus
+    bus.Close()
+
+def test_publish_and_read(bus):
+    reader = FrameBus.Attach(bus.name)
+    try:
+        assert reader.Read() is None and reader.Seq() == 0
+        bus.Publish(Frame(1))
+        frame = reader.Read()
+        assert (frame.seq, frame.time, frame.pwr_crate) == (1, 1001., 1)
+        assert frame.channels == tuple(CHANNELS) and frame.modules == tuple(MODULES)
+        for field in CrateFrame.CHANNEL_FIELDS + CrateFrame.MODULE_FIELDS:
+            assert np.array_equal(frame[field], Frame(1)[field])
+        assert frame.updated['v_actual'] == 1001.
+        with pytest.raises(PermissionError):
+            reader.Publish(Frame(2))
+    finally:
+        reader.Close()
+
+def test_ring_overwrite(bus):
+    reader = FrameBus.Attach(bus.name)
+    try:
+        view = None
+        for seq in range(1, 7):
+            bus.Publish(Frame(seq))
+            if seq == 2:
+                view = reader.View()
+        assert [frame.seq for frame in reader.Since(0)] == [3, 4, 5, 6]#4 slots
+        assert reader.Frame(2) is None
+        assert not reader.Valid(view)#its slot now holds seq 6
+        bus.Publish(Frame(6))#not newer, ignored
+        assert reader.WaitFrame(5, timeout = 0.1).seq == 6 and reader.WaitFrame(6, timeout = 0.05) is None
+    finally:
+        view = None
+        reader.Close()
+
+def test_reserve_then_configure():
+    '''The name is taken before the channels are known, readers wait for Configure'''
+    bus = FrameBus.Reserve(10, 4, f'mpod_test_reserve_{os.getpid()}', slots = 2)
+    try:
+        with pytest.raises(ValueError):
+            FrameBus.Attach(bus.name)
+        with pytest.raises(FileExistsError):
+            FrameBus.Reserve(10, 4, bus.name)
+        bus.Configure(CHANNELS, MODULES)
+        bus.Publish(Frame(1))
+        reader = FrameBus.Attach(bus.name)
+        assert np.array_equal(reader.Read().v_actual, Frame(1).v_actual)
+        reader.Close()
+    finally:
+        bus.Close()
+
+def test_views_are_read_only_and_seqlock(bus):
+    reader = FrameBus.Attach(bus.name)
+    try:
+        bus.Publish(Frame(1))
+        view = reader.View()
+        with pytest.raises(ValueError):
+            view.v_actual[0] = 5.
+        assert reader.Valid(view)
+        bus.slot_words[1, LOCK] += 1#publisher stopped half way through the slot
+        assert reader.Frame(1) is None and not reader.Valid(view)
+        bus.slot_words[1, LOCK] += 1
+        assert reader.Read().seq == 1 and reader.Valid(view)
+    finally:
+        view = None
+        reader.Close()
+
+def test_block_of_dead_publisher_is_replaced():
+    name = f'mpod_test_stale_{os.getpid()}'
+    child = subprocess.Popen([sys.executable, '-c', ''])
+    child.wait()
+    crashed = FrameBus.Create(CHANNELS, MODULES, name, slots = 2)
+    crashed.Publish(Frame(3))
+    crashed.header[PID] = child.pid#as if the publisher was that (exited) process
+    crashed.owner = False#crash: the block is never unlinked
+    crashed.Close()
+    bus = FrameBus.Create(CHANNELS[:2], MODULES, name, slots = 2)
+    try:
+        reader = FrameBus.Attach(name)
+        assert reader.channels == tuple(CHANNELS[:2]) and reader.Read() is None
+        reader.Close()
+    finally:
+        bus.Close()
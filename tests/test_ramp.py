@@ -0,0 +1,74 @@
+#MPODRamp.RampEngine against the simulated crate
+import time
+import numpy as np
+from Driver.MPODRamp import RampEngine
+
+def test_abort_holds_at_present_voltage(mpod):
+    '''No poller: Abort must read the voltages itself, not hold at the start voltage of the last Step'''
+    ramp = RampEngine(mpod)
+    channels = mpod.channels[:2]
+    ramp.Start({channels[0]: 1000, channels[1]: 500}, rate = 100)
+    time.sleep(1.0)
+    assert ramp.Abort() == 'aborted'
+    frame = mpod.GetFrame(['v_actual', 'v_target'])
+    rows = mpod.channel_map.Rows(channels)
+    assert np.all(frame['v_target'][rows] > 20)#moved away from 0 V (the 500 V channel ramps at 50 V/s)
+    assert np.allclose(frame['v_target'][rows], frame['v_actual'][rows], atol = 10)#about 0.1 s of ramp
+    assert ramp.Progress()['progress'] > 0
+
+def test_ramp_done(sim, mpod):
+    '''Channels ramp together: proportional rates, both arrive, old rates are put back'''
+    ramp = RampEngine(mpod)
+    channels = mpod.channels[:2]
+    rows = sim.Rows(channels)
+    sim.v_rise[rows] = 5.
+    ramp.Start({channels[0]: 200, channels[1]: -100}, rate = 400)
+    assert list(sim.v_rise[rows]) == [400., 200.]#100 V at half the rate of 200 V
+    assert ramp.Run(tick = 0.05)['state'] == 'done'
+    assert np.allclose(sim.v[rows], [200, -100], atol = 1)
+    assert list(sim.v_rise[rows]) == [5., 5.]
+    assert ramp.Progress()['done'] == list(channels)
+
+def test_ramp_fault_holds_the_others(sim, mpod):
+    '''A trip on one channel: the other channel stops where it is (fault_action 'hold')'''
+    faults = []
+    ramp = RampEngine(mpod, on_fault = lambda r, channels: faults.append(channels))
+    channels = mpod.channels[:2]
+    sim.SetLoad([channels[0]], 1e5)#0.5 mA limit reached at 50 V, trips 100 ms later
+    ramp.Start({channels[0]: 500, channels[1]: 500}, rate = 100)
+    assert ramp.Run(tick = 0.05)['state'] == 'fault'
+    assert faults == [[channels[0]]]
+    row = sim.row[channels[1]]
+    assert 30 < sim.v_target[row] < 400 and abs(sim.v_target[row] - sim.v[row]) < 10
+    assert ramp.Progress()['faulted'] == [channels[0]]
+    assert list(sim.v_rise[sim.Rows(channels)]) == [30., 30.]#ramp rates replaced by the ones from before Start
+
+def test_ramp_inhibit_ramps_down(sim, mpod):
+    '''fault_action 'down': an inhibited channel sends every channel back to 0 V'''
+    ramp = RampEngine(mpod, fault_action = 'down')
+    channels = mpod.channels[:2]
+    ramp.Start({channels[0]: 500, channels[1]: 500}, rate = 100)
+    time.sleep(0.3)
+    sim.Inhibit([channels[1]])
+    assert ramp.Run(tick = 0.05)['state'] == 'fault'
+    assert list(sim.v_target[sim.Rows(channels)]) == [0., 0.]
+
+def test_ramp_without_power_on_is_not_a_fault(sim, mpod):
+    '''power_on False: channels still off are waiting to be switched on, not dropped out'''
+    ramp = RampEngine(mpod)
+    channels = mpod.channels[:2]
+    ramp.Start({channels[0]: 100, channels[1]: 50}, rate = 100, power_on = False)
+    assert ramp.Step() == 'ramping'
+    mpod.SetPower(channels[0], 1)
+    mpod.SetPower(channels[1], 1)
+    assert ramp.Run(tick = 0.05)['state'] == 'done'
+
+def test_ramp_timeout_restores_rates(sim, mpod):
+    ramp = RampEngine(mpod, timeout_factor = 0.1, grace = 0)
+    channels = mpod.channels[:2]
+    rows = sim.Rows(channels)
+    sim.v_rise[rows], sim.v_fall[rows] = 5., 7.
+    ramp.Start({channels[0]: 100, channels[1]: 10}, rate = 20)
+    assert sim.v_rise[rows][1] == 2.
+    assert ramp.Run(tick = 0.05)['state'] == 'timeout'
+    assert list(sim.v_rise[rows]) == [5., 5.] and list(sim.v_fall[rows]) == [7., 7.]
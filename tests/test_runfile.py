@@ -0,0 +1,83 @@
+#GUIExtras.RunFile: binary run files, their reader and the save_plot CSV conversion
+import numpy as np
+import pytest
+from GUIExtras.RunFile import RunFileWriter, RunFileReader, CSVToRunFile, RunFileToCSV
+
+COLUMNS = ['t[s]', 'V0[V]', 'I0[uA]', 'V101[V]']
+
+def Rows(n, start = 0):
+    t = np.arange(start, start + n)*0.5
+    return np.column_stack([t, np.sin(t), np.cos(t)*1e-3, t*100.])
+
+def test_write_and_read_back(tmp_path):
+    '''write and write_rows mixed across sync boundaries (sync_every 8): rows stay in order'''
+    path = tmp_path/'run.mpod'
+    data = Rows(100)
+    with RunFileWriter(path, COLUMNS, scale_factor = [1, 1e6, 1], sync_every = 8, channels = [0, 101],
+                       channel_names = ['a', 'b']) as run:
+        for row in data[:5]:
+            run.write(row)
+        run.write_rows(data[5:30])#fills the open block, then whole blocks one row at a time
+        run.sync()
+        run.write_rows(data[30:70])#empty block: straight to the file
+        run.write(data[70])
+        run.write_rows(data[71:73])
+        run.write_rows(np.empty((0, 4)))
+        run.write_rows(data[73:])
+        assert run.n_rows == 100
+    reader = RunFileReader(path)
+    assert len(reader) == 100 and reader.columns == COLUMNS and reader.offset % 64 == 0
+    assert np.array_equal(reader.data, data)
+    assert reader.header['units'] == ['s', 'V', 'uA', 'V'] and reader.header['channels'] == [0, 101]
+    assert reader.header['scale_factor'] == [1., 1e6, 1.] and reader.header['channel_names'] == ['a', 'b']
+    t, v = reader.range(10, 20, 'V101[V]')
+    assert np.array_equal(t, data[20:40, 0]) and np.array_equal(v, data[20:40, 3])
+    assert np.array_equal(reader.column('I0[uA]'), data[:, 2]) and np.array_equal(reader.rows(45.), data[90:])
+
+def test_float32_and_cut_short_row(tmp_path):
+    path = tmp_path/'run.mpod'
+    with RunFileWriter(path, COLUMNS, dtype = '<f4') as run:
+        run.write_rows(Rows(10))
+    with open(path, 'ab') as f:
+        f.write(b'\x00'*6)#a row cut short by a crash
+    reader = RunFileReader(path)
+    assert len(reader) == 10 and reader.data.dtype == np.float32
+    assert np.array_equal(reader.data, Rows(10).astype(np.float32))
+    path = tmp_path/'empty.mpod'
+    RunFileWriter(path, COLUMNS).close()
+    assert len(RunFileReader(path)) == 0 and RunFileReader(path).data.shape == (0, 4)
+
+def test_csv_round_trip(tmp_path):
+    '''save_plot layout: header line, one row per line, scale factors in _scale.csv'''
+    csv_path = tmp_path/'plot.csv'
+    data = Rows(25)
+    with open(csv_path, 'w') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        f.writelines(','.join(map(repr, row)) + '\n' for row in data.tolist())
+        f.write('\n')
+    with open(tmp_path/'plot_scale.csv', 'w') as f:
+        f.write(','.join(COLUMNS[1:]) + '\n1.0,1000000.0,1.0\n')
+    run_path = CSVToRunFile(csv_path, block_rows = 7)
+    assert run_path == str(tmp_path/'plot.mpod')
+    reader = RunFileReader(run_path)
+    assert np.array_equal(reader.data, data) and reader.header['scale_factor'] == [1., 1e6, 1.]
+    back = RunFileToCSV(run_path, tmp_path/'back.csv', block_rows = 7)
+    assert open(back).read() == open(csv_path).read().rstrip('\n') + '\n'
+    assert open(tmp_path/'back_scale.csv').read() == open(tmp_path/'plot_scale.csv').read()
+
+def test_refuses_to_overwrite(tmp_path):
+    path = tmp_path/'run.mpod'
+    with RunFileWriter(path, COLUMNS) as run:
+        run.write(Rows(1)[0])
+    with pytest.raises(FileExistsError):
+        RunFileWriter(path, COLUMNS)
+    assert len(RunFileReader(path)) == 1#untouched
+    with pytest.raises(FileExistsError):
+        CSVToRunFile(RunFileToCSV(path), path)
+    CSVToRunFile(tmp_path/'run.csv', path, overwrite = True)
+    assert len(RunFileReader(path)) == 1
+    RunFileWriter(path, COLUMNS, overwrite = True).close()
+    assert len(RunFileReader(path)) == 0
+    (tmp_path/'other.bin').write_bytes(b'not a run file')
+    with pytest.raises(ValueError):
+        RunFileReader(tmp_path/'other.bin')
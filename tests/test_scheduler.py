@@ -0,0 +1,61 @@
+#MPODScheduler.PollScheduler: which fields are due
+import time
+import numpy as np
+from Driver.MPODCustomFunctions import CustomFx
+from Driver.MPODFrame import CrateFrame
+from Driver.MPODScheduler import PollScheduler
+from Driver.MPODStatus import FlagMask
+
+def Frame(seq, **changes):
+    values = {field: np.zeros(2) for field in CrateFrame.CHANNEL_FIELDS}
+    values.update({field: np.zeros(1) for field in CrateFrame.MODULE_FIELDS})
+    values['pwr_crate'] = 1
+    values.update(changes)
+    return CrateFrame(seq, float(seq), [0, 1], [0], values, {})
+
+def test_set_during_walk_stays_due():
+    '''A SET whose Invalidate lands while a walk is running must be re-read on the next frame'''
+    scheduler = PollScheduler()
+    scheduler.Done(scheduler.Due(now = 100.), 100.)
+    assert 'v_target' not in scheduler.Due(now = 100.5)
+    read_time = 101.
+    fields = ['v_actual', 'i_actual', 'v_target', 'i_limit']#walk starts at read_time
+    scheduler.Invalidate(['outputVoltage.u0'], now = 101.2)#SET sent during the walk
+    scheduler.Done(fields, read_time)#walk ends
+    assert 'v_target' in scheduler.Due(now = 101.3)
+    scheduler.Done(scheduler.Due(now = 101.3), 101.3)
+    assert 'v_target' not in scheduler.Due(now = 101.4)
+
+def test_idle_and_active_intervals():
+    scheduler = PollScheduler()
+    scheduler.Done(scheduler.Due(now = 100.), 100.)
+    assert set(scheduler.Due(now = 100.5)) == {'v_actual', 'i_actual', 'pwr_crate', 'pwr_ch'}
+    assert 'status' in scheduler.Due(now = 101.)#idle: status words once a second
+    scheduler.Activate(now = 101.)
+    assert 'status' in scheduler.Due(now = 100.5) and 'v_target' in scheduler.Due(now = 101.)
+    assert scheduler.Interval(now = 101.) == 0.2 and scheduler.Interval(now = 200.) == 1.0
+
+def test_observe_status_change():
+    '''A new status bit without a switch change (trip, inhibit) starts active mode'''
+    scheduler = PollScheduler()
+    scheduler.Observe(Frame(2), Frame(1))
+    assert not scheduler.Active()
+    scheduler.Observe(Frame(3, status = np.array([0, FlagMask(['TRIP'])])), Frame(2))
+    assert scheduler.Active()
+    scheduler = PollScheduler()
+    scheduler.Observe(Frame(2, pwr_ch = np.array([1, 0]), v_target = np.array([100, 0]), v_actual = np.array([50, 0])), Frame(1))
+    assert scheduler.Active()#ramping
+
+def test_inhibit_read_by_get_all_values(sim, mpod):
+    '''Inhibit on a channel that is off: only the status word changes'''
+    fx = CustomFx(mpod)
+    fx.scheduler.active_until = -float('inf')
+    time.sleep(1.05)
+    fx.GetAllValues()
+    assert not fx.scheduler.Active()
+    sim.Inhibit([1])
+    time.sleep(1.05)
+    fx.GetAllValues()
+    row = fx.my_channels.index(1)
+    assert int(fx.last_frame.status[row]) & FlagMask(['INHIBIT'])
+    assert fx.scheduler.Active()
@@ -0,0 +1,88 @@
+#MPODSimulator.CrateSimulator: the crate model and the agent rules the driver relies on
+import numpy as np
+import pytest
+from Driver.MPODSimulator import CrateSimulator, CHANNEL_FLAGS, ERRORS
+from Driver.MPODTransport import GET, SET, GETBULK, EncodeMessage, DecodeMessage, ResolveOID, NO_SUCH_VALUES, NativeTransport
+
+def Request(sim, community, pdu_tag, varbinds, error_status = 0, error_index = 0):
+    '''One request through the agent without the socket: (request id, status, index, varbinds) or None if unanswered'''
+    reply, n_varbinds = sim.Handle(EncodeMessage(community, pdu_tag, 1, varbinds, error_status, error_index))
+    return None if reply is None else DecodeMessage(reply)
+
+def test_trip_after_trip_time():
+    '''1 MOhm at the 0.5 mA limit: over the limit from 500 V, tripped 100 ms later, off without ramp'''
+    sim = CrateSimulator({0: 2})
+    t = sim.last_update
+    sim.load[1] = 1e6
+    sim.v_target[:], sim.on[:] = 1000., True
+    sim.Update(t + 16.)#30 V/s: 480 V
+    assert not sim.trip.any() and np.isnan(sim.over_since[1])
+    sim.Update(t + 16.7)
+    assert np.isclose(sim.over_since[1], t + 500/30)#when the ramp crossed 500 V, not when it was seen
+    sim.Update(t + 16.7 + 0.05)
+    assert sim.on[1] and not sim.trip[1]
+    sim.Update(t + 16.8)
+    assert not sim.on[1] and sim.trip[1] and sim.v[1] == 0
+    assert sim.StatusWord(1) & CHANNEL_FLAGS['TRIP'] and sim.on[0]#10 MOhm channel keeps ramping
+    assert sim.Set([(ResolveOID('outputSwitch.u1'), 1)]) == (0, 0) and not sim.on[1]#tripped: can't switch on
+    sim.Set([(ResolveOID('outputSwitch.u1'), 10), (ResolveOID('outputSwitch.u1'), 1)])#clearEvents, then on
+    assert sim.on[1] and not sim.trip[1]
+
+def test_main_switch_off_hides_tables():
+    sim = CrateSimulator({0: 2})
+    sim.v[:], sim.on[:] = 100., True
+    oids = [ResolveOID('outputVoltage.u0'), ResolveOID('sysMainSwitch.0')]
+    assert Request(sim, 'guru', SET, [(ResolveOID('sysMainSwitch.0'), 'i', 0)])[1] == 0
+    assert not sim.on.any() and not sim.v.any()
+    values = [value for oid, value in Request(sim, 'public', GET, [(oid, None, None) for oid in oids])[3]]
+    assert values == [NO_SUCH_VALUES[0x81], 0]
+    reply = Request(sim, 'public', GETBULK, [(ResolveOID('outputVoltage'), None, None)], 0, 10)[3]
+    assert reply == [(ResolveOID('outputVoltage'), NO_SUCH_VALUES[0x82])]#walk finds no channels
+    status, index = Request(sim, 'guru', SET, [(ResolveOID('outputSwitch.u0'), 'i', 1)])[1:3]
+    assert (status, index) == (ERRORS['noCreation'], 1)
+
+def test_wrong_community_not_answered():
+    sim = CrateSimulator({0: 2})
+    oid = ResolveOID('outputSwitch.u0')
+    assert Request(sim, 'guru', GET, [(oid, None, None)]) is None
+    assert Request(sim, 'public', SET, [(oid, 'i', 1)]) is None and not sim.on[0]
+    with sim:
+        transport = NativeTransport('127.0.0.1', sim.port, read_community = 'private', timeout = 0.05)
+        try:
+            with pytest.raises(OSError):#the client times out
+                transport.Get([oid])
+        finally:
+            transport.Close()
+
+def test_bulk_reply_cut_to_max_message_size():
+    sim = CrateSimulator({0: 48, 1: 48})
+    roots = [ResolveOID('outputVoltage'), ResolveOID('outputName')]
+    reply, n_varbinds = sim.Handle(EncodeMessage('public', GETBULK, 1, [(oid, None, None) for oid in roots], 0, 1000))
+    assert len(reply) <= sim.max_message_size
+    varbinds = DecodeMessage(reply)[3]
+    assert 0 < len(varbinds) < 2*len(sim.channels) and len(varbinds) % 2 == 0#whole rows only
+    assert [oid for oid, value in varbinds[:4]] == [ResolveOID('outputVoltage.u0'), ResolveOID('outputName.u0'),
+                                                    ResolveOID('outputVoltage.u1'), ResolveOID('outputName.u1')]
+
+def test_set_is_all_or_nothing():
+    sim = CrateSimulator({0: 2})
+    varbinds = [(ResolveOID('outputVoltage.u0'), 'F', 100.), (ResolveOID('outputSwitch.u1'), 'i', 1)]
+    for bad, status in (((ResolveOID('outputSwitch.u0'), 'i', 7), 'wrongValue'),
+                        ((ResolveOID('outputVoltage.u1'), 'i', 5), 'wrongType'),
+                        ((ResolveOID('outputStatus.u0'), 'i', 0), 'notWritable')):
+        reply = Request(sim, 'guru', SET, varbinds + [bad])
+        assert reply[1:3] == (ERRORS[status], 3)
+        assert sim.v_target[0] == 0 and not sim.on[1]#nothing applied
+    reply = Request(sim, 'guru', SET, varbinds)
+    assert reply[1:3] == (0, 0) and [value for oid, value in reply[3]] == [100., 1]
+    assert sim.v_target[0] == 100. and sim.on[1]
+
+def test_loss_counted():
+    with CrateSimulator({0: 2}, loss = 1.) as sim:
+        transport = NativeTransport('127.0.0.1', sim.port, timeout = 0.05, retries = 2)
+        try:
+            with pytest.raises(OSError):
+                transport.Get([ResolveOID('outputSwitch.u0')])
+        finally:
+            transport.Close()
+        assert sim.Stats() == {'requests': 3, 'varbinds': 3, 'dropped': 3}
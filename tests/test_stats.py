@@ -0,0 +1,72 @@
+#MPODStats: latency buckets and percentiles, and MPOD.stats() request/error/retry counts
+import numpy as np
+from Driver.MPODStats import SUB_BUCKETS, BucketIndex, BucketValue, Family, LatencyHistogram, CommandStats
+
+def test_bucket_edges():
+    '''Every value lands in a bucket whose upper edge is >= it and within 1/SUB_BUCKETS of it, buckets are in order'''
+    values = list(range(0, 1 << 16)) + [int(x) for x in np.logspace(5, 10, 500)]
+    for us in values:
+        index = BucketIndex(us)
+        assert BucketValue(index) >= us and (index == 0 or BucketValue(index - 1) < us)
+        assert BucketValue(index) - us <= us/SUB_BUCKETS
+    assert [BucketIndex(us) for us in (0, 31, 32, 63, 64, 65, 66)] == [0, 31, 32, 63, 64, 64, 65]
+    assert [BucketValue(index) for index in (31, 32, 63, 64, 65)] == [31, 32, 63, 65, 67]
+
+def test_percentiles_of_known_distribution():
+    hist = LatencyHistogram()
+    assert hist.Percentile(50) == 0.
+    for ms in range(1, 1001):#uniform 1..1000 ms
+        hist.Record(ms/1000)
+    for p in (10, 50, 90, 99):
+        assert p*1e-2 <= hist.Percentile(p) <= p*1e-2*(1 + 1/SUB_BUCKETS)
+    assert hist.Percentile(100) == hist.max == 1.
+    assert hist.count == 1000 and np.isclose(hist.total, 500.5)
+    other = LatencyHistogram()
+    for _ in range(1000):
+        other.Record(2.)
+    hist.Merge(other)
+    assert hist.Percentile(40) <= 0.81 and hist.Percentile(60) == 2. and hist.count == 2000
+    single = LatencyHistogram()
+    single.Record(0.)#below 1 us
+    assert single.Percentile(99) == 0.
+
+def test_summary_and_family():
+    assert Family('outputVoltage.u1 F 5 outputSwitch.u1 i 1 outputVoltage.u2 F 6') == 'outputVoltage+outputSwitch'
+    stats = CommandStats()
+    stats.Record('walk', 'outputMeasurementCurrent', 0.004)
+    stats.Record('walk', 'outputMeasurementCurrent', 0.002, errors = 1, retries = 1)
+    stats.Record('get', 'sysMainSwitch', 0.010)
+    summary = stats.Summary()
+    assert list(summary) == ['get sysMainSwitch', 'walk outputMeasurementCurrent']#most total time first
+    row = summary['walk outputMeasurementCurrent']
+    assert (row['count'], row['errors'], row['retries']) == (2, 1, 1) and np.isclose(row['mean_ms'], 3.)
+    assert np.isclose(stats.busy, 0.016) and len(stats.Table().splitlines()) == 3
+    stats.Reset()
+    assert stats.Summary() == {} and stats.busy == 0
+
+def test_mpod_stats_counts_retries_and_errors(sim, mpod):
+    assert mpod.stats() == {}
+    mpod.EnableStats()
+    send, failures = mpod.transport.Send, [ConnectionResetError('lost')]
+    def flaky(cmd_type, cmd):#first request fails, the retry goes through
+        if failures:
+            raise failures.pop()
+        return send(cmd_type, cmd)
+    mpod.transport.Send = flaky
+    mpod.GetAllVoltages()
+    mpod.SetPower(0, 7)#wrongValue: rejected, retried, rejected again
+    mpod.GetPowerCrate()
+    with mpod.batch() as b:
+        b.set_power(1, 7)
+        b.set_power(2, 1)
+    commands = mpod.stats(reset = True)['commands']
+    walk = commands['walk outputMeasurementSenseVoltage']
+    assert (walk['count'], walk['errors'], walk['retries']) == (1, 0, 1)
+    switch = commands['set outputSwitch']
+    assert (switch['count'], switch['errors'], switch['retries']) == (2, 2, 1)#SetPower, then the batch PDU
+    assert (commands['get sysMainSwitch']['count'], commands['get sysMainSwitch']['errors']) == (1, 0)
+    assert sim.on[2] and len(b.errors) == 1
+    assert mpod.stats()['commands'] == {}
+    mpod.EnableStats(False)
+    mpod.GetPowerCrate()
+    assert mpod.stats() == {}
@@ -0,0 +1,34 @@
+#MPODStatus: status words of every known bit, from bytes (native transport) and hex pairs (snmp commands)
+import numpy as np
+from Driver.MPODStatus import (STATUS_FLAGS, BIT_LENGTH, BitMask, FlagMask, StatusWords, StatusBits, WordsToBits,
+                               AnyFlag, Describe)
+
+def Octets(bits, mode):
+    '''bytes of a status with bits set (bit 0 is the MSB of the first octet)'''
+    n_bytes = BIT_LENGTH[mode] // 8
+    value = sum(1 << (8*n_bytes - 1 - b) for b in bits)
+    return value.to_bytes(n_bytes, 'big')
+
+def test_every_flag_decodes():
+    for mode, flags in STATUS_FLAGS.items():
+        for bit, (name, flag, desc) in flags.items():
+            octets = Octets([bit], mode)
+            hex_pairs = [f'{x:02x}' for x in octets]
+            words = StatusWords([octets, hex_pairs, b''], mode)
+            assert list(words) == [FlagMask([name], mode)]*2 + [0], (mode, name)
+            assert BitMask([bit], mode) == FlagMask([name], mode) == 1 << (BIT_LENGTH[mode] - 1 - bit)
+            assert np.array_equal(WordsToBits(words, mode), StatusBits([octets, hex_pairs, b''], mode))
+            assert np.flatnonzero(WordsToBits(words, mode)[0]).tolist() == [bit]
+            assert Describe(int(words[0]), mode) == [[name], [flag], [desc], [bit]]
+            assert list(AnyFlag(words, FlagMask([name], mode))) == [0, 1]
+
+def test_known_channel_words():
+    '''outputStatus 'BITS: 04 00 40' is TRIP (5) and LCR (17), short replies are zero padded'''
+    words = StatusWords([b'\x04\x00\x40', ['80', '10'], b'\x00\x00\x80', b'\x80'], 'channel')
+    assert list(words) == [FlagMask(['TRIP', 'LCR']), FlagMask(['ON', 'RAMP UP']), FlagMask(['CV']), FlagMask(['ON'])]
+    assert Describe(WordsToBits(words)[0])[0] == ['TRIP', 'LCR']
+    assert Describe(0x000001)[3] == []#bit 23: not a known flag
+    trip_or_on = FlagMask(['TRIP', 'ON'])
+    assert list(AnyFlag(words, trip_or_on)) == [0, 1, 3]
+    assert list(AnyFlag(words, trip_or_on, rows = [3, 2, 0])) == [3, 0]#indices into words
+    assert list(StatusWords([b'\x80\x00'], 'get crate status')) == [FlagMask(['ON'], 'crate')] == [1 << 15]
@@ -0,0 +1,74 @@
+#MPODTransport: BER codec and the native SNMP transport against the simulated crate
+import random
+import numpy as np
+import pytest
+from Driver.MPODSimulator import CrateSimulator
+from Driver.MPODTransport import (GET, SET, RESPONSE, EncodeMessage, DecodeMessage, ResolveOID, NoSuchValue,
+                                  NO_SUCH_VALUES, EncodeTLV, NativeTransport, SNMPError)
+
+def test_codec_round_trip():
+    '''Every value type the driver sends or reads survives EncodeMessage -> DecodeMessage'''
+    oid = ResolveOID('outputVoltage.u101')
+    varbinds = [(oid, 'i', 0), (oid, 'i', -129), (oid, 'i', 2**31 - 1), (oid, 'u', 4000000000),
+                (oid, 'F', 1234.5), (oid, 'F', -0.001), (oid, 'D', 1e-9), (oid, 's', 'HV 101'), (oid, 'x', 'a5ff'),
+                ((1, 3, 6, 1, 4, 1, 19947, 1, 3, 2, 1, 10, 2**28 + 5), None, None)]
+    request_id, status, index, decoded = DecodeMessage(EncodeMessage('guru', SET, 123456, varbinds))
+    assert (request_id, status, index) == (123456, 0, 0)
+    assert [oid for oid, value in decoded] == [vb[0] for vb in varbinds]
+    values = [value for oid, value in decoded]
+    assert values[:4] == [0, -129, 2**31 - 1, 4000000000]
+    assert np.float32(values[4]) == np.float32(1234.5) and np.isclose(values[5], -0.001)#Opaque float32
+    assert values[6] == 1e-9#Opaque double is exact
+    assert values[7:] == [b'HV 101', bytes.fromhex('a5ff'), None]
+
+def test_decode_long_message_and_no_such():
+    '''Lengths above 127 bytes (long form) and noSuchInstance/endOfMibView values'''
+    oid = ResolveOID('outputVoltage.u0')
+    message = EncodeMessage('public', RESPONSE, 7, [(oid, 's', 'x'*300)])
+    assert DecodeMessage(message)[3][0][1] == b'x'*300
+    message = EncodeMessage('public', GET, 8, [(oid, None, None)]).replace(b'\x05\x00', EncodeTLV(0x81, b''))
+    value = DecodeMessage(message)[3][0][1]
+    assert isinstance(value, NoSuchValue) and value is NO_SUCH_VALUES[0x81] and not value
+
+def test_native_set_and_get(sim):
+    transport = NativeTransport('127.0.0.1', sim.port)
+    try:
+        transport.Set([(ResolveOID('outputVoltage.u101'), 'F', 250.5), (ResolveOID('outputSwitch.u101'), 'i', 1)])
+        reply = transport.Get([ResolveOID('outputVoltage.u101'), ResolveOID('outputSwitch.u101'), ResolveOID('outputVoltage.u999')])
+        assert [vb.name for vb in reply[:2]] == ['outputVoltage', 'outputSwitch'] and reply[0].index == 'u101'
+        assert [vb.value for vb in reply[:2]] == [250.5, 1]
+        assert reply[2].value is NO_SUCH_VALUES[0x81]
+        with pytest.raises(SNMPError) as err:
+            transport.Set([(ResolveOID('outputSwitch.u101'), 'i', 7)])
+        assert (err.value.status, err.value.index) == (10, 1)#wrongValue on the first varbind
+    finally:
+        transport.Close()
+
+def test_native_splits_too_big_requests():
+    '''A GET whose reply is larger than the agent allows (1472 bytes) is split, the smaller size is remembered'''
+    with CrateSimulator({0: 48, 1: 48}) as sim:
+        transport = NativeTransport('127.0.0.1', sim.port, max_message_size = 60000)
+        try:
+            oids = [ResolveOID(f'{name}.u{ch}') for name in ('outputVoltage', 'outputCurrent', 'outputName') for ch in sim.channels]
+            reply = transport.Get(oids)
+            assert [vb.oid for vb in reply] == oids
+            assert transport.max_message_size < 60000
+        finally:
+            transport.Close()
+
+def test_native_retries_lost_replies():
+    random.seed(1)#the simulator drops replies with random.random()
+    with CrateSimulator({0: 4}, loss = 0.3) as sim:
+        transport = NativeTransport('127.0.0.1', sim.port, timeout = 0.05, retries = 10)
+        try:
+            for k in range(20):
+                assert transport.Get([ResolveOID('outputSwitch.u0')])[0].value == 0
+            assert sim.Stats()['dropped'] > 0
+        finally:
+            transport.Close()
+    transport = NativeTransport('127.0.0.1', sim.port, timeout = 0.05)#agent stopped: an error, not a hang
+    try:
+        with pytest.raises(OSError):#socket.timeout, or ConnectionRefusedError from the local port
+            transport.Get([ResolveOID('outputSwitch.u0')])
+    finally:
+        transport.Close()
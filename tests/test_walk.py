@@ -0,0 +1,26 @@
+#GETBULK table walks: MPODTransport.BulkWalk and the MPOD.GetAll* methods against the simulated crate
+import numpy as np
+
+def test_bulk_walk_across_columns(sim, mpod):
+    '''Columns of different lengths walked together, a few rows per GETBULK: every instance once, in order'''
+    sim.v_target[:] = np.arange(len(sim.channels))*10.
+    names = ['outputVoltage', 'outputSwitch', 'moduleRampSpeedVoltage']
+    result = mpod.transport.Walk(names, max_repetitions = 3)
+    assert [len(result[name]) for name in names] == [len(sim.channels), len(sim.channels), len(sim.slots)]
+    for name in names:
+        oids = [vb.oid for vb in result[name]]
+        assert oids == sorted(oids) and all(vb.name == name for vb in result[name])
+    assert [vb.value for vb in result['outputVoltage']] == list(sim.v_target)
+    assert [vb.index for vb in result['outputVoltage']] == [f'u{ch}' for ch in sim.channels]
+
+def test_get_all_in_a_few_requests(sim, mpod):
+    '''A column walk of the whole crate is one or two GETBULKs, not one GETNEXT per channel'''
+    sim.v_target[:] = np.arange(len(sim.channels))*10.
+    sim.on[::2] = True
+    before = sim.Stats()['requests']
+    assert mpod.GetAllTargetVoltages() == list(sim.v_target)
+    assert sim.Stats()['requests'] - before <= 2
+    columns = mpod.GetAllColumns({'outputVoltage': 'float array', 'outputSwitch': 'binary array'})
+    assert columns['outputVoltage'] == list(sim.v_target)
+    assert columns['outputSwitch'] == [1, 0]*(len(sim.channels)//2)
+    assert mpod.GetAllNames() == list(sim.channels)#channel numbers parsed from u101...
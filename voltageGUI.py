@@ -1,19 +1,27 @@
 import dearpygui.dearpygui as dpg
 import pathlib
 import csv
+import threading
+import time
 from screeninfo import get_monitors
 from Driver.MPODClass import MPOD
 from Driver.MPODCustomFunctions import CustomFx
 
 class voltageGUI: 
-    def __init__(self, IP = '169.254.107.70', take_real_data = True, active_modules = [0],channel_names = ['Cathode','GEM Top+','GEM Top-','GEM Mid+','GEM Mid-','GEM Low+','GEM Low-','None'],Crate = None, FX = None):
+    def __init__(self, IP = '169.254.107.70', take_real_data = True, active_modules = [0],channel_names = ['Cathode','GEM Top+','GEM Top-','GEM Mid+','GEM Mid-','GEM Low+','GEM Low-','None'],Crate = None, FX = None, broker = None):
         self.dv_tags = ["DriftInput","TopGEMInput","TopTransferInput","MidGEMInput","LowTransferInput","LowGEMInput","InductionInput"]
         self.v_tags = ['VCathode', 'VTopGEM+', 'VTopGEM-', 'VMidGEM+', 'VMidGEM-', 'VLowGEM+', 'VLowGEM-', 'VAnode']
+        self.broker = broker
+        if broker is not None:#Driver.MPODBroker client: the broker process owns the crate connection
+            Crate, FX = broker.MPOD, broker.FX
+        self.Crate, self.FX = Crate, FX
         if Crate is None:
             self.Crate = MPOD(IP=IP)
         self.savefile_path = str(pathlib.Path(__file__).parent.resolve()/"Results") # Default/current file path
         if FX is None: 
             self.FX = CustomFx(self.Crate, take_real_data=take_real_data,active_modules = active_modules, channel_names = [channel_names])
+        self.ramp_thread = None#steps FX.ramp while a RampTogether runs (no broker)
+        self.ramp_lock = threading.Lock()
 
     def print_checkbox_state(self, sender, app_data):
         """Callback for checkboxes."""
@@ -27,7 +35,10 @@ class voltageGUI:
         if sender == 'SendAll':
             v = [dpg.get_value(tag) for tag in self.v_tags]
             if dpg.get_value('checkbox_b'):
-                self.FX.RampTogether(self.FX.my_channels,v,n_div = 25)
+                #returns at once, the broker's poll loop or the ramp thread steps FX.ramp: the window keeps drawing
+                self.FX.RampTogether(self.FX.my_channels, v, pass_to_GUI = True)
+                if self.broker is None:
+                    self.start_ramp_thread()
             else:
                 self.FX.RampAll(self.FX.my_channels,[v])
 
@@ -44,6 +55,23 @@ class voltageGUI:
                 dpg.set_value(tag,round(v_start*(1+pct/100),1))
             self.update_voltages_callback('VCathode')
    
+    def start_ramp_thread(self, tick = 0.2):
+        #What the acquisition thread's GetAllValues does in GUI.py: one FX.ramp.Step every tick until the ramp ends
+        #One thread at a time, a ramp started while it runs is stepped by the same thread
+        def step_ramp():
+            while True:
+                with self.ramp_lock:
+                    if not self.FX.ramp.Active():
+                        self.ramp_thread = None
+                        break
+                self.FX.ramp.Step()
+                time.sleep(tick)
+            print(self.FX.ramp.Summary())
+        with self.ramp_lock:
+            if self.ramp_thread is None:
+                self.ramp_thread = threading.Thread(target = step_ramp, name = 'ramp', daemon = True)
+                self.ramp_thread.start()
+
     def save_config(self):
         # new_row_data = [a,b,c]
         # with open('people.csv', mode='a', newline='') as file: